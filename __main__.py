@@ -1,23 +1,254 @@
-import logging
+import argparse
+import atexit
 import os
+from datetime import datetime
 
-from krakenapi import KrakenApi
+from krakendca.logs import setup_logging
+from krakendca.profiling import ImportTimer, Profiler
 
-from krakendca.config import Config
-from krakendca.krakendca import KrakenDCA
 
-if __name__ == "__main__":
-    logging.basicConfig(
-        format="%(asctime)s - %(levelname)s:%(name)s: %(message)s",
-        level=logging.INFO,
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parse command line arguments.
+
+    :return: Parsed arguments as Namespace.
+    """
+    parser = argparse.ArgumentParser(
+        description="Automate Dollar Cost Averaging on Kraken exchange."
+    )
+    parser.add_argument(
+        "--plan-only",
+        action="store_true",
+        help="Print the orders plan without sending any order.",
+    )
+    parser.add_argument(
+        "--migrate-orders",
+        nargs="?",
+        const="orders.csv",
+        metavar="CSV_FILE",
+        help="Import an orders history CSV file (default: orders.csv) to "
+        "the configured order_store, without sending any order.",
+    )
+    parser.add_argument(
+        "--ohlc-update",
+        type=int,
+        metavar="INTERVAL",
+        help="Append the new INTERVAL minutes candles of every DCA pair to "
+        "the configured ohlc_store, without sending any order.",
+    )
+    parser.add_argument(
+        "--ohlc-backfill",
+        type=int,
+        metavar="INTERVAL",
+        help="Fill the INTERVAL minutes candles gaps of every DCA pair in "
+        "the configured ohlc_store from Kraken trades history.",
+    )
+    parser.add_argument(
+        "--ohlc-ingest",
+        nargs=3,
+        metavar=("CSV_FILE", "PAIR", "INTERVAL"),
+        help="Add INTERVAL minutes candles of PAIR to the configured "
+        "ohlc_store from a Kraken trades CSV file.",
+    )
+    parser.add_argument(
+        "--simulate",
+        type=int,
+        metavar="PATHS",
+        help="Report the DCA pairs cost basis and units percentiles over "
+        "PATHS price paths simulated from the daily candles of the "
+        "configured ohlc_store, without sending any order.",
+    )
+    parser.add_argument(
+        "--simulation-model",
+        choices=("bootstrap", "gbm"),
+        help="With --simulate, resample history daily returns (default) or "
+        "draw them from a geometric Brownian motion fitted to history.",
+    )
+    parser.add_argument(
+        "--simulation-days",
+        type=int,
+        help="With --simulate, number of simulated days (default: 365).",
+    )
+    parser.add_argument(
+        "--reconcile",
+        nargs="+",
+        metavar="DATE",
+        help="Report orders missing from, orphaned in or mismatching the "
+        "order journal against Kraken orders opened from the first to the "
+        "second DATE (YYYY-MM-DD, default: now), without sending any order.",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="With --reconcile, add missing orders to the order journal, "
+        "remove orphaned ones and replace mismatching ones.",
     )
+    parser.add_argument(
+        "--resident",
+        nargs="?",
+        type=float,
+        const=60,
+        metavar="MINUTES",
+        help="Keep running and handle the DCA every MINUTES (default: 60), "
+        "with orders kept from the private WebSocket feed if order_feed is "
+        "set.",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default="text",
+        help="Log records as text lines (default) or JSON lines with pair, "
+        "run_id and phase fields.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the DCA run, write pstats and collapsed stacks files "
+        "and report import, CPU and network times.",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default="profile",
+        help="Profiling output files path prefix (default: profile).",
+    )
+    args = parser.parse_args()
+    ohlc_intervals = {
+        "--ohlc-update": args.ohlc_update,
+        "--ohlc-backfill": args.ohlc_backfill,
+    }
+    if args.ohlc_ingest:
+        interval = args.ohlc_ingest[2]
+        ohlc_intervals["--ohlc-ingest"] = (
+            int(interval) if interval.isdigit() else -1
+        )
+    if any(interval is not None for interval in ohlc_intervals.values()):
+        from krakendca.ohlc_store import INTERVALS
+
+        for argument, interval in ohlc_intervals.items():
+            if interval is not None and interval not in INTERVALS:
+                parser.error(
+                    f"argument {argument}: INTERVAL must be one of "
+                    f"{', '.join(str(interval) for interval in INTERVALS)}"
+                )
+    if args.resident is not None and not 0 < args.resident < float("inf"):
+        parser.error("argument --resident: MINUTES must be a number > 0")
+    if args.simulate is not None and args.simulate < 1:
+        parser.error("argument --simulate: must be at least 1")
+    if args.simulate is None and (
+        args.simulation_model is not None or args.simulation_days is not None
+    ):
+        parser.error(
+            "arguments --simulation-model, --simulation-days: require "
+            "--simulate"
+        )
+    if args.simulation_days is not None and args.simulation_days < 1:
+        parser.error("argument --simulation-days: must be at least 1")
+    if args.reconcile and len(args.reconcile) > 2:
+        parser.error("argument --reconcile: expected at most 2 arguments")
+    if args.repair and not args.reconcile:
+        parser.error("argument --repair: requires --reconcile")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    # Records are written by a dedicated thread, flushed on exit.
+    atexit.register(setup_logging(args.log_format == "json").stop)
+    import_timer: ImportTimer = ImportTimer()
+    if args.profile:
+        import_timer.install()
+    # Imported here for their import time to be measured when profiling.
+    from krakendca.client import KrakenClient
+    from krakendca.config import Config
+    from krakendca.krakendca import KrakenDCA
+
+    import_timer.uninstall()
     # Get parameters from configuration file.
     current_directory: str = os.path.dirname(os.path.realpath(__file__))
     config_file: str = current_directory + "/config.yaml"
     config: Config = Config(config_file)
     # Initialize the KrakenAPI object.
-    ka: KrakenApi = KrakenApi(config.api_public_key, config.api_private_key)
+    ka: KrakenClient = KrakenClient.from_config(config)
     # Initialize KrakenDCA and handle the DCA based on configuration.
     kdca: KrakenDCA = KrakenDCA(config, ka)
-    kdca.initialize_pairs_dca()
-    kdca.handle_pairs_dca()
+    try:
+        if args.migrate_orders:
+            if not kdca.order_store:
+                raise ValueError(
+                    "No order_store set in the configuration file."
+                )
+            kdca.order_store.import_csv(args.migrate_orders)
+        elif (
+            args.ohlc_update is not None
+            or args.ohlc_backfill is not None
+            or args.ohlc_ingest
+        ):
+            if not config.ohlc_store:
+                raise ValueError(
+                    "No ohlc_store set in the configuration file."
+                )
+            from krakendca.ohlc_store import OHLCStore
+
+            ohlc_store: OHLCStore = OHLCStore(config.ohlc_store)
+            pairs = [dca_pair.get("pair") for dca_pair in config.dca_pairs]
+            if args.ohlc_ingest:
+                trades_file, pair, interval = args.ohlc_ingest
+                ohlc_store.ingest_trades_csv(pair, int(interval), trades_file)
+            for pair in pairs if args.ohlc_update is not None else []:
+                ohlc_store.update(ka, pair, args.ohlc_update)
+            for pair in pairs if args.ohlc_backfill is not None else []:
+                ohlc_store.backfill(ka, pair, args.ohlc_backfill)
+        elif args.simulate is not None:
+            if not config.ohlc_store:
+                raise ValueError(
+                    "No ohlc_store set in the configuration file."
+                )
+            from krakendca.ohlc_store import OHLCStore
+            from krakendca.simulation import MonteCarlo
+
+            kdca.initialize_pairs_dca()
+            monte_carlo: MonteCarlo = MonteCarlo.from_ohlc_store(
+                kdca.dcas_list,
+                OHLCStore(config.ohlc_store),
+                model=args.simulation_model or "bootstrap",
+                days=args.simulation_days or 365,
+            )
+            for result in monte_carlo.run(args.simulate).values():
+                print(result.report())
+        elif args.reconcile:
+            start, *end = [
+                datetime.strptime(date, "%Y-%m-%d") for date in args.reconcile
+            ]
+            kdca.reconcile_orders(
+                start, end[0] if end else datetime.utcnow(), args.repair
+            )
+        elif args.plan_only:
+            with kdca.notified_errors():
+                kdca.initialize_pairs_dca()
+                print(kdca.plan_pairs_dca())
+        elif args.profile:
+            profiler: Profiler = Profiler(args.profile_output, import_timer)
+            profiler.instrument_api(ka)
+            try:
+                with kdca.notified_errors():
+                    profiler.run(kdca.initialize_pairs_dca)
+                    profiler.run(kdca.handle_pairs_dca)
+            finally:
+                profiler.write_stats()
+                profiler.report()
+        elif args.resident is not None:
+            with kdca.notified_errors():
+                kdca.initialize_pairs_dca()
+            try:
+                kdca.run_resident(args.resident * 60)
+            except KeyboardInterrupt:
+                pass
+        else:
+            with kdca.notified_errors():
+                kdca.initialize_pairs_dca()
+                kdca.handle_pairs_dca()
+    finally:
+        ka.coalescer.log_statistics()
+        if kdca.notifier:
+            # Queued notifications are sent or spilled before exiting.
+            kdca.notifier.close()
@@ -0,0 +1,74 @@
+"""
+Measure the last pair order lookup latency from the SQLite order store
+against reading the orders history CSV file.
+
+Usage: python -m benchmarks.order_store [orders]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from krakendca.order import Order
+from krakendca.order_store import OrderStore
+
+PAIRS = ["XETHZEUR", "XXBTZEUR", "DOTEUR"]
+LOOKUPS: int = 1000
+
+
+def main(orders_count: int) -> None:
+    """
+    Print the average last order lookup time per storage.
+
+    :param orders_count: Orders count in the history.
+    :return: None
+    """
+    directory = tempfile.mkdtemp()
+    csv_filepath = os.path.join(directory, "orders.csv")
+    store = OrderStore(os.path.join(directory, "orders.db"))
+    start_date = datetime(2021, 1, 1)
+    orders = []
+    for index in range(orders_count):
+        order = Order.buy_limit_order(
+            start_date + timedelta(hours=index),
+            PAIRS[index % len(PAIRS)],
+            20,
+            2083.16,
+            8,
+            4,
+        )
+        order.txid = f"O{index:06d}"
+        order.description = ""
+        orders.append(order)
+    store.add_orders(orders)
+    pd.DataFrame.from_records([vars(order) for order in orders]).to_csv(
+        csv_filepath, index=False
+    )
+
+    start = time.perf_counter()
+    for index in range(LOOKUPS):
+        store.last_order(PAIRS[index % len(PAIRS)])
+    store_time = (time.perf_counter() - start) / LOOKUPS
+
+    lookups = max(LOOKUPS // 100, 1)
+    start = time.perf_counter()
+    for index in range(lookups):
+        history = pd.read_csv(csv_filepath)
+        history[history["pair"] == PAIRS[index % len(PAIRS)]].iloc[-1]
+    csv_time = (time.perf_counter() - start) / lookups
+    store.close()
+    print(
+        f"{orders_count} orders: order store {store_time * 1e6:.1f}us, "
+        f"CSV file {csv_time * 1e6:.1f}us per last order lookup."
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        for orders_count in (100, 10000, 100000):
+            main(orders_count)
@@ -0,0 +1,118 @@
+"""
+Measure the local overhead of an AddOrder request, from the final order to
+the request bytes ready to be written on the connection, with the request
+built and signed at send time against prepared ahead and signed with the
+reused HMAC state.
+
+Both paths include the nonce and signature made when the request takes its
+dispatch turn, the prepared path being signed there only.
+
+Usage: python -m benchmarks.presigned_order [requests]
+"""
+import base64
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List
+from urllib.parse import parse_qsl, urlencode
+
+from krakenapi import KrakenApi
+
+from krakendca.nonce import NonceKrakenApi
+from krakendca.order import Order
+from krakendca.signer import SigningKrakenApi, replace_nonce
+
+API_PRIVATE_KEY = base64.b64encode(os.urandom(64)).decode()
+
+
+class Client(NonceKrakenApi, SigningKrakenApi):
+    pass
+
+
+def send_time(ka: KrakenApi, order: Order) -> None:
+    """
+    Build and sign the AddOrder request at send time, then renew its nonce
+    by parsing the POST data again.
+
+    :param ka: KrakenApi object.
+    :param order: Order object.
+    :return: None
+    """
+    post_inputs = {
+        "pair": order.pair,
+        "type": order.type,
+        "ordertype": order.order_type,
+        "price": order.pair_price,
+        "volume": order.volume,
+        "oflags": order.o_flags,
+        "userref": order.userref,
+    }
+    request = ka.create_api_request(False, "AddOrder", post_inputs)
+    nonce = ka.create_api_nonce()
+    post_inputs = dict(parse_qsl(request.data.decode()))
+    post_inputs["nonce"] = nonce
+    body = urlencode(post_inputs, safe=",").encode()
+    ka.create_api_signature(nonce, body, "AddOrder")
+
+
+def prepared_ahead(ka: KrakenApi, order: Order) -> Callable[[], None]:
+    """
+    Return the send step of an AddOrder request prepared ahead: finalize
+    it, then renew its nonce in place.
+
+    :param ka: KrakenApi object.
+    :param order: Order object.
+    :return: Send step function.
+    """
+    prepared = order.prepare_request(ka)
+
+    def send() -> None:
+        request = prepared.finalize(ka)
+        nonce = ka.create_api_nonce()
+        body = replace_nonce(request.data, nonce)
+        ka.create_api_signature(nonce, body, "AddOrder")
+
+    return send
+
+
+def percentiles(timings: List[float]) -> str:
+    """
+    Return p50 and p99 of timings in microseconds.
+
+    :param timings: Timings in seconds.
+    :return: Percentiles as string.
+    """
+    quantiles = statistics.quantiles(timings, n=100)
+    return f"p50 {quantiles[49] * 1e6:.1f}us, p99 {quantiles[98] * 1e6:.1f}us"
+
+
+def main(requests: int) -> None:
+    """
+    Print the p50 and p99 overhead per request path.
+
+    :param requests: Requests count per path.
+    :return: None
+    """
+    order = Order.buy_limit_order(
+        datetime(2021, 4, 15), "XETHZEUR", 20, 2083.16, 8, 4
+    )
+    ka = KrakenApi("api_public_key", API_PRIVATE_KEY)
+    client = Client("api_public_key", API_PRIVATE_KEY)
+    baseline, presigned = [], []
+    for _ in range(requests):
+        start = time.perf_counter()
+        send_time(ka, order)
+        baseline.append(time.perf_counter() - start)
+        # Prepared once the order is final, before the send decision.
+        send = prepared_ahead(client, order)
+        start = time.perf_counter()
+        send()
+        presigned.append(time.perf_counter() - start)
+    print(f"Built at send time: {percentiles(baseline)}.")
+    print(f"Prepared ahead:     {percentiles(presigned)}.")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
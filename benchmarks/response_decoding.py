@@ -0,0 +1,138 @@
+"""
+Measure the decoding time and peak memory of an account orders history,
+parsed into full nested dictionaries with the standard json module against
+decoded into slotted records.
+
+ClosedOrders pages of 50 orders and a single OpenOrders response are built
+in Kraken format, decoded and kept like Account.get_closed_orders does.
+
+Usage: python -m benchmarks.response_decoding [orders]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+from benchmarks.userref_payload import PAGE_SIZE, order
+from krakendca.records import decode_response, loads
+
+REPEATS: int = 5
+
+
+def response(result: dict) -> bytes:
+    """
+    Return a Kraken API response body.
+
+    :param result: Response result.
+    :return: Response body.
+    """
+    return json.dumps({"error": [], "result": result}).encode()
+
+
+def closed_pages(orders_count: int) -> List[bytes]:
+    """
+    Return the ClosedOrders responses of an orders history.
+
+    :param orders_count: Orders count in the history.
+    :return: Responses bodies, one per page.
+    """
+    orders = {
+        f"O{index:05d}-XXXXX-XXXXXX": order(index, "ETHEUR", 0)
+        for index in range(orders_count)
+    }
+    txids = list(orders)
+    return [
+        response(
+            {
+                "closed": {
+                    txid: orders[txid] for txid in txids[start:][:PAGE_SIZE]
+                },
+                "count": orders_count,
+            }
+        )
+        for start in range(0, orders_count, PAGE_SIZE)
+    ]
+
+
+def json_decode(body: bytes, endpoint: str) -> dict:
+    """
+    Decode a response like KrakenApi.extract_response_data.
+
+    :param body: Response body.
+    :param endpoint: Request endpoint, unused.
+    :return: Response result.
+    """
+    return json.loads(body.decode()).get("result")
+
+
+def measure(
+    decode: Callable[[bytes, str], dict], pages: List[bytes], key: str
+) -> tuple:
+    """
+    Decode every page and merge their orders.
+
+    :param decode: Response decoding function.
+    :param pages: Responses bodies.
+    :param key: Result orders key, open or closed.
+    :return: Best decoding time in seconds, peak and kept memory in bytes.
+    """
+    endpoint = "ClosedOrders" if key == "closed" else "OpenOrders"
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        orders = {}
+        for page in pages:
+            orders.update(decode(page, endpoint).get(key))
+        best = min(best, time.perf_counter() - start)
+        del orders
+    tracemalloc.start()
+    orders = {}
+    for page in pages:
+        orders.update(decode(page, endpoint).get(key))
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, kept
+
+
+def main(orders_count: int) -> None:
+    """
+    Print decoding time and memory per decoding path.
+
+    :param orders_count: Orders count in the history.
+    :return: None
+    """
+    parser = getattr(loads, "__module__", None) or "json"
+    pages = closed_pages(orders_count)
+    open_orders = [
+        response(
+            {
+                "open": {
+                    f"O{index:05d}-XXXXX-XXXXXX": order(index, "ETHEUR", 0)
+                    for index in range(orders_count)
+                }
+            }
+        )
+    ]
+    for name, bodies, key in (
+        ("ClosedOrders", pages, "closed"),
+        ("OpenOrders", open_orders, "open"),
+    ):
+        json_time, json_peak, json_kept = measure(json_decode, bodies, key)
+        time_, peak, kept = measure(decode_response, bodies, key)
+        print(
+            f"{orders_count} {name} orders: "
+            f"json dicts {json_time * 1000:.1f}ms, "
+            f"peak {json_peak / 1e6:.1f}MB, kept {json_kept / 1e6:.1f}MB / "
+            f"{parser} records {time_ * 1000:.1f}ms, "
+            f"peak {peak / 1e6:.1f}MB, kept {kept / 1e6:.1f}MB."
+        )
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    if arguments:
+        main(*arguments)
+    else:
+        for orders_count in (100, 1000, 10000):
+            main(orders_count)
@@ -0,0 +1,127 @@
+"""
+Measure OpenOrders/ClosedOrders response payloads of the duplicate orders
+check, unfiltered versus filtered on the pairs userrefs by Kraken.
+
+Responses are built in Kraken format for an account with manual trading
+alongside Kraken-DCA orders, closed orders being paginated by 50.
+
+Usage: python -m benchmarks.userref_payload [manual_orders] [pairs]
+"""
+import json
+import sys
+from typing import List
+
+from krakendca.utils import pair_userref
+
+PAIRS: List[str] = ["XETHZEUR", "XXBTZEUR", "DOTEUR", "ADAEUR", "SOLEUR"]
+# Kraken ClosedOrders page size.
+PAGE_SIZE: int = 50
+
+
+def order(index: int, pair: str, userref: int) -> dict:
+    """
+    Return a closed limit order as returned by Kraken.
+
+    :param index: Order index, used for txid and times.
+    :param pair: Pair alt name.
+    :param userref: Order userref, 0 if untagged.
+    :return: Order information dictionary.
+    """
+    opentm = 1618444800 + index * 60
+    return {
+        "refid": None,
+        "userref": userref,
+        "status": "closed",
+        "opentm": opentm + 0.6683,
+        "closetm": opentm + 1.2012,
+        "starttm": 0,
+        "expiretm": 0,
+        "descr": {
+            "pair": pair,
+            "type": "buy",
+            "ordertype": "limit",
+            "price": "2083.16",
+            "price2": "0",
+            "leverage": "none",
+            "order": f"buy 0.00957589 {pair} @ limit 2083.16",
+            "close": "",
+        },
+        "vol": "0.00957589",
+        "vol_exec": "0.00957589",
+        "cost": "19.94810",
+        "fee": "0.05190",
+        "price": "2083.16",
+        "stopprice": "0.00000",
+        "limitprice": "0.00000",
+        "misc": "",
+        "oflags": "fciq",
+    }
+
+
+def response_size(orders: dict, key: str) -> int:
+    """
+    Return the total size of the responses needed to get orders.
+
+    :param orders: Orders with txid as the key.
+    :param key: Response orders key, open or closed.
+    :return: Responses size in bytes.
+    """
+    txids = list(orders)
+    pages = []
+    for start in range(0, len(txids), PAGE_SIZE):
+        end = start + PAGE_SIZE
+        pages.append(txids[start:end])
+    size = 0
+    for page in pages or [[]]:
+        result = {key: {txid: orders[txid] for txid in page}}
+        if key == "closed":
+            result["count"] = len(orders)
+        size += len(json.dumps({"error": [], "result": result}))
+    return size
+
+
+def main(manual_orders: int, pairs_count: int) -> None:
+    """
+    Print unfiltered and filtered duplicate check payload sizes.
+
+    :param manual_orders: Manual closed orders in the check window.
+    :param pairs_count: DCA pairs count, one order per pair in the window.
+    :return: None
+    """
+    pairs = PAIRS[:pairs_count]
+    closed = {
+        f"OMANUAL-{index:05d}": order(index, pairs[index % len(pairs)], 0)
+        for index in range(manual_orders)
+    }
+    for index, pair in enumerate(pairs):
+        closed[f"OBOT-{index:05d}"] = order(index, pair, pair_userref(pair))
+    open_orders = {
+        f"OOPEN-{index:05d}": order(index, pair, 0)
+        for index, pair in enumerate(pairs)
+    }
+    unfiltered = response_size(open_orders, "open") + response_size(
+        closed, "closed"
+    )
+    filtered = 0
+    for pair in pairs:
+        userref = pair_userref(pair)
+        tagged = {
+            txid: infos
+            for txid, infos in closed.items()
+            if infos["userref"] == userref
+        }
+        filtered += response_size({}, "open") + response_size(tagged, "closed")
+    print(
+        f"{manual_orders} manual orders, {pairs_count} pairs: "
+        f"unfiltered {unfiltered} bytes, filtered {filtered} bytes "
+        f"({1 - filtered / unfiltered:.1%} reduction)."
+    )
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    if arguments:
+        main(*arguments)
+    else:
+        for manual_orders in (0, 10, 100, 1000):
+            main(manual_orders, 3)
@@ -0,0 +1,294 @@
+"""Kraken account data module."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from krakenapi import KrakenApi
+
+from .nonce import NonceKrakenApi
+from .order import Order
+
+T = TypeVar("T", bound="Account")
+
+
+class Account:
+    """
+    Kraken account data shared by every DCA pair during a run.
+    """
+
+    kraken_time: int
+    trade_balance: dict
+    balance: dict
+    open_orders: dict
+    closed_orders: dict
+    closed_orders_start: int
+    userrefs: Optional[List[int]]
+
+    def __init__(
+        self,
+        kraken_time: int,
+        trade_balance: dict,
+        balance: dict,
+        open_orders: dict,
+        closed_orders: dict,
+        closed_orders_start: int,
+        userrefs: Optional[List[int]] = None,
+    ) -> None:
+        """
+        Initialize the Account object.
+
+        :param kraken_time: Kraken time as unix time.
+        :param trade_balance: Account trade balance.
+        :param balance: Dict of asset names and balance amount.
+        :param open_orders: Dict of open orders with txid as the key.
+        :param closed_orders: Dict of closed orders opened since
+                              closed_orders_start with txid as the key.
+        :param closed_orders_start: Closed orders start as unix time.
+        :param userrefs: Userrefs the open and closed orders are filtered
+                         on, every order if not specified.
+        """
+        self.kraken_time = kraken_time
+        self.trade_balance = trade_balance
+        self.balance = balance
+        self.open_orders = open_orders
+        self.closed_orders = closed_orders
+        self.closed_orders_start = closed_orders_start
+        self.userrefs = userrefs
+        self.__untagged_orders: Optional[Tuple[dict, dict]] = None
+
+    @classmethod
+    def get_account_from_kraken(
+        cls,
+        ka: KrakenApi,
+        closed_orders_start: int,
+        userrefs: Optional[List[int]] = None,
+        with_orders: bool = True,
+    ) -> T:
+        """
+        Initialize the Account object from Kraken API.
+        Kraken time is requested concurrently with private data.
+
+        :param ka: KrakenApi object.
+        :param closed_orders_start: Unix time from which to get closed
+                                    orders, the earliest for all pairs.
+        :param userrefs: Userrefs to filter open and closed orders on,
+                         every order is requested if not specified.
+        :param with_orders: Request open and closed orders, left empty if
+                            False, e.g. when kept by an OrderFeed.
+        :return: Instanced Account object.
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            kraken_time = executor.submit(ka.get_time)
+            private_data = executor.submit(
+                cls.get_private_data,
+                ka,
+                closed_orders_start,
+                userrefs,
+                with_orders,
+            )
+            return cls(
+                kraken_time.result(),
+                *private_data.result(),
+                closed_orders_start,
+                userrefs,
+            )
+
+    @classmethod
+    def get_private_data(
+        cls,
+        ka: KrakenApi,
+        closed_orders_start: int,
+        userrefs: Optional[List[int]] = None,
+        with_orders: bool = True,
+    ) -> Tuple[dict, dict, dict, dict]:
+        """
+        Request account private data from Kraken API.
+        Requests are sent concurrently if nonces are ordered by the
+        KrakenApi object, sequentially otherwise as Kraken rejects private
+        requests received with a nonce lower than a previous one.
+
+        :param ka: KrakenApi object.
+        :param closed_orders_start: Unix time from which to get closed
+                                    orders.
+        :param userrefs: Userrefs to filter open and closed orders on,
+                         every order is requested if not specified.
+        :param with_orders: Request open and closed orders, empty if False.
+        :return: Trade balance, balance, open orders and closed orders.
+        """
+        max_workers = 4 if isinstance(ka, NonceKrakenApi) else 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            trade_balance = executor.submit(ka.get_trade_balance)
+            balance = executor.submit(ka.get_balance)
+            if not with_orders:
+                return trade_balance.result(), balance.result(), {}, {}
+            if userrefs is None:
+                open_orders = executor.submit(ka.get_open_orders)
+                closed_orders = executor.submit(
+                    cls.get_closed_orders, ka, closed_orders_start
+                )
+            else:
+                open_orders = executor.submit(
+                    cls.get_userrefs_orders, cls.get_open_orders, userrefs, ka
+                )
+                closed_orders = executor.submit(
+                    cls.get_userrefs_orders,
+                    cls.get_closed_orders,
+                    userrefs,
+                    ka,
+                    closed_orders_start,
+                )
+            return (
+                trade_balance.result(),
+                balance.result(),
+                open_orders.result(),
+                closed_orders.result(),
+            )
+
+    @staticmethod
+    def get_userrefs_orders(
+        get_orders: Callable, userrefs: List[int], *args
+    ) -> dict:
+        """
+        Get orders filtered on each userref.
+
+        :param get_orders: get_open_orders or get_closed_orders.
+        :param userrefs: Orders userrefs.
+        :param args: get_orders arguments, before the userref.
+        :return: Dict of orders with txid as the key.
+        """
+        orders: dict = {}
+        for userref in userrefs:
+            orders.update(get_orders(*args, userref))
+        return orders
+
+    @staticmethod
+    def get_open_orders(ka: KrakenApi, userref: Optional[int] = None) -> dict:
+        """
+        Get open orders, filtered on userref by Kraken if specified.
+
+        :param ka: KrakenApi object.
+        :param userref: Orders userref.
+        :return: Dict of open orders with txid as the key.
+        """
+        post_inputs = {"userref": userref} if userref else None
+        request = ka.create_api_request(False, "OpenOrders", post_inputs)
+        return ka.send_api_request(request).get("open")
+
+    @staticmethod
+    def get_closed_orders(
+        ka: KrakenApi, start: int, userref: Optional[int] = None
+    ) -> dict:
+        """
+        Get every closed order opened since start, requesting the following
+        pages while Kraken closed orders count is not reached.
+
+        :param ka: KrakenApi object.
+        :param start: Unix time from which to get closed orders.
+        :param userref: Orders userref to filter on by Kraken.
+        :return: Dict of closed orders with txid as the key.
+        """
+        closed_orders: dict = {}
+        while True:
+            post_inputs = {"start": start, "closetime": "open"}
+            if userref:
+                post_inputs["userref"] = userref
+            if closed_orders:
+                post_inputs["ofs"] = len(closed_orders)
+            request = ka.create_api_request(False, "ClosedOrders", post_inputs)
+            data = ka.send_api_request(request)
+            page = data.get("closed")
+            closed_orders.update(page)
+            if not page or len(closed_orders) >= int(data.get("count", 0)):
+                return closed_orders
+
+    def get_closed_orders_since(self, start: int) -> dict:
+        """
+        Return closed orders opened since start.
+
+        :param start: Unix time, must not be before closed_orders_start.
+        :return: Dict of closed orders with txid as the key.
+        """
+        if start < self.closed_orders_start:
+            raise ValueError(
+                f"Closed orders only available since "
+                f"{self.closed_orders_start}, not {start}."
+            )
+        return self.filter_opened_since(self.closed_orders, start)
+
+    @staticmethod
+    def filter_opened_since(orders: dict, start: int) -> dict:
+        """
+        Filter orders opened since start.
+
+        :param orders: Dict of orders with txid as the key.
+        :param start: Unix time.
+        :return: Dict of orders opened since start.
+        """
+        return {
+            txid: order_infos
+            for txid, order_infos in orders.items()
+            if float(order_infos.get("opentm", start)) >= start
+        }
+
+    @staticmethod
+    def has_tagged_orders(ka: KrakenApi, userref: int) -> bool:
+        """
+        Return True if any closed order was ever tagged with the userref.
+
+        :param ka: KrakenApi object.
+        :param userref: Orders userref.
+        :return: True if tagged closed orders exist.
+        """
+        request = ka.create_api_request(
+            False, "ClosedOrders", {"userref": userref}
+        )
+        closed_orders = ka.send_api_request(request).get("closed")
+        return any(
+            order_infos.get("userref") == userref
+            for order_infos in closed_orders.values()
+        )
+
+    def get_untagged_orders(self, ka: KrakenApi) -> Tuple[dict, dict]:
+        """
+        Return open orders and closed orders opened since
+        closed_orders_start without userref, requested once from Kraken
+        if orders were filtered on userrefs.
+
+        :param ka: KrakenApi object.
+        :return: Untagged open orders and closed orders.
+        """
+        if self.__untagged_orders is None:
+            if self.userrefs is None:
+                open_orders = self.open_orders
+                closed_orders = self.closed_orders
+            else:
+                open_orders = ka.get_open_orders()
+                closed_orders = self.get_closed_orders(
+                    ka, self.closed_orders_start
+                )
+            self.__untagged_orders = tuple(
+                {
+                    txid: order_infos
+                    for txid, order_infos in orders.items()
+                    if not order_infos.get("userref")
+                }
+                for orders in (open_orders, closed_orders)
+            )
+        return self.__untagged_orders
+
+    def add_order(self, order: Order, quote: str) -> None:
+        """
+        Add an order sent during the run to open orders and withdraw its
+        total price from quote balance.
+
+        :param order: Sent Order object.
+        :param quote: Order pair quote asset.
+        :return: None
+        """
+        self.open_orders[order.txid] = {
+            "opentm": self.kraken_time,
+            "descr": {"pair": order.pair, "price": str(order.pair_price)},
+            "vol": str(order.volume),
+            "userref": order.userref,
+        }
+        quote_balance = float(self.balance.get(quote, 0))
+        self.balance[quote] = str(quote_balance - order.total_price)
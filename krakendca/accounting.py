@@ -0,0 +1,208 @@
+"""Kraken API calls accounting and per-run budgets module."""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+# Kraken private API rate limit counter cost per endpoint, 1 for other
+# private endpoints. Orders endpoints use the separate trading counter.
+RATE_LIMIT_COSTS: Dict[str, int] = {
+    "Ledgers": 2,
+    "QueryLedgers": 2,
+    "TradesHistory": 2,
+    "ClosedOrders": 2,
+    "AddOrder": 0,
+    "AddOrderBatch": 0,
+    "EditOrder": 0,
+    "CancelOrder": 0,
+    "CancelOrderBatch": 0,
+    "CancelAll": 0,
+}
+# Budget names: calls per run, private calls per run, calls per pair per
+# run and private rate limit weight per run.
+BUDGETS: tuple = ("calls", "private_calls", "pair_calls", "weight")
+# Pair whose DCA step sends the current calls, None for shared calls,
+# e.g. account data requested once for every pair.
+current_pair: ContextVar[Optional[str]] = ContextVar(
+    "current_pair", default=None
+)
+
+
+@contextmanager
+def pair_context(pair: str) -> Iterator[None]:
+    """
+    Account the calls sent within the context to a pair. Calls sent from
+    other threads are accounted to the run only.
+
+    :param pair: Pair name.
+    :return: Context manager.
+    """
+    token = current_pair.set(pair)
+    try:
+        yield
+    finally:
+        current_pair.reset(token)
+
+
+def rate_limit_weight(endpoint: str, public: bool) -> int:
+    """
+    Return a call weight in Kraken private API rate limit counter.
+
+    :param endpoint: Request endpoint.
+    :param public: True for public endpoints.
+    :return: Counter increment.
+    """
+    return 0 if public else RATE_LIMIT_COSTS.get(endpoint, 1)
+
+
+class BudgetExceededError(ValueError):
+    """
+    Kraken API call not sent as it would exceed a run budget.
+    """
+
+
+class EndpointCalls:
+    """
+    Calls of an endpoint during a run.
+    """
+
+    calls: int
+    weight: int
+    response_bytes: int
+
+    def __init__(self) -> None:
+        """
+        Initialize the EndpointCalls object.
+
+        :return: None
+        """
+        self.calls = 0
+        self.weight = 0
+        self.response_bytes = 0
+
+
+class CallAccounting:
+    """
+    Record every call sent to Kraken API during a run per endpoint, with
+    its rate limit weight and response size, and refuse calls beyond the
+    run budgets.
+    """
+
+    budgets: Dict[str, int]
+    endpoints: Dict[str, EndpointCalls]
+    pairs: Dict[str, int]
+    private_calls: int
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None) -> None:
+        """
+        Initialize the CallAccounting object.
+
+        :param budgets: Maximum per run for BUDGETS names, unlimited if
+                        missing.
+        :return: None
+        """
+        self.budgets = dict(budgets or {})
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Start a new run accounting.
+
+        :return: None
+        """
+        with self.__lock:
+            self.endpoints = {}
+            self.pairs = {}
+            self.private_calls = 0
+
+    @property
+    def calls(self) -> int:
+        """
+        Calls count of the run.
+
+        :return: Calls count.
+        """
+        return sum(calls.calls for calls in self.endpoints.values())
+
+    @property
+    def weight(self) -> int:
+        """
+        Private rate limit weight of the run.
+
+        :return: Sum of calls weights.
+        """
+        return sum(calls.weight for calls in self.endpoints.values())
+
+    @property
+    def response_bytes(self) -> int:
+        """
+        Response bytes received during the run.
+
+        :return: Bytes count.
+        """
+        return sum(calls.response_bytes for calls in self.endpoints.values())
+
+    def record_call(self, endpoint: str, public: bool) -> None:
+        """
+        Account a call about to be sent, raise BudgetExceededError instead
+        if it would exceed a budget.
+
+        :param endpoint: Request endpoint.
+        :param public: True for public endpoints.
+        :return: None
+        """
+        pair = current_pair.get()
+        weight = rate_limit_weight(endpoint, public)
+        with self.__lock:
+            totals = {
+                "calls": self.calls + 1,
+                "private_calls": self.private_calls + (not public),
+                "weight": self.weight + weight,
+            }
+            if pair is not None:
+                totals["pair_calls"] = self.pairs.get(pair, 0) + 1
+            for budget, total in totals.items():
+                if budget in self.budgets and total > self.budgets[budget]:
+                    raise BudgetExceededError(
+                        f"API budget of {self.budgets[budget]} {budget} "
+                        f"per run exceeded, {endpoint} not sent."
+                    )
+            calls = self.endpoints.setdefault(endpoint, EndpointCalls())
+            calls.calls += 1
+            calls.weight += weight
+            self.private_calls += not public
+            if pair is not None:
+                self.pairs[pair] = totals["pair_calls"]
+
+    def record_response(self, endpoint: str, size: int) -> None:
+        """
+        Account a response received.
+
+        :param endpoint: Request endpoint.
+        :param size: Response size in bytes.
+        :return: None
+        """
+        with self.__lock:
+            self.endpoints.setdefault(
+                endpoint, EndpointCalls()
+            ).response_bytes += size
+
+    def report(self) -> str:
+        """
+        Return the run calls per endpoint and per pair.
+
+        :return: Report as string.
+        """
+        lines = [
+            f"API calls: {self.calls} ({self.private_calls} private, "
+            f"weight {self.weight}, {self.response_bytes} bytes received)."
+        ]
+        for endpoint, calls in sorted(self.endpoints.items()):
+            lines.append(
+                f"  {endpoint}: {calls.calls} calls, weight {calls.weight}, "
+                f"{calls.response_bytes} bytes."
+            )
+        for pair, calls in sorted(self.pairs.items()):
+            lines.append(f"  {pair}: {calls} calls.")
+        return "\n".join(lines)
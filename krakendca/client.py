@@ -0,0 +1,47 @@
+"""Kraken-DCA Kraken API client module."""
+from typing import TypeVar
+
+from .coalescing import CoalescingKrakenApi
+from .config import Config
+from .nonce import NonceAllocator, NonceKrakenApi, default_nonce_filepath
+from .retry import DEFAULT_RETRY_POLICIES, RetryingKrakenApi, RetryPolicy
+from .signer import SigningKrakenApi
+
+T = TypeVar("T", bound="KrakenClient")
+
+
+class KrakenClient(
+    CoalescingKrakenApi, NonceKrakenApi, RetryingKrakenApi, SigningKrakenApi
+):
+    """
+    KrakenApi object used by Kraken-DCA.
+    Identical public requests are coalesced, private requests are sent in
+    nonce order, and the requests actually sent are retried on transient
+    errors. Private requests are signed with the private key decoded once.
+    """
+
+    @classmethod
+    def from_config(cls, config: Config) -> T:
+        """
+        Initialize the KrakenClient object from configuration.
+
+        :param config: Config object.
+        :return: Instanced KrakenClient object.
+        """
+        retry_policies = {
+            endpoint_class: RetryPolicy.from_config(
+                policy_config, DEFAULT_RETRY_POLICIES[endpoint_class]
+            )
+            for endpoint_class, policy_config in config.retry.items()
+        }
+        nonce_filepath = config.nonce_file or default_nonce_filepath(
+            config.api_public_key
+        )
+        return cls(
+            config.api_public_key,
+            config.api_private_key,
+            nonce_allocator=NonceAllocator(nonce_filepath),
+            nonce_window=config.nonce_window,
+            retry_policies=retry_policies,
+            endpoint_timeouts=config.timeouts,
+        )
@@ -0,0 +1,202 @@
+"""Kraken API public requests coalescing module."""
+import copy
+import logging
+import threading
+from concurrent.futures import Future
+from functools import partial
+from time import monotonic
+from typing import Callable, Dict, Optional, Tuple
+from urllib.request import Request
+
+from krakenapi import KrakenApi
+
+from .utils import is_public_request, request_endpoint
+
+logger = logging.getLogger(__name__)
+
+# Public endpoints responses freshness in seconds, not cached if missing.
+DEFAULT_CACHE_TTLS: Dict[str, float] = {
+    "Assets": 3600,
+    "AssetPairs": 3600,
+    "Ticker": 2,
+    "OHLC": 30,
+}
+
+RequestKey = Tuple[str, Optional[bytes]]
+
+
+class RequestCoalescer:
+    """
+    Share responses between identical public requests: requests already
+    in flight are waited on instead of being sent again, and responses are
+    cached according to their endpoint freshness.
+    Can be shared by several KrakenApi objects, e.g. one per account.
+    """
+
+    cache_ttls: Dict[str, float]
+    statistics: Dict[str, Dict[str, int]]
+
+    def __init__(self, cache_ttls: Optional[Dict[str, float]] = None) -> None:
+        """
+        Initialize the RequestCoalescer object.
+
+        :param cache_ttls: Responses freshness in seconds per endpoint.
+        :return: None
+        """
+        self.cache_ttls = (
+            DEFAULT_CACHE_TTLS if cache_ttls is None else cache_ttls
+        )
+        # Endpoint -> sent, coalesced and cached requests counts.
+        self.statistics = {}
+        self.__lock = threading.Lock()
+        self.__in_flight: Dict[RequestKey, Future] = {}
+        self.__cache: Dict[RequestKey, Tuple[float, dict]] = {}
+
+    def __count(self, endpoint: str, counter: str) -> None:
+        """
+        Increment an endpoint counter, lock must be held.
+
+        :param endpoint: Request endpoint.
+        :param counter: sent, coalesced or cached.
+        :return: None
+        """
+        counters = self.statistics.setdefault(
+            endpoint, {"sent": 0, "coalesced": 0, "cached": 0}
+        )
+        counters[counter] += 1
+
+    def get(
+        self, key: RequestKey, endpoint: str, send: Callable[[], dict]
+    ) -> dict:
+        """
+        Return the response for the request key, from cache, from the
+        identical request in flight or by sending the request.
+
+        :param key: Request url and data.
+        :param endpoint: Request endpoint.
+        :param send: Function sending the request and returning response.
+        :return: Copy of the response data.
+        """
+        with self.__lock:
+            cached = self.__cache.get(key)
+            if cached and cached[0] > monotonic():
+                self.__count(endpoint, "cached")
+                return copy.deepcopy(cached[1])
+            future = self.__in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.__in_flight[key] = future
+                self.__count(endpoint, "sent")
+            else:
+                self.__count(endpoint, "coalesced")
+        if leader:
+            try:
+                data = send()
+            except BaseException as e:
+                with self.__lock:
+                    del self.__in_flight[key]
+                future.set_exception(e)
+                raise
+            with self.__lock:
+                del self.__in_flight[key]
+                ttl = self.cache_ttls.get(endpoint, 0)
+                if ttl > 0:
+                    self.__cache[key] = (monotonic() + ttl, data)
+            future.set_result(data)
+        return copy.deepcopy(future.result())
+
+    def clear(self) -> None:
+        """
+        Drop every cached response.
+
+        :return: None
+        """
+        with self.__lock:
+            self.__cache.clear()
+
+    def invalidate(self, endpoint: str) -> None:
+        """
+        Drop the cached responses of an endpoint, so its next request is
+        sent even if the cached response is still fresh.
+
+        :param endpoint: Request endpoint.
+        :return: None
+        """
+        with self.__lock:
+            for key in [
+                key
+                for key in self.__cache
+                if key[0].rsplit("/", 1)[-1] == endpoint
+            ]:
+                del self.__cache[key]
+
+    @property
+    def saved_requests(self) -> int:
+        """
+        Count of requests answered without being sent.
+
+        :return: Coalesced and cached requests count.
+        """
+        return sum(
+            counters["coalesced"] + counters["cached"]
+            for counters in self.statistics.values()
+        )
+
+    def log_statistics(self) -> None:
+        """
+        Log sent, coalesced and cached requests counts per endpoint.
+
+        :return: None
+        """
+        logger.info(
+            "Public requests saved by coalescing: %s.", self.saved_requests
+        )
+        for endpoint, counters in sorted(self.statistics.items()):
+            logger.info(
+                "  %s: %s sent, %s coalesced, %s cached.",
+                endpoint,
+                counters["sent"],
+                counters["coalesced"],
+                counters["cached"],
+            )
+
+
+class CoalescingKrakenApi(KrakenApi):
+    """
+    KrakenApi object coalescing identical public requests.
+    Private requests are always sent.
+    """
+
+    coalescer: RequestCoalescer
+
+    def __init__(
+        self,
+        *args,
+        coalescer: Optional[RequestCoalescer] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Initialize the CoalescingKrakenApi object.
+
+        :param coalescer: RequestCoalescer object, possibly shared with
+                          other KrakenApi objects.
+        :return: None
+        """
+        super().__init__(*args, **kwargs)
+        self.coalescer = coalescer or RequestCoalescer()
+
+    def send_api_request(self, request: Request) -> dict:
+        """
+        Send public requests through the coalescer and private requests
+        to Kraken API.
+
+        :param request: Request object to send to Kraken API
+        :return: Kraken API's response as dict.
+        """
+        send = partial(super().send_api_request, request)
+        if not is_public_request(request):
+            return send()
+        return self.coalescer.get(
+            (request.full_url, request.data), request_endpoint(request), send
+        )
@@ -1,8 +1,17 @@
 """Configuration module."""
+from typing import Optional
+
 import yaml
 from yaml.scanner import ScannerError
 
+from .accounting import BUDGETS
+from .notifications import EVENTS
+from .strategy import STRATEGIES
+
 CONFIG_ERROR_MSG: str = "Configuration file incorrectly formatted"
+RETRY_ENDPOINT_CLASSES: tuple = ("public", "private", "write")
+# Maximum orders count of an AddOrderBatch request.
+MAX_LADDER_ORDERS: int = 15
 
 
 class Config:
@@ -13,6 +22,21 @@ class Config:
     api_public_key: str
     api_private_key: str
     dca_pairs: list
+    retry: dict
+    shared_cache: Optional[str]
+    order_store: Optional[str]
+    nonce_file: Optional[str]
+    nonce_window: int
+    order_feed: bool
+    snapshot: Optional[str]
+    ohlc_store: Optional[str]
+    strategy_state: str
+    reprice_state: str
+    run_deadline: Optional[float]
+    timeouts: dict
+    metrics_port: Optional[int]
+    api_budget: dict
+    notifications: Optional[dict]
 
     def __init__(self, config_file: str) -> None:
         """
@@ -27,9 +51,31 @@ class Config:
             self.api_public_key = config.get("api").get("public_key")
             self.api_private_key = config.get("api").get("private_key")
             self.dca_pairs = config.get("dca_pairs")
+            self.retry = config.get("retry") or {}
+            self.shared_cache = config.get("shared_cache")
+            self.order_store = config.get("order_store")
+            self.nonce_file = config.get("nonce_file")
+            self.nonce_window = config.get("nonce_window", 0)
+            self.order_feed = config.get("order_feed", False)
+            self.snapshot = config.get("snapshot")
+            self.ohlc_store = config.get("ohlc_store")
+            self.strategy_state = config.get(
+                "strategy_state", "strategy_state.json"
+            )
+            self.reprice_state = config.get(
+                "reprice_state", "reprice_state.json"
+            )
+            self.run_deadline = config.get("run_deadline")
+            self.timeouts = config.get("timeouts") or {}
+            self.metrics_port = config.get("metrics_port")
+            self.api_budget = config.get("api_budget") or {}
+            self.notifications = config.get("notifications")
             self.__check_configuration()
             for dca_pair in self.dca_pairs:
                 self.__check_dca_pair_configuration(dca_pair)
+            self.__check_retry_configuration(self.retry)
+            if self.notifications is not None:
+                self.__check_notifications_configuration(self.notifications)
         except EnvironmentError:
             raise FileNotFoundError("Configuration file not found.")
         except ScannerError as e:
@@ -48,6 +94,71 @@ class Config:
                 raise ValueError("Please provide your Kraken API private key.")
             if not self.dca_pairs or type(self.dca_pairs) is not list:
                 raise ValueError("No DCA pairs specified.")
+            if self.shared_cache is not None and (
+                not isinstance(self.shared_cache, str) or not self.shared_cache
+            ):
+                raise ValueError("shared_cache must be a file path.")
+            if self.order_store is not None and (
+                not isinstance(self.order_store, str) or not self.order_store
+            ):
+                raise ValueError("order_store must be a file path.")
+            if self.nonce_file is not None and (
+                not isinstance(self.nonce_file, str) or not self.nonce_file
+            ):
+                raise ValueError("nonce_file must be a file path.")
+            if self.snapshot is not None and (
+                not isinstance(self.snapshot, str) or not self.snapshot
+            ):
+                raise ValueError("snapshot must be a file path.")
+            if self.ohlc_store is not None and (
+                not isinstance(self.ohlc_store, str) or not self.ohlc_store
+            ):
+                raise ValueError("ohlc_store must be a directory path.")
+            if not isinstance(self.strategy_state, str) or not (
+                self.strategy_state
+            ):
+                raise ValueError("strategy_state must be a file path.")
+            if not isinstance(self.reprice_state, str) or not (
+                self.reprice_state
+            ):
+                raise ValueError("reprice_state must be a file path.")
+            if type(self.nonce_window) != int or self.nonce_window < 0:
+                raise ValueError(
+                    "nonce_window must be a positive integer or 0."
+                )
+            if not isinstance(self.order_feed, bool):
+                raise ValueError("order_feed must be a boolean.")
+            if self.run_deadline is not None and (
+                type(self.run_deadline) not in (int, float)
+                or self.run_deadline <= 0
+            ):
+                raise ValueError("run_deadline must be a number > 0.")
+            if type(self.timeouts) is not dict or any(
+                type(timeout) not in (int, float) or timeout <= 0
+                for timeout in self.timeouts.values()
+            ):
+                raise ValueError(
+                    "timeouts must be a dictionary of numbers > 0 per "
+                    "endpoint."
+                )
+            if self.metrics_port is not None and (
+                type(self.metrics_port) is not int
+                or not 0 < self.metrics_port < 65536
+            ):
+                raise ValueError(
+                    "metrics_port must be an integer between 1 and 65535."
+                )
+            if type(self.api_budget) is not dict:
+                raise ValueError("api_budget must be a dictionary.")
+            for budget, value in self.api_budget.items():
+                if budget not in BUDGETS:
+                    raise ValueError(
+                        f"api_budget must be one of {', '.join(BUDGETS)}."
+                    )
+                if type(value) is not int or value < 1:
+                    raise ValueError(
+                        f"api_budget {budget} must be an integer > 0."
+                    )
         except ValueError as e:
             raise ValueError(CONFIG_ERROR_MSG + f": {e}")
 
@@ -111,5 +222,200 @@ class Config:
                     raise ValueError(
                         "ignore_differing_orders must be a boolean."
                     )
+
+            # depth_pricing
+            if dca_pair.get("depth_pricing"):
+                if not isinstance(dca_pair.get("depth_pricing"), bool):
+                    raise ValueError("depth_pricing must be a boolean.")
+
+            # ladder_orders, ladder_range
+            ladder_orders = dca_pair.get("ladder_orders")
+            if ladder_orders is not None and (
+                type(ladder_orders) is not int
+                or not 1 <= ladder_orders <= MAX_LADDER_ORDERS
+            ):
+                raise ValueError(
+                    f"ladder_orders must be an integer between 1 and "
+                    f"{MAX_LADDER_ORDERS}."
+                )
+            ladder_range = dca_pair.get("ladder_range")
+            if ladder_range is not None and (
+                type(ladder_range) not in (int, float)
+                or not 0 < ladder_range < 1
+            ):
+                raise ValueError("ladder_range must be a number in ]0, 1[.")
+            # reprice_after, cancel_after
+            for parameter in ("reprice_after", "cancel_after"):
+                minutes = dca_pair.get(parameter)
+                if minutes is not None and (
+                    type(minutes) not in (int, float) or minutes <= 0
+                ):
+                    raise ValueError(
+                        f"{parameter} must be a number of minutes > 0."
+                    )
+            # amount_strategy
+            amount_strategy = dca_pair.get("amount_strategy")
+            if amount_strategy is not None:
+                Config.__check_amount_strategy(amount_strategy)
+        except ValueError as e:
+            raise ValueError(CONFIG_ERROR_MSG + f": {e}")
+
+    @staticmethod
+    def __check_amount_strategy(amount_strategy: dict) -> None:
+        """
+        Check a DCA pair amount strategy parameters.
+
+        :param amount_strategy: Dictionary with the strategy type and
+        parameters.
+        :return: None
+        """
+        if type(amount_strategy) is not dict or (
+            amount_strategy.get("type") not in STRATEGIES
+        ):
+            raise ValueError(
+                f"amount_strategy type must be one of "
+                f"{', '.join(STRATEGIES)}."
+            )
+        strategy = STRATEGIES[amount_strategy.get("type")]
+        for parameter, value in amount_strategy.items():
+            if parameter == "type":
+                continue
+            if parameter not in ("max_multiplier", *strategy.parameters):
+                raise ValueError(
+                    f"Unknown {strategy.name} amount_strategy parameter: "
+                    f"{parameter}."
+                )
+            if parameter == "days":
+                if type(value) is not int or value < 1:
+                    raise ValueError(
+                        "amount_strategy days must be an integer > 0."
+                    )
+            elif type(value) not in (int, float) or value <= 0:
+                raise ValueError(
+                    f"amount_strategy {parameter} must be a number > 0."
+                )
+
+    @staticmethod
+    def __check_notifications_configuration(notifications: dict) -> None:
+        """
+        Check notifications configuration parameters.
+
+        :param notifications: Dictionary of notified events, sinks and
+                              spill file.
+        :return: None
+        """
+        try:
+            if type(notifications) is not dict:
+                raise ValueError("notifications must be a dictionary.")
+            if not notifications.get("webhook") and not notifications.get(
+                "smtp"
+            ):
+                raise ValueError(
+                    "notifications must set a webhook or smtp sink."
+                )
+            events = notifications.get("events", list(EVENTS))
+            if type(events) is not list or any(
+                event not in EVENTS for event in events
+            ):
+                raise ValueError(
+                    f"notifications events must be a list of "
+                    f"{', '.join(EVENTS)}."
+                )
+            spill_file = notifications.get("spill_file")
+            if "spill_file" in notifications and (
+                not isinstance(spill_file, str) or not spill_file
+            ):
+                raise ValueError(
+                    "notifications spill_file must be a file path."
+                )
+            webhook = notifications.get("webhook")
+            if webhook is not None and (
+                type(webhook) is not dict
+                or not isinstance(webhook.get("url"), str)
+                or not set(webhook) <= {"url", "fields"}
+                or type(webhook.get("fields", {})) is not dict
+            ):
+                raise ValueError(
+                    "notifications webhook must set a url and optional "
+                    "fields."
+                )
+            smtp = notifications.get("smtp")
+            if smtp is not None and (
+                type(smtp) is not dict
+                or not isinstance(smtp.get("host"), str)
+                or not isinstance(smtp.get("sender"), str)
+                or type(smtp.get("recipients")) is not list
+                or not smtp.get("recipients")
+                or type(smtp.get("port", 25)) is not int
+                or not set(smtp)
+                <= {
+                    "host",
+                    "port",
+                    "sender",
+                    "recipients",
+                    "username",
+                    "password",
+                    "starttls",
+                }
+            ):
+                raise ValueError(
+                    "notifications smtp must set a host, sender and "
+                    "recipients list."
+                )
+        except ValueError as e:
+            raise ValueError(CONFIG_ERROR_MSG + f": {e}")
+
+    @staticmethod
+    def __check_retry_configuration(retry: dict) -> None:
+        """
+        Check retry policies per endpoint class are correctly specified.
+
+        :param retry: Dictionary of retry policy parameters per endpoint
+        class.
+        :return: None
+        """
+        try:
+            if type(retry) is not dict:
+                raise ValueError("retry must be a dictionary.")
+            for endpoint_class, policy in retry.items():
+                if endpoint_class not in RETRY_ENDPOINT_CLASSES:
+                    raise ValueError(
+                        f"retry endpoint class must be one of "
+                        f"{', '.join(RETRY_ENDPOINT_CLASSES)}."
+                    )
+                if type(policy) is not dict:
+                    raise ValueError(
+                        f"retry {endpoint_class} policy must be a dictionary."
+                    )
+                for parameter, value in policy.items():
+                    if parameter == "max_attempts":
+                        if type(value) is not int or value < 1:
+                            raise ValueError(
+                                "retry max_attempts must be an integer > 0."
+                            )
+                    elif parameter == "hedge":
+                        if not isinstance(value, bool):
+                            raise ValueError("retry hedge must be a boolean.")
+                    elif parameter in (
+                        "base_delay",
+                        "max_delay",
+                        "timeout",
+                        "hedge_delay",
+                    ):
+                        if type(value) not in (int, float) or value <= 0:
+                            raise ValueError(
+                                f"retry {parameter} must be a number > 0."
+                            )
+                    else:
+                        raise ValueError(
+                            f"Unknown retry parameter: {parameter}."
+                        )
+                # Writes, e.g. orders creation, are never blindly retried.
+                if endpoint_class == "write" and (
+                    policy.get("max_attempts", 1) != 1 or policy.get("hedge")
+                ):
+                    raise ValueError(
+                        "write requests can't be retried or hedged."
+                    )
         except ValueError as e:
             raise ValueError(CONFIG_ERROR_MSG + f": {e}")
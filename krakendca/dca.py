@@ -1,21 +1,35 @@
 """Dollar Cost Averaging module."""
 import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Union
 
 from krakenapi import KrakenApi
 
-from .order import Order
+from .account import Account
+from .accounting import pair_context
+from .logs import phase_context
+from .order import Order, OrderLadder
+from .notifications import Notifier
+from .order_book import OrderBook
+from .order_feed import OrderFeed
+from .order_store import OrderStore
 from .pair import Pair
+from .shared_cache import SharedCache
+from .signer import PreparedRequest
+from .strategy import AmountStrategy, unix_day
 from .utils import (
     current_utc_datetime,
     current_utc_day_datetime,
     datetime_as_utc_unix,
+    pair_userref,
     utc_unix_time_datetime,
 )
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of orders Kraken returns per QueryOrders request.
+MAX_QUERY_ORDERS: int = 50
+
 
 class DCA:
     """
@@ -30,6 +44,19 @@ class DCA:
     limit_factor: float
     max_price: float
     ignore_differing_orders: bool
+    depth_pricing: bool
+    ladder_orders: int
+    ladder_range: float
+    reprice_after: Optional[float]
+    cancel_after: Optional[float]
+    amount_strategy: Optional[AmountStrategy]
+    order_book: Optional[OrderBook]
+    shared_cache: Optional[SharedCache]
+    order_store: Optional[OrderStore]
+    notifier: Optional[Notifier]
+    opened_at: Dict[str, float]
+    tagged_orders_seen: bool
+    rejection: Optional[str]
 
     def __init__(
         self,
@@ -40,7 +67,17 @@ class DCA:
         limit_factor: float = 1,
         max_price: float = -1,
         ignore_differing_orders: bool = False,
+        depth_pricing: bool = False,
+        ladder_orders: int = 1,
+        ladder_range: float = 0.01,
+        reprice_after: Optional[float] = None,
+        cancel_after: Optional[float] = None,
+        amount_strategy: Optional[AmountStrategy] = None,
+        shared_cache: Optional[SharedCache] = None,
+        order_store: Optional[OrderStore] = None,
         orders_filepath: str = "orders.csv",
+        order_feed: Optional[OrderFeed] = None,
+        notifier: Optional[Notifier] = None,
     ) -> None:
         """
         Initialize the DCA object.
@@ -55,7 +92,30 @@ class DCA:
                                         the history are ignored if they
                                         have an amount that differs more
                                         than 1% from this DCA's amount.
+        :param depth_pricing: Price the limit order from the order book
+                              depth needed to fill the amount instead of
+                              the ask price.
+        :param ladder_orders: Count of limit orders the amount is split
+                              into, 1 for a single order.
+        :param ladder_range: Ladder lowest price below the limit price, as
+                             a fraction of the limit price.
+        :param reprice_after: Minutes after which an open order of the
+                              pair is amended toward the ask price, never
+                              if not specified.
+        :param cancel_after: Minutes after which an open order of the pair
+                             is canceled, never if not specified.
+        :param amount_strategy: AmountStrategy object computing each order
+                                amount from the DCA amount, the DCA amount
+                                is bought if not specified.
+        :param shared_cache: SharedCache object to read the ask price from,
+                             shared with other processes.
+        :param order_store: OrderStore object to save orders to instead of
+                            the orders CSV file.
         :param orders_filepath: Orders save file path as String.
+        :param order_feed: OrderFeed object to count orders from while
+                           live, instead of requesting Kraken.
+        :param notifier: Notifier object sent orders and errors are
+                         notified to.
         """
         self.ka = ka
         self.delay = delay
@@ -64,7 +124,27 @@ class DCA:
         self.limit_factor = float(limit_factor)
         self.max_price = float(max_price)
         self.ignore_differing_orders = ignore_differing_orders
+        self.depth_pricing = depth_pricing
+        self.ladder_orders = ladder_orders
+        self.ladder_range = float(ladder_range)
+        self.reprice_after = reprice_after
+        self.cancel_after = cancel_after
+        self.amount_strategy = amount_strategy
+        self.order_book = None
+        self.shared_cache = shared_cache
+        self.order_store = order_store
         self.orders_filepath = orders_filepath
+        self.order_feed = order_feed
+        self.notifier = notifier
+        # Last known order open time of the pair, e.g. from a Snapshot.
+        self.last_order_unix = None
+        # Original open time of edited orders per TXID, set by a Repricer.
+        self.opened_at = {}
+        # Set once an order tagged with the pair userref was seen, for
+        # untagged orders not to be counted anymore.
+        self.tagged_orders_seen = False
+        # Reason of the last order planning rejection.
+        self.rejection = None
 
     def __str__(self) -> str:
         desc: str = (
@@ -75,54 +155,411 @@ class DCA:
             desc += f", limit_factor: {self.limit_factor}"
         if self.max_price != -1:
             desc += f", max_price: {self.max_price}"
+        if self.depth_pricing:
+            desc += ", depth_pricing"
+        if self.ladder_orders > 1:
+            desc += (
+                f", ladder: {self.ladder_orders} orders down to "
+                f"-{self.ladder_range:.2%}"
+            )
+        if self.reprice_after:
+            desc += f", reprice_after: {self.reprice_after}min"
+        if self.cancel_after:
+            desc += f", cancel_after: {self.cancel_after}min"
+        if self.amount_strategy:
+            desc += f", amount_strategy: {self.amount_strategy.name}"
         return desc
 
-    def handle_dca_logic(self) -> None:
+    def handle_dca_logic(self, account: Optional[Account] = None) -> None:
         """
         Handle DCA logic.
 
+        :param account: Account data shared between pairs, requested from
+                        Kraken for this pair only if not specified.
+        :return: None
+        """
+        with pair_context(self.pair.name):
+            try:
+                with phase_context("plan"):
+                    order = self.plan_order(account)
+                if order:
+                    with phase_context("send"):
+                        self.apply_order(order, account)
+            except (OSError, ValueError) as e:
+                self.notify("error", f"DCA {self.pair.name} failed: {e}")
+                raise
+
+    def notify(self, event: str, message: str) -> None:
+        """
+        Queue a notification if a notifier is set, without waiting for it
+        to be sent.
+
+        :param event: Notified event.
+        :param message: Notification text.
         :return: None
         """
+        if self.notifier:
+            self.notifier.notify(event, message)
+
+    def plan_order(
+        self,
+        account: Optional[Account] = None,
+        ticker_ask_price: Optional[float] = None,
+    ) -> Optional[Union[Order, OrderLadder]]:
+        """
+        Check the DCA can be done today and compute its order, without
+        sending it. The rejection reason is kept if no order is planned.
+
+        :param account: Account data shared between pairs, requested from
+                        Kraken for this pair only if not specified.
+        :param ticker_ask_price: Pair ticker ask price, requested if not
+                                 specified and no order book is set.
+        :return: Order or OrderLadder object, None if no DCA for the pair.
+        """
+        self.rejection = None
         # Check current system time.
-        current_date = self.get_system_time()
-        # Check Kraken account balance.
-        self.check_account_balance()
-        # Check if didn't already DCA today
-        if self.count_pair_daily_orders() != 0:
-            logger.warning(
-                f"No DCA for {self.pair.name}: Already placed an order "
-                f"today."
+        current_date = self.get_system_time(account)
+        self.observe_price(current_date, ticker_ask_price)
+        # Check Kraken account balance, against the amount strategy order
+        # amount once priced.
+        quote_balance = self.check_account_balance(
+            account, 0 if self.amount_strategy else self.amount
+        )
+        # Check if didn't already DCA today, without requests first.
+        if self.has_recent_order() or self.count_pair_daily_orders(account):
+            self.rejection = "Already placed an order today."
+            logger.warning("No DCA for %s: %s", self.pair.name, self.rejection)
+            return None
+        logger.info("Didn't DCA already today.")
+        self.settle_strategy_orders(account)
+        order = self.price_order(current_date, ticker_ask_price)
+        if order and self.amount_strategy:
+            self.check_quote_balance(quote_balance, order.total_price)
+        return order
+
+    def observe_price(
+        self, date: datetime, ticker_ask_price: Optional[float] = None
+    ) -> None:
+        """
+        Update the amount strategy indicators with the price of every run,
+        whether an order is due or not, if already requested.
+
+        :param date: Run date.
+        :param ticker_ask_price: Pair ticker ask price.
+        :return: None
+        """
+        if not self.amount_strategy:
+            return
+        price = ticker_ask_price
+        if price is None and self.order_book:
+            try:
+                price = self.order_book.price_to_fill(self.amount)
+            except ValueError:
+                return
+        if price is not None:
+            self.amount_strategy.observe(
+                price, unix_day(datetime_as_utc_unix(date))
             )
+
+    def settle_strategy_orders(
+        self, account: Optional[Account] = None
+    ) -> None:
+        """
+        Settle the amount strategy pending orders no longer open with
+        their executed volume, from the account closed orders or requested
+        with QueryOrders. Orders still pending are settled by a later run.
+
+        :param account: Account data with open and closed orders.
+        :return: None
+        """
+        if not self.amount_strategy:
             return
-        logger.info("Didn't DCA already today.")
+        txids = []
+        for txid in self.amount_strategy.pending_orders():
+            if account and txid in account.open_orders:
+                continue
+            if account and txid in account.closed_orders:
+                self.settle_strategy_order(txid, account.closed_orders[txid])
+            else:
+                txids.append(txid)
+        for start in range(0, len(txids), MAX_QUERY_ORDERS):
+            end = start + MAX_QUERY_ORDERS
+            request = self.ka.create_api_request(
+                False, "QueryOrders", {"txid": ",".join(txids[start:end])}
+            )
+            try:
+                orders = self.ka.send_api_request(request)
+            except (OSError, ValueError) as e:
+                logger.warning(
+                    "%s strategy orders not settled: %s", self.pair.name, e
+                )
+                return
+            for txid, order_infos in orders.items():
+                self.settle_strategy_order(txid, order_infos)
+
+    def settle_strategy_order(self, txid: str, order_infos: dict) -> None:
+        """
+        Settle an amount strategy pending order with its executed volume
+        once closed, canceled or expired.
+
+        :param txid: Order TXID.
+        :param order_infos: Kraken order information.
+        :return: None
+        """
+        if order_infos.get("status") in ("pending", "open"):
+            return
+        volume_executed = float(order_infos.get("vol_exec") or 0)
+        self.amount_strategy.settle_order(txid, volume_executed)
+        logger.info(
+            "Order %s settled: %s%s executed.",
+            txid,
+            volume_executed,
+            self.pair.base,
+        )
+
+    def price_order(
+        self, date: datetime, ticker_ask_price: Optional[float] = None
+    ) -> Optional[Union[Order, OrderLadder]]:
+        """
+        Compute the DCA order, or orders ladder, from the current pair ask
+        price.
+
+        :param date: Order date.
+        :param ticker_ask_price: Pair ticker ask price, requested if not
+                                 specified and no order book is set.
+        :return: Order or OrderLadder object, None if the limit price is
+                 greater than the maximum price.
+        """
         # Get current pair ask price.
-        pair_ask_price = self.pair.get_pair_ask_price(self.ka, self.pair.name)
-        logger.info(f"Current {self.pair.name} ask price: {pair_ask_price}.")
+        pair_ask_price = self.get_pair_ask_price(ticker_ask_price)
+        amount = self.get_order_amount(date, pair_ask_price)
+        if self.order_book and amount and amount != self.amount:
+            # Order book depth needed to fill the strategy amount.
+            pair_ask_price = self.get_pair_ask_price(ticker_ask_price, amount)
         # Get limit price based on limit_factor
         limit_price = self.get_limit_price(
             pair_ask_price, self.pair.pair_decimals
         )
         # Reject DCA if limit_price greater than max_price
         if self.max_price != -1 and limit_price > self.max_price:
-            logger.info(
-                f"No DCA for {self.pair.name}: Limit price ({limit_price}) "
-                f"greater than maximum price ({self.max_price})."
+            self.rejection = (
+                f"Limit price ({limit_price}) greater than maximum price "
+                f"({self.max_price})."
             )
-            return
+            logger.info("No DCA for %s: %s", self.pair.name, self.rejection)
+            return None
+        if not amount:
+            self.rejection = "Amount strategy order amount is 0."
+            logger.info("No DCA for %s: %s", self.pair.name, self.rejection)
+            return None
+        if self.ladder_orders > 1:
+            ladder = self.ladder_order(date, limit_price, amount)
+            if ladder:
+                return ladder
         # Create the Order object.
-        order = Order.buy_limit_order(
-            current_date,
+        return Order.buy_limit_order(
+            date,
             self.pair.name,
-            self.amount,
+            amount,
             limit_price,
             self.pair.lot_decimals,
             self.pair.quote_decimals,
         )
+
+    def get_order_amount(self, date: datetime, pair_ask_price: float) -> float:
+        """
+        Return the order amount, computed by the amount strategy from the
+        pair ask price already requested, the DCA amount without strategy.
+
+        :param date: Order date.
+        :param pair_ask_price: Pair ask price.
+        :return: Order amount rounded to the quote decimals.
+        """
+        if not self.amount_strategy:
+            return self.amount
+        amount = round(
+            self.amount_strategy.get_amount(
+                self.amount,
+                pair_ask_price,
+                unix_day(datetime_as_utc_unix(date)),
+            ),
+            self.pair.quote_decimals,
+        )
+        logger.info(
+            "%s amount strategy: %s%s instead of %s%s.",
+            self.amount_strategy.name,
+            amount,
+            self.pair.quote,
+            self.amount,
+            self.pair.quote,
+        )
+        return amount
+
+    def ladder_order(
+        self, date: datetime, limit_price: float, amount: float
+    ) -> Optional[OrderLadder]:
+        """
+        Split the order amount in limit orders from the limit price down to
+        the ladder range, fewer orders if needed for each one to reach the
+        pair minimum volume.
+
+        :param date: Orders date.
+        :param limit_price: Highest limit order price.
+        :param amount: Order amount.
+        :return: OrderLadder object, None if two orders would be below the
+                 pair minimum volume.
+        """
+        low_price = round(
+            limit_price * (1 - self.ladder_range), self.pair.pair_decimals
+        )
+        for orders_count in range(self.ladder_orders, 1, -1):
+            ladder = OrderLadder.buy_limit_ladder(
+                date,
+                self.pair.name,
+                amount,
+                limit_price,
+                low_price,
+                orders_count,
+                self.pair.pair_decimals,
+                self.pair.lot_decimals,
+                self.pair.quote_decimals,
+            )
+            if all(
+                order.volume >= self.pair.order_min for order in ladder.orders
+            ):
+                if orders_count < self.ladder_orders:
+                    logger.info(
+                        "Ladder reduced to %s orders for the %s%s minimum "
+                        "volume.",
+                        orders_count,
+                        self.pair.order_min,
+                        self.pair.base,
+                    )
+                return ladder
+        logger.info(
+            "Amount too low for a ladder of %s%s minimum volume orders, "
+            "single order.",
+            self.pair.order_min,
+            self.pair.base,
+        )
+        return None
+
+    def apply_order(
+        self,
+        order: Union[Order, OrderLadder],
+        account: Optional[Account] = None,
+        prepared: Optional[PreparedRequest] = None,
+    ) -> None:
+        """
+        Send a planned order, or orders ladder, to Kraken and save every
+        sent order.
+
+        :param order: Order or OrderLadder object.
+        :param account: Account data the sent orders are added to.
+        :param prepared: AddOrder or AddOrderBatch request prepared from
+                         the order.
+        :return: None
+        """
         # Send buy order to Kraken API and print information.
-        self.send_buy_limit_order(order)
-        # Save order information to CSV file.
-        order.save_order_csv(self.orders_filepath)
-        logger.info("Order information saved to CSV.")
+        self.send_buy_limit_order(order, prepared)
+        self.last_order_unix = datetime_as_utc_unix(order.date)
+        self.tagged_orders_seen = True
+        for leg in order.legs:
+            self.notify(
+                "order",
+                f"{self.pair.name} order sent: {leg.description}, "
+                f"{leg.total_price}{self.pair.quote} ({leg.txid}).",
+            )
+        if self.amount_strategy:
+            for leg in order.legs:
+                self.amount_strategy.record_order(leg.txid, leg.volume)
+        if account:
+            for leg in order.legs:
+                account.add_order(leg, self.pair.quote)
+        if self.order_store:
+            self.order_store.add_orders(order.legs)
+            logger.info("Order information saved to the order store.")
+        else:
+            # Save order information to CSV file.
+            for leg in order.legs:
+                leg.save_order_csv(self.orders_filepath)
+            logger.info("Order information saved to CSV.")
+
+    def has_recent_order(self) -> bool:
+        """
+        Return True if an order of the pair within the delay is known
+        without requesting Kraken: from the last run snapshot or the order
+        store.
+
+        :return: True if a known order is within the delay.
+        """
+        if (
+            self.last_order_unix
+            and self.last_order_unix >= self.get_delay_start_unix()
+        ):
+            return True
+        return self.has_stored_order()
+
+    def has_stored_order(self) -> bool:
+        """
+        Return True if the order store has an order of the pair within
+        the delay, without requesting Kraken.
+
+        :return: True if a stored order is within the delay.
+        """
+        if not self.order_store:
+            return False
+        last_order = self.order_store.last_order(self.pair.name)
+        return bool(
+            last_order
+            and datetime_as_utc_unix(last_order.date)
+            >= self.get_delay_start_unix()
+        )
+
+    def get_pair_ask_price(
+        self,
+        ticker_ask_price: Optional[float] = None,
+        amount: Optional[float] = None,
+    ) -> float:
+        """
+        Return the pair ask price: from the order book depth needed to fill
+        the order amount if available, the ticker ask price otherwise, read
+        from the shared cache if any.
+
+        :param ticker_ask_price: Pair ticker ask price, requested if not
+                                 specified.
+        :param amount: Order amount to fill, the DCA amount if not
+                       specified.
+        :return: Pair ask price.
+        """
+        if self.order_book:
+            amount = amount or self.amount
+            pair_ask_price = self.order_book.price_to_fill(amount)
+            average_price = self.order_book.average_price_to_fill(amount)
+            logger.info(
+                "Current %s price to fill %s%s: %s (average %.*f).",
+                self.pair.name,
+                amount,
+                self.pair.quote,
+                pair_ask_price,
+                self.pair.pair_decimals,
+                average_price,
+            )
+        else:
+            if ticker_ask_price is not None:
+                pair_ask_price = ticker_ask_price
+            elif self.shared_cache:
+                pair_ask_price = self.shared_cache.get_ask_price(
+                    self.ka, self.pair.name
+                )
+            else:
+                pair_ask_price = self.pair.get_pair_ask_price(
+                    self.ka, self.pair.name
+                )
+            logger.info(
+                "Current %s ask price: %s.", self.pair.name, pair_ask_price
+            )
+        return pair_ask_price
 
     def get_limit_price(
         self, pair_ask_price: float, pair_decimals: int
@@ -141,22 +578,29 @@ class DCA:
                 pair_ask_price * self.limit_factor, pair_decimals
             )
             logger.info(
-                f"Factor adjusted limit price ({self.limit_factor:.4f})"
-                f": {limit_price}."
+                "Factor adjusted limit price (%.4f): %s.",
+                self.limit_factor,
+                limit_price,
             )
         return limit_price
 
-    def get_system_time(self) -> datetime:
+    def get_system_time(self, account: Optional[Account] = None) -> datetime:
         """
         Compare system and Kraken time.
         Raise an error if too much difference (> 2sc).
 
+        :param account: Account data with Kraken time, requested from
+                        Kraken if not specified.
         :return: datetime object of current system time
         """
-        kraken_time: int = self.ka.get_time()
+        kraken_time: int = (
+            account.kraken_time if account else self.ka.get_time()
+        )
         kraken_date: datetime = utc_unix_time_datetime(kraken_time)
         current_date: datetime = current_utc_datetime()
-        logger.info(f"It's {kraken_date} on Kraken, {current_date} on system.")
+        logger.info(
+            "It's %s on Kraken, %s on system.", kraken_date, current_date
+        )
         lag_in_seconds: float = (current_date - kraken_date).seconds
         if lag_in_seconds > 2:
             raise OSError(
@@ -165,17 +609,26 @@ class DCA:
             )
         return current_date
 
-    def check_account_balance(self) -> None:
+    def check_account_balance(
+        self, account: Optional[Account] = None, amount: Optional[float] = None
+    ) -> float:
         """
         Check account trade balance, pair base and pair quote balances.
         Raise an error if quote pair balance
         is too low to DCA specified amount.
 
-        :return: None
+        :param account: Account data with balances, requested from Kraken
+                        if not specified.
+        :param amount: Amount to buy, the DCA amount if not specified.
+        :return: Pair quote balance.
         """
-        trade_balance = self.ka.get_trade_balance().get("eb")
-        logger.info(f"Current trade balance: {trade_balance} ZUSD.")
-        balance = self.ka.get_balance()
+        if account:
+            trade_balance = account.trade_balance.get("eb")
+            balance = account.balance
+        else:
+            trade_balance = self.ka.get_trade_balance().get("eb")
+            balance = self.ka.get_balance()
+        logger.info("Current trade balance: %s ZUSD.", trade_balance)
         try:
             pair_base_balance = float(balance.get(self.pair.base))
         # No pair base balance on Kraken account.
@@ -187,49 +640,189 @@ class DCA:
         except TypeError:
             pair_quote_balance = 0
         logger.info(
-            f"Pair balances: {pair_quote_balance} {self.pair.quote}, "
-            f"{pair_base_balance} {self.pair.base}."
+            "Pair balances: %s %s, %s %s.",
+            pair_quote_balance,
+            self.pair.quote,
+            pair_base_balance,
+            self.pair.base,
         )
-        if pair_quote_balance < self.amount:
+        self.check_quote_balance(
+            pair_quote_balance, self.amount if amount is None else amount
+        )
+        return pair_quote_balance
+
+    def check_quote_balance(self, quote_balance: float, amount: float) -> None:
+        """
+        Raise an error if quote pair balance is too low to buy an amount.
+
+        :param quote_balance: Pair quote balance.
+        :param amount: Amount to buy.
+        :return: None
+        """
+        if quote_balance < amount:
             raise ValueError(
-                f"Insufficient funds to buy {self.amount} "
+                f"Insufficient funds to buy {amount} "
                 f"{self.pair.quote} of {self.pair.base}"
             )
 
-    def count_pair_daily_orders(self) -> int:
+    def count_pair_daily_orders(
+        self, account: Optional[Account] = None
+    ) -> int:
         """
-        Count current day open and closed orders for the DCA pair.
+        Count current day open and closed orders for the DCA pair, tagged
+        with the pair userref.
+        Untagged orders, e.g. sent by previous versions, are counted as
+        well while no closed order of the pair was ever tagged.
+        Orders are counted from the order feed state while it is live,
+        untagged orders being counted again once the feed sees a new one.
 
+        :param account: Account data with open and closed orders, requested
+                        from Kraken if not specified.
         :return: Count of daily orders for the dollar cost averaged pair.
         """
+        start_day_unix = self.get_delay_start_unix()
+        userref = pair_userref(self.pair.name)
+        if self.order_feed and self.order_feed.live:
+            state = self.order_feed.state
+            pair_daily_orders = state.count_orders(userref, start_day_unix)
+            if pair_daily_orders or self.has_tagged_orders():
+                return pair_daily_orders
+            # Requested again once the feed sees an untagged order.
+            untagged = state.get_untagged_count(userref, start_day_unix)
+            if untagged is None:
+                untagged = self.count_untagged_pair_orders(
+                    start_day_unix, account
+                )
+                state.set_untagged_count(userref, start_day_unix, untagged)
+            return untagged
+        # Get current open orders and daily closed orders, filtered on the
+        # pair userref by Kraken.
+        if account:
+            open_orders = account.open_orders
+            closed_orders = account.get_closed_orders_since(start_day_unix)
+        else:
+            open_orders = Account.get_open_orders(self.ka, userref)
+            closed_orders = Account.get_closed_orders(
+                self.ka, start_day_unix, userref
+            )
+        # Sum the count of closed and daily open orders for the DCA pair,
+        # edited orders counted from their original open time.
+        tagged_orders = {
+            **self.extract_tagged_orders(open_orders, userref),
+            **{
+                txid: order_infos
+                for txid, order_infos in self.extract_tagged_orders(
+                    closed_orders, userref
+                ).items()
+                if self.opened_at.get(txid, start_day_unix) >= start_day_unix
+            },
+        }
+        pair_daily_orders = len(tagged_orders)
+        if pair_daily_orders:
+            self.update_last_order(tagged_orders)
+            self.tagged_orders_seen = True
+            return pair_daily_orders
+        legacy_orders = (
+            account and account.userrefs is None
+        ) or not self.has_tagged_orders()
+        if legacy_orders:
+            pair_daily_orders = self.count_untagged_pair_orders(
+                start_day_unix, account
+            )
+        return pair_daily_orders
+
+    def has_tagged_orders(self) -> bool:
+        """
+        Return True if any order was ever tagged with the pair userref,
+        requested from the order feed state or Kraken until one is seen.
+
+        :return: True if tagged orders exist.
+        """
+        if not self.tagged_orders_seen:
+            userref = pair_userref(self.pair.name)
+            if self.order_feed and self.order_feed.live:
+                tagged = self.order_feed.state.has_tagged_orders(userref)
+            else:
+                tagged = Account.has_tagged_orders(self.ka, userref)
+            self.tagged_orders_seen = tagged
+        return self.tagged_orders_seen
+
+    def update_last_order(self, orders: dict) -> None:
+        """
+        Keep the latest open time of the pair orders.
+
+        :param orders: Pair orders with txid as the key.
+        :return: None
+        """
+        opentms = [
+            self.opened_at.get(txid, float(order_infos.get("opentm")))
+            for txid, order_infos in orders.items()
+            if order_infos.get("opentm")
+        ]
+        self.last_order_unix = (
+            max([*opentms, self.last_order_unix or 0]) or None
+        )
+
+    def count_untagged_pair_orders(
+        self, start: int, account: Optional[Account] = None
+    ) -> int:
+        """
+        Count untagged open orders and closed orders opened since start
+        for the DCA pair, matched on pair and amount if
+        ignore_differing_orders is set.
+
+        :param start: Unix time from which to count closed orders.
+        :param account: Account data, orders are requested from Kraken if
+                        not specified.
+        :return: Count of untagged orders for the dollar cost averaged pair.
+        """
         filter_amount = self.amount if self.ignore_differing_orders else None
-        # Get current open orders.
-        open_orders = self.ka.get_open_orders()
-        daily_open_orders = len(
-            self.extract_pair_orders(
-                open_orders, self.pair.name, self.pair.alt_name, filter_amount
+        if account:
+            open_orders, closed_orders = account.get_untagged_orders(self.ka)
+            closed_orders = Account.filter_opened_since(closed_orders, start)
+        else:
+            open_orders = self.ka.get_open_orders()
+            closed_orders = self.ka.get_closed_orders(
+                {"start": start, "closetime": "open"}
+            )
+        return sum(
+            len(
+                self.extract_pair_orders(
+                    self.extract_tagged_orders(orders, None),
+                    self.pair.name,
+                    self.pair.alt_name,
+                    filter_amount,
+                )
             )
+            for orders in (open_orders, closed_orders)
         )
 
-        # Get daily closed orders.
+    def get_delay_start_unix(self) -> int:
+        """
+        Return the unix time of the first day of the current DCA delay,
+        from which orders are considered as already placed.
+
+        :return: Delay start day as unix time.
+        """
         start_day_datetime = current_utc_day_datetime() - timedelta(
             days=self.delay - 1
         )
-        start_day_unix = datetime_as_utc_unix(start_day_datetime)
-        closed_orders = self.ka.get_closed_orders(
-            {"start": start_day_unix, "closetime": "open"}
-        )
-        daily_closed_orders = len(
-            self.extract_pair_orders(
-                closed_orders,
-                self.pair.name,
-                self.pair.alt_name,
-                filter_amount,
-            )
-        )
-        # Sum the count of closed and daily open orders for the DCA pair.
-        pair_daily_orders = daily_closed_orders + daily_open_orders
-        return pair_daily_orders
+        return datetime_as_utc_unix(start_day_datetime)
+
+    @staticmethod
+    def extract_tagged_orders(orders: dict, userref: Optional[int]) -> dict:
+        """
+        Filter orders passed as dictionary on userref.
+
+        :param orders: Orders as dictionary.
+        :param userref: Userref to filter on, None for untagged orders.
+        :return: Filtered orders dictionary on userref.
+        """
+        return {
+            order_id: order_infos
+            for order_id, order_infos in orders.items()
+            if (order_infos.get("userref") or None) == userref
+        }
 
     @staticmethod
     def extract_pair_orders(
@@ -277,43 +870,63 @@ class DCA:
                 order_amount = float(order_info.get("vol")) * price
             except (ValueError, TypeError, KeyError) as e:
                 logger.info(
-                    f"Cannot figure out order amount of {order_info}: {e}"
+                    "Cannot figure out order amount of %s: %s", order_info, e
                 )
                 return True  # don't skip in order to avoid repeating orders.
             include_order = amount * 0.99 < order_amount < amount * 1.01
             if not include_order:
                 logger.info(
-                    f"Ignoring an existing/closed order of {order_amount}"
+                    "Ignoring an existing/closed order of %s", order_amount
                 )
             return include_order
 
         return {k: v for k, v in pair_orders.items() if is_similiar_amount(v)}
 
-    def send_buy_limit_order(self, order: Order) -> None:
+    def send_buy_limit_order(
+        self,
+        order: Union[Order, OrderLadder],
+        prepared: Optional[PreparedRequest] = None,
+    ) -> None:
         """
-        Send a limit order for specified dca pair and amount to Kraken.
+        Send a limit order, or a ladder of limit orders in one request, for
+        specified dca pair and amount to Kraken.
 
+        :param order: Order or OrderLadder object.
+        :param prepared: AddOrder or AddOrderBatch request prepared from
+                         the order.
         :return: None.
         """
-        if order.volume < self.pair.order_min:
-            raise ValueError(
-                f"Too low volume to buy {self.pair.base}: "
-                f"current {order.volume}, "
-                f"minimum {self.pair.order_min}."
+        for leg in order.legs:
+            if leg.volume < self.pair.order_min:
+                raise ValueError(
+                    f"Too low volume to buy {self.pair.base}: "
+                    f"current {leg.volume}, "
+                    f"minimum {self.pair.order_min}."
+                )
+        for leg in order.legs:
+            logger.info(
+                "Create a %s%s buy limit order of %s%s at %s%s.",
+                leg.price,
+                self.pair.quote,
+                leg.volume,
+                self.pair.base,
+                leg.pair_price,
+                self.pair.quote,
             )
         logger.info(
-            f"Create a {order.price}{self.pair.quote} buy limit order of "
-            f"{order.volume}{self.pair.base} at "
-            f"{order.pair_price}{self.pair.quote}."
-        )
-        logger.info(
-            f"Fee expected: {order.fee}{self.pair.quote} (0.26% taker fee)."
+            "Fee expected: %s%s (0.26%% taker fee).",
+            order.fee,
+            self.pair.quote,
         )
         logger.info(
-            f"Total price expected: {order.volume}{self.pair.base} for "
-            f"{order.total_price}{self.pair.quote}."
+            "Total price expected: %s%s for %s%s.",
+            order.volume,
+            self.pair.base,
+            order.total_price,
+            self.pair.quote,
         )
-        order.send_order(self.ka)
+        order.send_order(self.ka, prepared)
         logger.info("Order successfully created.")
-        logger.info(f"TXID: {order.txid}")
-        logger.info(f"Description: {order.description}")
+        for leg in order.legs:
+            logger.info("TXID: %s", leg.txid)
+            logger.info("Description: %s", leg.description)
@@ -1,15 +1,42 @@
 """Main KrakenDCA object module."""
 import logging
-from typing import Any, Dict, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
 
 from krakenapi import KrakenApi
 
+from .account import Account
+from .accounting import CallAccounting
 from .config import Config
 from .dca import DCA
+from .logs import phase_context, run_context
+from .metrics import Metrics, MetricsServer
+from .notifications import Notifier
+from .order_book import OrderBook, OrderBookFeed
+from .order_feed import OrderFeed
+from .order_store import OrderStore
 from .pair import Pair
+from .plan import Plan, PlannedOrder
+from .reconcile import Reconciler, Reconciliation
+from .repricing import Repricer
+from .retry import RetryingKrakenApi
+from .shared_cache import SharedCache
+from .snapshot import Snapshot, SnapshotError
+from .strategy import AmountStrategy, load_states, save_states
+from .utils import pair_userref
 
 logger = logging.getLogger(__name__)
 
+# Seconds the resident mode waits for the order feed before its first run.
+ORDER_FEED_TIMEOUT: float = 30
+# Maximum Kraken clock offset in seconds for the snapshot to decide no
+# DCA is due, as the system lag check.
+MAX_CLOCK_OFFSET: float = 2
+
 
 class KrakenDCA:
     """
@@ -19,6 +46,16 @@ class KrakenDCA:
     config: Config
     ka: KrakenApi
     dcas_list: List[DCA]
+    shared_cache: Optional[SharedCache]
+    order_store: Optional[OrderStore]
+    order_feed: Optional[OrderFeed]
+    order_book_feed: Optional[OrderBookFeed]
+    snapshot: Optional[Snapshot]
+    clock_offset: Optional[float]
+    metrics: Optional[Metrics]
+    accounting: Optional[CallAccounting]
+    notifier: Optional[Notifier]
+    repricer: Optional[Repricer]
 
     def __init__(self, config: Config, ka: KrakenApi) -> None:
         """
@@ -31,6 +68,37 @@ class KrakenDCA:
         self.config = config
         self.ka = ka
         self.dcas_list = []
+        self.shared_cache = (
+            SharedCache(config.shared_cache) if config.shared_cache else None
+        )
+        self.order_store = (
+            OrderStore(config.order_store) if config.order_store else None
+        )
+        self.order_feed = None
+        self.order_book_feed = None
+        self.repricer = None
+        self.metrics = Metrics() if config.metrics_port else None
+        self.notifier = (
+            Notifier.from_config(config.notifications)
+            if config.notifications
+            else None
+        )
+        self.accounting = None
+        if isinstance(ka, RetryingKrakenApi):
+            ka.metrics = self.metrics
+            self.accounting = ka.accounting = CallAccounting(config.api_budget)
+        self.snapshot = (
+            Snapshot.load(config.snapshot, config.api_public_key)
+            if config.snapshot
+            else None
+        )
+        self.clock_offset = None
+        self.__pairs_created_at = None
+        if self.snapshot:
+            self.clock_offset = self.snapshot.clock_offset
+            if isinstance(ka, RetryingKrakenApi):
+                ka.load_latencies(self.snapshot.latencies)
+        self.__stopped = threading.Event()
 
     def initialize_pairs_dca(self) -> None:
         """
@@ -39,11 +107,20 @@ class KrakenDCA:
         :return: None
         """
         logger.info("Hi, current configuration:")
-        asset_pairs: Dict[str, Any] = self.ka.get_asset_pairs()
+        pairs: Dict[str, Pair] = self.get_pairs(
+            [dca_pair.get("pair") for dca_pair in self.config.dca_pairs]
+        )
+        strategy_states: Optional[Dict[str, dict]] = None
         for dca_pair in self.config.dca_pairs:
-            pair: Pair = Pair.get_pair_from_kraken(
-                self.ka, asset_pairs, dca_pair.get("pair")
-            )
+            pair: Pair = pairs[dca_pair.get("pair")]
+            amount_strategy: Optional[AmountStrategy] = None
+            if dca_pair.get("amount_strategy"):
+                if strategy_states is None:
+                    strategy_states = load_states(self.config.strategy_state)
+                amount_strategy = AmountStrategy.from_config(
+                    dca_pair.get("amount_strategy"), dca_pair.get("delay")
+                )
+                amount_strategy.load_state(strategy_states.get(pair.name, {}))
             dca: DCA = DCA(
                 self.ka,
                 dca_pair.get("delay"),
@@ -54,22 +131,509 @@ class KrakenDCA:
                 ignore_differing_orders=dca_pair.get(
                     "ignore_differing_orders", False
                 ),
+                depth_pricing=dca_pair.get("depth_pricing", False),
+                ladder_orders=dca_pair.get("ladder_orders", 1),
+                ladder_range=dca_pair.get("ladder_range", 0.01),
+                reprice_after=dca_pair.get("reprice_after"),
+                cancel_after=dca_pair.get("cancel_after"),
+                amount_strategy=amount_strategy,
+                shared_cache=self.shared_cache,
+                order_store=self.order_store,
+                notifier=self.notifier,
             )
+            if self.snapshot:
+                dca.last_order_unix = self.snapshot.last_orders.get(pair.name)
+                dca.tagged_orders_seen = (
+                    pair.name in self.snapshot.tagged_pairs
+                )
             logger.info(dca)
             self.dcas_list.append(dca)
+        repriced = [
+            dca
+            for dca in self.dcas_list
+            if dca.reprice_after or dca.cancel_after
+        ]
+        if repriced:
+            self.repricer = Repricer(
+                self.ka, repriced, self.config.reprice_state
+            )
+        if self.config.order_feed:
+            self.order_feed = OrderFeed(
+                self.ka,
+                [pair_userref(dca.pair.name) for dca in self.dcas_list],
+                self.get_closed_orders_start,
+                on_trade=self.notify_fill if self.notifier else None,
+            )
+            for dca in self.dcas_list:
+                dca.order_feed = self.order_feed
+            if self.repricer:
+                self.order_feed.state.opened_at = self.repricer.opened_at
+
+    def get_closed_orders_start(self) -> int:
+        """
+        Return the earliest DCA pairs delay start, from which closed
+        orders are needed.
+
+        :return: Unix time.
+        """
+        return min(
+            (dca.get_delay_start_unix() for dca in self.dcas_list),
+            default=0,
+        )
+
+    def get_pairs(self, pair_names: List[str]) -> Dict[str, Pair]:
+        """
+        Return Pair objects from the snapshot or the shared cache if any,
+        from Kraken otherwise.
+
+        :param pair_names: Pairs names.
+        :return: Dictionary of Pair objects per pair name.
+        """
+        if self.snapshot and all(
+            pair_name in self.snapshot.pairs for pair_name in pair_names
+        ):
+            # Pairs metadata keep their age, for the snapshot to expire.
+            self.__pairs_created_at = self.snapshot.created_at
+            return {
+                pair_name: self.snapshot.pairs[pair_name]
+                for pair_name in pair_names
+            }
+        self.__pairs_created_at = time.time()
+        if self.shared_cache:
+            return self.shared_cache.get_pairs(self.ka, pair_names)
+        # Pairs and assets information are requested concurrently.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            asset_pairs_future = executor.submit(self.ka.get_asset_pairs)
+            assets_future = executor.submit(self.ka.get_assets)
+            asset_pairs: Dict[str, Any] = asset_pairs_future.result()
+            assets: Dict[str, Any] = assets_future.result()
+        return {
+            pair_name: Pair.get_pair_from_kraken(
+                self.ka, asset_pairs, pair_name, assets
+            )
+            for pair_name in pair_names
+        }
 
     def handle_pairs_dca(self) -> None:
         """
-        Iterate though DCA objects list and execute DCA logic.
+        Plan every DCA pair order then send them at once.
         Handle pairs Dollar Cost Averaging.
+        Nothing is requested if the snapshot shows no DCA is due.
+        :return: None
+        """
+        run_time = time.time()
+        if self.is_nothing_due():
+            logger.info("No DCA due according to the snapshot.")
+            if self.metrics:
+                self.metrics.record_skipped(
+                    [dca.pair.name for dca in self.dcas_list], run_time
+                )
+            if self.repricer:
+                with self.run_deadline(), self.accounted_run(), run_context():
+                    self.reprice_orders()
+                # Edited orders replace the strategies pending orders.
+                self.save_strategy_states()
+            return
+        with self.run_deadline(), self.accounted_run(), run_context():
+            with phase_context("plan"):
+                plan = self.plan_pairs_dca()
+            self.apply_plan(plan)
+            logger.info(plan.summary())
+            if self.repricer:
+                self.reprice_orders()
+        if self.metrics:
+            self.metrics.record_plan(plan, run_time)
+        self.save_strategy_states()
+        if self.config.snapshot:
+            self.save_snapshot()
+
+    def reprice_orders(self) -> None:
+        """
+        Reprice the stale open orders and cancel the old ones of the DCA
+        pairs configured to, logging failures so the run goes on.
+
         :return: None
         """
+        with phase_context("reprice"):
+            try:
+                self.repricer.reprice(
+                    lambda dcas: self.get_ask_prices(dcas, refresh=True)
+                )
+            except (OSError, ValueError) as e:
+                logger.warning("Repricing failed: %s", e)
+
+    def run_deadline(self) -> ContextManager:
+        """
+        Return the context bounding the run requests to the configured
+        run deadline, if any.
+
+        :return: Context manager.
+        """
+        if self.config.run_deadline and isinstance(self.ka, RetryingKrakenApi):
+            return self.ka.run_deadline(self.config.run_deadline)
+        return nullcontext()
+
+    @contextmanager
+    def accounted_run(self) -> Iterator[None]:
+        """
+        Account the run API calls within the budgets, and log them once
+        the run is over.
+
+        :return: Context manager.
+        """
+        if not self.accounting:
+            yield
+            return
+        self.accounting.reset()
+        try:
+            yield
+        finally:
+            logger.info(self.accounting.report())
+
+    def reconcile_orders(
+        self, start: datetime, end: datetime, repair: bool = False
+    ) -> Reconciliation:
+        """
+        Reconcile the order journal of the DCA pairs with Kraken orders
+        opened within a range, and repair it if requested.
+
+        :param start: Range start date.
+        :param end: Range end date.
+        :param repair: True to repair the journal.
+        :return: Reconciliation object.
+        """
+        pairs: Dict[str, Pair] = self.get_pairs(
+            [dca_pair.get("pair") for dca_pair in self.config.dca_pairs]
+        )
+        reconciler = Reconciler(
+            self.ka, list(pairs.values()), order_store=self.order_store
+        )
+        with self.accounted_run():
+            reconciliation = reconciler.reconcile(start, end)
+        logger.info(reconciliation.report())
+        if repair and not reconciliation.is_consistent:
+            reconciler.repair(reconciliation)
+        return reconciliation
+
+    def is_nothing_due(self) -> bool:
+        """
+        Return True if every DCA pair has a known order within its delay
+        and the system clock was in sync with Kraken on the last run.
+
+        :return: True if no DCA is due.
+        """
+        return (
+            bool(self.dcas_list)
+            and self.clock_offset is not None
+            and abs(self.clock_offset) <= MAX_CLOCK_OFFSET
+            and all(dca.has_recent_order() for dca in self.dcas_list)
+        )
+
+    def save_strategy_states(self) -> None:
+        """
+        Save the DCA pairs amount strategies indicators, if any, to the
+        strategy state file.
+
+        :return: None
+        """
+        states = {
+            dca.pair.name: dca.amount_strategy.get_state()
+            for dca in self.dcas_list
+            if dca.amount_strategy
+        }
+        if not states:
+            return
+        try:
+            save_states(self.config.strategy_state, states)
+        except OSError as e:
+            logger.warning(
+                "Strategy states %s not saved: %s.",
+                self.config.strategy_state,
+                e,
+            )
+
+    def save_snapshot(self) -> None:
+        """
+        Save the DCA pairs metadata and last orders, the Kraken clock
+        offset and the requests latencies to the snapshot file.
+
+        :return: None
+        """
+        snapshot = Snapshot(
+            {dca.pair.name: dca.pair for dca in self.dcas_list},
+            {
+                dca.pair.name: dca.last_order_unix
+                for dca in self.dcas_list
+                if dca.last_order_unix
+            },
+            self.clock_offset or 0,
+            self.ka.get_latencies()
+            if isinstance(self.ka, RetryingKrakenApi)
+            else None,
+            self.__pairs_created_at,
+            {
+                dca.pair.name
+                for dca in self.dcas_list
+                if dca.tagged_orders_seen
+            },
+        )
+        try:
+            snapshot.save(self.config.snapshot, self.config.api_public_key)
+        except (OSError, SnapshotError) as e:
+            logger.warning(
+                "Snapshot %s not saved: %s.", self.config.snapshot, e
+            )
+            return
+        self.snapshot = snapshot
+
+    def run_resident(self, interval: float) -> None:
+        """
+        Handle pairs DCA every interval until stopped, with orders kept
+        by the order feed if enabled, and health and metrics served over
+        HTTP if metrics_port is set.
+
+        :param interval: Delay in seconds between DCA runs.
+        :return: None
+        """
+        metrics_server: Optional[MetricsServer] = None
+        if self.metrics:
+            metrics_server = MetricsServer(
+                self.metrics,
+                self.config.metrics_port,
+                public_requests=self.get_public_requests_statistics,
+            )
+            metrics_server.start()
+        if self.order_feed:
+            self.order_feed.start()
+            if not self.order_feed.wait_live(ORDER_FEED_TIMEOUT):
+                logger.warning("Order feed not live, orders are requested.")
+        self.start_order_book_feed()
+        try:
+            while not self.__stopped.is_set():
+                try:
+                    self.handle_pairs_dca()
+                except (OSError, ValueError) as e:
+                    logger.error("DCA run error: %s", e)
+                    if self.notifier:
+                        self.notifier.notify("error", f"DCA run error: {e}")
+                if self.metrics:
+                    self.metrics.schedule(time.time() + interval)
+                self.__stopped.wait(interval)
+        finally:
+            if self.order_feed:
+                self.order_feed.stop()
+            if self.order_book_feed:
+                self.order_book_feed.stop()
+            if metrics_server:
+                metrics_server.stop()
+
+    def start_order_book_feed(self) -> None:
+        """
+        Keep the order books of the depth priced pairs up to date from
+        Kraken WebSocket book channel, if any, so they are not requested
+        on every run.
+
+        :return: None
+        """
+        dcas = [
+            dca
+            for dca in self.dcas_list
+            if dca.depth_pricing and dca.pair.ws_name
+        ]
+        if not dcas:
+            return
+        for dca in dcas:
+            dca.order_book = OrderBook(dca.pair.name, dca.pair.ws_name)
+        self.order_book_feed = OrderBookFeed([dca.order_book for dca in dcas])
+        self.order_book_feed.start()
+        if not self.order_book_feed.wait_live(ORDER_FEED_TIMEOUT):
+            logger.warning(
+                "Order book feed not live, order books are requested."
+            )
+
+    @contextmanager
+    def notified_errors(self) -> Iterator[None]:
+        """
+        Notify a run failure as an error before raising it again, e.g. a
+        one-shot run failing to request account data.
+
+        :return: Context manager.
+        """
+        try:
+            yield
+        except Exception as e:
+            if self.notifier:
+                self.notifier.notify("error", f"DCA run error: {e}")
+            raise
+
+    def notify_fill(self, trade: dict) -> None:
+        """
+        Notify a DCA pair order trade from the order feed.
+
+        :param trade: Order feed trade.
+        :return: None
+        """
+        self.notifier.notify(
+            "fill",
+            f"{trade.get('pair')} order {trade.get('ordertxid')} filled: "
+            f"{trade.get('type')} {trade.get('vol')} at {trade.get('price')}"
+            f", cost {trade.get('cost')} + {trade.get('fee')} fee.",
+        )
+
+    def get_public_requests_statistics(self) -> Dict[str, Dict[str, int]]:
+        """
+        Return the sent, coalesced and cached public requests counts per
+        endpoint, if requests are coalesced.
+
+        :return: Dictionary of counters per endpoint.
+        """
+        coalescer = getattr(self.ka, "coalescer", None)
+        if not coalescer:
+            return {}
+        return {
+            endpoint: dict(counters)
+            for endpoint, counters in list(coalescer.statistics.items())
+        }
+
+    def stop(self) -> None:
+        """
+        Stop the resident mode after the current DCA run.
+
+        :return: None
+        """
+        self.__stopped.set()
+
+    def plan_pairs_dca(self) -> Plan:
+        """
+        Gather account data and prices, then compute every DCA pair order
+        without sending any.
+
+        :return: Plan object.
+        """
         pair: str = "pair"
         n_dca: int = len(self.dcas_list)
         if n_dca > 1:
             pair += "s"
 
-        logger.info(f"DCA ({n_dca} {pair}):")
+        logger.info("DCA (%s %s):", n_dca, pair)
+        # Account data is requested once for every pair, ask prices and
+        # order books are requested meanwhile.
+        # Orders are not requested while kept by the order feed.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            account_future = executor.submit(
+                Account.get_account_from_kraken,
+                self.ka,
+                self.get_closed_orders_start(),
+                [pair_userref(dca.pair.name) for dca in self.dcas_list],
+                not (self.order_feed and self.order_feed.live),
+            )
+            ask_prices: Dict[str, float] = self.get_ask_prices(self.dcas_list)
+            account: Account = account_future.result()
+        self.clock_offset = account.kraken_time - time.time()
+        planned_orders: List[PlannedOrder] = []
+        # A failing pair is recorded, the next ones are planned anyway.
         for dca in self.dcas_list:
             logger.info(dca)
-            dca.handle_dca_logic()
+            planned = PlannedOrder(dca, None)
+            with planned.handling():
+                planned.order = dca.plan_order(
+                    account, ask_prices.get(dca.pair.name)
+                )
+                planned.rejection = dca.rejection
+            planned_orders.append(planned)
+        return Plan(account, planned_orders)
+
+    def apply_plan(self, plan: Plan) -> None:
+        """
+        Re-price planned orders from ask prices requested at once, prepare
+        their AddOrder requests, then send them immediately: only nonces
+        and signatures are left to compute when sending.
+
+        :param plan: Plan object.
+        :return: None
+        """
+        planned_orders: List[PlannedOrder] = plan.orders
+        if not planned_orders:
+            return
+        try:
+            ask_prices: Dict[str, float] = self.get_ask_prices(
+                [planned.dca for planned in planned_orders], refresh=True
+            )
+        except (OSError, ValueError) as e:
+            for planned in planned_orders:
+                planned.fail(e)
+            return
+        for planned in planned_orders:
+            dca = planned.dca
+            with phase_context("price"), planned.handling():
+                planned.order = dca.price_order(
+                    planned.order.date, ask_prices.get(dca.pair.name)
+                )
+                planned.rejection = dca.rejection
+                if planned.order:
+                    planned.prepared = planned.order.prepare_request(self.ka)
+        for planned in plan.orders:
+            logger.info(planned.dca)
+            with phase_context("send"), planned.handling():
+                planned.dca.apply_order(
+                    planned.order, plan.account, planned.prepared
+                )
+                planned.sent = True
+
+    def get_ask_prices(
+        self, dcas: List[DCA], refresh: bool = False
+    ) -> Dict[str, float]:
+        """
+        Request ask prices of the DCA pairs priced from the ticker at once,
+        and the order books of depth priced pairs not kept live meanwhile.
+
+        :param dcas: DCA objects.
+        :param refresh: Request ask prices even if fresh in the shared
+                        cache or the requests coalescer.
+        :return: Dictionary of ticker ask prices per pair name.
+        """
+        pair_names: List[str] = [
+            dca.pair.name for dca in dcas if not dca.depth_pricing
+        ]
+        with ThreadPoolExecutor() as executor:
+            order_books = {
+                dca: executor.submit(
+                    OrderBook.get_order_book_from_kraken,
+                    self.ka,
+                    dca.pair.name,
+                    dca.pair.ws_name,
+                )
+                for dca in dcas
+                if dca.depth_pricing
+                and not (dca.order_book and dca.order_book.live)
+            }
+            ask_prices: Dict[str, float] = {}
+            coalescer = getattr(self.ka, "coalescer", None)
+            if pair_names and refresh and coalescer:
+                # Fresh ticker even if coalesced by an earlier request.
+                coalescer.invalidate("Ticker")
+            if pair_names and self.shared_cache:
+                if refresh:
+                    with self.shared_cache.lock():
+                        prices = self.shared_cache.refresh_prices(
+                            self.ka, pair_names
+                        )
+                else:
+                    prices = self.shared_cache.get_prices(self.ka, pair_names)
+                ask_prices = {name: ask for name, (ask, _) in prices.items()}
+            elif pair_names:
+                tickers = self.ka.get_pair_ticker(",".join(pair_names))
+                ask_prices = {
+                    name: float(tickers.get(name).get("a")[0])
+                    for name in pair_names
+                }
+            for dca, order_book in order_books.items():
+                order_book = order_book.result()
+                if dca.order_book:
+                    # Same object kept up to date by the feed once live.
+                    dca.order_book.load_snapshot(
+                        order_book.asks.levels(), order_book.bids.levels()
+                    )
+                else:
+                    dca.order_book = order_book
+        return ask_prices
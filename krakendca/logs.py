@@ -0,0 +1,131 @@
+"""Non-blocking logging setup module."""
+import json
+import logging
+import sys
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import IO, Iterator, Optional
+
+from .accounting import current_pair
+
+TEXT_FORMAT: str = "%(asctime)s - %(levelname)s:%(name)s: %(message)s"
+# Identifier of the current DCA run, None outside of a run.
+current_run_id: ContextVar[Optional[str]] = ContextVar(
+    "current_run_id", default=None
+)
+# Current step of the run: plan, price, send or reprice.
+current_phase: ContextVar[Optional[str]] = ContextVar(
+    "current_phase", default=None
+)
+
+
+@contextmanager
+def run_context() -> Iterator[str]:
+    """
+    Tag the records logged within the context with a new run ID.
+
+    :return: Context manager yielding the run ID.
+    """
+    token = current_run_id.set(uuid.uuid4().hex[:12])
+    try:
+        yield current_run_id.get()
+    finally:
+        current_run_id.reset(token)
+
+
+@contextmanager
+def phase_context(phase: str) -> Iterator[None]:
+    """
+    Tag the records logged within the context with a run phase.
+
+    :param phase: Phase name.
+    :return: Context manager.
+    """
+    token = current_phase.set(phase)
+    try:
+        yield
+    finally:
+        current_phase.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Add the pair, run ID and phase of the logging thread context to
+    records, unless set by the caller.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for field, context in (
+            ("pair", current_pair),
+            ("run_id", current_run_id),
+            ("phase", current_phase),
+        ):
+            if not hasattr(record, field):
+                setattr(record, field, context.get())
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue records as logged: messages are formatted from their arguments
+    by the writer thread, not by the logging thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as JSON lines with their pair, run ID and phase.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pair": getattr(record, "pair", None),
+            "run_id": getattr(record, "run_id", None),
+            "phase": getattr(record, "phase", None),
+        }
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line)
+
+
+def setup_logging(
+    json_format: bool = False,
+    level: int = logging.INFO,
+    stream: Optional[IO] = None,
+) -> QueueListener:
+    """
+    Route every record through an unbounded queue to a writer thread, so
+    logging never waits for the output stream.
+
+    :param json_format: True for JSON lines, text lines otherwise.
+    :param level: Root logger level.
+    :param stream: Output stream, standard error if not specified.
+    :return: Started QueueListener, to stop before exiting for queued
+             records to be written.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(
+        JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    )
+    queue: SimpleQueue = SimpleQueue()
+    queue_handler = LazyQueueHandler(queue)
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,439 @@
+"""Resident mode health and OpenMetrics HTTP endpoint module."""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .accounting import rate_limit_weight
+from .plan import Plan
+
+logger = logging.getLogger(__name__)
+
+# Request latency histogram upper bounds in seconds.
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+# Rate limit counter decrease per second, Kraken starter tier.
+RATE_LIMIT_DECAY: float = 0.33
+RUN_OUTCOMES: Tuple[str, ...] = ("completed", "skipped", "failed")
+# Seconds a scheduled run may be late before the process is unhealthy.
+HEALTH_GRACE: float = 300
+CONTENT_TYPE: str = (
+    "application/openmetrics-text; version=1.0.0; charset=utf-8"
+)
+
+
+def family(name: str, metric_type: str, description: str) -> List[str]:
+    """
+    Return a metric family metadata lines.
+
+    :param name: Metric family name.
+    :param metric_type: OpenMetrics type.
+    :param description: Family help.
+    :return: TYPE and HELP lines.
+    """
+    return [f"# TYPE {name} {metric_type}", f"# HELP {name} {description}"]
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values, OpenMetrics style.
+    """
+
+    buckets: Tuple[float, ...]
+    counts: List[int]
+    count: int
+    sum: float
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """
+        Initialize the Histogram object.
+
+        :param buckets: Buckets upper bounds, sorted.
+        :return: None
+        """
+        self.buckets = buckets
+        # Last count for values above the highest bound.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Add a value to its bucket.
+
+        :param value: Observed value.
+        :return: None
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        """
+        Return the count of values up to each bucket bound.
+
+        :return: List of (le label, cumulative count), +Inf last.
+        """
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        cumulative, total = [], 0
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class Metrics:
+    """
+    Resident process metrics, recorded in constant time by the DCA loop
+    and API client threads and rendered on request by the HTTP server.
+    """
+
+    started_at: float
+    next_run: Optional[float]
+
+    def __init__(self) -> None:
+        """
+        Initialize the Metrics object.
+
+        :return: None
+        """
+        self.started_at = time.time()
+        self.next_run = None
+        # Pair -> (last run Unix time, outcome, duration in seconds).
+        self.pair_runs: Dict[str, Tuple[float, str, float]] = {}
+        self.orders_placed: Dict[str, int] = {}
+        self.latencies: Dict[str, Histogram] = {}
+        self.requests: Dict[str, int] = {}
+        self.__rate_limit = (0.0, time.monotonic())
+        self.__lock = threading.Lock()
+
+    def observe_request(self, endpoint: str, public: bool) -> None:
+        """
+        Count a request sent to Kraken, in the rate limit counter estimate
+        if private.
+
+        :param endpoint: Request endpoint.
+        :param public: True for public endpoints.
+        :return: None
+        """
+        with self.__lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            if not public:
+                now = time.monotonic()
+                self.__rate_limit = (
+                    self.decayed_rate_limit(now)
+                    + rate_limit_weight(endpoint, public),
+                    now,
+                )
+
+    def observe_latency(self, endpoint: str, latency: float) -> None:
+        """
+        Add a request latency to its endpoint histogram.
+
+        :param endpoint: Request endpoint.
+        :param latency: Request latency in seconds.
+        :return: None
+        """
+        with self.__lock:
+            histogram = self.latencies.get(endpoint)
+            if histogram is None:
+                histogram = self.latencies[endpoint] = Histogram()
+            histogram.observe(latency)
+
+    def decayed_rate_limit(self, now: float) -> float:
+        """
+        Return the rate limit counter estimate decayed until now.
+
+        :param now: time.monotonic() time.
+        :return: Counter estimate.
+        """
+        counter, updated = self.__rate_limit
+        return max(0.0, counter - (now - updated) * RATE_LIMIT_DECAY)
+
+    def record_plan(self, plan: Plan, run_time: float) -> None:
+        """
+        Record each pair outcome and sent orders of a DCA run.
+
+        :param plan: Applied Plan object.
+        :param run_time: Run Unix time.
+        :return: None
+        """
+        with self.__lock:
+            for planned in plan.planned_orders:
+                pair = planned.dca.pair.name
+                self.pair_runs[pair] = (
+                    run_time,
+                    planned.status,
+                    planned.duration,
+                )
+                if planned.sent:
+                    self.orders_placed[pair] = self.orders_placed.get(
+                        pair, 0
+                    ) + len(planned.order.legs)
+
+    def record_skipped(self, pairs: List[str], run_time: float) -> None:
+        """
+        Record a DCA run skipped for every pair, without request.
+
+        :param pairs: Pairs names.
+        :param run_time: Run Unix time.
+        :return: None
+        """
+        with self.__lock:
+            for pair in pairs:
+                self.pair_runs[pair] = (run_time, "skipped", 0)
+
+    def schedule(self, next_run: float) -> None:
+        """
+        Record the next DCA run time.
+
+        :param next_run: Next run Unix time.
+        :return: None
+        """
+        self.next_run = next_run
+
+    def healthy(self, now: Optional[float] = None) -> bool:
+        """
+        Return True unless the DCA loop is late on its schedule by more
+        than HEALTH_GRACE, e.g. stuck in a run.
+
+        :param now: Unix time, now if not specified.
+        :return: True if healthy.
+        """
+        now = time.time() if now is None else now
+        expected = self.started_at if self.next_run is None else self.next_run
+        return now <= expected + HEALTH_GRACE
+
+    def render(
+        self, public_requests: Optional[Dict[str, Dict[str, int]]] = None
+    ) -> str:
+        """
+        Return the metrics in OpenMetrics text format.
+
+        :param public_requests: Sent, coalesced and cached public requests
+                                counts per endpoint, e.g. from a
+                                RequestCoalescer.
+        :return: Metrics exposition.
+        """
+        with self.__lock:
+            pair_runs = dict(self.pair_runs)
+            orders_placed = dict(self.orders_placed)
+            requests = dict(self.requests)
+            latencies = {
+                endpoint: (
+                    histogram.cumulative_counts(),
+                    histogram.count,
+                    histogram.sum,
+                )
+                for endpoint, histogram in self.latencies.items()
+            }
+            rate_limit = self.decayed_rate_limit(time.monotonic())
+        lines: List[str] = []
+        lines += family(
+            "kraken_dca_up", "gauge", "1 if the DCA loop is on time."
+        )
+        lines.append(f"kraken_dca_up {int(self.healthy())}")
+        lines += family(
+            "kraken_dca_next_run_timestamp_seconds",
+            "gauge",
+            "Next scheduled DCA run time.",
+        )
+        if self.next_run is not None:
+            lines.append(
+                f"kraken_dca_next_run_timestamp_seconds {self.next_run}"
+            )
+        lines += family(
+            "kraken_dca_pair_last_run_timestamp_seconds",
+            "gauge",
+            "Last DCA run time per pair.",
+        )
+        for pair, (run_time, _, _) in sorted(pair_runs.items()):
+            lines.append(
+                f'kraken_dca_pair_last_run_timestamp_seconds{{pair="{pair}"}}'
+                f" {run_time}"
+            )
+        lines += family(
+            "kraken_dca_pair_last_run_duration_seconds",
+            "gauge",
+            "Last DCA run duration per pair.",
+        )
+        for pair, (_, _, duration) in sorted(pair_runs.items()):
+            lines.append(
+                f'kraken_dca_pair_last_run_duration_seconds{{pair="{pair}"}}'
+                f" {duration}"
+            )
+        lines += family(
+            "kraken_dca_pair_last_run_outcome",
+            "stateset",
+            "Last DCA run outcome per pair.",
+        )
+        for pair, (_, outcome, _) in sorted(pair_runs.items()):
+            for state in RUN_OUTCOMES:
+                lines.append(
+                    f'kraken_dca_pair_last_run_outcome{{pair="{pair}",'
+                    f'kraken_dca_pair_last_run_outcome="{state}"}} '
+                    f"{int(state == outcome)}"
+                )
+        lines += family(
+            "kraken_dca_orders_placed", "counter", "Orders sent per pair."
+        )
+        for pair, count in sorted(orders_placed.items()):
+            lines.append(
+                f'kraken_dca_orders_placed_total{{pair="{pair}"}} {count}'
+            )
+        lines += family(
+            "kraken_dca_api_requests",
+            "counter",
+            "Requests sent to Kraken API per endpoint, retries included.",
+        )
+        for endpoint, count in sorted(requests.items()):
+            lines.append(
+                f'kraken_dca_api_requests_total{{endpoint="{endpoint}"}} '
+                f"{count}"
+            )
+        lines += family(
+            "kraken_dca_api_request_duration_seconds",
+            "histogram",
+            "Kraken API requests latency per endpoint.",
+        )
+        for endpoint, (buckets, count, total) in sorted(latencies.items()):
+            name = "kraken_dca_api_request_duration_seconds"
+            for bound, bucket_count in buckets:
+                lines.append(
+                    f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                    f"{bucket_count}"
+                )
+            lines.append(f'{name}_count{{endpoint="{endpoint}"}} {count}')
+            lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {total}')
+        lines += family(
+            "kraken_dca_api_rate_limit_counter",
+            "gauge",
+            "Estimated Kraken private API rate limit counter.",
+        )
+        lines.append(f"kraken_dca_api_rate_limit_counter {rate_limit:.2f}")
+        lines += family(
+            "kraken_dca_cache_hit_ratio",
+            "gauge",
+            "Public requests answered without being sent per endpoint.",
+        )
+        for endpoint, counters in sorted((public_requests or {}).items()):
+            total = sum(counters.values())
+            saved = total - counters.get("sent", 0)
+            lines.append(
+                f'kraken_dca_cache_hit_ratio{{endpoint="{endpoint}"}} '
+                f"{saved / total if total else 0:.4f}"
+            )
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    HTTP server exposing /healthz and /metrics on a local port, served by
+    its own threads so scrapes never block the DCA loop.
+    """
+
+    metrics: Metrics
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        port: int,
+        host: str = "127.0.0.1",
+        public_requests: Optional[
+            Callable[[], Dict[str, Dict[str, int]]]
+        ] = None,
+    ) -> None:
+        """
+        Initialize the MetricsServer object, listening at once.
+
+        :param metrics: Metrics object to expose.
+        :param port: Listening port, 0 for any free port.
+        :param host: Listening address.
+        :param public_requests: Function returning sent, coalesced and
+                                cached public requests counts per endpoint.
+        :return: None
+        """
+        self.metrics = metrics
+        self.public_requests = public_requests or dict
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                server.handle(self)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """
+        Listening port.
+
+        :return: Port number.
+        """
+        return self.__server.server_address[1]
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        """
+        Answer a GET request.
+
+        :param request: Request handler.
+        :return: None
+        """
+        if request.path == "/healthz":
+            healthy = self.metrics.healthy()
+            status = 200 if healthy else 503
+            body = b"ok\n" if healthy else b"late\n"
+            content_type = "text/plain; charset=utf-8"
+        elif request.path == "/metrics":
+            status = 200
+            body = self.metrics.render(self.public_requests()).encode()
+            content_type = CONTENT_TYPE
+        else:
+            status, body, content_type = 404, b"", "text/plain"
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self) -> None:
+        """
+        Serve requests in a daemon thread.
+
+        :return: None
+        """
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever,
+            name="kraken-dca-metrics",
+            daemon=True,
+        )
+        self.__thread.start()
+        logger.info("Metrics served on port %s.", self.port)
+
+    def stop(self) -> None:
+        """
+        Stop serving and close the listening socket.
+
+        :return: None
+        """
+        if self.__thread:
+            self.__server.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.__server.server_close()
@@ -0,0 +1,296 @@
+"""Kraken API private requests nonces module."""
+import fcntl
+import hashlib
+import http.client
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Iterator, Optional
+from urllib.request import (
+    HTTPHandler,
+    HTTPSHandler,
+    Request,
+    build_opener,
+    urlopen,
+)
+
+from krakenapi import KrakenApi
+
+from .signer import PreparedRequest, replace_nonce
+from .utils import is_public_request, request_endpoint
+
+# Last allocated nonce, unsigned 64-bit.
+NONCE = struct.Struct("<Q")
+
+
+def default_nonce_filepath(api_public_key: str) -> str:
+    """
+    Return the nonce file path shared by processes using an API key.
+
+    :param api_public_key: Kraken API public key.
+    :return: Nonce file path in the temporary directory.
+    """
+    key_hash = hashlib.sha256(api_public_key.encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"kraken-dca-{key_hash}.nonce")
+
+
+class NonceAllocator:
+    """
+    Strictly increasing nonces shared by threads, and by processes through
+    a file holding the last allocated nonce.
+    Nonces are the current time in microseconds, or the last nonce plus
+    one if the clock went backwards or allocations are faster than the
+    clock resolution.
+    """
+
+    filepath: Optional[str]
+
+    def __init__(self, filepath: Optional[str] = None) -> None:
+        """
+        Initialize the NonceAllocator object.
+
+        :param filepath: File shared with other processes, nonces are only
+                         shared between threads if not specified.
+        :return: None
+        """
+        self.filepath = filepath
+        self.__last = 0
+        self.__lock = threading.Lock()
+        self.__fd: Optional[int] = None
+        if filepath:
+            self.__fd = os.open(filepath, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def close(self) -> None:
+        """
+        Close the nonce file.
+
+        :return: None
+        """
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Hold the allocator lock, across processes if a file is used.
+
+        :return: None
+        """
+        with self.__lock:
+            if self.__fd is None:
+                yield
+                return
+            fcntl.flock(self.__fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+    def next_nonce(self) -> int:
+        """
+        Allocate a nonce, the lock must be held.
+
+        :return: Nonce greater than any nonce previously allocated.
+        """
+        last = self.__last
+        if self.__fd is not None:
+            data = os.pread(self.__fd, NONCE.size, 0)
+            if len(data) == NONCE.size:
+                last = max(last, NONCE.unpack(data)[0])
+        nonce = max(time.time_ns() // 1000, last + 1)
+        if self.__fd is not None:
+            os.pwrite(self.__fd, NONCE.pack(nonce), 0)
+        self.__last = nonce
+        return nonce
+
+    def allocate(self) -> int:
+        """
+        Allocate a nonce.
+
+        :return: Nonce greater than any nonce previously allocated.
+        """
+        with self.lock():
+            return self.next_nonce()
+
+
+def ordered_connection(
+    base: type, dispatch: Callable, acknowledged: bool
+) -> type:
+    """
+    Return an HTTP connection class taking its dispatch turn once
+    connected: the request body and headers are renewed and sent while
+    holding the nonce lock.
+
+    :param base: http.client connection class.
+    :param dispatch: Context manager factory renewing body and headers.
+    :param acknowledged: Hold the turn until the response headers are
+                         received, so Kraken checks nonces in order.
+    :return: Connection class.
+    """
+
+    class OrderedConnection(base):
+        turn: Optional[ExitStack] = None
+
+        def request(self, method, url, body=None, headers=None, **kwargs):
+            # Connected, with TLS handshake, before taking the turn.
+            self.connect()
+            turn = ExitStack()
+            body, headers = turn.enter_context(dispatch(body, headers or {}))
+            with ExitStack() as on_error:
+                on_error.push(turn)
+                super().request(method, url, body, headers, **kwargs)
+                on_error.pop_all()
+            if acknowledged:
+                self.turn = turn
+            else:
+                turn.close()
+
+        def getresponse(self):
+            try:
+                return super().getresponse()
+            finally:
+                if self.turn:
+                    self.turn.close()
+                    self.turn = None
+
+    return OrderedConnection
+
+
+class OrderedHTTPHandler(HTTPHandler):
+    """
+    urllib HTTP handler sending requests in nonce order.
+    """
+
+    def __init__(self, dispatch: Callable, acknowledged: bool) -> None:
+        super().__init__()
+        self.dispatch = dispatch
+        self.acknowledged = acknowledged
+
+    def http_open(self, request: Request):
+        connection = ordered_connection(
+            http.client.HTTPConnection, self.dispatch, self.acknowledged
+        )
+        return self.do_open(connection, request)
+
+
+class OrderedHTTPSHandler(HTTPSHandler):
+    """
+    urllib HTTPS handler sending requests in nonce order.
+    """
+
+    def __init__(self, dispatch: Callable, acknowledged: bool) -> None:
+        super().__init__()
+        self.dispatch = dispatch
+        self.acknowledged = acknowledged
+
+    def https_open(self, request: Request):
+        connection = ordered_connection(
+            http.client.HTTPSConnection, self.dispatch, self.acknowledged
+        )
+        return self.do_open(connection, request, context=self._context)
+
+
+class NonceKrakenApi(KrakenApi):
+    """
+    KrakenApi object allocating strictly increasing nonces and sending
+    private requests in nonce order, so they can be sent in parallel by
+    threads and processes using the same API key.
+    Connections are opened concurrently, then requests are sent one at a
+    time and, without an API key nonce window, wait for Kraken response
+    headers before the next one is sent, as Kraken could otherwise check
+    nonces of different connections out of order.
+    Requests are opened through open_request by RetryingKrakenApi, private
+    requests being created without nonce nor signature.
+    """
+
+    nonce_allocator: NonceAllocator
+    nonce_window: int
+    # Private requests nonce and signature are only set when sent.
+    signed_at_dispatch: bool = True
+
+    def __init__(
+        self,
+        *args,
+        nonce_allocator: Optional[NonceAllocator] = None,
+        nonce_window: int = 0,
+        **kwargs,
+    ) -> None:
+        """
+        Initialize the NonceKrakenApi object.
+
+        :param nonce_allocator: NonceAllocator object, possibly shared with
+                                other KrakenApi objects using the same key.
+        :param nonce_window: API key nonce window set on Kraken, requests
+                             are sent without waiting for the previous
+                             response if not 0.
+        :return: None
+        """
+        super().__init__(*args, **kwargs)
+        self.nonce_allocator = nonce_allocator or NonceAllocator()
+        self.nonce_window = nonce_window
+
+    def create_api_nonce(self) -> str:
+        """
+        Allocate a nonce.
+
+        :return: Nonce as string.
+        """
+        return str(self.nonce_allocator.allocate())
+
+    def create_api_request(
+        self, public_method: bool, api_method: str, post_inputs: dict = None
+    ) -> Request:
+        """
+        Create a request object, private requests with a placeholder nonce
+        and no signature, both set when their turn to be sent comes.
+
+        :param public_method: Is the method a public market data.
+        :param api_method: API method as string.
+        :param post_inputs: POST inputs as dict.
+        :return: Request object.
+        """
+        if public_method:
+            return super().create_api_request(
+                public_method, api_method, post_inputs
+            )
+        return PreparedRequest(self, api_method, post_inputs).finalize(self)
+
+    def open_request(self, request: Request, timeout: float):
+        """
+        Open the request, private requests being signed with a new nonce
+        when their turn to be sent comes.
+
+        :param request: Request object to send to Kraken API.
+        :param timeout: Request timeout in seconds.
+        :return: HTTP response.
+        """
+        if is_public_request(request):
+            return urlopen(request, timeout=timeout)
+        endpoint = request_endpoint(request)
+
+        @contextmanager
+        def dispatch(body: bytes, headers: dict):
+            with self.nonce_allocator.lock():
+                nonce = str(self.nonce_allocator.next_nonce())
+                body = replace_nonce(body, nonce)
+                headers = {
+                    name: value
+                    for name, value in headers.items()
+                    if name.lower() != "api-sign"
+                }
+                headers["API-Sign"] = self.create_api_signature(
+                    nonce, body, endpoint
+                )
+                headers["Content-Length"] = str(len(body))
+                yield body, headers
+
+        acknowledged = not self.nonce_window
+        opener = build_opener(
+            OrderedHTTPHandler(dispatch, acknowledged),
+            OrderedHTTPSHandler(dispatch, acknowledged),
+        )
+        return opener.open(request, timeout=timeout)
@@ -0,0 +1,525 @@
+"""Asynchronous notifications module."""
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from abc import ABC, abstractmethod
+from email.message import EmailMessage
+from queue import Empty, Full, Queue
+from typing import Dict, List, Optional, Sequence, TypeVar
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound="Notification")
+N = TypeVar("N", bound="Notifier")
+
+# Notified events: orders sent, orders filled and pair or run errors.
+EVENTS: tuple = ("order", "fill", "error")
+# Notifications waiting for the worker, newer ones are dropped beyond.
+QUEUE_SIZE: int = 1000
+# Maximum notifications per message sent to a sink.
+BATCH_SIZE: int = 50
+# Seconds notifications are gathered after the first one of a batch.
+BATCH_DELAY: float = 2
+# Seconds between attempts to send a batch to a sink.
+RETRY_DELAYS: tuple = (1, 5, 15)
+# Sink connection timeout in seconds.
+SINK_TIMEOUT: float = 10
+# Seconds close waits for queued notifications to be sent.
+CLOSE_TIMEOUT: float = 30
+
+
+class Notification:
+    """
+    A notified event, with the count of identical notifications it
+    coalesces.
+    """
+
+    event: str
+    message: str
+    created_at: float
+    count: int
+
+    def __init__(
+        self,
+        event: str,
+        message: str,
+        created_at: Optional[float] = None,
+        count: int = 1,
+    ) -> None:
+        """
+        Initialize the Notification object.
+
+        :param event: One of EVENTS.
+        :param message: Notification text.
+        :param created_at: Unix time of the first notification, now if not
+                           specified.
+        :param count: Identical notifications count.
+        :return: None
+        """
+        self.event = event
+        self.message = message
+        self.created_at = time.time() if created_at is None else created_at
+        self.count = count
+
+    def __str__(self) -> str:
+        repeated = f" (x{self.count})" if self.count > 1 else ""
+        return f"[{self.event}] {self.message}{repeated}"
+
+    def as_dict(self) -> dict:
+        """
+        Return the notification as JSON serializable dict.
+
+        :return: Notification attributes.
+        """
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, attributes: dict) -> T:
+        """
+        Return a Notification object from as_dict attributes.
+
+        :param attributes: Notification attributes.
+        :return: Notification object.
+        """
+        return cls(**attributes)
+
+
+def coalesce(notifications: List[Notification]) -> List[Notification]:
+    """
+    Merge identical notifications, in first notification order.
+
+    :param notifications: Notification objects.
+    :return: Coalesced Notification objects.
+    """
+    coalesced: Dict[tuple, Notification] = {}
+    for notification in notifications:
+        key = (notification.event, notification.message)
+        if key in coalesced:
+            coalesced[key].count += notification.count
+        else:
+            coalesced[key] = Notification(
+                notification.event,
+                notification.message,
+                notification.created_at,
+                notification.count,
+            )
+    return list(coalesced.values())
+
+
+class Sink(ABC):
+    """
+    Notifications destination, raising OSError when unavailable.
+    """
+
+    name: str = ""
+
+    @staticmethod
+    def format_text(notifications: List[Notification]) -> str:
+        """
+        Return the notifications as a message text, one per line.
+
+        :param notifications: Notification objects.
+        :return: Message text.
+        """
+        return "\n".join(str(notification) for notification in notifications)
+
+    @abstractmethod
+    def send(self, notifications: List[Notification]) -> None:
+        """
+        Send notifications at once.
+
+        :param notifications: Notification objects.
+        :return: None
+        """
+
+
+class WebhookSink(Sink):
+    """
+    POST notifications as JSON to a webhook: the text is set as text and
+    content fields, read by Slack, Mattermost and Discord webhooks, and
+    extra fields are added, e.g. chat_id for Telegram bots sendMessage.
+    """
+
+    name = "webhook"
+    url: str
+    fields: dict
+
+    def __init__(self, url: str, fields: Optional[dict] = None) -> None:
+        """
+        Initialize the WebhookSink object.
+
+        :param url: Webhook URL.
+        :param fields: Extra JSON body fields.
+        :return: None
+        """
+        self.url = url
+        self.fields = fields or {}
+
+    def send(self, notifications: List[Notification]) -> None:
+        text = self.format_text(notifications)
+        body = {
+            "text": text,
+            "content": text,
+            "notifications": [
+                notification.as_dict() for notification in notifications
+            ],
+            **self.fields,
+        }
+        request = Request(
+            self.url,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urlopen(request, timeout=SINK_TIMEOUT) as response:
+            response.read()
+
+
+class SmtpSink(Sink):
+    """
+    Send notifications by email.
+    """
+
+    name = "smtp"
+    host: str
+    port: int
+    sender: str
+    recipients: List[str]
+    username: Optional[str]
+    password: Optional[str]
+    starttls: bool
+
+    def __init__(
+        self,
+        host: str,
+        sender: str,
+        recipients: List[str],
+        port: int = 25,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+    ) -> None:
+        """
+        Initialize the SmtpSink object.
+
+        :param host: SMTP server host.
+        :param sender: Sender email address.
+        :param recipients: Recipients email addresses.
+        :param port: SMTP server port.
+        :param username: SMTP login username, no login if not specified.
+        :param password: SMTP login password.
+        :param starttls: True to upgrade the connection with STARTTLS.
+        :return: None
+        """
+        self.host = host
+        self.sender = sender
+        self.recipients = recipients
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def send(self, notifications: List[Notification]) -> None:
+        events = sorted({notification.event for notification in notifications})
+        message = EmailMessage()
+        message["Subject"] = f"Kraken-DCA: {', '.join(events)}"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(self.format_text(notifications))
+        with smtplib.SMTP(self.host, self.port, timeout=SINK_TIMEOUT) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+
+class Notifier:
+    """
+    Send notifications from a background worker: notify only queues them,
+    so it never delays orders nor fails a run. Queued notifications are
+    batched and coalesced, and sent to every sink with retries, batches a
+    sink keeps refusing being spilled to a file and sent again with the
+    sink next batch.
+    """
+
+    sinks: List[Sink]
+    events: Sequence[str]
+    spill_file: Optional[str]
+    batch_size: int
+    batch_delay: float
+    retry_delays: Sequence[float]
+    dropped: int
+
+    def __init__(
+        self,
+        sinks: List[Sink],
+        events: Sequence[str] = EVENTS,
+        spill_file: Optional[str] = None,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        batch_delay: float = BATCH_DELAY,
+        retry_delays: Sequence[float] = RETRY_DELAYS,
+    ) -> None:
+        """
+        Initialize the Notifier object.
+
+        :param sinks: Notifications destinations.
+        :param events: Notified events, others are ignored.
+        :param spill_file: JSON lines file of batches not sent, dropped if
+                           not specified.
+        :param queue_size: Maximum queued notifications.
+        :param batch_size: Maximum notifications per batch.
+        :param batch_delay: Seconds to gather a batch.
+        :param retry_delays: Seconds between a batch attempts.
+        :return: None
+        """
+        self.sinks = sinks
+        self.events = events
+        self.spill_file = spill_file
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.retry_delays = retry_delays
+        self.dropped = 0
+        self.__queue: Queue = Queue(queue_size)
+        self.__lock = threading.Lock()
+        # Sink name -> notifications taken by the worker, not sent nor
+        # spilled yet, spilled by close if the worker is still busy.
+        self.__in_flight: Dict[str, List[Notification]] = {}
+        self.__closing = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> N:
+        """
+        Initialize the Notifier object from the notifications
+        configuration.
+
+        :param config: notifications configuration.
+        :return: Notifier object.
+        """
+        sinks: List[Sink] = []
+        if config.get("webhook"):
+            sinks.append(WebhookSink(**config.get("webhook")))
+        if config.get("smtp"):
+            sinks.append(SmtpSink(**config.get("smtp")))
+        return cls(
+            sinks,
+            events=config.get("events", EVENTS),
+            spill_file=config.get("spill_file", "notifications_spill.jsonl"),
+        )
+
+    def notify(self, event: str, message: str) -> None:
+        """
+        Queue a notification without waiting, the worker is started on the
+        first one.
+
+        :param event: One of EVENTS.
+        :param message: Notification text.
+        :return: None
+        """
+        if event not in self.events or self.__closing.is_set():
+            return
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(
+                    target=self.run, name="notifier", daemon=True
+                )
+                self.__thread.start()
+        try:
+            self.__queue.put_nowait(Notification(event, message))
+        except Full:
+            self.dropped += 1
+            logger.warning("Notification queue full, dropped: %s", message)
+
+    def close(self, timeout: float = CLOSE_TIMEOUT) -> None:
+        """
+        Send the queued notifications and stop the worker, notifications
+        still queued or being sent after the timeout are spilled.
+
+        :param timeout: Seconds to wait for the worker.
+        :return: None
+        """
+        self.__closing.set()
+        if self.__thread:
+            self.__thread.join(timeout)
+        if self.__thread and self.__thread.is_alive():
+            logger.warning("Notifications not sent in time, spilled.")
+        with self.__lock:
+            in_flight = self.__in_flight
+            self.__in_flight = {}
+        remaining = self.take_batch(0, self.__queue.qsize())
+        for sink in self.sinks:
+            notifications = in_flight.get(sink.name, []) + remaining
+            if notifications:
+                self.spill(sink, coalesce(notifications))
+
+    def take_batch(self, first_timeout: float, size: int) -> list:
+        """
+        Take queued notifications, waiting for the first one.
+
+        :param first_timeout: Seconds to wait for a first notification.
+        :param size: Maximum batch size.
+        :return: List of Notification objects.
+        """
+        batch: List[Notification] = []
+        deadline = time.monotonic() + first_timeout
+        while len(batch) < size:
+            try:
+                if batch:
+                    batch.append(self.__queue.get_nowait())
+                else:
+                    batch.append(self.__queue.get(timeout=first_timeout))
+                    deadline = time.monotonic() + self.batch_delay
+            except Empty:
+                remaining = deadline - time.monotonic()
+                if not batch or self.__closing.is_set() or remaining <= 0:
+                    break
+                time.sleep(min(remaining, 0.05))
+        return batch
+
+    def run(self) -> None:
+        """
+        Send batches of queued notifications until closed and the queue is
+        empty.
+
+        :return: None
+        """
+        while not (self.__closing.is_set() and self.__queue.empty()):
+            batch = self.take_batch(0.1, self.batch_size)
+            if not batch:
+                continue
+            notifications = coalesce(batch)
+            with self.__lock:
+                for sink in self.sinks:
+                    self.__in_flight[sink.name] = notifications
+            for sink in self.sinks:
+                try:
+                    self.deliver(sink, notifications)
+                except Exception as e:
+                    self.release(sink)
+                    logger.error("Notification %s error: %s", sink.name, e)
+
+    def release(self, sink: Sink) -> bool:
+        """
+        Forget the notifications in flight for a sink, once sent or to be
+        spilled by the worker.
+
+        :param sink: Sink object.
+        :return: False if close already spilled them.
+        """
+        with self.__lock:
+            return self.__in_flight.pop(sink.name, None) is not None
+
+    def deliver(self, sink: Sink, notifications: List[Notification]) -> None:
+        """
+        Send notifications and the sink spilled ones to a sink with
+        retries, spill them if the sink is still down.
+
+        :param sink: Sink object.
+        :param notifications: Notification objects.
+        :return: None
+        """
+        spilled = self.load_spilled(sink)
+        pending = coalesce(spilled + notifications)
+        delays = list(self.retry_delays)
+        while True:
+            try:
+                sink.send(pending)
+                break
+            except OSError as e:
+                # Retries are cancelled by close.
+                if delays and not self.__closing.wait(delays.pop(0)):
+                    continue
+                if not self.release(sink):
+                    return
+                logger.warning(
+                    "Notification %s down (%s), %s notifications spilled.",
+                    sink.name,
+                    e,
+                    len(notifications),
+                )
+                self.spill(sink, notifications)
+                return
+        self.release(sink)
+        if spilled:
+            self.remove_spilled(sink)
+
+    def spill(self, sink: Sink, notifications: List[Notification]) -> None:
+        """
+        Append notifications of a sink to the spill file.
+
+        :param sink: Sink object.
+        :param notifications: Notification objects.
+        :return: None
+        """
+        if not self.spill_file:
+            self.dropped += len(notifications)
+            return
+        record = {
+            "sink": sink.name,
+            "notifications": [
+                notification.as_dict() for notification in notifications
+            ],
+        }
+        with self.__lock, open(self.spill_file, "a") as spill_file:
+            spill_file.write(json.dumps(record) + "\n")
+
+    def read_spill_file(self) -> List[dict]:
+        """
+        Read the spill file records.
+
+        :return: Spilled batches records.
+        """
+        try:
+            with open(self.spill_file, "r") as spill_file:
+                return [json.loads(line) for line in spill_file if line]
+        except FileNotFoundError:
+            return []
+        except ValueError as e:
+            logger.warning("Spilled notifications discarded: %s.", e)
+            return []
+
+    def load_spilled(self, sink: Sink) -> List[Notification]:
+        """
+        Return the notifications spilled for a sink.
+
+        :param sink: Sink object.
+        :return: List of Notification objects.
+        """
+        if not self.spill_file:
+            return []
+        with self.__lock:
+            records = self.read_spill_file()
+        return [
+            Notification.from_dict(attributes)
+            for record in records
+            if record.get("sink") == sink.name
+            for attributes in record.get("notifications")
+        ]
+
+    def remove_spilled(self, sink: Sink) -> None:
+        """
+        Remove the notifications spilled for a sink, sent, the file being
+        replaced at once.
+
+        :param sink: Sink object.
+        :return: None
+        """
+        with self.__lock:
+            records = [
+                record
+                for record in self.read_spill_file()
+                if record.get("sink") != sink.name
+            ]
+            if not records:
+                os.remove(self.spill_file)
+                return
+            temporary_filepath = f"{self.spill_file}.{os.getpid()}.tmp"
+            with open(temporary_filepath, "w") as spill_file:
+                for record in records:
+                    spill_file.write(json.dumps(record) + "\n")
+            os.replace(temporary_filepath, self.spill_file)
@@ -0,0 +1,352 @@
+"""Local OHLC candles history store module."""
+import logging
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from krakenapi import KrakenApi
+
+logger = logging.getLogger(__name__)
+
+# Candle columns, as returned by Kraken OHLC endpoint.
+COLUMNS: tuple = (
+    "time",
+    "open",
+    "high",
+    "low",
+    "close",
+    "vwap",
+    "volume",
+    "count",
+)
+TIME, OPEN, HIGH, LOW, CLOSE, VWAP, VOLUME, COUNT = range(len(COLUMNS))
+# Candles are stored as contiguous little-endian float64 records.
+DTYPE = np.dtype("<f8")
+RECORD_SIZE: int = DTYPE.itemsize * len(COLUMNS)
+# Kraken OHLC intervals in minutes.
+INTERVALS: tuple = (1, 5, 15, 30, 60, 240, 1440, 10080, 21600)
+# Trades read per chunk from Kraken trades CSV files.
+CSV_CHUNK_SIZE: int = 1_000_000
+
+
+def trades_to_candles(trades: np.ndarray, interval: int) -> np.ndarray:
+    """
+    Aggregate trades into candles of an interval.
+
+    :param trades: Trades as (time, price, volume) rows, sorted by time.
+    :param interval: Candle interval in minutes.
+    :return: Candles as rows of COLUMNS.
+    """
+    if not len(trades):
+        return np.empty((0, len(COLUMNS)), dtype=DTYPE)
+    times, prices, volumes = trades[:, 0], trades[:, 1], trades[:, 2]
+    buckets = times // (interval * 60) * (interval * 60)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(trades)]
+    candles = np.empty((len(starts), len(COLUMNS)), dtype=DTYPE)
+    candles[:, TIME] = buckets[starts]
+    candles[:, OPEN] = prices[starts]
+    candles[:, HIGH] = np.maximum.reduceat(prices, starts)
+    candles[:, LOW] = np.minimum.reduceat(prices, starts)
+    candles[:, CLOSE] = prices[ends - 1]
+    candles[:, VOLUME] = np.add.reduceat(volumes, starts)
+    notional = np.add.reduceat(prices * volumes, starts)
+    candles[:, VWAP] = np.divide(
+        notional,
+        candles[:, VOLUME],
+        out=candles[:, CLOSE].copy(),
+        where=candles[:, VOLUME] > 0,
+    )
+    candles[:, COUNT] = ends - starts
+    return candles
+
+
+def combine_candles(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Combine two candles of the same time, from consecutive trades.
+
+    :param first: Candle of the earliest trades.
+    :param second: Candle of the latest trades.
+    :return: Combined candle.
+    """
+    candle = first.copy()
+    candle[HIGH] = max(first[HIGH], second[HIGH])
+    candle[LOW] = min(first[LOW], second[LOW])
+    candle[CLOSE] = second[CLOSE]
+    candle[VOLUME] = first[VOLUME] + second[VOLUME]
+    if candle[VOLUME] > 0:
+        candle[VWAP] = (
+            first[VWAP] * first[VOLUME] + second[VWAP] * second[VOLUME]
+        ) / candle[VOLUME]
+    candle[COUNT] = first[COUNT] + second[COUNT]
+    return candle
+
+
+class OHLCStore:
+    """
+    Candles history per pair and interval, each in a file of contiguous
+    float64 records sorted by time: new candles are appended, and files
+    are memory-mapped to be read without copy.
+    """
+
+    directory: str
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initialize the OHLCStore object, creating its directory if needed.
+
+        :param directory: Candles files directory.
+        :return: None
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def filepath(self, pair: str, interval: int) -> str:
+        """
+        Return the candles file path of a pair and interval.
+
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :return: File path.
+        """
+        if interval not in INTERVALS:
+            raise ValueError(
+                f"OHLC interval must be one of "
+                f"{', '.join(str(interval) for interval in INTERVALS)}."
+            )
+        return os.path.join(self.directory, f"{pair}_{interval}.f64")
+
+    def read(self, pair: str, interval: int) -> np.ndarray:
+        """
+        Return the stored candles of a pair, memory-mapped read-only.
+
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :return: Candles as rows of COLUMNS, oldest first.
+        """
+        filepath = self.filepath(pair, interval)
+        records = self.records_count(filepath)
+        if not records:
+            return np.empty((0, len(COLUMNS)), dtype=DTYPE)
+        return np.memmap(
+            filepath, dtype=DTYPE, mode="r", shape=(records, len(COLUMNS))
+        )
+
+    @staticmethod
+    def records_count(filepath: str) -> int:
+        """
+        Return the count of complete candles in a file, a partial record
+        left by an interrupted write is ignored.
+
+        :param filepath: Candles file path.
+        :return: Candles count.
+        """
+        try:
+            return os.path.getsize(filepath) // RECORD_SIZE
+        except FileNotFoundError:
+            return 0
+
+    def last_time(self, pair: str, interval: int) -> Optional[float]:
+        """
+        Return the time of the last stored candle.
+
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :return: Unix time, None if no candle is stored.
+        """
+        candles = self.read(pair, interval)
+        return float(candles[-1, TIME]) if len(candles) else None
+
+    def append(self, pair: str, interval: int, candles: np.ndarray) -> int:
+        """
+        Append candles newer than the last stored one.
+
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :param candles: Candles as rows of COLUMNS, sorted by time.
+        :return: Count of appended candles.
+        """
+        filepath = self.filepath(pair, interval)
+        last_time = self.last_time(pair, interval)
+        if last_time is not None:
+            candles = candles[candles[:, TIME] > last_time]
+        if not len(candles):
+            return 0
+        with open(filepath, "ab") as candles_file:
+            # Drop a partial record left by an interrupted write.
+            candles_file.truncate(self.records_count(filepath) * RECORD_SIZE)
+            candles_file.write(np.ascontiguousarray(candles, DTYPE).tobytes())
+        return len(candles)
+
+    def merge(self, pair: str, interval: int, candles: np.ndarray) -> int:
+        """
+        Add candles missing from the store at any time, stored candles
+        are kept. The file is rewritten and replaced at once.
+
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :param candles: Candles as rows of COLUMNS.
+        :return: Count of added candles.
+        """
+        stored = self.read(pair, interval)
+        if not len(candles):
+            return 0
+        merged = np.concatenate([stored, candles])
+        # First occurrence of each time, stored candles first.
+        _, indexes = np.unique(merged[:, TIME], return_index=True)
+        added = len(indexes) - len(stored)
+        if not added:
+            return 0
+        filepath = self.filepath(pair, interval)
+        temporary_filepath = f"{filepath}.{os.getpid()}.tmp"
+        with open(temporary_filepath, "wb") as candles_file:
+            candles_file.write(merged[indexes].astype(DTYPE).tobytes())
+        os.replace(temporary_filepath, filepath)
+        return added
+
+    def gaps(self, pair: str, interval: int) -> List[Tuple[float, float]]:
+        """
+        Return the missing candles ranges between stored candles.
+
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :return: List of (first, last) missing candle times.
+        """
+        times = self.read(pair, interval)[:, TIME]
+        step = interval * 60
+        missing = np.flatnonzero(np.diff(times) > step)
+        return [
+            (float(times[index] + step), float(times[index + 1] - step))
+            for index in missing
+        ]
+
+    def update(self, ka: KrakenApi, pair: str, interval: int) -> int:
+        """
+        Append the closed candles published by Kraken since the last
+        stored one, in one request. Kraken publishes the last 720 candles
+        only, older missing candles are left as a gap to backfill.
+
+        :param ka: KrakenApi object.
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :return: Count of appended candles.
+        """
+        post_inputs = {"pair": pair, "interval": interval}
+        last_time = self.last_time(pair, interval)
+        if last_time is not None:
+            post_inputs["since"] = int(last_time)
+        request = ka.create_api_request(True, "OHLC", post_inputs)
+        result = ka.send_api_request(request)
+        rows = next(value for key, value in result.items() if key != "last")
+        candles = np.array(rows, dtype=DTYPE).reshape(-1, len(COLUMNS))
+        # The last candle is still open.
+        candles = candles[candles[:, TIME] + interval * 60 <= time.time()]
+        appended = self.append(pair, interval, candles)
+        logger.info("%s %s %sm candles appended.", appended, pair, interval)
+        return appended
+
+    def backfill(self, ka: KrakenApi, pair: str, interval: int) -> int:
+        """
+        Fill the stored candles gaps from Kraken trades history.
+
+        :param ka: KrakenApi object.
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :return: Count of added candles.
+        """
+        added = 0
+        for first, last in self.gaps(pair, interval):
+            end = last + interval * 60
+            trades = np.concatenate(
+                list(self.request_trades(ka, pair, first, end))
+                or [np.empty((0, 3), dtype=DTYPE)]
+            )
+            trades = trades[(trades[:, 0] >= first) & (trades[:, 0] < end)]
+            added += self.merge(
+                pair, interval, trades_to_candles(trades, interval)
+            )
+        logger.info("%s %s %sm candles backfilled.", added, pair, interval)
+        return added
+
+    @staticmethod
+    def request_trades(
+        ka: KrakenApi, pair: str, start: float, end: float
+    ) -> Iterator[np.ndarray]:
+        """
+        Request Kraken trades history pages from start until end.
+
+        :param ka: KrakenApi object.
+        :param pair: Pair name.
+        :param start: Unix time of the first trade.
+        :param end: Unix time after the last trade.
+        :return: Iterator of trades as (time, price, volume) rows.
+        """
+        since = int(start * 1e9)
+        while True:
+            request = ka.create_api_request(
+                True, "Trades", {"pair": pair, "since": since}
+            )
+            result = ka.send_api_request(request)
+            rows = next(
+                value for key, value in result.items() if key != "last"
+            )
+            if not rows:
+                return
+            trades = np.array(
+                [(row[2], row[0], row[1]) for row in rows], dtype=DTYPE
+            )
+            yield trades
+            since = int(result.get("last"))
+            if trades[-1, 0] >= end:
+                return
+
+    def ingest_trades_csv(
+        self, pair: str, interval: int, trades_filepath: str
+    ) -> int:
+        """
+        Add candles aggregated from a Kraken trades CSV file, as
+        downloaded from Kraken time and sales data: time, price and volume
+        columns without header, sorted by time.
+
+        :param pair: Pair name.
+        :param interval: Candle interval in minutes.
+        :param trades_filepath: Trades CSV file path.
+        :return: Count of added candles.
+        """
+        chunks: List[np.ndarray] = []
+        pending: Optional[np.ndarray] = None
+        try:
+            reader = pd.read_csv(
+                trades_filepath,
+                header=None,
+                usecols=[0, 1, 2],
+                dtype=DTYPE,
+                chunksize=CSV_CHUNK_SIZE,
+            )
+            for trades in reader:
+                candles = trades_to_candles(trades.to_numpy(), interval)
+                # A candle may span two chunks.
+                if pending is not None:
+                    if candles[0, TIME] == pending[TIME]:
+                        candles[0] = combine_candles(pending, candles[0])
+                    else:
+                        chunks.append(pending[np.newaxis])
+                pending = candles[-1]
+                chunks.append(candles[:-1])
+        except (FileNotFoundError, pd.errors.EmptyDataError) as e:
+            raise ValueError(f"Can't read trades -> {e}")
+        if pending is not None:
+            chunks.append(pending[np.newaxis])
+        added = (
+            self.merge(pair, interval, np.concatenate(chunks)) if chunks else 0
+        )
+        logger.info(
+            "%s %s %sm candles ingested from %s.",
+            added,
+            pair,
+            interval,
+            trades_filepath,
+        )
+        return added
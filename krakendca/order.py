@@ -1,12 +1,22 @@
 """Order object module."""
+import logging
 import math
 from datetime import datetime
-from typing import TypeVar
+from typing import List, Optional, TypeVar
 
 import pandas as pd
 from krakenapi import KrakenApi
 
+from .signer import PreparedRequest
+from .utils import pair_userref
+
+logger = logging.getLogger(__name__)
+
 T = TypeVar("T", bound="Order")
+L = TypeVar("L", bound="OrderLadder")
+
+# Kraken taker fee the order volumes are adjusted to.
+TAKER_FEE: float = 0.0026
 
 
 class Order:
@@ -68,6 +78,24 @@ class Order:
         self.fee = fee
         self.total_price = total_price
 
+    @property
+    def userref(self) -> int:
+        """
+        Order userref, tagging the order as sent by Kraken-DCA for its pair.
+
+        :return: Pair orders userref.
+        """
+        return pair_userref(self.pair)
+
+    @property
+    def legs(self) -> List[T]:
+        """
+        Orders sent to Kraken, the order itself.
+
+        :return: List of Order objects.
+        """
+        return [self]
+
     @classmethod
     def buy_limit_order(
         cls,
@@ -110,22 +138,47 @@ class Order:
             total_price,
         )
 
-    def send_order(self, ka: KrakenApi) -> None:
+    def order_inputs(self) -> dict:
         """
-        Execute the order by sending it to Kraken API.
+        Return the order parameters, tagged with the pair userref.
+
+        :return: Order parameters as dict.
+        """
+        return {
+            "type": self.type,
+            "ordertype": self.order_type,
+            "price": self.pair_price,
+            "volume": self.volume,
+            "oflags": self.o_flags,
+            "userref": self.userref,
+        }
+
+    def prepare_request(self, ka: KrakenApi) -> PreparedRequest:
+        """
+        Build the AddOrder request of the order ahead of sending it,
+        tagged with the pair userref.
+
+        :param ka: KrakenApi object.
+        :return: PreparedRequest object, to finalize at send time.
+        """
+        post_inputs = {"pair": self.pair, **self.order_inputs()}
+        return PreparedRequest(ka, "AddOrder", post_inputs)
+
+    def send_order(
+        self, ka: KrakenApi, prepared: Optional[PreparedRequest] = None
+    ) -> None:
+        """
+        Execute the order by sending it to Kraken API, tagged with the
+        pair userref.
         Add the returned TXID and order description to Order object.
 
         :param ka: krakenAPI object.
+        :param prepared: AddOrder request prepared from the order, only
+                         its nonce and signature are left to add.
         :return: None
         """
-        response = ka.create_order(
-            self.pair,
-            self.type,
-            self.order_type,
-            self.pair_price,
-            self.volume,
-            self.o_flags,
-        )
+        request = (prepared or self.prepare_request(ka)).finalize(ka)
+        response = ka.send_api_request(request)
         self.txid = response.get("txid")[0]
         self.description = response.get("descr").get("order")
 
@@ -172,7 +225,8 @@ class Order:
             )
             # Adjust amount to the 0.26% taker fee on Kraken
             order_volume_fee_adjusted = (
-                math.floor(order_volume / 1.0026 * decimals) / decimals
+                math.floor(order_volume / (1 + TAKER_FEE) * decimals)
+                / decimals
             )
         except ZeroDivisionError:
             raise ZeroDivisionError(
@@ -212,5 +266,190 @@ class Order:
         :return: Order fees as float.
         """
         order_price = volume * pair_price
-        fees = order_price * 0.0026
+        fees = order_price * TAKER_FEE
         return round(fees, quote_decimals)
+
+
+class OrderLadder:
+    """
+    Buy limit orders of a pair splitting an amount across a price range,
+    sent at once with a single AddOrderBatch request.
+    """
+
+    orders: List[Order]
+    quote_decimals: int
+
+    def __init__(self, orders: List[Order], quote_decimals: int) -> None:
+        """
+        Initialize the OrderLadder object.
+
+        :param orders: Order objects of the same pair, highest price first.
+        :param quote_decimals: Pair quote asset decimals.
+        :return: None
+        """
+        self.orders = orders
+        self.quote_decimals = quote_decimals
+
+    @classmethod
+    def buy_limit_ladder(
+        cls,
+        date: datetime,
+        pair: str,
+        amount: float,
+        high_price: float,
+        low_price: float,
+        orders_count: int,
+        pair_decimals: int,
+        lot_decimals: int,
+        quote_decimals: int,
+    ) -> L:
+        """
+        Split the amount in equal limit orders with prices evenly spread
+        from the high to the low price.
+
+        :param date: Orders date as datetime.
+        :param pair: Asset pair.
+        :param amount: Amount to buy across the orders.
+        :param high_price: Highest limit order pair price.
+        :param low_price: Lowest limit order pair price.
+        :param orders_count: Limit orders count.
+        :param pair_decimals: Pair price decimals.
+        :param lot_decimals: Pair lot decimals.
+        :param quote_decimals: Pair quote asset decimals.
+        :return: Instance of OrderLadder object.
+        """
+        step = (high_price - low_price) / (orders_count - 1)
+        orders = [
+            Order.buy_limit_order(
+                date,
+                pair,
+                amount / orders_count,
+                round(high_price - step * index, pair_decimals),
+                lot_decimals,
+                quote_decimals,
+            )
+            for index in range(orders_count)
+        ]
+        return cls(orders, quote_decimals)
+
+    @property
+    def legs(self) -> List[Order]:
+        """
+        Orders of the ladder, without the ones rejected by Kraken once
+        sent.
+
+        :return: List of Order objects.
+        """
+        return self.orders
+
+    @property
+    def date(self) -> datetime:
+        """
+        :return: Ladder orders date.
+        """
+        return self.orders[0].date
+
+    @property
+    def pair(self) -> str:
+        """
+        :return: Ladder orders pair.
+        """
+        return self.orders[0].pair
+
+    @property
+    def pair_price(self) -> float:
+        """
+        :return: Highest limit order pair price.
+        """
+        return self.orders[0].pair_price
+
+    @property
+    def low_pair_price(self) -> float:
+        """
+        :return: Lowest limit order pair price.
+        """
+        return self.orders[-1].pair_price
+
+    @property
+    def volume(self) -> float:
+        """
+        :return: Ladder orders volume.
+        """
+        return round(sum(order.volume for order in self.orders), 10)
+
+    @property
+    def price(self) -> float:
+        """
+        :return: Ladder orders price in quote asset.
+        """
+        return self.round_quote(sum(order.price for order in self.orders))
+
+    @property
+    def fee(self) -> float:
+        """
+        :return: Ladder orders fee in quote asset.
+        """
+        return self.round_quote(sum(order.fee for order in self.orders))
+
+    @property
+    def total_price(self) -> float:
+        """
+        :return: Ladder orders total price in quote asset.
+        """
+        return self.round_quote(
+            sum(order.total_price for order in self.orders)
+        )
+
+    def round_quote(self, value: float) -> float:
+        """
+        Round a quote asset value to the quote asset decimals.
+
+        :param value: Quote asset value.
+        :return: Rounded value.
+        """
+        return round(value, self.quote_decimals)
+
+    def prepare_request(self, ka: KrakenApi) -> PreparedRequest:
+        """
+        Build the AddOrderBatch request of the ladder orders ahead of
+        sending it.
+
+        :param ka: KrakenApi object.
+        :return: PreparedRequest object, to finalize at send time.
+        """
+        post_inputs = {"pair": self.pair}
+        for index, order in enumerate(self.orders):
+            for parameter, value in order.order_inputs().items():
+                post_inputs[f"orders[{index}][{parameter}]"] = value
+        return PreparedRequest(ka, "AddOrderBatch", post_inputs)
+
+    def send_order(
+        self, ka: KrakenApi, prepared: Optional[PreparedRequest] = None
+    ) -> None:
+        """
+        Send the ladder orders to Kraken API in one request.
+        Add the returned TXID and description to each Order object, orders
+        rejected by Kraken are removed from the ladder.
+
+        :param ka: KrakenApi object.
+        :param prepared: AddOrderBatch request prepared from the ladder.
+        :return: None
+        """
+        request = (prepared or self.prepare_request(ka)).finalize(ka)
+        response = ka.send_api_request(request)
+        sent, errors = [], []
+        for order, result in zip(self.orders, response.get("orders")):
+            if result.get("error"):
+                errors.append(f"{order.pair_price}: {result.get('error')}")
+                continue
+            order.txid = result.get("txid")
+            order.description = result.get("descr").get("order")
+            sent.append(order)
+        if not sent:
+            raise ValueError(
+                f"Kraken API error -> Ladder orders rejected: "
+                f"{', '.join(errors)}."
+            )
+        for error in errors:
+            logger.warning("Ladder order at %s", error)
+        self.orders = sent
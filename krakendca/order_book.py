@@ -0,0 +1,444 @@
+"""Local L2 order book module."""
+import json
+import logging
+import threading
+import zlib
+from bisect import bisect_left, insort
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, TypeVar
+
+from krakenapi import KrakenApi
+
+from .websocket import WebSocket
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound="OrderBook")
+
+KRAKEN_WEBSOCKET_URL: str = "wss://ws.kraken.com"
+# Book depth subscribed to, one of Kraken's 10, 25, 100, 500 or 1000.
+DEFAULT_DEPTH: int = 25
+# Price levels per side included in Kraken's book checksum.
+CHECKSUM_DEPTH: int = 10
+# Delay in seconds before reconnecting a dropped feed.
+RECONNECT_DELAY: float = 5
+
+
+class OrderBookChecksumError(ValueError):
+    """
+    Local order book differing from Kraken's after an update.
+    """
+
+
+def checksum_field(value: str) -> str:
+    """
+    Format a price or volume string as in Kraken's book checksum.
+
+    :param value: Price or volume as received from Kraken.
+    :return: Value without decimal point and leading zeros.
+    """
+    return value.replace(".", "").lstrip("0")
+
+
+class BookSide:
+    """
+    Order book side price levels, kept sorted from the best price.
+    """
+
+    ascending: bool
+
+    def __init__(self, ascending: bool) -> None:
+        """
+        Initialize the BookSide object.
+
+        :param ascending: True for asks, False for bids.
+        :return: None
+        """
+        self.ascending = ascending
+        # Sort keys: price for asks, negated price for bids.
+        self.__keys: List[float] = []
+        # Sort key -> price and volume strings as received.
+        self.__levels: Dict[float, Tuple[str, str]] = {}
+        # Prices, cumulative quote and base volumes per level, built
+        # lazily once per book change.
+        self.__cumulative: Optional[
+            Tuple[List[float], List[float], List[float]]
+        ] = None
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+    def clear(self) -> None:
+        """
+        Remove every price level.
+
+        :return: None
+        """
+        self.__keys = []
+        self.__levels = {}
+        self.__cumulative = None
+
+    def update(self, price: str, volume: str) -> None:
+        """
+        Set a price level volume, removing the level if volume is zero.
+
+        :param price: Level price as string.
+        :param volume: Level volume as string.
+        :return: None
+        """
+        key = float(price) if self.ascending else -float(price)
+        if float(volume) == 0:
+            if self.__levels.pop(key, None):
+                del self.__keys[bisect_left(self.__keys, key)]
+        else:
+            if key not in self.__levels:
+                insort(self.__keys, key)
+            self.__levels[key] = (price, volume)
+        self.__cumulative = None
+
+    def truncate(self, depth: int) -> None:
+        """
+        Remove the price levels out of the subscribed depth.
+
+        :param depth: Price levels count to keep.
+        :return: None
+        """
+        for key in self.__keys[depth:]:
+            del self.__levels[key]
+        del self.__keys[depth:]
+        self.__cumulative = None
+
+    def levels(self, count: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        Return price levels from the best price.
+
+        :param count: Count of levels to return, all if not specified.
+        :return: List of price and volume strings.
+        """
+        return [self.__levels[key] for key in self.__keys[:count]]
+
+    def cumulative(self) -> Tuple[List[float], List[float], List[float]]:
+        """
+        Return prices, cumulative quote and base volumes from the best
+        price, computed again only after the book changed.
+
+        :return: Prices, cumulative quote volumes, cumulative base volumes.
+        """
+        if self.__cumulative is None:
+            prices: List[float] = []
+            quote_volumes: List[float] = []
+            base_volumes: List[float] = []
+            quote_total = base_total = 0.0
+            for price, volume in self.levels():
+                base_total += float(volume)
+                quote_total += float(price) * float(volume)
+                prices.append(float(price))
+                quote_volumes.append(quote_total)
+                base_volumes.append(base_total)
+            self.__cumulative = (prices, quote_volumes, base_volumes)
+        return self.__cumulative
+
+
+class OrderBook:
+    """
+    Kraken pair L2 order book, from a REST snapshot or the WebSocket book
+    channel.
+    """
+
+    pair: str
+    ws_name: Optional[str]
+    depth: int
+    live: bool
+
+    def __init__(
+        self,
+        pair: str,
+        ws_name: Optional[str] = None,
+        depth: int = DEFAULT_DEPTH,
+    ) -> None:
+        """
+        Initialize the OrderBook object.
+
+        :param pair: Pair name.
+        :param ws_name: Pair WebSocket name, e.g. ETH/EUR.
+        :param depth: Price levels count kept per side.
+        :return: None
+        """
+        self.pair = pair
+        self.ws_name = ws_name
+        self.depth = depth
+        # Kept up to date by an OrderBookFeed.
+        self.live = False
+        self.asks = BookSide(ascending=True)
+        self.bids = BookSide(ascending=False)
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def get_order_book_from_kraken(
+        cls,
+        ka: KrakenApi,
+        pair: str,
+        ws_name: Optional[str] = None,
+        depth: int = DEFAULT_DEPTH,
+    ) -> T:
+        """
+        Initialize the OrderBook object from a Kraken Depth snapshot.
+
+        :param ka: KrakenApi object.
+        :param pair: Pair name.
+        :param ws_name: Pair WebSocket name, e.g. ETH/EUR.
+        :param depth: Price levels count kept per side.
+        :return: Instanced OrderBook object.
+        """
+        request = ka.create_api_request(
+            True, "Depth", {"pair": pair, "count": depth}
+        )
+        depth_information = next(iter(ka.send_api_request(request).values()))
+        order_book = cls(pair, ws_name, depth)
+        order_book.load_snapshot(
+            depth_information.get("asks"), depth_information.get("bids")
+        )
+        return order_book
+
+    def load_snapshot(self, asks: list, bids: list) -> None:
+        """
+        Replace the order book price levels.
+
+        :param asks: Ask levels as [price, volume, timestamp] lists.
+        :param bids: Bid levels as [price, volume, timestamp] lists.
+        :return: None
+        """
+        with self.__lock:
+            for side, levels in ((self.asks, asks), (self.bids, bids)):
+                side.clear()
+                for level in levels:
+                    side.update(level[0], level[1])
+                side.truncate(self.depth)
+
+    def apply_message(self, message: list) -> None:
+        """
+        Apply a WebSocket book channel message, snapshot or update, and
+        verify the book checksum when specified.
+
+        :param message: Book message as
+                        [channel_id, data, (data), channel_name, pair].
+        :return: None
+        """
+        with self.__lock:
+            checksum = None
+            for data in message[1:-2]:
+                if "as" in data or "bs" in data:
+                    self.asks.clear()
+                    self.bids.clear()
+                for side, keys in ((self.asks, "as a"), (self.bids, "bs b")):
+                    for key in keys.split():
+                        for level in data.get(key, []):
+                            side.update(level[0], level[1])
+                checksum = data.get("c", checksum)
+            self.asks.truncate(self.depth)
+            self.bids.truncate(self.depth)
+            if checksum is not None and int(checksum) != self.checksum():
+                raise OrderBookChecksumError(
+                    f"{self.pair} order book checksum mismatch."
+                )
+
+    def checksum(self) -> int:
+        """
+        Return the order book CRC32 checksum, computed as Kraken on the
+        top 10 asks then the top 10 bids.
+
+        :return: Unsigned CRC32 checksum.
+        """
+        fields = [
+            checksum_field(price) + checksum_field(volume)
+            for side in (self.asks, self.bids)
+            for price, volume in side.levels(CHECKSUM_DEPTH)
+        ]
+        return zlib.crc32("".join(fields).encode()) & 0xFFFFFFFF
+
+    def price_to_fill(self, quote_amount: float, side: str = "buy") -> float:
+        """
+        Return the worst price reached to fill an amount of quote asset
+        at once, in O(log n).
+
+        :param quote_amount: Amount of quote asset to fill.
+        :param side: buy to walk the asks, sell to walk the bids.
+        :return: Limit price filling the whole amount.
+        """
+        return self.__fill(quote_amount, side)[0]
+
+    def average_price_to_fill(
+        self, quote_amount: float, side: str = "buy"
+    ) -> float:
+        """
+        Return the volume-weighted average price to fill an amount of
+        quote asset at once, in O(log n).
+
+        :param quote_amount: Amount of quote asset to fill.
+        :param side: buy to walk the asks, sell to walk the bids.
+        :return: Average fill price.
+        """
+        return self.__fill(quote_amount, side)[1]
+
+    def __fill(self, quote_amount: float, side: str) -> Tuple[float, float]:
+        """
+        Return the worst and average prices to fill an amount of quote
+        asset.
+
+        :param quote_amount: Amount of quote asset to fill.
+        :param side: buy to walk the asks, sell to walk the bids.
+        :return: Worst fill price, average fill price.
+        """
+        with self.__lock:
+            book_side = self.asks if side == "buy" else self.bids
+            prices, quote_volumes, base_volumes = book_side.cumulative()
+            index = bisect_left(quote_volumes, quote_amount)
+            if index == len(quote_volumes):
+                raise ValueError(
+                    f"Not enough {self.pair} order book depth to fill "
+                    f"{quote_amount}."
+                )
+            price = prices[index]
+        filled_quote = quote_volumes[index - 1] if index else 0.0
+        filled_base = base_volumes[index - 1] if index else 0.0
+        filled_base += (quote_amount - filled_quote) / price
+        return price, quote_amount / filled_base
+
+
+class OrderBookFeed:
+    """
+    Keep order books up to date from Kraken WebSocket book channel in a
+    background thread.
+    """
+
+    url: str
+    order_books: Dict[str, OrderBook]
+
+    def __init__(
+        self, order_books: List[OrderBook], url: str = KRAKEN_WEBSOCKET_URL
+    ) -> None:
+        """
+        Initialize the OrderBookFeed object.
+
+        :param order_books: OrderBook objects with WebSocket names, of the
+                            same depth.
+        :param url: Kraken WebSocket url.
+        :return: None
+        """
+        self.url = url
+        self.order_books = {
+            order_book.ws_name: order_book for order_book in order_books
+        }
+        self.__stopped = threading.Event()
+        self.__websocket: Optional[WebSocket] = None
+        self.__thread: Optional[threading.Thread] = None
+        self.__subscribed: Future = Future()
+
+    def start(self) -> None:
+        """
+        Start the feed thread.
+
+        :return: None
+        """
+        self.__thread = threading.Thread(
+            target=self.run, name="order-book-feed", daemon=True
+        )
+        self.__thread.start()
+
+    def wait_live(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for every order book to receive its WebSocket snapshot.
+
+        :param timeout: Timeout in seconds.
+        :return: True if every order book is live.
+        """
+        try:
+            self.__subscribed.result(timeout)
+        except Exception:
+            return False
+        return True
+
+    def stop(self) -> None:
+        """
+        Stop the feed thread and close the connection.
+
+        :return: None
+        """
+        self.__stopped.set()
+        if self.__websocket:
+            self.__websocket.close()
+        if self.__thread:
+            self.__thread.join()
+
+    def run(self) -> None:
+        """
+        Subscribe to the order books and apply received messages,
+        reconnecting on error until stopped.
+
+        :return: None
+        """
+        while not self.__stopped.is_set():
+            self.__websocket = None
+            try:
+                self.__websocket = WebSocket.connect(self.url)
+                self.subscribe()
+                while not self.__stopped.is_set():
+                    self.handle_message(self.__websocket.receive())
+            except (OSError, ValueError) as e:
+                if self.__stopped.is_set():
+                    break
+                logger.warning(
+                    "Order book feed error (%s), reconnecting in %ss.",
+                    e,
+                    RECONNECT_DELAY,
+                )
+                self.__stopped.wait(RECONNECT_DELAY)
+            finally:
+                for order_book in self.order_books.values():
+                    order_book.live = False
+                if self.__websocket:
+                    self.__websocket.close()
+
+    def subscribe(self) -> None:
+        """
+        Subscribe to the book channel of every order book.
+
+        :return: None
+        """
+        depth = next(iter(self.order_books.values())).depth
+        self.__websocket.send(
+            json.dumps(
+                {
+                    "event": "subscribe",
+                    "pair": list(self.order_books),
+                    "subscription": {"name": "book", "depth": depth},
+                }
+            )
+        )
+
+    def handle_message(self, message: str) -> None:
+        """
+        Apply a book message to its order book, events are only logged
+        on error.
+
+        :param message: WebSocket message as JSON string.
+        :return: None
+        """
+        message = json.loads(message)
+        if isinstance(message, dict):
+            if message.get("status") == "error":
+                logger.error(
+                    "Order book feed error: %s", message.get("errorMessage")
+                )
+            return
+        order_book = self.order_books.get(message[-1])
+        if not order_book:
+            return
+        order_book.apply_message(message)
+        if "as" in message[1]:
+            order_book.live = True
+            logger.info("%s order book live.", order_book.pair)
+            if not self.__subscribed.done() and all(
+                book.live for book in self.order_books.values()
+            ):
+                self.__subscribed.set_result(True)
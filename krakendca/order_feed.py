@@ -0,0 +1,425 @@
+"""Private WebSocket orders feed module."""
+import json
+import logging
+import threading
+from bisect import bisect_left, insort
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from krakenapi import KrakenApi
+
+from .account import Account
+from .websocket import WebSocket
+
+logger = logging.getLogger(__name__)
+
+KRAKEN_AUTH_WEBSOCKET_URL: str = "wss://ws-auth.kraken.com"
+# Private channels subscribed to, each with its own sequence numbers.
+CHANNELS = ("openOrders", "ownTrades")
+# Delay in seconds before reconnecting a dropped feed.
+RECONNECT_DELAY: float = 5
+# Kraken statuses of orders not closed yet.
+OPEN_STATUSES = ("pending", "open")
+
+
+class OrderState:
+    """
+    Open times of the orders tagged with the DCA pairs userrefs, open or
+    closed alike as for the duplicate orders check, indexed per userref.
+    """
+
+    userrefs: List[int]
+    opened_at: Dict[str, float]
+
+    def __init__(self, userrefs: List[int]) -> None:
+        """
+        Initialize the OrderState object.
+
+        :param userrefs: DCA pairs userrefs.
+        :return: None
+        """
+        self.userrefs = userrefs
+        # Original open time of edited orders per TXID, counted instead of
+        # the open time Kraken gives edited orders.
+        self.opened_at = {}
+        self.__lock = threading.Lock()
+        # TXID -> userref and open time counted.
+        self.__txids: Dict[str, Tuple[int, float]] = {}
+        self.__opentms: Dict[int, List[float]] = {
+            userref: [] for userref in userrefs
+        }
+        # TXIDs of the orders not closed yet, never pruned.
+        self.__open: Set[str] = set()
+        self.__tagged: Set[int] = set()
+        # Userref -> start and count of the untagged orders of its pair,
+        # until an untagged order is seen.
+        self.__untagged: Dict[int, Tuple[int, int]] = {}
+
+    def reset(self, orders: dict, tagged: Set[int]) -> None:
+        """
+        Replace the state with orders requested from Kraken.
+
+        :param orders: Open and closed orders with txid as the key.
+        :param tagged: Userrefs with tagged orders ever.
+        :return: None
+        """
+        with self.__lock:
+            self.__txids = {}
+            self.__opentms = {userref: [] for userref in self.userrefs}
+            self.__open = set()
+            self.__untagged = {}
+            self.__tagged |= tagged
+            self.__add_orders(orders)
+
+    def add_orders(self, orders: dict) -> None:
+        """
+        Add orders of the DCA pairs userrefs, orders already known are
+        ignored.
+
+        :param orders: Orders with txid as the key, with userref and
+                       opentm.
+        :return: None
+        """
+        with self.__lock:
+            self.__add_orders(orders)
+
+    def __add_orders(self, orders: dict) -> None:
+        """
+        Add orders, the lock must be held.
+
+        :param orders: Orders with txid as the key.
+        :return: None
+        """
+        for txid, order_infos in orders.items():
+            userref = int(order_infos.get("userref") or 0)
+            status = order_infos.get("status")
+            if status and (txid in self.__txids or status in OPEN_STATUSES):
+                if status in OPEN_STATUSES:
+                    self.__open.add(txid)
+                else:
+                    self.__open.discard(txid)
+            if not userref and order_infos.get("opentm") is not None:
+                # Untagged orders counts are requested again.
+                self.__untagged = {}
+            opentms = self.__opentms.get(userref)
+            if (
+                opentms is None
+                or txid in self.__txids
+                or order_infos.get("opentm") is None
+            ):
+                continue
+            opentm = self.opened_at.get(txid, float(order_infos.get("opentm")))
+            self.__txids[txid] = (userref, opentm)
+            insort(opentms, opentm)
+            self.__tagged.add(userref)
+
+    def set_open_time(self, txid: str, userref: int, opentm: float) -> None:
+        """
+        Count an order from its original open time, e.g. once edited, even
+        if the order is not known yet.
+
+        :param txid: Order TXID.
+        :param userref: Order userref.
+        :param opentm: Original order open time.
+        :return: None
+        """
+        with self.__lock:
+            opentms = self.__opentms.get(userref)
+            if opentms is None:
+                return
+            counted = self.__txids.get(txid)
+            if counted is not None:
+                del opentms[bisect_left(opentms, counted[1])]
+            self.__txids[txid] = (userref, opentm)
+            insort(opentms, opentm)
+            self.__tagged.add(userref)
+
+    def count_orders(self, userref: int, start: int) -> int:
+        """
+        Count orders of a userref opened since start.
+
+        :param userref: Pair userref.
+        :param start: Unix time.
+        :return: Orders count.
+        """
+        with self.__lock:
+            opentms = self.__opentms.get(userref, [])
+            return len(opentms) - bisect_left(opentms, start)
+
+    def prune(self, start: int) -> None:
+        """
+        Forget closed orders opened before start, no longer counted.
+
+        :param start: Unix time, the earliest DCA delay start.
+        :return: None
+        """
+        with self.__lock:
+            for txid, (userref, opentm) in list(self.__txids.items()):
+                if opentm < start and txid not in self.__open:
+                    del self.__txids[txid]
+                    opentms = self.__opentms[userref]
+                    del opentms[bisect_left(opentms, opentm)]
+
+    def get_untagged_count(self, userref: int, start: int) -> Optional[int]:
+        """
+        Return the untagged orders count of a userref pair, if counted
+        from the same start since the last untagged order was seen.
+
+        :param userref: Pair userref.
+        :param start: Unix time.
+        :return: Untagged orders count, None if not known.
+        """
+        with self.__lock:
+            counted = self.__untagged.get(userref)
+            if counted and counted[0] == start:
+                return counted[1]
+            return None
+
+    def set_untagged_count(self, userref: int, start: int, count: int) -> None:
+        """
+        Keep the untagged orders count of a userref pair.
+
+        :param userref: Pair userref.
+        :param start: Unix time the orders were counted from.
+        :param count: Untagged orders count.
+        :return: None
+        """
+        with self.__lock:
+            self.__untagged[userref] = (start, count)
+
+    def has_tagged_orders(self, userref: int) -> bool:
+        """
+        Return True if any order was ever tagged with the userref.
+
+        :param userref: Pair userref.
+        :return: True if tagged orders exist.
+        """
+        with self.__lock:
+            return userref in self.__tagged
+
+
+class OrderFeed:
+    """
+    Keep the DCA pairs orders state up to date from Kraken private
+    WebSocket openOrders and ownTrades channels in a background thread.
+    The state is requested again from Kraken REST API on connection and
+    on any sequence gap.
+    """
+
+    ka: KrakenApi
+    state: OrderState
+    closed_orders_start: Callable[[], int]
+    url: str
+    live: bool
+    on_trade: Optional[Callable[[dict], None]]
+
+    def __init__(
+        self,
+        ka: KrakenApi,
+        userrefs: List[int],
+        closed_orders_start: Callable[[], int],
+        url: str = KRAKEN_AUTH_WEBSOCKET_URL,
+        on_trade: Optional[Callable[[dict], None]] = None,
+    ) -> None:
+        """
+        Initialize the OrderFeed object.
+
+        :param ka: KrakenApi object.
+        :param userrefs: DCA pairs userrefs.
+        :param closed_orders_start: Return the Unix time from which
+                                    closed orders are requested on resync,
+                                    the earliest DCA delay start.
+        :param url: Kraken private WebSocket url.
+        :param on_trade: Called with every new trade of the DCA pairs
+                         orders, from the feed thread.
+        :return: None
+        """
+        self.ka = ka
+        self.state = OrderState(userrefs)
+        self.closed_orders_start = closed_orders_start
+        self.url = url
+        self.on_trade = on_trade
+        self.live = False
+        self.__sequences: Dict[str, int] = {}
+        # Start the state was last pruned from.
+        self.__pruned_start = 0
+        self.__stopped = threading.Event()
+        self.__websocket: Optional[WebSocket] = None
+        self.__thread: Optional[threading.Thread] = None
+        self.__subscribed: Future = Future()
+
+    def start(self) -> None:
+        """
+        Start the feed thread.
+
+        :return: None
+        """
+        self.__thread = threading.Thread(
+            target=self.run, name="order-feed", daemon=True
+        )
+        self.__thread.start()
+
+    def wait_live(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the state to be synced and every channel subscribed.
+
+        :param timeout: Timeout in seconds.
+        :return: True if the feed is live.
+        """
+        try:
+            self.__subscribed.result(timeout)
+        except Exception:
+            return False
+        return True
+
+    def stop(self) -> None:
+        """
+        Stop the feed thread and close the connection.
+
+        :return: None
+        """
+        self.__stopped.set()
+        if self.__websocket:
+            self.__websocket.close()
+        if self.__thread:
+            self.__thread.join()
+
+    def run(self) -> None:
+        """
+        Subscribe to the private channels, resync the state and apply
+        received messages, reconnecting on error until stopped.
+
+        :return: None
+        """
+        while not self.__stopped.is_set():
+            self.__websocket = None
+            try:
+                self.__websocket = WebSocket.connect(self.url)
+                self.subscribe()
+                self.resync()
+                while not self.__stopped.is_set():
+                    self.handle_message(self.__websocket.receive())
+            except (OSError, ValueError) as e:
+                if self.__stopped.is_set():
+                    break
+                logger.warning(
+                    "Order feed error (%s), reconnecting in %ss.",
+                    e,
+                    RECONNECT_DELAY,
+                )
+                self.__stopped.wait(RECONNECT_DELAY)
+            finally:
+                self.live = False
+                if self.__websocket:
+                    self.__websocket.close()
+
+    def subscribe(self) -> None:
+        """
+        Subscribe to the private channels with a new WebSocket token.
+
+        :return: None
+        """
+        request = self.ka.create_api_request(False, "GetWebSocketsToken")
+        token = self.ka.send_api_request(request).get("token")
+        self.__sequences = {}
+        for channel in CHANNELS:
+            self.__websocket.send(
+                json.dumps(
+                    {
+                        "event": "subscribe",
+                        "subscription": {"name": channel, "token": token},
+                    }
+                )
+            )
+
+    def resync(self) -> None:
+        """
+        Replace the state with the DCA pairs open orders and closed orders
+        requested from Kraken REST API.
+
+        :return: None
+        """
+        userrefs = self.state.userrefs
+        start = self.closed_orders_start()
+        open_orders = Account.get_userrefs_orders(
+            Account.get_open_orders, userrefs, self.ka
+        )
+        closed_orders = Account.get_userrefs_orders(
+            Account.get_closed_orders, userrefs, self.ka, start
+        )
+        orders = {**closed_orders, **open_orders}
+        found = {int(order.get("userref")) for order in orders.values()}
+        tagged = found | {
+            userref
+            for userref in userrefs
+            if userref not in found
+            and not self.state.has_tagged_orders(userref)
+            and Account.has_tagged_orders(self.ka, userref)
+        }
+        self.state.reset(orders, tagged)
+        self.__pruned_start = start
+        logger.info("Order feed state synced, %s orders.", len(orders))
+
+    def handle_message(self, message: str) -> None:
+        """
+        Apply a private channel message to the state, resynced on sequence
+        gap. Events are only logged on error.
+
+        :param message: WebSocket message as JSON string.
+        :return: None
+        """
+        message = json.loads(message)
+        if isinstance(message, dict):
+            if message.get("status") == "error":
+                logger.error(
+                    "Order feed error: %s", message.get("errorMessage")
+                )
+            return
+        data, channel, sequence = message[0], message[1], message[2]
+        sequence = sequence.get("sequence")
+        last_sequence = self.__sequences.get(channel)
+        self.__sequences[channel] = sequence
+        if last_sequence is not None and sequence != last_sequence + 1:
+            logger.warning(
+                "Order feed %s sequence gap (%s -> %s), resyncing.",
+                channel,
+                last_sequence,
+                sequence,
+            )
+            self.resync()
+        if channel == "openOrders":
+            for orders in data:
+                self.state.add_orders(orders)
+        elif channel == "ownTrades":
+            # The first message of a connection is the latest trades
+            # snapshot, already known trades.
+            if self.on_trade and last_sequence is not None:
+                for trades in data:
+                    for trade in trades.values():
+                        if int(trade.get("userref") or 0) in (
+                            self.state.userrefs
+                        ):
+                            self.on_trade(trade)
+            for trades in data:
+                # Traded orders opened before the trade.
+                self.state.add_orders(
+                    {
+                        trade.get("ordertxid"): {
+                            "userref": trade.get("userref"),
+                            "opentm": trade.get("time"),
+                        }
+                        for trade in trades.values()
+                    }
+                )
+        # Orders of the previous delays are forgotten once a day.
+        start = self.closed_orders_start()
+        if start > self.__pruned_start:
+            self.state.prune(start)
+            self.__pruned_start = start
+        if not self.live and all(
+            channel in self.__sequences for channel in CHANNELS
+        ):
+            self.live = True
+            logger.info("Order feed live.")
+            if not self.__subscribed.done():
+                self.__subscribed.set_result(True)
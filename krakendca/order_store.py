@@ -0,0 +1,222 @@
+"""SQLite orders history store module."""
+import logging
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+
+import pandas as pd
+
+from .order import Order
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT: str = "%Y-%m-%d %H:%M:%S"
+# Seconds a writer waits for another process transaction to end.
+BUSY_TIMEOUT: float = 30
+COLUMNS: tuple = (
+    "date",
+    "pair",
+    "type",
+    "order_type",
+    "o_flags",
+    "pair_price",
+    "volume",
+    "price",
+    "fee",
+    "total_price",
+    "txid",
+    "description",
+)
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    pair TEXT NOT NULL,
+    type TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    o_flags TEXT NOT NULL,
+    pair_price REAL NOT NULL,
+    volume REAL NOT NULL,
+    price REAL NOT NULL,
+    fee REAL NOT NULL,
+    total_price REAL NOT NULL,
+    txid TEXT,
+    description TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_pair_date ON orders (pair, date);
+CREATE UNIQUE INDEX IF NOT EXISTS orders_txid ON orders (txid);
+"""
+
+
+class OrderStore:
+    """
+    Orders history in a SQLite database in WAL mode: readers never block
+    writers, and writers of several processes or accounts wait for each
+    other's transactions.
+    """
+
+    filepath: str
+
+    def __init__(self, filepath: str) -> None:
+        """
+        Open the orders database, creating it if needed.
+
+        :param filepath: Database file path.
+        :return: None
+        """
+        self.filepath = filepath
+        self.__connection = sqlite3.connect(filepath, timeout=BUSY_TIMEOUT)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        # Durable at each checkpoint, enough for a WAL database.
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        with self.__connection:
+            self.__connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+
+        :return: None
+        """
+        self.__connection.close()
+
+    def add_order(self, order: Order) -> None:
+        """
+        Save an order, ignored if its txid is already saved.
+
+        :param order: Order object.
+        :return: None
+        """
+        self.add_orders([order])
+
+    def add_orders(self, orders: List[Order]) -> int:
+        """
+        Save orders in a single transaction, orders with an already saved
+        txid are ignored.
+
+        :param orders: Order objects.
+        :return: Count of saved orders.
+        """
+        rows = [
+            (
+                order.date.strftime(DATE_FORMAT),
+                order.pair,
+                order.type,
+                order.order_type,
+                order.o_flags,
+                order.pair_price,
+                order.volume,
+                order.price,
+                order.fee,
+                order.total_price,
+                getattr(order, "txid", None),
+                getattr(order, "description", None),
+            )
+            for order in orders
+        ]
+        changes = self.__connection.total_changes
+        with self.__connection:
+            self.__connection.executemany(
+                f"INSERT OR IGNORE INTO orders ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+        return self.__connection.total_changes - changes
+
+    def remove_orders(self, txids: List[str]) -> int:
+        """
+        Remove saved orders in a single transaction.
+
+        :param txids: Txids of the orders to remove.
+        :return: Count of removed orders.
+        """
+        changes = self.__connection.total_changes
+        with self.__connection:
+            self.__connection.executemany(
+                "DELETE FROM orders WHERE txid = ?",
+                [(txid,) for txid in txids],
+            )
+        return self.__connection.total_changes - changes
+
+    @staticmethod
+    def order_from_row(row: tuple) -> Order:
+        """
+        Return an Order object from a database row.
+
+        :param row: Row values in COLUMNS order.
+        :return: Order object.
+        """
+        order = Order(datetime.strptime(row[0], DATE_FORMAT), *row[1:10])
+        order.txid = row[10]
+        order.description = row[11]
+        return order
+
+    def last_order(self, pair: str) -> Optional[Order]:
+        """
+        Return the last saved order of a pair, from the (pair, date)
+        index.
+
+        :param pair: Pair name.
+        :return: Order object, None if no order of the pair is saved.
+        """
+        row = self.__connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM orders WHERE pair = ? "
+            f"ORDER BY date DESC, id DESC LIMIT 1",
+            (pair,),
+        ).fetchone()
+        return self.order_from_row(row) if row else None
+
+    def get_orders(
+        self,
+        pair: str,
+        since: Optional[datetime] = None,
+        amount: Optional[float] = None,
+    ) -> List[Order]:
+        """
+        Return saved orders of a pair, oldest first.
+
+        :param pair: Pair name.
+        :param since: Earliest order date, every order if not specified.
+        :param amount: Keep only orders whose amount (volume * pair price)
+                       is within 1% of it, as with ignore_differing_orders.
+        :return: List of Order objects.
+        """
+        query = f"SELECT {', '.join(COLUMNS)} FROM orders WHERE pair = ?"
+        parameters: list = [pair]
+        if since:
+            query += " AND date >= ?"
+            parameters.append(since.strftime(DATE_FORMAT))
+        if amount:
+            query += " AND volume * pair_price > ? AND volume * pair_price < ?"
+            parameters += [amount * 0.99, amount * 1.01]
+        rows = self.__connection.execute(
+            query + " ORDER BY date, id", parameters
+        ).fetchall()
+        return [self.order_from_row(row) for row in rows]
+
+    def import_csv(self, orders_filepath: str) -> int:
+        """
+        Import an orders history CSV file, orders already saved are
+        ignored so the import can be run again.
+
+        :param orders_filepath: Orders history CSV file path.
+        :return: Count of imported orders.
+        """
+        try:
+            history = pd.read_csv(orders_filepath, dtype={"txid": str})
+        except (FileNotFoundError, pd.errors.EmptyDataError) as e:
+            raise ValueError(f"Can't read order history -> {e}")
+        history = history.astype(object).where(history.notna(), None)
+        orders = [
+            self.order_from_row(tuple(row))
+            for row in history[list(COLUMNS)].itertuples(index=False)
+        ]
+        imported = self.add_orders(orders)
+        logger.info(
+            "%s orders imported from %s to %s, %s already saved.",
+            imported,
+            orders_filepath,
+            self.filepath,
+            len(orders) - imported,
+        )
+        return imported
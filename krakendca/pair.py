@@ -1,5 +1,5 @@
 """Pair object module."""
-from typing import TypeVar
+from typing import Optional, TypeVar
 
 from krakenapi import KrakenApi
 
@@ -21,6 +21,7 @@ class Pair:
     lot_decimals: int
     quote_decimals: int
     order_min: float
+    ws_name: Optional[str]
 
     def __init__(
         self,
@@ -32,6 +33,7 @@ class Pair:
         lot_decimals: int,
         quote_decimals: int,
         order_min: float,
+        ws_name: Optional[str] = None,
     ) -> None:
         """
         Initialize the Pair object.
@@ -44,6 +46,7 @@ class Pair:
         :param lot_decimals: Pair lot decimals.
         :param quote_decimals: Pair quote asset decimals.
         :param order_min: Pair minimum order size.
+        :param ws_name: Pair WebSocket name, e.g. ETH/EUR.
         """
         self.name = name
         self.alt_name = alt_name
@@ -53,10 +56,15 @@ class Pair:
         self.lot_decimals = lot_decimals
         self.quote_decimals = quote_decimals
         self.order_min = order_min
+        self.ws_name = ws_name
 
     @classmethod
     def get_pair_from_kraken(
-        cls, ka: KrakenApi, asset_pairs: dict, pair: str
+        cls,
+        ka: KrakenApi,
+        asset_pairs: dict,
+        pair: str,
+        assets: Optional[dict] = None,
     ) -> T:
         """
         Initialize the Pair object using KrakenAPI and provided pair.
@@ -65,6 +73,8 @@ class Pair:
         :param asset_pairs: Dictionary of available pairs on Kraken
         got through the API.
         :param pair: Pair to dollar cost average as string.
+        :param assets: Dictionary of available assets on Kraken got
+        through the API, requested if not specified.
         :return: Instanced Pair object.
         """
         pair_information = cls.get_pair_information(asset_pairs, pair)
@@ -74,7 +84,8 @@ class Pair:
         pair_decimals = pair_information.get("pair_decimals")
         lot_decimals = pair_information.get("lot_decimals")
         order_min = float(pair_information.get("ordermin"))
-        quote_information = cls.get_asset_information(ka, quote)
+        ws_name = pair_information.get("wsname")
+        quote_information = cls.get_asset_information(ka, quote, assets)
         quote_decimals = quote_information.get("decimals")
         return cls(
             pair,
@@ -85,6 +96,7 @@ class Pair:
             lot_decimals,
             quote_decimals,
             order_min,
+            ws_name,
         )
 
     @staticmethod
@@ -97,7 +109,7 @@ class Pair:
         :param pair: Pair to find.
         :return: Dict of pair information.
         """
-        pair_information = find_nested_dictionary(asset_pairs, pair)
+        pair_information = asset_pairs.get(pair)
         if not pair_information:
             available_pairs = [pair for pair in asset_pairs]
             raise ValueError(
@@ -107,15 +119,20 @@ class Pair:
         return pair_information
 
     @staticmethod
-    def get_asset_information(ka: KrakenApi, asset: str) -> dict:
+    def get_asset_information(
+        ka: KrakenApi, asset: str, assets: Optional[dict] = None
+    ) -> dict:
         """
         Return asset information from Kraken API.
 
         :param ka: KrakenAPI object.
         :param asset: Asset to find.
+        :param assets: Dictionary of available assets on Kraken got
+        through the API, requested if not specified.
         :return: Dict of asset information.
         """
-        assets = ka.get_assets()
+        if assets is None:
+            assets = ka.get_assets()
         asset_information = find_nested_dictionary(assets, asset)
         if not asset_information:
             available_assets = [asset for asset in assets]
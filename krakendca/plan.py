@@ -0,0 +1,172 @@
+"""DCA orders plan module."""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Union
+
+from .account import Account
+from .accounting import pair_context
+from .dca import DCA
+from .order import Order, OrderLadder
+from .signer import PreparedRequest
+
+logger = logging.getLogger(__name__)
+
+
+class PlannedOrder:
+    """
+    A DCA pair order computed by the planner, or its rejection reason.
+    """
+
+    dca: DCA
+    order: Optional[Union[Order, OrderLadder]]
+    rejection: Optional[str]
+    error: Optional[str]
+    prepared: Optional[PreparedRequest]
+    sent: bool
+    duration: float
+
+    def __init__(
+        self,
+        dca: DCA,
+        order: Optional[Union[Order, OrderLadder]],
+        rejection: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Initialize the PlannedOrder object.
+
+        :param dca: DCA object of the pair.
+        :param order: Planned Order or OrderLadder object, None if
+                      rejected or failed.
+        :param rejection: Reason of no order for the pair.
+        :param error: Error raised while handling the pair.
+        :return: None
+        """
+        self.dca = dca
+        self.order = order
+        self.rejection = rejection
+        self.error = error
+        # AddOrder request built once the order is final.
+        self.prepared = None
+        self.sent = False
+        # Seconds spent planning and sending the pair order.
+        self.duration = 0
+
+    def fail(self, error: Exception) -> None:
+        """
+        Record an error of the pair, its order is not sent.
+
+        :param error: Raised error.
+        :return: None
+        """
+        logger.error("DCA %s failed: %s", self.dca.pair.name, error)
+        self.dca.notify("error", f"DCA {self.dca.pair.name} failed: {error}")
+        self.order = None
+        self.error = str(error)
+
+    @contextmanager
+    def handling(self) -> Iterator[None]:
+        """
+        Time a step of the pair and record its error if any, for the other
+        pairs to be handled anyway. API calls are accounted to the pair.
+
+        :return: Context manager.
+        """
+        start = time.perf_counter()
+        try:
+            with pair_context(self.dca.pair.name):
+                yield
+        except (OSError, ValueError) as e:
+            self.fail(e)
+        finally:
+            self.duration += time.perf_counter() - start
+
+    @property
+    def status(self) -> str:
+        """
+        Pair status in the run summary.
+
+        :return: completed, skipped or failed.
+        """
+        if self.error:
+            return "failed"
+        return "completed" if self.sent else "skipped"
+
+    def __str__(self) -> str:
+        pair = self.dca.pair
+        if self.error:
+            return f"{pair.name}: failed, {self.error}"
+        if not self.order:
+            return f"{pair.name}: no order, {self.rejection}"
+        price = f"{self.order.pair_price}{pair.quote}"
+        if isinstance(self.order, OrderLadder):
+            price = (
+                f"{len(self.order.orders)} orders from {price} to "
+                f"{self.order.low_pair_price}{pair.quote}"
+            )
+        return (
+            f"{pair.name}: buy {self.order.volume}{pair.base} at "
+            f"{price}, {self.order.price}"
+            f"{pair.quote} + {self.order.fee}{pair.quote} fee = "
+            f"{self.order.total_price}{pair.quote}."
+        )
+
+
+class Plan:
+    """
+    Orders planned for every DCA pair from the same account data, to be
+    re-priced and sent at once.
+    """
+
+    account: Account
+    planned_orders: List[PlannedOrder]
+
+    def __init__(
+        self, account: Account, planned_orders: List[PlannedOrder]
+    ) -> None:
+        """
+        Initialize the Plan object.
+
+        :param account: Account data the orders were planned from.
+        :param planned_orders: PlannedOrder objects, one per DCA pair.
+        :return: None
+        """
+        self.account = account
+        self.planned_orders = planned_orders
+
+    def __str__(self) -> str:
+        orders = len(self.orders)
+        lines = [f"Plan ({orders} order{'s' if orders > 1 else ''}):"]
+        lines += [str(planned) for planned in self.planned_orders]
+        return "\n".join(lines)
+
+    def summary(self) -> str:
+        """
+        Return the run summary: completed, skipped and failed pairs with
+        their durations.
+
+        :return: Summary as string.
+        """
+        statuses = [planned.status for planned in self.planned_orders]
+        counts = ", ".join(
+            f"{statuses.count(status)} {status}"
+            for status in ("completed", "skipped", "failed")
+        )
+        lines = [f"Run summary: {counts}."]
+        for planned in self.planned_orders:
+            reason = planned.error or planned.rejection
+            lines.append(
+                f"{planned.dca.pair.name}: {planned.status} in "
+                f"{planned.duration:.2f}s" + (f", {reason}" if reason else "")
+            )
+        return "\n".join(lines)
+
+    @property
+    def orders(self) -> List[PlannedOrder]:
+        """
+        Planned orders to send, without rejected pairs.
+
+        :return: List of PlannedOrder objects with an order.
+        """
+        return [planned for planned in self.planned_orders if planned.order]
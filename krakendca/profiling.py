@@ -0,0 +1,315 @@
+"""Profiling module."""
+import builtins
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.request import Request
+
+from .utils import request_endpoint
+
+logger = logging.getLogger(__name__)
+
+FunctionKey = Tuple[str, int, str]
+# Branches below one microsecond are not split further between callees.
+MIN_STACK_TIME: float = 0.000001
+
+
+class ImportTimer:
+    """
+    Measure import time of modules imported while installed.
+    Only imports done at top level, i.e. not triggered by another import,
+    are recorded with their inclusive import time.
+    """
+
+    timings: Dict[str, float]
+
+    def __init__(self) -> None:
+        """
+        Initialize the ImportTimer object.
+
+        :return: None
+        """
+        self.timings = {}
+        self.__depth = 0
+        self.__original_import: Optional[Callable] = None
+
+    def install(self) -> None:
+        """
+        Replace builtins __import__ function by the timed one.
+
+        :return: None
+        """
+        if self.__original_import:
+            return
+        self.__original_import = builtins.__import__
+        builtins.__import__ = self.__timed_import
+
+    def uninstall(self) -> None:
+        """
+        Restore original builtins __import__ function.
+
+        :return: None
+        """
+        if self.__original_import:
+            builtins.__import__ = self.__original_import
+            self.__original_import = None
+
+    def __timed_import(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Import a module and record its import time if it is a top level
+        import.
+
+        :param name: Module name to import.
+        :return: Imported module.
+        """
+        self.__depth += 1
+        start = time.perf_counter()
+        try:
+            return self.__original_import(name, *args, **kwargs)
+        finally:
+            self.__depth -= 1
+            if self.__depth == 0:
+                elapsed = time.perf_counter() - start
+                self.timings[name] = self.timings.get(name, 0) + elapsed
+
+
+class Profiler:
+    """
+    Profile a DCA run: CPU profile through cProfile, of the calling thread
+    and of the threads it starts, network time per Kraken API endpoint and
+    import time breakdown.
+    """
+
+    output_prefix: str
+    import_timer: ImportTimer
+    endpoints: Dict[str, List[float]]
+    wall_time: float
+    cpu_time: float
+
+    def __init__(
+        self, output_prefix: str, import_timer: Optional[ImportTimer] = None
+    ) -> None:
+        """
+        Initialize the Profiler object.
+
+        :param output_prefix: Output files path prefix, ".pstats" and
+        ".collapsed" extensions are added to it.
+        :param import_timer: ImportTimer used during program imports.
+        :return: None
+        """
+        self.output_prefix = output_prefix
+        self.import_timer = import_timer or ImportTimer()
+        # Endpoint -> [calls count, wall time, cpu time].
+        self.endpoints = {}
+        self.wall_time = 0
+        self.cpu_time = 0
+        self.__lock = threading.Lock()
+        self.__profile = cProfile.Profile()
+        # Profiles of the threads started during runs, merged at the end.
+        self.__thread_profiles: List[cProfile.Profile] = []
+
+    def instrument_api(self, ka: Any) -> None:
+        """
+        Time each request sent by the KrakenApi object per endpoint.
+
+        :param ka: KrakenApi object.
+        :return: None
+        """
+        send_api_request = ka.send_api_request
+
+        def timed_send_api_request(request: Request) -> dict:
+            endpoint = request_endpoint(request)
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            try:
+                return send_api_request(request)
+            finally:
+                wall = time.perf_counter() - wall_start
+                cpu = time.thread_time() - cpu_start
+                # Requests are sent from several threads.
+                with self.__lock:
+                    timing = self.endpoints.setdefault(endpoint, [0, 0, 0])
+                    timing[0] += 1
+                    timing[1] += wall
+                    timing[2] += cpu
+
+        ka.send_api_request = timed_send_api_request
+
+    def run(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Run the function under the profiler, threads started meanwhile
+        being profiled as well.
+
+        :param function: Function to profile.
+        :return: Function return value.
+        """
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        threading.setprofile(self.__profile_thread)
+        self.__profile.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.__profile.disable()
+            threading.setprofile(None)
+            self.wall_time += time.perf_counter() - wall_start
+            self.cpu_time += time.process_time() - cpu_start
+
+    def __profile_thread(self, frame: Any, event: str, arg: Any) -> None:
+        """
+        Start a thread own profile, called once when the thread starts.
+
+        :param frame: Frame of the profile event.
+        :param event: Profile event.
+        :param arg: Profile event argument.
+        :return: None
+        """
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        # Profilers already see every thread since Python 3.12.
+        except ValueError:
+            return
+        with self.__lock:
+            self.__thread_profiles.append(profile)
+
+    def get_stats(self) -> pstats.Stats:
+        """
+        Return the stats of the calling thread and started threads merged.
+
+        :return: pstats.Stats object.
+        """
+        with self.__lock:
+            thread_profiles = list(self.__thread_profiles)
+        return pstats.Stats(self.__profile, *thread_profiles)
+
+    @property
+    def network_time(self) -> float:
+        """
+        Time spent waiting on Kraken API, i.e. requests wall time minus
+        CPU time spent building requests and decoding responses.
+
+        :return: Network time in seconds.
+        """
+        return sum(
+            max(wall - cpu, 0) for _, wall, cpu in self.endpoints.values()
+        )
+
+    def write_stats(self) -> Tuple[str, str]:
+        """
+        Write pstats file and flamegraph collapsed stacks file.
+
+        :return: pstats and collapsed stacks file paths.
+        """
+        directory = os.path.dirname(self.output_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        stats_filepath = self.output_prefix + ".pstats"
+        collapsed_filepath = self.output_prefix + ".collapsed"
+        stats = self.get_stats()
+        stats.dump_stats(stats_filepath)
+        with open(collapsed_filepath, "w") as stream:
+            for stack, microseconds in self.collapse_stacks(stats.stats):
+                stream.write(f"{stack} {microseconds}\n")
+        logger.info(
+            "Profile written to %s and %s.", stats_filepath, collapsed_filepath
+        )
+        return stats_filepath, collapsed_filepath
+
+    @staticmethod
+    def collapse_stacks(stats: dict) -> List[Tuple[str, int]]:
+        """
+        Rebuild collapsed stacks from a cProfile call graph.
+        cProfile only records caller/callee pairs, so the time of a
+        function called from several stacks is split proportionally to
+        its cumulative time from each caller.
+
+        :param stats: pstats.Stats stats dictionary.
+        :return: List of (semicolon separated stack, microseconds).
+        """
+        callees: Dict[FunctionKey, Dict[FunctionKey, float]] = {}
+        for function, (_, _, _, _, callers) in stats.items():
+            for caller, caller_stats in callers.items():
+                callees.setdefault(caller, {})[function] = caller_stats[3]
+        # Functions called from outside the profiled code are stack roots.
+        roots = [
+            function
+            for function, function_stats in stats.items()
+            if not any(
+                caller in stats and caller != function
+                for caller in function_stats[4]
+            )
+        ]
+        collapsed: Dict[str, float] = {}
+
+        def walk(function: FunctionKey, path: list, elapsed: float) -> None:
+            _, _, self_time, cumulative_time, _ = stats[function]
+            path = path + [Profiler.function_label(function)]
+            stack = ";".join(path)
+            # Stop on negligible branches to bound the call graph walk.
+            if cumulative_time <= 0 or elapsed < MIN_STACK_TIME:
+                collapsed[stack] = collapsed.get(stack, 0) + elapsed
+                return
+            ratio = elapsed / cumulative_time
+            collapsed[stack] = collapsed.get(stack, 0) + self_time * ratio
+            for callee, callee_time in callees.get(function, {}).items():
+                # Skip recursive calls, already accounted in cumulative time.
+                if Profiler.function_label(callee) in path:
+                    continue
+                walk(callee, path, callee_time * ratio)
+
+        for root in roots:
+            walk(root, [], stats[root][3])
+        return [
+            (stack, int(seconds * 1000000))
+            for stack, seconds in collapsed.items()
+            if int(seconds * 1000000) > 0
+        ]
+
+    @staticmethod
+    def function_label(function: FunctionKey) -> str:
+        """
+        Return a flamegraph frame label for a pstats function key.
+
+        :param function: pstats function key (filename, line, name).
+        :return: Frame label as string.
+        """
+        filename, line, name = function
+        if filename == "~":
+            label = name
+        else:
+            label = f"{name} ({os.path.basename(filename)}:{line})"
+        return label.replace(";", ",")
+
+    def report(self) -> None:
+        """
+        Log import time breakdown, CPU time and network time per endpoint.
+
+        :return: None
+        """
+        logger.info("Import time breakdown:")
+        for module, seconds in sorted(
+            self.import_timer.timings.items(), key=lambda x: -x[1]
+        ):
+            logger.info("  %s: %.1fms", module, seconds * 1000)
+        logger.info(
+            "Run: %.1fms wall, %.1fms CPU, %.1fms network.",
+            self.wall_time * 1000,
+            self.cpu_time * 1000,
+            self.network_time * 1000,
+        )
+        logger.info("Network time per endpoint:")
+        for endpoint, (calls, wall, cpu) in sorted(self.endpoints.items()):
+            logger.info(
+                "  %s: %s call(s), %.1fms network, %.1fms CPU.",
+                endpoint,
+                calls,
+                max(wall - cpu, 0) * 1000,
+                cpu * 1000,
+            )
@@ -0,0 +1,426 @@
+"""Order journal reconciliation with Kraken orders history module."""
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from krakenapi import KrakenApi
+
+from .account import Account
+from .order import Order
+from .order_store import COLUMNS, DATE_FORMAT, OrderStore
+from .pair import Pair
+from .utils import datetime_as_utc_unix, pair_userref, utc_unix_time_datetime
+
+logger = logging.getLogger(__name__)
+
+# Kraken statuses of orders closed without being filled.
+DROPPED_STATUSES: tuple = ("canceled", "expired")
+# Concurrent ClosedOrders pages requests once the orders count is known.
+PAGE_WORKERS: int = 4
+# Seconds Kraken orders are requested beyond the date range, the journal
+# order date being set before the order is sent.
+RANGE_MARGIN: int = 3600
+# Relative difference from which journal and Kraken values mismatch.
+TOLERANCE: float = 1e-9
+# Compared order attributes, as journal attribute and description.
+COMPARED: Tuple[Tuple[str, str], ...] = (
+    ("volume", "volume"),
+    ("pair_price", "price"),
+)
+
+
+class Reconciliation:
+    """
+    Differences between the order journal and Kraken orders history over
+    a date range, joined on txid.
+    """
+
+    start: datetime
+    end: datetime
+    kraken_count: int
+    journal_count: int
+    missing: Dict[str, Order]
+    orphaned: Dict[str, str]
+    mismatched: Dict[str, Tuple[Order, Order]]
+    untracked: int
+
+    def __init__(self, start: datetime, end: datetime) -> None:
+        """
+        Initialize the Reconciliation object.
+
+        :param start: Range start date.
+        :param end: Range end date.
+        :return: None
+        """
+        self.start = start
+        self.end = end
+        self.kraken_count = 0
+        self.journal_count = 0
+        # Kraken orders absent from the journal.
+        self.missing = {}
+        # Journal orders absent from Kraken or never filled, with reason.
+        self.orphaned = {}
+        # Journal and Kraken orders with a differing volume or price.
+        self.mismatched = {}
+        # Journal orders without txid, which can't be reconciled.
+        self.untracked = 0
+
+    @property
+    def is_consistent(self) -> bool:
+        """
+        True if the journal matches Kraken orders history.
+
+        :return: True without missing, orphaned or mismatched order.
+        """
+        return not (self.missing or self.orphaned or self.mismatched)
+
+    def report(self) -> str:
+        """
+        Return the reconciliation counts and every difference.
+
+        :return: Report as string.
+        """
+        lines = [
+            f"Reconciliation from {self.start} to {self.end}: "
+            f"{self.kraken_count} Kraken orders, {self.journal_count} "
+            f"journal orders, {len(self.missing)} missing, "
+            f"{len(self.orphaned)} orphaned, {len(self.mismatched)} "
+            f"mismatched."
+        ]
+        for txid, order in self.missing.items():
+            lines.append(
+                f"  Missing {txid}: {order.description} ({order.date})."
+            )
+        for txid, reason in self.orphaned.items():
+            lines.append(f"  Orphaned {txid}: {reason}.")
+        for txid, (journal_order, kraken_order) in self.mismatched.items():
+            differences = ", ".join(
+                f"{description} {getattr(journal_order, attribute)} in "
+                f"journal, {getattr(kraken_order, attribute)} on Kraken"
+                for attribute, description in COMPARED
+                if not is_close(
+                    getattr(journal_order, attribute),
+                    getattr(kraken_order, attribute),
+                )
+            )
+            lines.append(f"  Mismatched {txid}: {differences}.")
+        if self.untracked:
+            lines.append(
+                f"  {self.untracked} journal orders without txid not "
+                f"reconciled."
+            )
+        return "\n".join(lines)
+
+
+def is_close(journal_value: float, kraken_value: float) -> bool:
+    """
+    Return True if a journal value matches the Kraken one.
+
+    :param journal_value: Journal order value.
+    :param kraken_value: Kraken order value.
+    :return: True if equal within TOLERANCE.
+    """
+    return math.isclose(journal_value, kraken_value, rel_tol=TOLERANCE)
+
+
+class Reconciler:
+    """
+    Reconcile the order journal, the order store or the orders CSV file,
+    with Kraken orders of the DCA pairs: orders on both sides are indexed
+    by txid and joined in a single pass.
+    """
+
+    ka: KrakenApi
+    pairs: Dict[str, Pair]
+    order_store: Optional[OrderStore]
+    orders_filepath: str
+
+    def __init__(
+        self,
+        ka: KrakenApi,
+        pairs: List[Pair],
+        order_store: Optional[OrderStore] = None,
+        orders_filepath: str = "orders.csv",
+    ) -> None:
+        """
+        Initialize the Reconciler object.
+
+        :param ka: KrakenApi object.
+        :param pairs: DCA pairs.
+        :param order_store: Order store, the journal if set.
+        :param orders_filepath: Orders CSV file path, the journal without
+                                order store.
+        :return: None
+        """
+        self.ka = ka
+        self.pairs = {pair.name: pair for pair in pairs}
+        self.order_store = order_store
+        self.orders_filepath = orders_filepath
+        self.__alt_names = {pair.alt_name: pair for pair in pairs}
+        self.__userrefs = {pair_userref(pair.name): pair for pair in pairs}
+
+    def get_closed_orders_page(self, start: int, end: int, ofs: int) -> dict:
+        """
+        Request a page of closed orders opened within a range.
+
+        :param start: Range start as unix time.
+        :param end: Range end as unix time.
+        :param ofs: Page offset.
+        :return: ClosedOrders result.
+        """
+        post_inputs = {"start": start, "end": end, "closetime": "open"}
+        if ofs:
+            post_inputs["ofs"] = ofs
+        request = self.ka.create_api_request(
+            False, "ClosedOrders", post_inputs
+        )
+        return self.ka.send_api_request(request)
+
+    def get_closed_orders(self, start: int, end: int) -> dict:
+        """
+        Get every closed order opened within a range: the first page gives
+        the orders count, the following pages are requested concurrently.
+
+        :param start: Range start as unix time.
+        :param end: Range end as unix time.
+        :return: Dict of closed orders with txid as the key.
+        """
+        data = self.get_closed_orders_page(start, end, 0)
+        closed_orders = dict(data.get("closed") or {})
+        page_size = len(closed_orders)
+        if not page_size:
+            return closed_orders
+        offsets = range(page_size, int(data.get("count", 0)), page_size)
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+            for data in executor.map(
+                lambda ofs: self.get_closed_orders_page(start, end, ofs),
+                offsets,
+            ):
+                closed_orders.update(data.get("closed") or {})
+        return closed_orders
+
+    def get_order_pair(self, order_infos: dict) -> Optional[Pair]:
+        """
+        Return the DCA pair of a Kraken order: from its userref, or its
+        pair for buy limit orders sent before orders were tagged.
+
+        :param order_infos: Kraken order information.
+        :return: Pair object, None if not a DCA pair order.
+        """
+        userref = order_infos.get("userref")
+        if userref:
+            return self.__userrefs.get(userref)
+        descr = order_infos.get("descr", {})
+        if descr.get("type") != "buy" or descr.get("ordertype") != "limit":
+            return None
+        return self.__alt_names.get(descr.get("pair"))
+
+    @staticmethod
+    def order_from_kraken(txid: str, order_infos: dict, pair: Pair) -> Order:
+        """
+        Return an Order object from Kraken order information, with the
+        executed cost and fee once filled, estimated otherwise.
+
+        :param txid: Order txid.
+        :param order_infos: Kraken order information.
+        :param pair: Order pair.
+        :return: Order object.
+        """
+        descr = order_infos.get("descr", {})
+        volume = float(order_infos.get("vol"))
+        if order_infos.get("status") in DROPPED_STATUSES:
+            volume = float(order_infos.get("vol_exec", 0))
+        pair_price = float(descr.get("price"))
+        price = float(order_infos.get("cost", 0)) or (
+            Order.estimate_order_price(volume, pair_price, pair.quote_decimals)
+        )
+        fee = float(order_infos.get("fee", 0)) or (
+            Order.estimate_order_fee(volume, pair_price, pair.quote_decimals)
+        )
+        order = Order(
+            utc_unix_time_datetime(int(float(order_infos.get("opentm")))),
+            pair.name,
+            descr.get("type"),
+            descr.get("ordertype"),
+            order_infos.get("oflags", ""),
+            pair_price,
+            volume,
+            price,
+            fee,
+            round(price + fee, pair.quote_decimals),
+        )
+        order.txid = txid
+        order.description = descr.get("order")
+        return order
+
+    def get_kraken_orders(
+        self, start: datetime, end: datetime
+    ) -> Dict[str, Tuple[Order, str]]:
+        """
+        Get DCA pairs open and closed orders opened within a range, and
+        RANGE_MARGIN around it.
+
+        :param start: Range start date.
+        :param end: Range end date.
+        :return: Order objects and Kraken status per txid.
+        """
+        start_unix = datetime_as_utc_unix(start) - RANGE_MARGIN
+        end_unix = datetime_as_utc_unix(end) + RANGE_MARGIN
+        orders = Account.get_open_orders(self.ka) or {}
+        orders = {
+            txid: order_infos
+            for txid, order_infos in orders.items()
+            if start_unix <= float(order_infos.get("opentm")) <= end_unix
+        }
+        orders.update(self.get_closed_orders(start_unix, end_unix))
+        kraken_orders: Dict[str, Tuple[Order, str]] = {}
+        for txid, order_infos in orders.items():
+            pair = self.get_order_pair(order_infos)
+            if pair:
+                kraken_orders[txid] = (
+                    self.order_from_kraken(txid, order_infos, pair),
+                    order_infos.get("status"),
+                )
+        return kraken_orders
+
+    def read_orders_csv(self) -> pd.DataFrame:
+        """
+        Read the orders CSV file.
+
+        :return: Orders history, empty if the file is missing.
+        """
+        try:
+            return pd.read_csv(self.orders_filepath, dtype={"txid": str})
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            return pd.DataFrame(columns=list(COLUMNS))
+        except (pd.errors.ParserError, IsADirectoryError) as e:
+            raise ValueError(f"Can't read order history -> {e}")
+
+    def get_journal_orders(
+        self, start: datetime, end: datetime
+    ) -> List[Order]:
+        """
+        Get the journal orders of the DCA pairs within a range.
+
+        :param start: Range start date.
+        :param end: Range end date.
+        :return: List of Order objects.
+        """
+        if self.order_store:
+            return [
+                order
+                for pair_name in self.pairs
+                for order in self.order_store.get_orders(pair_name, start)
+                if order.date <= end
+            ]
+        history = self.read_orders_csv()
+        dates = pd.to_datetime(history["date"], format=DATE_FORMAT)
+        history = history[
+            (dates >= start)
+            & (dates <= end)
+            & history["pair"].isin(list(self.pairs))
+        ]
+        history = history.astype(object).where(history.notna(), None)
+        return [
+            OrderStore.order_from_row(tuple(row))
+            for row in history[list(COLUMNS)].itertuples(index=False)
+        ]
+
+    def reconcile(self, start: datetime, end: datetime) -> Reconciliation:
+        """
+        Compare the journal orders within a range with Kraken orders.
+
+        :param start: Range start date.
+        :param end: Range end date.
+        :return: Reconciliation object.
+        """
+        reconciliation = Reconciliation(start, end)
+        kraken_orders = self.get_kraken_orders(start, end)
+        journal_orders = self.get_journal_orders(start, end)
+        reconciliation.journal_count = len(journal_orders)
+        journal_txids = set()
+        for journal_order in journal_orders:
+            txid = journal_order.txid
+            if not txid:
+                reconciliation.untracked += 1
+                continue
+            journal_txids.add(txid)
+            kraken_order, status = kraken_orders.get(txid, (None, None))
+            if kraken_order is None:
+                reconciliation.orphaned[txid] = "not on Kraken"
+            elif not kraken_order.volume:
+                reconciliation.orphaned[txid] = f"{status} on Kraken"
+            elif not all(
+                is_close(
+                    getattr(journal_order, attribute),
+                    getattr(kraken_order, attribute),
+                )
+                for attribute, _ in COMPARED
+            ):
+                reconciliation.mismatched[txid] = (journal_order, kraken_order)
+        for txid, (kraken_order, _) in kraken_orders.items():
+            if not start <= kraken_order.date <= end:
+                continue
+            reconciliation.kraken_count += 1
+            if txid not in journal_txids and kraken_order.volume:
+                reconciliation.missing[txid] = kraken_order
+        return reconciliation
+
+    def repair(self, reconciliation: Reconciliation) -> None:
+        """
+        Repair the journal: add missing orders, remove orphaned orders and
+        replace mismatched orders by Kraken ones.
+
+        :param reconciliation: Reconciliation object of the journal.
+        :return: None
+        """
+        removed = list(reconciliation.orphaned) + list(
+            reconciliation.mismatched
+        )
+        added = list(reconciliation.missing.values()) + [
+            kraken_order
+            for _, kraken_order in reconciliation.mismatched.values()
+        ]
+        if self.order_store:
+            self.order_store.remove_orders(removed)
+            self.order_store.add_orders(added)
+        else:
+            self.repair_orders_csv(removed, added)
+        logger.info(
+            "Order journal repaired: %s orders added, %s removed, %s "
+            "replaced.",
+            len(reconciliation.missing),
+            len(reconciliation.orphaned),
+            len(reconciliation.mismatched),
+        )
+
+    def repair_orders_csv(
+        self, removed: List[str], added: List[Order]
+    ) -> None:
+        """
+        Rewrite the orders CSV file without the removed txids and with the
+        added orders, sorted by date, replaced at once.
+
+        :param removed: Txids of the orders to remove.
+        :param added: Order objects to add.
+        :return: None
+        """
+        history = self.read_orders_csv()
+        history = history[~history["txid"].isin(removed)]
+        additions = pd.DataFrame.from_records(
+            [
+                {**order.__dict__, "date": order.date.strftime(DATE_FORMAT)}
+                for order in added
+            ],
+            columns=list(COLUMNS),
+        )
+        if not additions.empty:
+            history = pd.concat([history, additions], ignore_index=True)
+        history = history.sort_values("date", kind="stable")
+        temporary_filepath = f"{self.orders_filepath}.{os.getpid()}.tmp"
+        history.to_csv(temporary_filepath, index=False)
+        os.replace(temporary_filepath, self.orders_filepath)
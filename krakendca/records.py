@@ -0,0 +1,210 @@
+"""Compact Kraken response records module."""
+import json
+from typing import Any, Callable, Dict, Union
+
+try:
+    import orjson
+
+    loads: Callable[[bytes], Any] = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+class Record:
+    """
+    Slotted record of the Kraken response fields Kraken-DCA reads, read
+    like the response dictionary it replaces, so code handling orders
+    from REST and WebSocket APIs alike keeps working.
+    """
+
+    __slots__ = ()
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """
+        Return a field value.
+
+        :param field: Kraken response field name.
+        :param default: Value returned if the field is missing.
+        :return: Field value.
+        """
+        value = getattr(self, field, None)
+        return default if value is None else value
+
+    def as_dict(self) -> dict:
+        """
+        :return: Record fields as dictionary.
+        """
+        fields = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if isinstance(value, Record):
+                fields[field] = value.as_dict()
+            elif value is not None:
+                fields[field] = value
+        return fields
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Record):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_dict()})"
+
+
+class OrderDescription(Record):
+    """
+    Kraken order description.
+    """
+
+    __slots__ = ("pair", "type", "ordertype", "price", "order")
+
+    def __init__(self, descr: dict) -> None:
+        """
+        Instantiate the OrderDescription object.
+
+        :param descr: Kraken order description.
+        :return: None
+        """
+        self.pair = descr.get("pair")
+        self.type = descr.get("type")
+        self.ordertype = descr.get("ordertype")
+        self.price = descr.get("price")
+        self.order = descr.get("order")
+
+
+class OrderRecord(Record):
+    """
+    Kraken open or closed order.
+    """
+
+    __slots__ = (
+        "userref",
+        "status",
+        "opentm",
+        "vol",
+        "vol_exec",
+        "cost",
+        "fee",
+        "oflags",
+        "descr",
+    )
+
+    def __init__(self, order: dict) -> None:
+        """
+        Instantiate the OrderRecord object.
+
+        :param order: Kraken order information.
+        :return: None
+        """
+        self.userref = order.get("userref")
+        self.status = order.get("status")
+        self.opentm = order.get("opentm")
+        self.vol = order.get("vol")
+        self.vol_exec = order.get("vol_exec")
+        self.cost = order.get("cost")
+        self.fee = order.get("fee")
+        self.oflags = order.get("oflags")
+        self.descr = OrderDescription(order.get("descr") or {})
+
+
+class PairRecord(Record):
+    """
+    Kraken asset pair.
+    """
+
+    __slots__ = (
+        "altname",
+        "wsname",
+        "base",
+        "quote",
+        "pair_decimals",
+        "lot_decimals",
+        "ordermin",
+    )
+
+    def __init__(self, pair: dict) -> None:
+        """
+        Instantiate the PairRecord object.
+
+        :param pair: Kraken asset pair information.
+        :return: None
+        """
+        self.altname = pair.get("altname")
+        self.wsname = pair.get("wsname")
+        self.base = pair.get("base")
+        self.quote = pair.get("quote")
+        self.pair_decimals = pair.get("pair_decimals")
+        self.lot_decimals = pair.get("lot_decimals")
+        self.ordermin = pair.get("ordermin")
+
+
+def decode_orders(orders: dict) -> Dict[str, OrderRecord]:
+    """
+    Replace Kraken orders by records, each order dictionary being freed
+    once its record is created.
+
+    :param orders: Kraken orders with txid as the key.
+    :return: Dict of OrderRecord objects with txid as the key.
+    """
+    return {txid: OrderRecord(orders.pop(txid)) for txid in list(orders)}
+
+
+def decode_orders_result(key: str) -> Callable[[dict], dict]:
+    """
+    Return the decoder of an orders endpoint result.
+
+    :param key: Result key of the orders.
+    :return: Result decoder.
+    """
+
+    def decode(result: dict) -> dict:
+        result[key] = decode_orders(result.get(key) or {})
+        return result
+
+    return decode
+
+
+def decode_asset_pairs(asset_pairs: dict) -> Dict[str, PairRecord]:
+    """
+    Replace Kraken asset pairs by records.
+
+    :param asset_pairs: Kraken asset pairs with pair name as the key.
+    :return: Dict of PairRecord objects with pair name as the key.
+    """
+    return {
+        name: PairRecord(asset_pairs.pop(name)) for name in list(asset_pairs)
+    }
+
+
+# Decoders of the large endpoint results, keeping the fields read only.
+RESULT_DECODERS: Dict[str, Callable[[dict], Any]] = {
+    "OpenOrders": decode_orders_result("open"),
+    "ClosedOrders": decode_orders_result("closed"),
+    "QueryOrders": decode_orders,
+    "AssetPairs": decode_asset_pairs,
+}
+
+
+def decode_response(data: bytes, endpoint: str) -> Union[dict, str]:
+    """
+    Decode a Kraken API response with the fastest JSON parser available,
+    orders and asset pairs results into records.
+
+    :param data: Response body.
+    :param endpoint: Request endpoint.
+    :return: Response result, the first Kraken error message if any.
+    """
+    try:
+        response = loads(data)
+    except ValueError as e:
+        raise ValueError(
+            f"Response received from API was wrongly formatted -> {e}"
+        )
+    if response.get("error"):
+        return response.get("error")[0]
+    result = response.get("result")
+    decoder = RESULT_DECODERS.get(endpoint)
+    if decoder and isinstance(result, dict):
+        return decoder(result)
+    return result
@@ -0,0 +1,287 @@
+"""Open DCA orders repricing module."""
+import json
+import logging
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from krakenapi import KrakenApi
+
+from .account import Account
+from .dca import DCA
+from .utils import pair_userref
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of orders Kraken cancels per CancelOrderBatch request.
+MAX_CANCEL_BATCH: int = 50
+
+
+def load_open_times(filepath: str) -> Dict[str, float]:
+    """
+    Read the edited orders original open times file.
+
+    :param filepath: Open times JSON file path.
+    :return: Original open time per TXID, empty if the file is missing.
+    """
+    try:
+        with open(filepath, "r") as open_times_file:
+            return json.load(open_times_file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.warning("Reprice state %s discarded: %s.", filepath, e)
+        return {}
+
+
+def save_open_times(filepath: str, open_times: Dict[str, float]) -> None:
+    """
+    Write the edited orders original open times file, replaced at once.
+
+    :param filepath: Open times JSON file path.
+    :param open_times: Original open time per TXID.
+    :return: None
+    """
+    temporary_filepath = f"{filepath}.{os.getpid()}.tmp"
+    with open(temporary_filepath, "w") as open_times_file:
+        json.dump(open_times, open_times_file)
+    os.replace(temporary_filepath, filepath)
+
+
+class Repricer:
+    """
+    Amend the DCA pairs open orders left unfilled toward the current ask
+    price, and cancel the ones opened for too long.
+    """
+
+    ka: KrakenApi
+    dcas: Dict[int, DCA]
+    filepath: Optional[str]
+    opened_at: Dict[str, float]
+
+    def __init__(
+        self, ka: KrakenApi, dcas: List[DCA], filepath: Optional[str] = None
+    ) -> None:
+        """
+        Instantiate the Repricer object.
+
+        :param ka: KrakenApi object.
+        :param dcas: DCA objects of the pairs to reprice orders from.
+        :param filepath: File keeping the edited orders original open
+                         times between runs, kept in memory only if not
+                         specified.
+        :return: None
+        """
+        self.ka = ka
+        self.dcas = {pair_userref(dca.pair.name): dca for dca in dcas}
+        self.filepath = filepath
+        # Open time of the orders before being edited, Kraken gives edited
+        # orders a new TXID and open time. Shared with the DCA objects so
+        # edited orders are counted from their original open time.
+        self.opened_at = load_open_times(filepath) if filepath else {}
+        for dca in dcas:
+            dca.opened_at = self.opened_at
+
+    def reprice(
+        self,
+        get_ask_prices: Callable[[List[DCA]], Dict[str, float]],
+        now: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """
+        Get every open order at once, edit the stale orders of the pairs
+        with reprice_after to the limit price of the current ask price and
+        cancel the orders of the pairs with cancel_after in batches.
+
+        :param get_ask_prices: Function requesting the ask prices of DCA
+                               pairs at once.
+        :param now: Current Unix time.
+        :return: Dict of repriced and canceled orders counts.
+        """
+        now = now or time.time()
+        open_orders = Account.get_open_orders(self.ka) or {}
+        stale: Dict[str, dict] = {}
+        expired: List[str] = []
+        for txid, order in open_orders.items():
+            dca = self.dcas.get(order.get("userref"))
+            if not dca:
+                continue
+            age = now - self.opened_at.get(txid, float(order.get("opentm")))
+            if dca.cancel_after and age >= dca.cancel_after * 60:
+                expired.append(txid)
+            elif (
+                dca.reprice_after
+                and dca.ladder_orders == 1
+                and not float(order.get("vol_exec", 0))
+                and age >= dca.reprice_after * 60
+            ):
+                stale[txid] = order
+        opened_at = dict(self.opened_at)
+        self.forget_orders(open_orders, now)
+        repriced = self.edit_orders(stale, get_ask_prices) if stale else 0
+        canceled = self.cancel_orders(expired) if expired else 0
+        if self.filepath and self.opened_at != opened_at:
+            self.save()
+        logger.info(
+            "Repricing: %s order(s) repriced, %s order(s) canceled.",
+            repriced,
+            canceled,
+        )
+        return {"repriced": repriced, "canceled": canceled}
+
+    def forget_orders(self, open_orders: dict, now: float) -> None:
+        """
+        Forget the original open time of the closed orders no longer
+        within any DCA pair delay, the other ones are still counted as
+        daily orders.
+
+        :param open_orders: Dict of open orders with txid as the key.
+        :param now: Current Unix time.
+        :return: None
+        """
+        start = now - max(dca.delay for dca in self.dcas.values()) * 86400
+        for txid in [
+            txid
+            for txid, opentm in self.opened_at.items()
+            if txid not in open_orders and opentm < start
+        ]:
+            del self.opened_at[txid]
+
+    def save(self) -> None:
+        """
+        Save the edited orders original open times to the reprice state
+        file.
+
+        :return: None
+        """
+        try:
+            save_open_times(self.filepath, self.opened_at)
+        except OSError as e:
+            logger.warning("Reprice state %s not saved: %s.", self.filepath, e)
+
+    def edit_orders(
+        self,
+        orders: Dict[str, dict],
+        get_ask_prices: Callable[[List[DCA]], Dict[str, float]],
+    ) -> int:
+        """
+        Edit orders to the limit price of their pair current ask price,
+        capped to the pair maximum price, for the same quote amount.
+        Orders already at or above this price are left as is.
+
+        :param orders: Dict of open orders to edit with txid as the key.
+        :param get_ask_prices: Function requesting the ask prices of DCA
+                               pairs at once.
+        :return: Number of edited orders.
+        """
+        dcas = {self.dcas[order.get("userref")] for order in orders.values()}
+        ask_prices = get_ask_prices(list(dcas))
+        edited = 0
+        for txid, order in orders.items():
+            dca = self.dcas[order.get("userref")]
+            pair = dca.pair
+            price = float(order.get("descr").get("price"))
+            volume = float(order.get("vol"))
+            new_price = dca.get_limit_price(
+                dca.get_pair_ask_price(
+                    ask_prices.get(pair.name), volume * price
+                ),
+                pair.pair_decimals,
+            )
+            if dca.max_price != -1:
+                new_price = min(new_price, dca.max_price)
+            if new_price <= price:
+                continue
+            decimals = 10**pair.lot_decimals
+            new_volume = (
+                math.floor(volume * price / new_price * decimals) / decimals
+            )
+            if new_volume < pair.order_min:
+                logger.info(
+                    "Order %s not repriced: volume %s lower than pair "
+                    "minimum %s.",
+                    txid,
+                    new_volume,
+                    pair.order_min,
+                )
+                continue
+            try:
+                new_txid = self.edit_order(
+                    txid, order, pair.name, new_volume, new_price
+                )
+            except (OSError, ValueError) as e:
+                logger.warning("Order %s not repriced: %s", txid, e)
+                continue
+            opentm = self.opened_at.get(txid, float(order.get("opentm")))
+            self.opened_at[new_txid] = opentm
+            if dca.amount_strategy:
+                dca.amount_strategy.replace_order(txid, new_txid, new_volume)
+            if dca.order_feed:
+                dca.order_feed.state.set_open_time(
+                    new_txid, order.get("userref"), opentm
+                )
+            edited += 1
+            logger.info(
+                "Order %s repriced from %s to %s, volume %s: %s.",
+                txid,
+                price,
+                new_price,
+                new_volume,
+                new_txid,
+            )
+        return edited
+
+    def edit_order(
+        self,
+        txid: str,
+        order: dict,
+        pair_name: str,
+        volume: float,
+        price: float,
+    ) -> str:
+        """
+        Send the EditOrder request of an open order, keeping its userref.
+
+        :param txid: Order TXID.
+        :param order: Open order.
+        :param pair_name: Order pair name.
+        :param volume: New order volume.
+        :param price: New order limit price.
+        :return: Edited order new TXID.
+        """
+        post_inputs = {
+            "txid": txid,
+            "pair": pair_name,
+            "volume": str(volume),
+            "price": str(price),
+            "userref": order.get("userref"),
+        }
+        request = self.ka.create_api_request(False, "EditOrder", post_inputs)
+        return self.ka.send_api_request(request).get("txid")
+
+    def cancel_orders(self, txids: List[str]) -> int:
+        """
+        Cancel orders with CancelOrderBatch requests of at most
+        MAX_CANCEL_BATCH orders.
+
+        :param txids: TXIDs of the orders to cancel.
+        :return: Number of canceled orders.
+        """
+        canceled = 0
+        for start in range(0, len(txids), MAX_CANCEL_BATCH):
+            end = start + MAX_CANCEL_BATCH
+            batch = txids[start:end]
+            post_inputs = {
+                f"orders[{index}]": txid for index, txid in enumerate(batch)
+            }
+            request = self.ka.create_api_request(
+                False, "CancelOrderBatch", post_inputs
+            )
+            try:
+                response = self.ka.send_api_request(request)
+            except (OSError, ValueError) as e:
+                logger.warning("Orders %s not canceled: %s", batch, e)
+                continue
+            canceled += int(response.get("count", 0))
+            logger.info("Canceled orders: %s", ", ".join(batch))
+        return canceled
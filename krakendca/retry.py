@@ -0,0 +1,489 @@
+"""Kraken API requests retry and hedging module."""
+import http.client
+import logging
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import copy_context
+from typing import Deque, Dict, Iterator, List, Optional, TypeVar
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qsl
+from urllib.request import Request, urlopen
+
+from krakenapi import KrakenApi
+
+from .accounting import CallAccounting
+from .metrics import Metrics
+from .records import decode_response
+from .utils import is_public_request, request_endpoint
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound="RetryPolicy")
+
+# Private endpoints changing account state, never blindly retried.
+WRITE_ENDPOINTS = (
+    "AddOrder",
+    "AddOrderBatch",
+    "EditOrder",
+    "CancelOrder",
+    "CancelOrderBatch",
+    "CancelAll",
+    "Withdraw",
+)
+# Kraken errors worth retrying, anything else is raised at once.
+TRANSIENT_ERRORS = (
+    "EAPI:Rate limit exceeded",
+    # Nonce checked out of order beyond the API key nonce window.
+    "EAPI:Invalid nonce",
+    "EGeneral:Internal error",
+    "EService:Unavailable",
+    "EService:Busy",
+    "EService:Timeout",
+)
+# Latencies kept per endpoint to estimate the hedging delay.
+LATENCY_SAMPLES: int = 100
+# Minimum latencies count before hedging after the endpoint p95 latency.
+MIN_LATENCY_SAMPLES: int = 20
+
+
+class KrakenApiError(ValueError):
+    """
+    Error returned by Kraken API.
+    """
+
+    error: str
+
+    def __init__(self, error: str) -> None:
+        """
+        Initialize the KrakenApiError object.
+
+        :param error: Kraken API error as string, e.g. EService:Unavailable.
+        :return: None
+        """
+        super().__init__(f"Kraken API error -> {error}")
+        self.error = error
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Run deadline exceeded before a Kraken API request.
+    """
+
+
+class RetryPolicy:
+    """
+    Retry policy of a Kraken API endpoint class.
+    """
+
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    timeout: float
+    hedge: bool
+    hedge_delay: float
+
+    def __init__(
+        self,
+        max_attempts: int = 1,
+        base_delay: float = 0.5,
+        max_delay: float = 8,
+        timeout: float = 30,
+        hedge: bool = False,
+        hedge_delay: float = 1,
+    ) -> None:
+        """
+        Initialize the RetryPolicy object.
+
+        :param max_attempts: Maximum attempts count, 1 to never retry.
+        :param base_delay: Exponential backoff base delay in seconds.
+        :param max_delay: Exponential backoff maximum delay in seconds.
+        :param timeout: Request timeout in seconds.
+        :param hedge: Send a second request if the first one is slower
+                      than the endpoint p95 latency, for idempotent
+                      requests only.
+        :param hedge_delay: Delay before hedging in seconds while not
+                            enough latencies are known for the endpoint.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+
+    @classmethod
+    def from_config(cls, config: dict, default: T) -> T:
+        """
+        Initialize a RetryPolicy object from configuration, missing
+        parameters being taken from the default policy.
+
+        :param config: Endpoint class retry configuration.
+        :param default: Default endpoint class RetryPolicy object.
+        :return: Instanced RetryPolicy object.
+        """
+        parameters = dict(default.__dict__)
+        parameters.update(config)
+        return cls(**parameters)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Return the delay before next attempt: exponential backoff with
+        full jitter.
+
+        :param attempt: Count of failed attempts.
+        :return: Delay in seconds.
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+# Default retry policies per endpoint class.
+DEFAULT_RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    "public": RetryPolicy(
+        max_attempts=4, base_delay=0.25, max_delay=4, timeout=10, hedge=True
+    ),
+    "private": RetryPolicy(
+        max_attempts=3, base_delay=0.5, max_delay=8, timeout=15
+    ),
+    "write": RetryPolicy(max_attempts=1, timeout=30),
+}
+
+
+def endpoint_class(request: Request) -> str:
+    """
+    Return the endpoint class of a request: public, private or write.
+
+    :param request: Kraken API request.
+    :return: Endpoint class as string.
+    """
+    if is_public_request(request):
+        return "public"
+    if request_endpoint(request) in WRITE_ENDPOINTS:
+        return "write"
+    return "private"
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Return True if a request error may not happen again on retry.
+
+    :param error: Raised error.
+    :return: True if transient error.
+    """
+    if isinstance(error, DeadlineExceededError):
+        return False
+    if isinstance(error, KrakenApiError):
+        return error.error in TRANSIENT_ERRORS
+    if isinstance(error, HTTPError):
+        return error.code >= 500 or error.code == 429
+    return isinstance(
+        error,
+        (
+            URLError,
+            ConnectionError,
+            socket.timeout,
+            http.client.HTTPException,
+        ),
+    )
+
+
+class RetryingKrakenApi(KrakenApi):
+    """
+    KrakenApi object retrying transient errors with jittered exponential
+    backoff and hedging slow public requests.
+    Write requests, e.g. AddOrder, are never retried.
+    """
+
+    retry_policies: Dict[str, RetryPolicy]
+    endpoint_timeouts: Dict[str, float]
+    retry_statistics: Dict[str, Dict[str, int]]
+    deadline: Optional[float]
+    metrics: Optional[Metrics]
+    accounting: Optional[CallAccounting]
+
+    def __init__(
+        self,
+        *args,
+        retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+        endpoint_timeouts: Optional[Dict[str, float]] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Initialize the RetryingKrakenApi object.
+
+        :param retry_policies: RetryPolicy objects per endpoint class,
+                               default ones for missing classes.
+        :param endpoint_timeouts: Request timeouts in seconds per endpoint,
+                                  overriding the endpoint class policy one.
+        :return: None
+        """
+        super().__init__(*args, **kwargs)
+        self.retry_policies = dict(DEFAULT_RETRY_POLICIES)
+        self.retry_policies.update(retry_policies or {})
+        self.endpoint_timeouts = dict(endpoint_timeouts or {})
+        # time.monotonic() deadline of the current run, if any.
+        self.deadline = None
+        # Metrics object requests are recorded to, if any.
+        self.metrics = None
+        # CallAccounting object calls are accounted and budgeted by, if any.
+        self.accounting = None
+        # Endpoint -> retries and hedged requests counts.
+        self.retry_statistics = {}
+        self.__latencies: Dict[str, Deque[float]] = {}
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="kraken-hedge"
+        )
+
+    def __count(self, endpoint: str, counter: str) -> None:
+        """
+        Increment an endpoint counter.
+
+        :param endpoint: Request endpoint.
+        :param counter: retries or hedges.
+        :return: None
+        """
+        with self.__lock:
+            counters = self.retry_statistics.setdefault(
+                endpoint, {"retries": 0, "hedges": 0}
+            )
+            counters[counter] += 1
+
+    def send_api_request(self, request: Request) -> dict:
+        """
+        Send the request to Kraken API, retrying transient errors
+        according to the request endpoint class policy.
+
+        :param request: Request object to send to Kraken API
+        :return: Kraken API's response as dict.
+        """
+        endpoint = request_endpoint(request)
+        request_class = endpoint_class(request)
+        policy = self.retry_policies[request_class]
+        attempt = 1
+        while True:
+            timeout = self.request_timeout(endpoint, request_class, policy)
+            try:
+                if policy.hedge and request_class == "public":
+                    return self.send_hedged_request(request, policy, timeout)
+                return self.send_request(request, timeout)
+            except Exception as e:
+                retry = attempt < policy.max_attempts and is_transient_error(e)
+                if not retry:
+                    raise
+                delay = policy.backoff_delay(attempt)
+                if self.deadline and time.monotonic() + delay > self.deadline:
+                    raise DeadlineExceededError(
+                        f"Run deadline exceeded, {endpoint} not retried "
+                        f"({e})."
+                    )
+                logger.warning(
+                    "Kraken API %s attempt %s failed (%s), retrying in %.2fs.",
+                    endpoint,
+                    attempt,
+                    e,
+                    delay,
+                )
+                self.__count(endpoint, "retries")
+                time.sleep(delay)
+                attempt += 1
+                if request_class != "public":
+                    request = self.renew_private_request(request)
+
+    def request_timeout(
+        self, endpoint: str, request_class: str, policy: RetryPolicy
+    ) -> float:
+        """
+        Return the timeout of a request: the endpoint timeout if any, the
+        endpoint class policy one otherwise, shortened to the run deadline.
+        Write requests keep their whole timeout once sent, a write timed
+        out may have been executed by Kraken.
+
+        :param endpoint: Request endpoint.
+        :param request_class: Request endpoint class.
+        :param policy: Request endpoint class RetryPolicy object.
+        :return: Timeout in seconds.
+        """
+        timeout = self.endpoint_timeouts.get(endpoint, policy.timeout)
+        if self.deadline is None:
+            return timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(
+                f"Run deadline exceeded, {endpoint} not sent."
+            )
+        if request_class == "write":
+            return timeout
+        return min(timeout, remaining)
+
+    @contextmanager
+    def run_deadline(self, seconds: float) -> Iterator[None]:
+        """
+        Bound the requests sent within the context to a deadline: no
+        request is sent nor retried after it.
+
+        :param seconds: Deadline from now in seconds.
+        :return: Context manager.
+        """
+        self.deadline = time.monotonic() + seconds
+        try:
+            yield
+        finally:
+            self.deadline = None
+
+    def send_request(self, request: Request, timeout: float) -> dict:
+        """
+        Send the request once to Kraken API and record its latency.
+        Orders and asset pairs are decoded into compact records.
+
+        :param request: Request object to send to Kraken API.
+        :param timeout: Request timeout in seconds.
+        :return: Kraken API's response as dict.
+        """
+        endpoint = request_endpoint(request)
+        public = is_public_request(request)
+        if self.accounting:
+            self.accounting.record_call(endpoint, public)
+        if self.metrics:
+            self.metrics.observe_request(endpoint, public)
+        start = time.perf_counter()
+        with self.open_request(request, timeout) as response:
+            data = response.read()
+        latency = time.perf_counter() - start
+        if self.accounting:
+            self.accounting.record_response(endpoint, len(data))
+        self.record_latency(endpoint, latency)
+        if self.metrics:
+            self.metrics.observe_latency(endpoint, latency)
+        data = decode_response(data, endpoint)
+        if isinstance(data, str):
+            raise KrakenApiError(data)
+        return data
+
+    def open_request(self, request: Request, timeout: float):
+        """
+        Open the request to Kraken API.
+
+        :param request: Request object to send to Kraken API.
+        :param timeout: Request timeout in seconds.
+        :return: HTTP response.
+        """
+        return urlopen(request, timeout=timeout)
+
+    def send_hedged_request(
+        self,
+        request: Request,
+        policy: RetryPolicy,
+        timeout: Optional[float] = None,
+    ) -> dict:
+        """
+        Send the request, and the same request again if no response was
+        received after the endpoint p95 latency. Return the first response.
+
+        :param request: Idempotent request object to send to Kraken API.
+        :param policy: Request endpoint class RetryPolicy object.
+        :param timeout: Request timeout in seconds, the policy one if not
+                        specified.
+        :return: Kraken API's response as dict.
+        """
+        endpoint = request_endpoint(request)
+        timeout = timeout or policy.timeout
+        # Hedging threads send requests in the caller context, e.g. for
+        # calls to be accounted to the caller pair.
+        primary = self.__executor.submit(
+            copy_context().run, self.send_request, request, timeout
+        )
+        hedge_delay = self.hedge_delay(endpoint, policy)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+        logger.info(
+            "Kraken API %s slower than %.3fs, sending hedged request.",
+            endpoint,
+            hedge_delay,
+        )
+        self.__count(endpoint, "hedges")
+        hedge = self.__executor.submit(
+            copy_context().run, self.send_request, request, timeout
+        )
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        raise primary.exception()
+
+    def record_latency(self, endpoint: str, latency: float) -> None:
+        """
+        Record a request latency for its endpoint.
+
+        :param endpoint: Request endpoint.
+        :param latency: Request latency in seconds.
+        :return: None
+        """
+        with self.__lock:
+            latencies = self.__latencies.setdefault(
+                endpoint, deque(maxlen=LATENCY_SAMPLES)
+            )
+            latencies.append(latency)
+
+    def get_latencies(self) -> Dict[str, List[float]]:
+        """
+        Return the recorded latencies per endpoint.
+
+        :return: Latencies in seconds per endpoint, oldest first.
+        """
+        with self.__lock:
+            return {
+                endpoint: list(latencies)
+                for endpoint, latencies in self.__latencies.items()
+            }
+
+    def load_latencies(self, latencies: Dict[str, List[float]]) -> None:
+        """
+        Record latencies of a previous run, e.g. from a Snapshot.
+
+        :param latencies: Latencies in seconds per endpoint.
+        :return: None
+        """
+        for endpoint, endpoint_latencies in latencies.items():
+            for latency in endpoint_latencies:
+                self.record_latency(endpoint, latency)
+
+    def hedge_delay(self, endpoint: str, policy: RetryPolicy) -> float:
+        """
+        Return the delay before hedging a request: the endpoint p95
+        latency or the policy default while not enough latencies are known.
+
+        :param endpoint: Request endpoint.
+        :param policy: Request endpoint class RetryPolicy object.
+        :return: Hedging delay in seconds.
+        """
+        with self.__lock:
+            latencies = sorted(self.__latencies.get(endpoint, ()))
+        if len(latencies) < MIN_LATENCY_SAMPLES:
+            return policy.hedge_delay
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    def renew_private_request(self, request: Request) -> Request:
+        """
+        Create the private request again with a new nonce and signature,
+        Kraken rejecting an already used nonce.
+
+        :param request: Private request object sent to Kraken API.
+        :return: New Request object.
+        """
+        post_inputs = {
+            key: value
+            for key, value in parse_qsl(request.data.decode())
+            if key != "nonce"
+        }
+        return self.create_api_request(
+            False, request_endpoint(request), post_inputs
+        )
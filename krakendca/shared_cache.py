@@ -0,0 +1,416 @@
+"""Cross-process shared pairs cache module, in a memory-mapped file."""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from krakenapi import KrakenApi
+
+from .coalescing import DEFAULT_CACHE_TTLS
+from .pair import Pair
+
+logger = logging.getLogger(__name__)
+
+MAGIC: bytes = b"KDCA"
+VERSION: int = 1
+# Magic, version, capacity, padded to a cache line.
+HEADER = struct.Struct("<4sII")
+HEADER_SIZE: int = 64
+# Sequence number, then name, alt_name, ws_name, base, quote, pair_decimals,
+# lot_decimals, quote_decimals, order_min, metadata_timestamp, ask, bid,
+# price_timestamp.
+SEQUENCE = struct.Struct("<Q")
+RECORD = struct.Struct("<16s16s16s16s16siiiddddd")
+RECORD_SIZE: int = 192
+# Size of the names fields.
+NAME_SIZE: int = 16
+DEFAULT_CAPACITY: int = 256
+# Seqlock read attempts before considering a record as missing.
+MAX_READ_ATTEMPTS: int = 1000
+
+
+def pack_name(name: str) -> bytes:
+    """
+    Return a name as record field bytes, struct truncating longer names
+    silently.
+
+    :param name: Pair, asset or WebSocket name.
+    :return: Encoded name.
+    """
+    encoded = name.encode()
+    if len(encoded) > NAME_SIZE:
+        raise ValueError(f"{name} longer than {NAME_SIZE} bytes.")
+    return encoded
+
+
+class PairRecord(NamedTuple):
+    """
+    Shared cache pair record: pair metadata and prices.
+    """
+
+    name: str
+    alt_name: str = ""
+    ws_name: str = ""
+    base: str = ""
+    quote: str = ""
+    pair_decimals: int = 0
+    lot_decimals: int = 0
+    quote_decimals: int = 0
+    order_min: float = 0
+    metadata_timestamp: float = 0
+    ask: float = 0
+    bid: float = 0
+    price_timestamp: float = 0
+
+
+class SharedCache:
+    """
+    Pairs metadata and prices shared by Kraken-DCA processes of a host
+    through a memory-mapped file of fixed size records.
+    Readers never block: a record is read again if its sequence number
+    was odd or changed while reading it. Writers refresh records from
+    Kraken holding the file lock, so only one process refreshes them per
+    freshness window.
+    """
+
+    filepath: str
+    capacity: int
+    cache_ttls: Dict[str, float]
+
+    def __init__(
+        self,
+        filepath: str,
+        capacity: int = DEFAULT_CAPACITY,
+        cache_ttls: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """
+        Open the shared cache file, creating it if needed.
+
+        :param filepath: Shared cache file path.
+        :param capacity: Pairs count the file can hold if created.
+        :param cache_ttls: Data freshness in seconds per Kraken endpoint:
+                           AssetPairs for metadata, Ticker for prices.
+        :return: None
+        """
+        self.filepath = filepath
+        self.cache_ttls = (
+            DEFAULT_CACHE_TTLS if cache_ttls is None else cache_ttls
+        )
+        self.__fd = os.open(filepath, os.O_RDWR | os.O_CREAT, 0o644)
+        with self.lock():
+            if os.fstat(self.__fd).st_size == 0:
+                os.ftruncate(self.__fd, HEADER_SIZE + capacity * RECORD_SIZE)
+                os.pwrite(self.__fd, HEADER.pack(MAGIC, VERSION, capacity), 0)
+            magic, version, self.capacity = HEADER.unpack(
+                os.pread(self.__fd, HEADER.size, 0)
+            )
+        if magic != MAGIC or version != VERSION:
+            os.close(self.__fd)
+            raise ValueError(f"{filepath} is not a Kraken-DCA shared cache.")
+        self.__map = mmap.mmap(
+            self.__fd, HEADER_SIZE + self.capacity * RECORD_SIZE
+        )
+
+    def close(self) -> None:
+        """
+        Close the shared cache file.
+
+        :return: None
+        """
+        self.__map.close()
+        os.close(self.__fd)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Hold the shared cache file exclusive lock, to write records.
+
+        :return: None
+        """
+        fcntl.flock(self.__fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+    def __offsets(self, pair: str) -> Iterator[int]:
+        """
+        Return the record offsets to probe for a pair, from its hash.
+
+        :param pair: Pair name.
+        :return: Records offsets.
+        """
+        start = zlib.crc32(pair.encode())
+        for index in range(self.capacity):
+            slot = (start + index) % self.capacity
+            yield HEADER_SIZE + slot * RECORD_SIZE
+
+    def __read_record(self, offset: int) -> Optional[PairRecord]:
+        """
+        Read a consistent record, without locking.
+
+        :param offset: Record offset.
+        :return: PairRecord object, None if the record is empty or kept
+                 being written.
+        """
+        start = offset + SEQUENCE.size
+        end = start + RECORD.size
+        for _ in range(MAX_READ_ATTEMPTS):
+            sequence = SEQUENCE.unpack_from(self.__map, offset)[0]
+            if sequence & 1:
+                continue
+            data = self.__map[start:end]
+            if sequence == SEQUENCE.unpack_from(self.__map, offset)[0]:
+                if sequence == 0:
+                    return None
+                fields = RECORD.unpack(data)
+                strings = [
+                    field.rstrip(b"\0").decode() for field in fields[:5]
+                ]
+                return PairRecord(*strings, *fields[5:])
+        return None
+
+    def __find(self, pair: str) -> Tuple[Optional[int], Optional[PairRecord]]:
+        """
+        Find a pair record.
+
+        :param pair: Pair name.
+        :return: Pair record offset and record, else first empty record
+                 offset and None.
+        """
+        for offset in self.__offsets(pair):
+            record = self.__read_record(offset)
+            if record is None:
+                return offset, None
+            if record.name == pair:
+                return offset, record
+        return None, None
+
+    def read(self, pair: str) -> Optional[PairRecord]:
+        """
+        Return a pair record.
+
+        :param pair: Pair name.
+        :return: PairRecord object, None if not in cache.
+        """
+        return self.__find(pair)[1]
+
+    def write(self, record: PairRecord) -> None:
+        """
+        Write a pair record, the lock must be held.
+
+        :param record: PairRecord object.
+        :return: None
+        """
+        data = RECORD.pack(
+            *[pack_name(field) for field in record[:5]], *record[5:]
+        )
+        offset, _ = self.__find(record.name)
+        if offset is None:
+            logger.warning("Shared cache full, %s is not shared.", record.name)
+            return
+        sequence = SEQUENCE.unpack_from(self.__map, offset)[0]
+        SEQUENCE.pack_into(self.__map, offset, sequence + 1)
+        start = offset + SEQUENCE.size
+        end = start + RECORD.size
+        self.__map[start:end] = data
+        SEQUENCE.pack_into(self.__map, offset, sequence + 2)
+
+    def __stale(
+        self, pairs: List[str], timestamp_field: str, endpoint: str
+    ) -> List[str]:
+        """
+        Return the pairs with missing or outdated data.
+
+        :param pairs: Pairs names.
+        :param timestamp_field: metadata_timestamp or price_timestamp.
+        :param endpoint: Kraken endpoint the data is from.
+        :return: Stale pairs names.
+        """
+        oldest = time.time() - self.cache_ttls.get(endpoint, 0)
+        stale = []
+        for pair in pairs:
+            record = self.read(pair)
+            if not record or getattr(record, timestamp_field) <= oldest:
+                stale.append(pair)
+        return stale
+
+    def get_pairs(self, ka: KrakenApi, pairs: List[str]) -> Dict[str, Pair]:
+        """
+        Return Pair objects from the shared cache, refreshed from Kraken
+        if outdated.
+
+        :param ka: KrakenApi object.
+        :param pairs: Pairs names.
+        :return: Dictionary of Pair objects per pair name.
+        """
+        fetched: Dict[str, Pair] = {}
+        stale = self.__stale(pairs, "metadata_timestamp", "AssetPairs")
+        if stale:
+            with self.lock():
+                # Possibly refreshed by another process meanwhile.
+                stale = self.__stale(stale, "metadata_timestamp", "AssetPairs")
+                if stale:
+                    fetched = self.refresh_pairs(ka, stale)
+        records = {pair: self.read(pair) for pair in pairs}
+        # Pairs not shared when the cache is full are requested directly.
+        missing = [
+            pair
+            for pair, record in records.items()
+            if not record and pair not in fetched
+        ]
+        if missing:
+            fetched.update(self.fetch_pairs(ka, missing))
+        return {
+            pair: Pair(
+                record.name,
+                record.alt_name,
+                record.base,
+                record.quote,
+                record.pair_decimals,
+                record.lot_decimals,
+                record.quote_decimals,
+                record.order_min,
+                record.ws_name or None,
+            )
+            if record
+            else fetched[pair]
+            for pair, record in records.items()
+        }
+
+    @staticmethod
+    def fetch_pairs(ka: KrakenApi, pairs: List[str]) -> Dict[str, Pair]:
+        """
+        Return Pair objects from Kraken.
+
+        :param ka: KrakenApi object.
+        :param pairs: Pairs names.
+        :return: Dictionary of Pair objects per pair name.
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            asset_pairs_future = executor.submit(ka.get_asset_pairs)
+            assets_future = executor.submit(ka.get_assets)
+            asset_pairs = asset_pairs_future.result()
+            assets = assets_future.result()
+        return {
+            name: Pair.get_pair_from_kraken(ka, asset_pairs, name, assets)
+            for name in pairs
+        }
+
+    def refresh_pairs(
+        self, ka: KrakenApi, pairs: List[str]
+    ) -> Dict[str, Pair]:
+        """
+        Write pairs metadata from Kraken, the lock must be held.
+
+        :param ka: KrakenApi object.
+        :param pairs: Pairs names.
+        :return: Dictionary of Pair objects per pair name.
+        """
+        fetched = self.fetch_pairs(ka, pairs)
+        now = time.time()
+        for name, pair in fetched.items():
+            record = self.read(name) or PairRecord(name)
+            self.write(
+                record._replace(
+                    alt_name=pair.alt_name,
+                    ws_name=pair.ws_name or "",
+                    base=pair.base,
+                    quote=pair.quote,
+                    pair_decimals=pair.pair_decimals,
+                    lot_decimals=pair.lot_decimals,
+                    quote_decimals=pair.quote_decimals,
+                    order_min=pair.order_min,
+                    metadata_timestamp=now,
+                )
+            )
+        logger.info("Shared cache pairs refreshed: %s.", ", ".join(pairs))
+        return fetched
+
+    def get_prices(
+        self, ka: KrakenApi, pairs: List[str]
+    ) -> Dict[str, Tuple[float, float]]:
+        """
+        Return pairs ask and bid prices from the shared cache, refreshed
+        from Kraken if outdated.
+
+        :param ka: KrakenApi object.
+        :param pairs: Pairs names.
+        :return: Dictionary of ask and bid prices per pair name.
+        """
+        fetched: Dict[str, Tuple[float, float]] = {}
+        stale = self.__stale(pairs, "price_timestamp", "Ticker")
+        if stale:
+            with self.lock():
+                # Possibly refreshed by another process meanwhile.
+                stale = self.__stale(stale, "price_timestamp", "Ticker")
+                if stale:
+                    fetched = self.refresh_prices(ka, stale)
+        records = {pair: self.read(pair) for pair in pairs}
+        # Pairs not shared when the cache is full are requested directly.
+        missing = [
+            pair
+            for pair, record in records.items()
+            if not record and pair not in fetched
+        ]
+        if missing:
+            fetched.update(self.fetch_prices(ka, missing))
+        return {
+            pair: (record.ask, record.bid) if record else fetched[pair]
+            for pair, record in records.items()
+        }
+
+    def get_ask_price(self, ka: KrakenApi, pair: str) -> float:
+        """
+        Return a pair ask price from the shared cache, refreshed from
+        Kraken if outdated.
+
+        :param ka: KrakenApi object.
+        :param pair: Pair name.
+        :return: Pair ask price.
+        """
+        return self.get_prices(ka, [pair])[pair][0]
+
+    @staticmethod
+    def fetch_prices(
+        ka: KrakenApi, pairs: List[str]
+    ) -> Dict[str, Tuple[float, float]]:
+        """
+        Return pairs ask and bid prices from a single Kraken Ticker request.
+
+        :param ka: KrakenApi object.
+        :param pairs: Pairs names.
+        :return: Dictionary of ask and bid prices per pair name.
+        """
+        tickers = ka.get_pair_ticker(",".join(pairs))
+        return {
+            name: (
+                float(tickers.get(name).get("a")[0]),
+                float(tickers.get(name).get("b")[0]),
+            )
+            for name in pairs
+        }
+
+    def refresh_prices(
+        self, ka: KrakenApi, pairs: List[str]
+    ) -> Dict[str, Tuple[float, float]]:
+        """
+        Write pairs prices from a single Kraken Ticker request, the lock
+        must be held.
+
+        :param ka: KrakenApi object.
+        :param pairs: Pairs names.
+        :return: Dictionary of ask and bid prices per pair name.
+        """
+        fetched = self.fetch_prices(ka, pairs)
+        now = time.time()
+        for name, (ask, bid) in fetched.items():
+            record = self.read(name) or PairRecord(name)
+            self.write(record._replace(ask=ask, bid=bid, price_timestamp=now))
+        return fetched
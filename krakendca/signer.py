@@ -0,0 +1,167 @@
+"""Kraken API private requests signing module."""
+import base64
+import binascii
+import hashlib
+import hmac
+from typing import Dict, Optional
+from urllib.parse import urlencode
+from urllib.request import Request
+
+from krakenapi import KrakenApi
+
+
+def replace_nonce(post_data: bytes, nonce: str) -> bytes:
+    """
+    Return POST data with its nonce replaced, other inputs untouched.
+
+    :param post_data: URL encoded POST data with a nonce.
+    :param nonce: New nonce as string.
+    :return: POST data with the new nonce.
+    """
+    return b"&".join(
+        b"nonce=" + nonce.encode() if item.startswith(b"nonce=") else item
+        for item in post_data.split(b"&")
+    )
+
+
+class RequestSigner:
+    """
+    Kraken API private requests signer: the private key is decoded once and
+    the HMAC state after each endpoint path is reused, only the nonce and
+    POST data are hashed for each request.
+    """
+
+    def __init__(self, api_private_key: str) -> None:
+        """
+        Initialize the RequestSigner object.
+
+        :param api_private_key: Kraken API private key, base64 encoded.
+        :return: None
+        """
+        self.__api_private_key = api_private_key
+        self.__hmac: Optional[hmac.HMAC] = None
+        self.__endpoint_hmacs: Dict[str, hmac.HMAC] = {}
+
+    def endpoint_hmac(self, endpoint: str) -> hmac.HMAC:
+        """
+        Return the HMAC state after the endpoint path, to be copied.
+
+        :param endpoint: Private endpoint name, e.g. AddOrder.
+        :return: HMAC object.
+        """
+        endpoint_hmac = self.__endpoint_hmacs.get(endpoint)
+        if endpoint_hmac is None:
+            if self.__hmac is None:
+                # Decoded on first use, as KrakenApi does.
+                try:
+                    secret = base64.b64decode(self.__api_private_key)
+                except binascii.Error as e:
+                    raise ValueError(
+                        f"Incorrect Kraken API private key -> {e}"
+                    )
+                self.__hmac = hmac.new(secret, digestmod=hashlib.sha512)
+            endpoint_hmac = self.__hmac.copy()
+            endpoint_hmac.update(f"/0/private/{endpoint}".encode())
+            self.__endpoint_hmacs[endpoint] = endpoint_hmac
+        return endpoint_hmac
+
+    def sign(self, nonce: str, post_data: bytes, endpoint: str) -> str:
+        """
+        Return the API-Sign header value of a private request.
+
+        :param nonce: Request nonce as string.
+        :param post_data: URL encoded POST data, with the nonce.
+        :param endpoint: Private endpoint name.
+        :return: Base64 encoded signature.
+        """
+        signature = self.endpoint_hmac(endpoint).copy()
+        signature.update(hashlib.sha256(nonce.encode() + post_data).digest())
+        return base64.b64encode(signature.digest()).decode()
+
+
+class PreparedRequest:
+    """
+    Private request built ahead of sending: only its nonce and signature
+    are left to finalize at send time.
+    """
+
+    endpoint: str
+    url: str
+    post_data: bytes
+
+    def __init__(
+        self, ka: KrakenApi, endpoint: str, post_inputs: Optional[dict]
+    ) -> None:
+        """
+        Build the request URL and POST data, without nonce.
+
+        :param ka: KrakenApi object.
+        :param endpoint: Private endpoint name, e.g. AddOrder.
+        :param post_inputs: POST inputs as dict.
+        :return: None
+        """
+        self.endpoint = endpoint
+        self.url = ka.create_api_path(False, endpoint)
+        self.post_data = (
+            urlencode(post_inputs, safe=",").encode() + b"&"
+            if post_inputs
+            else b""
+        )
+
+    def finalize(self, ka: KrakenApi) -> Request:
+        """
+        Return the request with a new nonce and its signature, left to
+        KrakenApi objects signing private requests at dispatch.
+
+        :param ka: KrakenApi object the request is sent with.
+        :return: Request object.
+        """
+        if getattr(ka, "signed_at_dispatch", False):
+            # Placeholder nonce, replaced when signed.
+            return Request(
+                self.url,
+                data=self.post_data + b"nonce=0",
+                headers={"API-Key": ka.api_public_key},
+            )
+        nonce = ka.create_api_nonce()
+        post_data = self.post_data + b"nonce=" + nonce.encode()
+        return Request(
+            self.url,
+            data=post_data,
+            headers={
+                "API-Sign": ka.create_api_signature(
+                    nonce, post_data, self.endpoint
+                ),
+                "API-Key": ka.api_public_key,
+            },
+        )
+
+
+class SigningKrakenApi(KrakenApi):
+    """
+    KrakenApi object signing private requests with a RequestSigner.
+    """
+
+    signer: RequestSigner
+
+    def __init__(self, *args, **kwargs) -> None:
+        """
+        Initialize the SigningKrakenApi object.
+
+        :return: None
+        """
+        super().__init__(*args, **kwargs)
+        self.signer = RequestSigner(self.api_private_key)
+
+    def create_api_signature(
+        self, api_nonce: str, api_post_data: bytes, api_method: str
+    ) -> str:
+        """
+        Create the private request signature.
+
+        :param api_nonce: Request nonce as string.
+        :param api_post_data: URL encoded POST data, with the nonce.
+        :param api_method: Private endpoint name.
+        :return: API-Sign header value.
+        """
+        return self.signer.sign(api_nonce, api_post_data, api_method)
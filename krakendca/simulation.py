@@ -0,0 +1,440 @@
+"""Monte Carlo simulation of DCA outcomes module."""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .dca import DCA
+from .ohlc_store import CLOSE, OHLCStore
+from .order import TAKER_FEE
+from .pair import Pair
+
+logger = logging.getLogger(__name__)
+
+# Price path models: daily log returns resampled from the history, or
+# geometric Brownian motion with the history returns mean and deviation.
+MODELS: tuple = ("bootstrap", "gbm")
+# Reported percentiles of the paths outcomes.
+PERCENTILES: tuple = (5, 25, 50, 75, 95)
+# Candle interval in minutes of the history, one price per day.
+HISTORY_INTERVAL: int = 1440
+# Outcomes computed per path.
+OUTCOMES: tuple = ("cost_basis", "units", "spent", "value", "filled")
+
+
+def log_returns(closes: np.ndarray) -> np.ndarray:
+    """
+    Compute daily log returns from daily close prices.
+
+    :param closes: Close prices, oldest first.
+    :return: Log returns, one less than close prices.
+    """
+    return np.diff(np.log(closes))
+
+
+def bootstrap_paths(
+    returns: np.ndarray,
+    start_price: float,
+    days: int,
+    paths: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Simulate daily price paths from log returns drawn with replacement
+    from the history returns.
+
+    :param returns: History daily log returns.
+    :param start_price: Price of the first day.
+    :param days: Simulated days after the first one.
+    :param paths: Number of paths.
+    :param rng: NumPy random generator.
+    :return: Prices of shape (paths, days + 1).
+    """
+    return prices_from_returns(
+        rng.choice(returns, size=(paths, days)), start_price
+    )
+
+
+def gbm_paths(
+    returns: np.ndarray,
+    start_price: float,
+    days: int,
+    paths: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Simulate daily price paths as a geometric Brownian motion with the
+    drift and volatility of the history returns.
+
+    :param returns: History daily log returns.
+    :param start_price: Price of the first day.
+    :param days: Simulated days after the first one.
+    :param paths: Number of paths.
+    :param rng: NumPy random generator.
+    :return: Prices of shape (paths, days + 1).
+    """
+    return prices_from_returns(
+        rng.normal(returns.mean(), returns.std(ddof=1), size=(paths, days)),
+        start_price,
+    )
+
+
+def prices_from_returns(returns: np.ndarray, start_price: float) -> np.ndarray:
+    """
+    Compound daily log returns from a start price.
+
+    :param returns: Log returns of shape (paths, days).
+    :param start_price: Price of the first day.
+    :return: Prices of shape (paths, days + 1).
+    """
+    log_prices = np.zeros((returns.shape[0], returns.shape[1] + 1))
+    np.cumsum(returns, axis=1, out=log_prices[:, 1:])
+    return start_price * np.exp(log_prices)
+
+
+def order_volumes(
+    amount: float, prices: np.ndarray, lot_decimals: int
+) -> np.ndarray:
+    """
+    Vectorized Order.set_order_volume: volume of an amount at each price,
+    adjusted for the taker fee.
+
+    :param amount: DCA amount.
+    :param prices: Pair prices.
+    :param lot_decimals: Pair lot decimals.
+    :return: Fee adjusted order volumes.
+    """
+    decimals = 10**lot_decimals
+    volumes = np.floor(amount / prices * decimals) / decimals
+    return np.floor(volumes / (1 + TAKER_FEE) * decimals) / decimals
+
+
+class SimulatedDCA:
+    """
+    DCA pair order rules applied to simulated daily price paths: a limit
+    order is created every delay days from the day price as ask price,
+    and filled if the price reaches it before the next order.
+    """
+
+    pair: Pair
+    delay: int
+    amount: float
+    limit_factor: float
+    max_price: float
+
+    def __init__(
+        self,
+        pair: Pair,
+        delay: int,
+        amount: float,
+        limit_factor: float = 1,
+        max_price: float = -1,
+    ) -> None:
+        """
+        Instantiate the SimulatedDCA object.
+
+        :param pair: Pair object.
+        :param delay: DCA days delay between orders.
+        :param amount: DCA order amount in quote asset.
+        :param limit_factor: Price factor of the limit orders.
+        :param max_price: Maximum limit price, no maximum if -1.
+        :return: None
+        """
+        self.pair = pair
+        self.delay = delay
+        self.amount = amount
+        self.limit_factor = limit_factor
+        self.max_price = max_price
+
+    @classmethod
+    def from_dca(cls, dca: DCA) -> "SimulatedDCA":
+        """
+        Instantiate the SimulatedDCA object from a DCA pair, its amount
+        strategy if any is not simulated.
+
+        :param dca: DCA object.
+        :return: SimulatedDCA object.
+        """
+        return cls(
+            dca.pair, dca.delay, dca.amount, dca.limit_factor, dca.max_price
+        )
+
+    def limit_prices(self, ask_prices: np.ndarray) -> np.ndarray:
+        """
+        Vectorized DCA.get_limit_price: limit prices from ask prices and
+        limit_factor.
+
+        :param ask_prices: Pair ask prices.
+        :return: Limit prices.
+        """
+        if round(self.limit_factor, 5) == 1.0:
+            return ask_prices
+        return np.round(
+            ask_prices * self.limit_factor, self.pair.pair_decimals
+        )
+
+    def simulate(self, prices: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Simulate the DCA orders on every price path at once.
+        Orders are not created if their limit price is greater than
+        max_price or their volume lower than the pair minimum, nor filled
+        if the price does not reach their limit price before the next
+        order.
+
+        :param prices: Daily prices of shape (paths, days + 1).
+        :return: Dict of OUTCOMES arrays of one value per path.
+        """
+        days = prices.shape[1] - 1
+        order_days = np.arange(0, days, self.delay)
+        limit_prices = self.limit_prices(prices[:, order_days])
+        volumes = order_volumes(
+            self.amount, limit_prices, self.pair.lot_decimals
+        )
+        created = volumes >= self.pair.order_min
+        if self.max_price != -1:
+            created &= limit_prices <= self.max_price
+        if self.limit_factor < 1:
+            # Lowest price of the days each order is open.
+            lows = np.minimum.reduceat(prices[:, 1:], order_days, axis=1)
+            filled = created & (lows <= limit_prices)
+        else:
+            filled = created
+        volumes = np.where(filled, volumes, 0)
+        costs = volumes * limit_prices
+        # Order.estimate_order_price and estimate_order_fee.
+        decimals = self.pair.quote_decimals
+        spent = (
+            np.round(costs, decimals) + np.round(costs * TAKER_FEE, decimals)
+        ).sum(axis=1)
+        units = volumes.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cost_basis = np.where(units > 0, spent / units, np.nan)
+        return {
+            "cost_basis": cost_basis,
+            "units": units,
+            "spent": spent,
+            "value": units * prices[:, -1],
+            "filled": filled.sum(axis=1) / len(order_days),
+        }
+
+
+def simulate_paths(
+    dca: SimulatedDCA,
+    returns: np.ndarray,
+    start_price: float,
+    model: str,
+    days: int,
+    paths: int,
+    seed: np.random.SeedSequence,
+) -> Dict[str, np.ndarray]:
+    """
+    Simulate price paths of a model and the DCA outcomes on them, run by
+    the worker processes.
+
+    :param dca: SimulatedDCA object.
+    :param returns: History daily log returns.
+    :param start_price: Price of the first day.
+    :param model: Price paths model in MODELS.
+    :param days: Simulated days after the first one.
+    :param paths: Number of paths.
+    :param seed: Seed of the paths random generator.
+    :return: Dict of OUTCOMES arrays of one value per path.
+    """
+    model_paths = bootstrap_paths if model == "bootstrap" else gbm_paths
+    prices = model_paths(
+        returns, start_price, days, paths, np.random.default_rng(seed)
+    )
+    return dca.simulate(prices)
+
+
+class SimulationResult:
+    """
+    Distribution of a DCA pair outcomes over simulated price paths.
+    """
+
+    pair: str
+    outcomes: Dict[str, np.ndarray]
+
+    def __init__(self, pair: str, outcomes: Dict[str, np.ndarray]) -> None:
+        """
+        Instantiate the SimulationResult object.
+
+        :param pair: Pair name.
+        :param outcomes: Dict of OUTCOMES arrays of one value per path.
+        :return: None
+        """
+        self.pair = pair
+        self.outcomes = outcomes
+
+    @property
+    def paths(self) -> int:
+        """
+        :return: Number of simulated paths.
+        """
+        return len(self.outcomes["units"])
+
+    def percentiles(self) -> Dict[str, np.ndarray]:
+        """
+        Compute the PERCENTILES of every outcome, ignoring the cost basis
+        of paths without filled orders.
+
+        :return: Dict of percentiles arrays per outcome.
+        """
+        return {
+            outcome: np.nanpercentile(values, PERCENTILES)
+            if np.isfinite(values).any()
+            else np.full(len(PERCENTILES), np.nan)
+            for outcome, values in self.outcomes.items()
+        }
+
+    def report(self) -> str:
+        """
+        :return: Outcome percentiles table.
+        """
+        lines = [
+            f"{self.pair}: {self.paths} paths",
+            f"{'':<12}" + "".join(f"{f'p{p}':>16}" for p in PERCENTILES),
+        ]
+        for outcome, values in self.percentiles().items():
+            lines.append(
+                f"{outcome:<12}"
+                + "".join(f"{value:>16.8g}" for value in values)
+            )
+        return "\n".join(lines)
+
+
+class MonteCarlo:
+    """
+    Monte Carlo simulation of DCA pairs outcomes, the paths being split
+    in chunks simulated by worker processes.
+    """
+
+    dcas: List[SimulatedDCA]
+    histories: Dict[str, np.ndarray]
+    model: str
+    days: int
+    workers: int
+    seed: Optional[int]
+
+    def __init__(
+        self,
+        dcas: List[SimulatedDCA],
+        histories: Dict[str, np.ndarray],
+        model: str = "bootstrap",
+        days: int = 365,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Instantiate the MonteCarlo object.
+
+        :param dcas: SimulatedDCA objects.
+        :param histories: Daily close prices per pair name, oldest first.
+        :param model: Price paths model in MODELS.
+        :param days: Simulated days.
+        :param workers: Worker processes, CPU count if not specified, the
+                        paths are simulated in process if 1.
+        :param seed: Random generator seed, for reproducible results.
+        :return: None
+        """
+        if model not in MODELS:
+            raise ValueError(f"Simulation model must be one of {MODELS}.")
+        for dca in dcas:
+            closes = histories.get(dca.pair.name)
+            if closes is None or len(closes) < 3:
+                raise ValueError(
+                    f"Not enough {dca.pair.name} daily prices history to "
+                    "simulate."
+                )
+        self.dcas = dcas
+        self.histories = histories
+        self.model = model
+        self.days = days
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+
+    @classmethod
+    def from_ohlc_store(
+        cls, dcas: List[DCA], ohlc_store: OHLCStore, **kwargs
+    ) -> "MonteCarlo":
+        """
+        Instantiate the MonteCarlo object of DCA pairs from their daily
+        candles stored in an OHLC store.
+
+        :param dcas: DCA objects.
+        :param ohlc_store: OHLCStore object.
+        :param kwargs: MonteCarlo parameters.
+        :return: MonteCarlo object.
+        """
+        return cls(
+            [SimulatedDCA.from_dca(dca) for dca in dcas],
+            {
+                dca.pair.name: np.array(
+                    ohlc_store.read(dca.pair.name, HISTORY_INTERVAL)[:, CLOSE]
+                )
+                for dca in dcas
+            },
+            **kwargs,
+        )
+
+    def run(self, paths: int) -> Dict[str, SimulationResult]:
+        """
+        Simulate the DCA pairs outcomes on price paths starting from the
+        last history price.
+
+        :param paths: Number of paths per pair.
+        :return: Dict of SimulationResult objects per pair name.
+        """
+        chunks = np.array_split(np.arange(paths), self.workers)
+        sizes = [len(chunk) for chunk in chunks if len(chunk)]
+        seeds = np.random.SeedSequence(self.seed).spawn(
+            len(self.dcas) * len(sizes)
+        )
+        tasks: List[tuple] = []
+        for dca in self.dcas:
+            closes = self.histories[dca.pair.name]
+            returns = log_returns(closes)
+            for size in sizes:
+                tasks.append(
+                    (
+                        dca,
+                        returns,
+                        closes[-1],
+                        self.model,
+                        self.days,
+                        size,
+                        seeds[len(tasks)],
+                    )
+                )
+        if self.workers == 1:
+            chunk_outcomes = [simulate_paths(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(self.workers) as executor:
+                chunk_outcomes = list(
+                    executor.map(simulate_paths, *zip(*tasks))
+                )
+        results: Dict[str, SimulationResult] = {}
+        for dca in self.dcas:
+            outcomes = [
+                chunk
+                for task, chunk in zip(tasks, chunk_outcomes)
+                if task[0] is dca
+            ]
+            results[dca.pair.name] = SimulationResult(
+                dca.pair.name,
+                {
+                    outcome: np.concatenate(
+                        [chunk[outcome] for chunk in outcomes]
+                    )
+                    for outcome in OUTCOMES
+                },
+            )
+            logger.info(
+                "Simulated %s %s paths over %s days.",
+                paths,
+                dca.pair.name,
+                self.days,
+            )
+        return results
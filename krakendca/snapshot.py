@@ -0,0 +1,267 @@
+"""Warm state snapshot module, for fast one-shot runs."""
+import hashlib
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional, Set, TypeVar
+
+from .pair import Pair
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound="Snapshot")
+
+MAGIC: bytes = b"KDCS"
+VERSION: int = 2
+# Magic, version, creation time, Kraken clock offset, API key digest,
+# pairs count, latency endpoints count.
+HEADER = struct.Struct("<4sHdd32sHH")
+# name, alt_name, ws_name, base, quote, pair_decimals, lot_decimals,
+# quote_decimals, order_min, last order open time (0 if unknown), flags.
+PAIR = struct.Struct("<16s16s16s16s16sHHHddH")
+# Pair flag set once an order tagged with the pair userref was seen.
+TAGGED_ORDERS: int = 1
+# Endpoint name and latencies count, followed by the latencies.
+ENDPOINT = struct.Struct("<32sH")
+LATENCY = struct.Struct("<f")
+# Payload CRC32, at the end of the file.
+CHECKSUM = struct.Struct("<I")
+# Seconds after which a snapshot is discarded, for pairs metadata to be
+# requested again.
+DEFAULT_MAX_AGE: float = 7 * 24 * 3600
+
+
+def key_digest(api_public_key: str) -> bytes:
+    """
+    Return the digest identifying the account a snapshot belongs to.
+
+    :param api_public_key: Kraken API public key.
+    :return: SHA-256 digest.
+    """
+    return hashlib.sha256(api_public_key.encode()).digest()
+
+
+class SnapshotError(ValueError):
+    """
+    Snapshot file unreadable, from another version or account, or stale.
+    """
+
+
+def pack_name(name: str, size: int = 16) -> bytes:
+    """
+    Return a name as fixed size field bytes, struct truncating longer
+    names silently.
+
+    :param name: Pair, asset or endpoint name.
+    :param size: Field size.
+    :return: Encoded name.
+    """
+    encoded = name.encode()
+    if len(encoded) > size:
+        raise SnapshotError(f"{name} longer than {size} bytes")
+    return encoded
+
+
+class Snapshot:
+    """
+    State rebuilt by every run, saved at exit and loaded at startup from a
+    single versioned binary file: pairs metadata, last order open time per
+    pair, pairs with tagged orders, Kraken clock offset and endpoints
+    latencies.
+    """
+
+    created_at: float
+    clock_offset: float
+    pairs: Dict[str, Pair]
+    last_orders: Dict[str, float]
+    latencies: Dict[str, List[float]]
+    tagged_pairs: Set[str]
+
+    def __init__(
+        self,
+        pairs: Dict[str, Pair],
+        last_orders: Optional[Dict[str, float]] = None,
+        clock_offset: float = 0,
+        latencies: Optional[Dict[str, List[float]]] = None,
+        created_at: Optional[float] = None,
+        tagged_pairs: Optional[Set[str]] = None,
+    ) -> None:
+        """
+        Initialize the Snapshot object.
+
+        :param pairs: Pair objects per pair name.
+        :param last_orders: Last order open time per pair name.
+        :param clock_offset: Kraken time minus system time in seconds.
+        :param latencies: Request latencies in seconds per endpoint.
+        :param created_at: Snapshot Unix time, now if not specified.
+        :param tagged_pairs: Names of the pairs with orders ever tagged
+                             with their userref.
+        :return: None
+        """
+        self.pairs = pairs
+        self.last_orders = last_orders or {}
+        self.clock_offset = clock_offset
+        self.latencies = latencies or {}
+        self.created_at = time.time() if created_at is None else created_at
+        self.tagged_pairs = tagged_pairs or set()
+
+    def encode(self, api_public_key: str) -> bytes:
+        """
+        Return the snapshot binary content.
+
+        :param api_public_key: Kraken API public key of the account.
+        :return: Snapshot bytes.
+        """
+        data = HEADER.pack(
+            MAGIC,
+            VERSION,
+            self.created_at,
+            self.clock_offset,
+            key_digest(api_public_key),
+            len(self.pairs),
+            len(self.latencies),
+        )
+        for pair in self.pairs.values():
+            data += PAIR.pack(
+                pack_name(pair.name),
+                pack_name(pair.alt_name),
+                pack_name(pair.ws_name or ""),
+                pack_name(pair.base),
+                pack_name(pair.quote),
+                pair.pair_decimals,
+                pair.lot_decimals,
+                pair.quote_decimals,
+                pair.order_min,
+                self.last_orders.get(pair.name, 0),
+                TAGGED_ORDERS if pair.name in self.tagged_pairs else 0,
+            )
+        for endpoint, latencies in self.latencies.items():
+            data += ENDPOINT.pack(pack_name(endpoint, 32), len(latencies))
+            data += b"".join(LATENCY.pack(latency) for latency in latencies)
+        return data + CHECKSUM.pack(zlib.crc32(data))
+
+    @classmethod
+    def decode(
+        cls,
+        data: bytes,
+        api_public_key: str,
+        max_age: float = DEFAULT_MAX_AGE,
+    ) -> T:
+        """
+        Return the Snapshot object from its binary content.
+
+        :param data: Snapshot bytes.
+        :param api_public_key: Kraken API public key of the account.
+        :param max_age: Maximum snapshot age in seconds.
+        :return: Snapshot object.
+        """
+        if len(data) < HEADER.size + CHECKSUM.size:
+            raise SnapshotError("truncated file")
+        magic, version = struct.unpack_from("<4sH", data)
+        if magic != MAGIC:
+            raise SnapshotError("not a Kraken-DCA snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"version {version}, expected {VERSION}")
+        payload = data[: -CHECKSUM.size]
+        if CHECKSUM.unpack_from(data, len(payload))[0] != zlib.crc32(payload):
+            raise SnapshotError("checksum mismatch")
+        (
+            _,
+            _,
+            created_at,
+            clock_offset,
+            digest,
+            pairs_count,
+            endpoints_count,
+        ) = HEADER.unpack_from(payload)
+        if digest != key_digest(api_public_key):
+            raise SnapshotError("saved for another API key")
+        age = time.time() - created_at
+        if not 0 <= age <= max_age:
+            raise SnapshotError(f"stale, saved {age:.0f}s ago")
+        pairs: Dict[str, Pair] = {}
+        last_orders: Dict[str, float] = {}
+        tagged_pairs: Set[str] = set()
+        offset = HEADER.size
+        try:
+            for _ in range(pairs_count):
+                fields = PAIR.unpack_from(payload, offset)
+                offset += PAIR.size
+                name, alt_name, ws_name, base, quote = [
+                    field.rstrip(b"\0").decode() for field in fields[:5]
+                ]
+                pairs[name] = Pair(
+                    name,
+                    alt_name,
+                    base,
+                    quote,
+                    *fields[5:9],
+                    ws_name or None,
+                )
+                if fields[9]:
+                    last_orders[name] = fields[9]
+                if fields[10] & TAGGED_ORDERS:
+                    tagged_pairs.add(name)
+            latencies: Dict[str, List[float]] = {}
+            for _ in range(endpoints_count):
+                endpoint, count = ENDPOINT.unpack_from(payload, offset)
+                start = offset + ENDPOINT.size
+                offset = start + count * LATENCY.size
+                latencies[endpoint.rstrip(b"\0").decode()] = [
+                    latency
+                    for (latency,) in LATENCY.iter_unpack(
+                        payload[start:offset]
+                    )
+                ]
+        except (struct.error, UnicodeDecodeError):
+            raise SnapshotError("corrupted file")
+        return cls(
+            pairs,
+            last_orders,
+            clock_offset,
+            latencies,
+            created_at,
+            tagged_pairs,
+        )
+
+    def save(self, filepath: str, api_public_key: str) -> None:
+        """
+        Write the snapshot file, replaced at once so concurrent runs never
+        read a partial file.
+
+        :param filepath: Snapshot file path.
+        :param api_public_key: Kraken API public key of the account.
+        :return: None
+        """
+        temporary_filepath = f"{filepath}.{os.getpid()}.tmp"
+        with open(temporary_filepath, "wb") as snapshot_file:
+            snapshot_file.write(self.encode(api_public_key))
+        os.replace(temporary_filepath, filepath)
+
+    @classmethod
+    def load(
+        cls,
+        filepath: str,
+        api_public_key: str,
+        max_age: float = DEFAULT_MAX_AGE,
+    ) -> Optional[T]:
+        """
+        Read the snapshot file, discarded if missing or invalid.
+
+        :param filepath: Snapshot file path.
+        :param api_public_key: Kraken API public key of the account.
+        :param max_age: Maximum snapshot age in seconds.
+        :return: Snapshot object, None if discarded.
+        """
+        try:
+            with open(filepath, "rb") as snapshot_file:
+                data = snapshot_file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            return cls.decode(data, api_public_key, max_age)
+        except SnapshotError as e:
+            logger.warning("Snapshot %s discarded: %s.", filepath, e)
+            return None
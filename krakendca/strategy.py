@@ -0,0 +1,571 @@
+"""DCA order amount strategies module."""
+import json
+import logging
+import math
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound="AmountStrategy")
+
+SECONDS_PER_DAY: int = 86400
+
+
+def unix_day(unix_time: float) -> int:
+    """
+    Return the count of days since the Unix epoch, UTC.
+
+    :param unix_time: Unix time.
+    :return: Day number.
+    """
+    return int(unix_time // SECONDS_PER_DAY)
+
+
+class DailySample:
+    """
+    Latest price of the current day, replaced by every run of the day and
+    committed to the indicator once a new day starts, so indicators do not
+    depend on the count of runs per day.
+    """
+
+    day: Optional[int]
+    price: Optional[float]
+
+    def __init__(self) -> None:
+        """
+        Initialize the DailySample object.
+
+        :return: None
+        """
+        self.day = None
+        self.price = None
+
+    def observe(self, price: float, day: int) -> Optional[float]:
+        """
+        Set the current day price.
+
+        :param price: Pair price.
+        :param day: Unix day of the price.
+        :return: Price of the previous day to commit, if a new day started.
+        """
+        committed = None
+        if self.day is not None and day > self.day:
+            committed = self.price
+        if self.day is None or day >= self.day:
+            self.day, self.price = day, price
+        return committed
+
+
+class AmountStrategy:
+    """
+    Order amount computed from the DCA amount and the pair ask price, with
+    indicators updated in constant time from the ask price of each run:
+    no price history is requested. Days without any run are accounted for
+    by the gap between committed prices.
+    """
+
+    name: str = ""
+    # Strategy parameters besides max_multiplier.
+    parameters: tuple = ()
+    max_multiplier: float
+    close_day: Optional[int]
+
+    def __init__(self, max_multiplier: float = 2) -> None:
+        """
+        Initialize the AmountStrategy object.
+
+        :param max_multiplier: Maximum amount as a multiple of the DCA
+                               amount.
+        :return: None
+        """
+        self.max_multiplier = float(max_multiplier)
+        self.sample = DailySample()
+        # Day of the last committed price.
+        self.close_day = None
+
+    @staticmethod
+    def from_config(config: dict, delay: int) -> T:
+        """
+        Initialize the AmountStrategy object of a DCA pair configuration.
+
+        :param config: Pair amount_strategy configuration.
+        :param delay: DCA pair days delay.
+        :return: Instanced AmountStrategy object.
+        """
+        parameters = dict(config)
+        strategy = STRATEGIES[parameters.pop("type")]
+        if strategy is ValueAveragingStrategy:
+            parameters["delay"] = delay
+        return strategy(**parameters)
+
+    def get_amount(self, amount: float, price: float, day: int) -> float:
+        """
+        Update the indicators with the current price and return the order
+        amount, from 0 to max_multiplier times the DCA amount.
+
+        :param amount: DCA amount.
+        :param price: Pair ask price.
+        :param day: Unix day of the price.
+        :return: Order amount.
+        """
+        self.observe(price, day)
+        strategy_amount = self.compute_amount(amount, price, day)
+        return min(max(strategy_amount, 0), amount * self.max_multiplier)
+
+    def observe(self, price: float, day: int) -> None:
+        """
+        Update the indicators with the current price, on every run whether
+        an order is due or not.
+
+        :param price: Pair ask price.
+        :param day: Unix day of the price.
+        :return: None
+        """
+        sample_day = self.sample.day
+        committed = self.sample.observe(price, day)
+        if committed is not None:
+            days = 1 if self.close_day is None else sample_day - self.close_day
+            self.commit(committed, max(days, 1))
+            self.close_day = sample_day
+
+    def commit(self, price: float, days: int = 1) -> None:
+        """
+        Add a day closing price to the indicators.
+
+        :param price: Last price of a past day.
+        :param days: Days since the previous closing price.
+        :return: None
+        """
+
+    def compute_amount(self, amount: float, price: float, day: int) -> float:
+        """
+        Return the strategy order amount.
+
+        :param amount: DCA amount.
+        :param price: Pair ask price.
+        :param day: Unix day of the price.
+        :return: Order amount.
+        """
+        return amount
+
+    def record_order(self, txid: str, volume: float) -> None:
+        """
+        Record a sent order of the pair, pending until settled.
+
+        :param txid: Order TXID.
+        :param volume: Order volume.
+        :return: None
+        """
+
+    def replace_order(self, txid: str, new_txid: str, volume: float) -> None:
+        """
+        Replace a pending order edited by Kraken with a new TXID.
+
+        :param txid: Edited order TXID.
+        :param new_txid: New order TXID.
+        :param volume: New order volume.
+        :return: None
+        """
+
+    def settle_order(self, txid: str, volume_executed: float) -> None:
+        """
+        Settle a pending order once closed, canceled or expired.
+
+        :param txid: Order TXID.
+        :param volume_executed: Order executed volume.
+        :return: None
+        """
+
+    def pending_orders(self) -> List[str]:
+        """
+        Return the TXIDs of the pending orders to settle.
+
+        :return: List of TXIDs.
+        """
+        return []
+
+    def get_state(self) -> dict:
+        """
+        Return the strategy state to persist between runs.
+
+        :return: State as JSON serializable dict.
+        """
+        return {
+            "day": self.sample.day,
+            "price": self.sample.price,
+            "close_day": self.close_day,
+        }
+
+    def load_state(self, state: dict) -> None:
+        """
+        Restore the strategy state of a previous run.
+
+        :param state: State returned by get_state.
+        :return: None
+        """
+        self.sample.day = state.get("day")
+        self.sample.price = state.get("price")
+        self.close_day = state.get("close_day")
+
+
+class MovingAverageStrategy(AmountStrategy):
+    """
+    Buy more when the price is below its N-day moving average: the amount
+    is multiplied by 1 + multiplier x the relative distance below the
+    average. The average uses the available days until N are known, days
+    without price being interpolated from the closing prices around them.
+    """
+
+    name = "moving_average"
+    parameters = ("days", "multiplier")
+    days: int
+    multiplier: float
+
+    def __init__(
+        self, days: int = 200, multiplier: float = 5, **kwargs
+    ) -> None:
+        """
+        Initialize the MovingAverageStrategy object.
+
+        :param days: Moving average days count, including the current day.
+        :param multiplier: Amount increase per 100% below the average.
+        :return: None
+        """
+        super().__init__(**kwargs)
+        self.days = days
+        self.multiplier = float(multiplier)
+        self.prices: Deque[float] = deque()
+        self.prices_sum = 0.0
+
+    def commit(self, price: float, days: int = 1) -> None:
+        """
+        Add a day closing price to the window, the days without price
+        interpolated from the previous closing price.
+
+        :param price: Last price of a past day.
+        :param days: Days since the previous closing price.
+        :return: None
+        """
+        previous = self.prices[-1] if self.prices else price
+        # Only the days within the window are added.
+        for step in range(max(days - self.days + 1, 1), days + 1):
+            self.add_price(previous + (price - previous) * step / days)
+
+    def add_price(self, price: float) -> None:
+        """
+        Add a day price to the window.
+
+        :param price: Day price.
+        :return: None
+        """
+        self.prices.append(price)
+        self.prices_sum += price
+        # The current day completes the window.
+        if len(self.prices) > self.days - 1:
+            self.prices_sum -= self.prices.popleft()
+
+    def moving_average(self) -> float:
+        """
+        Return the moving average including the current day price.
+
+        :return: Moving average.
+        """
+        return (self.prices_sum + self.sample.price) / (len(self.prices) + 1)
+
+    def compute_amount(self, amount: float, price: float, day: int) -> float:
+        """
+        Return the DCA amount increased by the multiplier times the
+        relative distance of the price below the moving average.
+
+        :param amount: DCA amount.
+        :param price: Pair ask price.
+        :param day: Unix day of the price.
+        :return: Order amount.
+        """
+        average = self.moving_average()
+        distance = max(0.0, (average - price) / average)
+        return amount * (1 + self.multiplier * distance)
+
+    def get_state(self) -> dict:
+        """
+        Return the strategy state with the window prices.
+
+        :return: State as JSON serializable dict.
+        """
+        return {**super().get_state(), "prices": list(self.prices)}
+
+    def load_state(self, state: dict) -> None:
+        """
+        Restore the strategy state, the window prices trimmed to the
+        current days count.
+
+        :param state: State returned by get_state.
+        :return: None
+        """
+        super().load_state(state)
+        prices = state.get("prices", [])
+        # Window may have been shortened since the state was saved.
+        start = max(len(prices) - (self.days - 1), 0)
+        self.prices = deque(prices[start:])
+        self.prices_sum = math.fsum(self.prices)
+
+
+class ValueAveragingStrategy(AmountStrategy):
+    """
+    Value averaging: the value of the base asset bought grows by the DCA
+    amount each delay, the order amount being what is missing to reach the
+    target value at the current price. Sent orders count for their volume
+    until settled, then for their executed volume only.
+    """
+
+    name = "value_averaging"
+    parameters = ()
+    delay: int
+    start_day: Optional[int]
+    volume: float
+    orders: Dict[str, float]
+
+    def __init__(self, delay: int = 1, **kwargs) -> None:
+        """
+        Initialize the ValueAveragingStrategy object.
+
+        :param delay: DCA pair days delay, the target period.
+        :return: None
+        """
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.start_day = None
+        # Executed volume of the settled orders.
+        self.volume = 0.0
+        # Volume of the pending orders with TXID as the key.
+        self.orders = {}
+
+    def compute_amount(self, amount: float, price: float, day: int) -> float:
+        """
+        Return the amount missing for the value of the settled and pending
+        orders volume to reach the target value at the current price.
+
+        :param amount: DCA amount.
+        :param price: Pair ask price.
+        :param day: Unix day of the price.
+        :return: Order amount.
+        """
+        if self.start_day is None:
+            self.start_day = day
+        periods = (day - self.start_day) // self.delay + 1
+        volume = self.volume + math.fsum(self.orders.values())
+        return amount * periods - volume * price
+
+    def record_order(self, txid: str, volume: float) -> None:
+        """
+        Record a sent order, its volume counted until settled.
+
+        :param txid: Order TXID.
+        :param volume: Order volume.
+        :return: None
+        """
+        self.orders[txid] = volume
+
+    def replace_order(self, txid: str, new_txid: str, volume: float) -> None:
+        """
+        Move a pending order to its new TXID and volume once edited.
+
+        :param txid: Edited order TXID.
+        :param new_txid: New order TXID.
+        :param volume: New order volume.
+        :return: None
+        """
+        if self.orders.pop(txid, None) is not None:
+            self.orders[new_txid] = volume
+
+    def settle_order(self, txid: str, volume_executed: float) -> None:
+        """
+        Count the executed volume of a pending order instead of its
+        volume, once closed, canceled or expired.
+
+        :param txid: Order TXID.
+        :param volume_executed: Order executed volume.
+        :return: None
+        """
+        if self.orders.pop(txid, None) is not None:
+            self.volume += volume_executed
+
+    def pending_orders(self) -> List[str]:
+        """
+        Return the TXIDs of the orders sent and not settled yet.
+
+        :return: List of TXIDs.
+        """
+        return list(self.orders)
+
+    def get_state(self) -> dict:
+        """
+        Return the strategy state with the start day, the settled volume
+        and the pending orders.
+
+        :return: State as JSON serializable dict.
+        """
+        return {
+            **super().get_state(),
+            "start_day": self.start_day,
+            "volume": self.volume,
+            "orders": self.orders,
+        }
+
+    def load_state(self, state: dict) -> None:
+        """
+        Restore the start day, the settled volume and the pending orders.
+
+        :param state: State returned by get_state.
+        :return: None
+        """
+        super().load_state(state)
+        self.start_day = state.get("start_day")
+        self.volume = state.get("volume", 0.0)
+        self.orders = dict(state.get("orders", {}))
+
+
+class VolatilityStrategy(AmountStrategy):
+    """
+    Scale the amount by the target volatility over the pair volatility,
+    estimated from the exponentially weighted moving average of squared
+    daily log returns, annualized. Returns over several days are scaled
+    to a daily variance and weighted by their days count.
+    """
+
+    name = "volatility"
+    parameters = ("halflife_days", "target_volatility")
+    halflife_days: float
+    target_volatility: float
+
+    def __init__(
+        self,
+        halflife_days: float = 30,
+        target_volatility: float = 0.6,
+        **kwargs,
+    ) -> None:
+        """
+        Initialize the VolatilityStrategy object.
+
+        :param halflife_days: EWMA half-life in days.
+        :param target_volatility: Annualized volatility at which the DCA
+                                  amount is bought.
+        :return: None
+        """
+        super().__init__(**kwargs)
+        self.halflife_days = float(halflife_days)
+        self.target_volatility = float(target_volatility)
+        self.alpha = 1 - 0.5 ** (1 / self.halflife_days)
+        self.close: Optional[float] = None
+        self.variance: Optional[float] = None
+
+    def update_variance(self, price: float, days: int = 1) -> Optional[float]:
+        """
+        Return the variance updated with the return from the last close.
+
+        :param price: Current or closing price.
+        :param days: Days since the last close.
+        :return: Daily variance, None without a previous close.
+        """
+        if self.close is None:
+            return None
+        squared_return = math.log(price / self.close) ** 2 / days
+        if self.variance is None:
+            return squared_return
+        alpha = 1 - (1 - self.alpha) ** days
+        return alpha * squared_return + (1 - alpha) * self.variance
+
+    def commit(self, price: float, days: int = 1) -> None:
+        """
+        Update the variance with the return to a day closing price.
+
+        :param price: Last price of a past day.
+        :param days: Days since the previous closing price.
+        :return: None
+        """
+        self.variance = self.update_variance(price, days)
+        self.close = price
+
+    def compute_amount(self, amount: float, price: float, day: int) -> float:
+        """
+        Return the DCA amount scaled by the target volatility over the
+        volatility including the current price return, the DCA amount
+        without a volatility estimate.
+
+        :param amount: DCA amount.
+        :param price: Pair ask price.
+        :param day: Unix day of the price.
+        :return: Order amount.
+        """
+        days = 1 if self.close_day is None else max(day - self.close_day, 1)
+        variance = self.update_variance(price, days)
+        if not variance:
+            return amount
+        volatility = math.sqrt(variance * 365)
+        return amount * self.target_volatility / volatility
+
+    def get_state(self) -> dict:
+        """
+        Return the strategy state with the last close and variance.
+
+        :return: State as JSON serializable dict.
+        """
+        return {
+            **super().get_state(),
+            "close": self.close,
+            "variance": self.variance,
+        }
+
+    def load_state(self, state: dict) -> None:
+        """
+        Restore the last close and variance.
+
+        :param state: State returned by get_state.
+        :return: None
+        """
+        super().load_state(state)
+        self.close = state.get("close")
+        self.variance = state.get("variance")
+
+
+STRATEGIES: Dict[str, Type[AmountStrategy]] = {
+    strategy.name: strategy
+    for strategy in (
+        MovingAverageStrategy,
+        ValueAveragingStrategy,
+        VolatilityStrategy,
+    )
+}
+
+
+def load_states(filepath: str) -> Dict[str, dict]:
+    """
+    Read the amount strategies states file.
+
+    :param filepath: States JSON file path.
+    :return: States per pair name, empty if the file is missing.
+    """
+    try:
+        with open(filepath, "r") as states_file:
+            return json.load(states_file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.warning("Strategy states %s discarded: %s.", filepath, e)
+        return {}
+
+
+def save_states(filepath: str, states: Dict[str, dict]) -> None:
+    """
+    Write the amount strategies states file, replaced at once.
+
+    :param filepath: States JSON file path.
+    :param states: States per pair name.
+    :return: None
+    """
+    temporary_filepath = f"{filepath}.{os.getpid()}.tmp"
+    with open(temporary_filepath, "w") as states_file:
+        json.dump(states, states_file)
+    os.replace(temporary_filepath, filepath)
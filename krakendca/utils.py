@@ -1,5 +1,7 @@
 """Utilities functions module."""
+import zlib
 from datetime import datetime, timezone
+from urllib.request import Request
 
 
 def utc_unix_time_datetime(nix_time: int) -> datetime:
@@ -60,3 +62,34 @@ def find_nested_dictionary(nested_dict: dict, elem: object):
     }
     dictionary = nested_dictionary.get(elem)
     return dictionary
+
+
+def request_endpoint(request: Request) -> str:
+    """
+    Return Kraken API endpoint of a request.
+
+    :param request: Kraken API request.
+    :return: Endpoint name as string.
+    """
+    return request.full_url.rsplit("/", 1)[-1]
+
+
+def is_public_request(request: Request) -> bool:
+    """
+    Return True if the request is a Kraken API public market data request.
+
+    :param request: Kraken API request.
+    :return: True if public request.
+    """
+    return "/0/public/" in request.full_url
+
+
+def pair_userref(pair: str) -> int:
+    """
+    Return the userref tagging Kraken-DCA orders of a pair: a positive
+    32-bit signed integer derived from the pair name.
+
+    :param pair: Pair name.
+    :return: Pair orders userref.
+    """
+    return zlib.crc32(pair.encode()) & 0x7FFFFFFF or 1
@@ -0,0 +1,203 @@
+"""Minimal WebSocket client module (RFC 6455), text messages only."""
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+from typing import BinaryIO, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+T = TypeVar("T", bound="WebSocket")
+
+WEBSOCKET_GUID: str = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPCODE_CONTINUATION: int = 0x0
+OPCODE_TEXT: int = 0x1
+OPCODE_CLOSE: int = 0x8
+OPCODE_PING: int = 0x9
+OPCODE_PONG: int = 0xA
+
+
+class WebSocketClosed(ConnectionError):
+    """
+    WebSocket connection closed by the server.
+    """
+
+
+def accept_key(key: str) -> str:
+    """
+    Return the Sec-WebSocket-Accept value expected for a handshake key.
+
+    :param key: Sec-WebSocket-Key handshake header value.
+    :return: Sec-WebSocket-Accept header value.
+    """
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()
+    return base64.b64encode(digest).decode()
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+    """
+    Encode a final WebSocket frame. Client frames must be masked.
+
+    :param opcode: Frame opcode.
+    :param payload: Frame payload.
+    :param mask: Mask the payload.
+    :return: Encoded frame.
+    """
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header += bytes([mask_bit | length])
+    elif length < 65536:
+        header += bytes([mask_bit | 126]) + struct.pack("!H", length)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack("!Q", length)
+    if not mask:
+        return header + payload
+    masking_key = os.urandom(4)
+    masked = bytes(
+        byte ^ masking_key[index % 4] for index, byte in enumerate(payload)
+    )
+    return header + masking_key + masked
+
+
+def read_frame(stream: BinaryIO) -> Tuple[bool, int, bytes]:
+    """
+    Read a WebSocket frame from a stream.
+
+    :param stream: Buffered binary stream of the connection.
+    :return: Final frame flag, opcode and unmasked payload.
+    """
+
+    def read_exactly(size: int) -> bytes:
+        data = stream.read(size)
+        if len(data) < size:
+            raise WebSocketClosed("WebSocket connection closed.")
+        return data
+
+    first, second = read_exactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", read_exactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", read_exactly(8))[0]
+    masking_key = read_exactly(4) if second & 0x80 else None
+    payload = read_exactly(length)
+    if masking_key:
+        payload = bytes(
+            byte ^ masking_key[index % 4] for index, byte in enumerate(payload)
+        )
+    return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocket:
+    """
+    WebSocket client connection exchanging text messages.
+    """
+
+    url: str
+
+    def __init__(self, url: str, connection: socket.socket) -> None:
+        """
+        Initialize the WebSocket object from an upgraded connection.
+
+        :param url: WebSocket url.
+        :param connection: Connected socket, after the handshake.
+        :return: None
+        """
+        self.url = url
+        self.__connection = connection
+        self.__stream = connection.makefile("rb")
+
+    @classmethod
+    def connect(cls, url: str, timeout: Optional[float] = 10) -> T:
+        """
+        Open a WebSocket connection: ws:// or wss:// url.
+
+        :param url: WebSocket url.
+        :param timeout: Connection and read timeout in seconds.
+        :return: Connected WebSocket object.
+        """
+        parsed_url = urlparse(url)
+        secure = parsed_url.scheme == "wss"
+        host = parsed_url.hostname
+        port = parsed_url.port or (443 if secure else 80)
+        connection = socket.create_connection((host, port), timeout=timeout)
+        if secure:
+            context = ssl.create_default_context()
+            connection = context.wrap_socket(connection, server_hostname=host)
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path += "?" + parsed_url.query
+        connection.sendall(
+            (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {host}:{port}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        websocket = cls(url, connection)
+        status_line = websocket.__stream.readline().decode()
+        headers = {}
+        while True:
+            line = websocket.__stream.readline().decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if " 101 " not in status_line or headers.get(
+            "sec-websocket-accept"
+        ) != accept_key(key):
+            websocket.close()
+            raise ConnectionError(
+                f"WebSocket handshake failed with {url}: "
+                f"{status_line.strip()}"
+            )
+        return websocket
+
+    def send(self, message: str) -> None:
+        """
+        Send a text message.
+
+        :param message: Message to send.
+        :return: None
+        """
+        self.__connection.sendall(encode_frame(OPCODE_TEXT, message.encode()))
+
+    def receive(self) -> str:
+        """
+        Receive the next text message, answering pings meanwhile.
+
+        :return: Received message.
+        """
+        message = b""
+        while True:
+            final, opcode, payload = read_frame(self.__stream)
+            if opcode == OPCODE_PING:
+                self.__connection.sendall(encode_frame(OPCODE_PONG, payload))
+            elif opcode == OPCODE_CLOSE:
+                raise WebSocketClosed("WebSocket connection closed.")
+            elif opcode in (OPCODE_TEXT, OPCODE_CONTINUATION):
+                message += payload
+                if final:
+                    return message.decode()
+
+    def close(self) -> None:
+        """
+        Close the connection.
+
+        :return: None
+        """
+        try:
+            self.__connection.sendall(encode_frame(OPCODE_CLOSE, b""))
+            # Wakes up a thread blocked on receive.
+            self.__connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.__stream.close()
+        self.__connection.close()
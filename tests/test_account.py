@@ -0,0 +1,202 @@
+"""account.py tests module."""
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from krakenapi import KrakenApi
+
+from krakendca.account import Account
+from krakendca.order import Order
+
+
+def closed_order(pair: str, opentm: float) -> dict:
+    return {"opentm": opentm, "descr": {"pair": pair}, "vol": "1"}
+
+
+class TestAccount:
+    account: Account
+    ka: KrakenApi
+
+    def setup(self) -> None:
+        # Fake keys.
+        self.ka = KrakenApi(
+            "R6/OvXmIQEv1E8nyJd7+a9Zmaf84yJ7uifwe2yj5BgV1N+lgqURsxQwQ",
+            "MWZ9lFF/mreK4Fdk/SEpFLvVn//nbKUbCytGShSwvCvYlgRkn4K8i7VY"
+            "18UQEgOHzBIEsqg78BZJCEhvFIzw1Q==",
+        )
+        self.account = Account(
+            1618522408,
+            {"eb": "1650.3006"},
+            {"ZEUR": "39.728", "XETH": "0.109598362"},
+            {},
+            {
+                "O1": closed_order("ETHEUR", 1618444800.5),
+                "O2": closed_order("ETHEUR", 1618358400.5),
+            },
+            1618358400,
+        )
+
+    def test_init(self) -> None:
+        assert self.account.kraken_time == 1618522408
+        assert self.account.trade_balance == {"eb": "1650.3006"}
+        assert self.account.balance.get("ZEUR") == "39.728"
+        assert self.account.open_orders == {}
+        assert len(self.account.closed_orders) == 2
+        assert self.account.closed_orders_start == 1618358400
+
+    def test_get_account_from_kraken(self) -> None:
+        pages = [
+            {"closed": {"O1": closed_order("ETHEUR", 1)}, "count": 2},
+            {"closed": {"O2": closed_order("XBTEUR", 2)}, "count": 2},
+        ]
+        with patch.object(
+            KrakenApi, "get_time", return_value=1618522408
+        ), patch.object(
+            KrakenApi, "get_trade_balance", return_value={"eb": "1.0"}
+        ), patch.object(
+            KrakenApi, "get_balance", return_value={"ZEUR": "2.0"}
+        ), patch.object(
+            KrakenApi, "get_open_orders", return_value={"O3": {}}
+        ), patch.object(
+            KrakenApi, "send_api_request", side_effect=pages
+        ) as send_api_request:
+            account = Account.get_account_from_kraken(self.ka, 1618358400)
+        assert account.kraken_time == 1618522408
+        assert account.trade_balance == {"eb": "1.0"}
+        assert account.balance == {"ZEUR": "2.0"}
+        assert account.open_orders == {"O3": {}}
+        assert list(account.closed_orders) == ["O1", "O2"]
+        assert account.closed_orders_start == 1618358400
+        # Second closed orders page requested with an offset.
+        second_request = send_api_request.call_args_list[1].args[0]
+        assert b"ofs=1" in second_request.data
+
+    def test_get_closed_orders_single_page(self) -> None:
+        page = {"closed": {"O1": closed_order("ETHEUR", 1)}, "count": 1}
+        with patch.object(
+            KrakenApi, "send_api_request", return_value=page
+        ) as send_api_request:
+            closed_orders = Account.get_closed_orders(self.ka, 0)
+        assert list(closed_orders) == ["O1"]
+        assert send_api_request.call_count == 1
+
+    def test_get_account_from_kraken_userrefs(self) -> None:
+        responses = {
+            ("OpenOrders", True): {"open": {"O3": {"userref": 1}}},
+            ("ClosedOrders", True): {
+                "closed": {"O1": closed_order("ETHEUR", 1)},
+                "count": 1,
+            },
+            ("OpenOrders", False): {"open": {}},
+            ("ClosedOrders", False): {"closed": {}, "count": 0},
+        }
+
+        def send_api_request(request) -> dict:
+            endpoint = request.full_url.rsplit("/", 1)[1]
+            userref = b"userref=1" in request.data
+            return responses[(endpoint, userref)]
+
+        with patch.object(
+            KrakenApi, "get_time", return_value=1618522408
+        ), patch.object(
+            KrakenApi, "get_trade_balance", return_value={"eb": "1.0"}
+        ), patch.object(
+            KrakenApi, "get_balance", return_value={"ZEUR": "2.0"}
+        ), patch.object(
+            KrakenApi, "send_api_request", side_effect=send_api_request
+        ) as send_api_request_mock:
+            account = Account.get_account_from_kraken(
+                self.ka, 1618358400, [1, 2]
+            )
+        assert account.userrefs == [1, 2]
+        assert account.open_orders == {"O3": {"userref": 1}}
+        assert list(account.closed_orders) == ["O1"]
+        # Orders filtered on each userref by Kraken.
+        assert send_api_request_mock.call_count == 4
+
+    def test_get_account_from_kraken_without_orders(self) -> None:
+        with patch.object(
+            KrakenApi, "get_time", return_value=1618522408
+        ), patch.object(
+            KrakenApi, "get_trade_balance", return_value={"eb": "1.0"}
+        ), patch.object(
+            KrakenApi, "get_balance", return_value={"ZEUR": "2.0"}
+        ), patch.object(
+            KrakenApi, "send_api_request"
+        ) as send_api_request:
+            account = Account.get_account_from_kraken(
+                self.ka, 1618358400, [1, 2], with_orders=False
+            )
+        assert account.balance == {"ZEUR": "2.0"}
+        assert account.open_orders == {}
+        assert account.closed_orders == {}
+        send_api_request.assert_not_called()
+
+    def test_has_tagged_orders(self) -> None:
+        closed = {"closed": {"O1": {"userref": 1}}, "count": 1}
+        with patch.object(
+            KrakenApi, "send_api_request", return_value=closed
+        ) as send_api_request:
+            assert Account.has_tagged_orders(self.ka, 1) is True
+            assert Account.has_tagged_orders(self.ka, 2) is False
+        assert b"userref=1" in send_api_request.call_args_list[0].args[0].data
+
+    def test_get_untagged_orders(self) -> None:
+        self.account.open_orders = {"O3": {"userref": 1}, "O4": {}}
+        self.account.closed_orders["O1"]["userref"] = 0
+        self.account.closed_orders["O2"]["userref"] = 1
+        open_orders, closed_orders = self.account.get_untagged_orders(self.ka)
+        assert list(open_orders) == ["O4"]
+        assert list(closed_orders) == ["O1"]
+
+    def test_get_untagged_orders_userrefs(self) -> None:
+        self.account.userrefs = [1]
+        closed = {
+            "closed": {"O5": {"userref": 1}, "O6": {"userref": 0}},
+            "count": 2,
+        }
+        with patch.object(
+            KrakenApi, "get_open_orders", return_value={"O7": {}}
+        ) as get_open_orders, patch.object(
+            KrakenApi, "send_api_request", return_value=closed
+        ):
+            open_orders, closed_orders = self.account.get_untagged_orders(
+                self.ka
+            )
+            # Requested once for every pair.
+            self.account.get_untagged_orders(self.ka)
+        assert list(open_orders) == ["O7"]
+        assert list(closed_orders) == ["O6"]
+        assert get_open_orders.call_count == 1
+
+    def test_get_closed_orders_since(self) -> None:
+        closed_orders = self.account.get_closed_orders_since(1618444800)
+        assert list(closed_orders) == ["O1"]
+        closed_orders = self.account.get_closed_orders_since(1618358400)
+        assert list(closed_orders) == ["O1", "O2"]
+        with pytest.raises(ValueError) as e_info:
+            self.account.get_closed_orders_since(1618272000)
+        assert "Closed orders only available since 1618358400" in str(
+            e_info.value
+        )
+
+    def test_add_order(self) -> None:
+        order = Order(
+            datetime.strptime("2021-04-15 21:33:28", "%Y-%m-%d %H:%M:%S"),
+            "XETHZEUR",
+            "buy",
+            "limit",
+            "fciq",
+            2083.16,
+            0.00957589,
+            19.9481,
+            0.0519,
+            20.0,
+        )
+        order.txid = "OCYS4K-OILOE-36HPAE"
+        self.account.add_order(order, "ZEUR")
+        added_order = self.account.open_orders.get("OCYS4K-OILOE-36HPAE")
+        assert added_order.get("descr").get("pair") == "XETHZEUR"
+        assert added_order.get("vol") == "0.00957589"
+        assert added_order.get("userref") == order.userref
+        assert float(self.account.balance.get("ZEUR")) == pytest.approx(19.728)
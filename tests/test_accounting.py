@@ -0,0 +1,76 @@
+"""accounting.py tests module."""
+import pytest
+
+from krakendca.accounting import (
+    BudgetExceededError,
+    CallAccounting,
+    current_pair,
+    pair_context,
+    rate_limit_weight,
+)
+
+
+def test_rate_limit_weight() -> None:
+    assert rate_limit_weight("Ticker", True) == 0
+    assert rate_limit_weight("Balance", False) == 1
+    assert rate_limit_weight("ClosedOrders", False) == 2
+    assert rate_limit_weight("AddOrder", False) == 0
+
+
+def test_pair_context() -> None:
+    assert current_pair.get() is None
+    with pair_context("XETHZEUR"):
+        assert current_pair.get() == "XETHZEUR"
+    assert current_pair.get() is None
+
+
+class TestCallAccounting:
+    def setup(self) -> None:
+        self.accounting = CallAccounting()
+
+    def test_record(self) -> None:
+        self.accounting.record_call("Time", True)
+        with pair_context("XETHZEUR"):
+            self.accounting.record_call("ClosedOrders", False)
+            self.accounting.record_call("ClosedOrders", False)
+            self.accounting.record_call("AddOrder", False)
+        self.accounting.record_response("ClosedOrders", 1000)
+        self.accounting.record_response("Time", 50)
+        assert self.accounting.calls == 4
+        assert self.accounting.private_calls == 3
+        assert self.accounting.weight == 4
+        assert self.accounting.response_bytes == 1050
+        assert self.accounting.pairs == {"XETHZEUR": 3}
+        assert self.accounting.report() == (
+            "API calls: 4 (3 private, weight 4, 1050 bytes received).\n"
+            "  AddOrder: 1 calls, weight 0, 0 bytes.\n"
+            "  ClosedOrders: 2 calls, weight 4, 1000 bytes.\n"
+            "  Time: 1 calls, weight 0, 50 bytes.\n"
+            "  XETHZEUR: 3 calls."
+        )
+        self.accounting.reset()
+        assert self.accounting.calls == 0
+        assert self.accounting.pairs == {}
+
+    def test_budgets(self) -> None:
+        self.accounting.budgets = {"private_calls": 2, "pair_calls": 1}
+        self.accounting.record_call("Balance", False)
+        # Calls outside of a pair context are not pair calls.
+        self.accounting.record_call("Ticker", True)
+        with pair_context("XETHZEUR"):
+            self.accounting.record_call("Ticker", True)
+            with pytest.raises(BudgetExceededError) as e_info:
+                self.accounting.record_call("Ticker", True)
+        assert str(e_info.value) == (
+            "API budget of 1 pair_calls per run exceeded, Ticker not sent."
+        )
+        with pair_context("XXBTZEUR"):
+            self.accounting.record_call("OpenOrders", False)
+        with pytest.raises(BudgetExceededError):
+            self.accounting.record_call("Balance", False)
+        # Refused calls are not accounted.
+        assert self.accounting.calls == 4
+        self.accounting.budgets = {"weight": 3}
+        self.accounting.record_call("OpenOrders", False)
+        with pytest.raises(BudgetExceededError):
+            self.accounting.record_call("ClosedOrders", False)
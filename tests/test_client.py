@@ -0,0 +1,40 @@
+"""client.py tests module."""
+from krakenapi import KrakenApi
+
+from krakendca.client import KrakenClient
+from krakendca.coalescing import CoalescingKrakenApi
+from krakendca.config import Config
+from krakendca.nonce import NonceKrakenApi, default_nonce_filepath
+from krakendca.retry import RetryingKrakenApi
+from krakendca.signer import SigningKrakenApi
+
+
+class TestKrakenClient:
+    def test_from_config(self, tmp_path) -> None:
+        config = Config("tests/fixtures/config.yaml")
+        config.retry = {"public": {"max_attempts": 5}}
+        config.timeouts = {"Ticker": 5}
+        config.nonce_file = str(tmp_path / "kraken-dca.nonce")
+        ka = KrakenClient.from_config(config)
+        assert isinstance(ka, KrakenApi)
+        assert isinstance(ka, CoalescingKrakenApi)
+        assert isinstance(ka, NonceKrakenApi)
+        assert isinstance(ka, RetryingKrakenApi)
+        assert isinstance(ka, SigningKrakenApi)
+        assert ka.api_public_key == "KRAKEN_API_PUBLIC_KEY"
+        assert ka.api_private_key == "KRAKEN_API_PRIVATE_KEY"
+        assert ka.retry_policies["public"].max_attempts == 5
+        assert ka.retry_policies["public"].hedge is True
+        assert ka.retry_policies["private"].max_attempts == 3
+        assert ka.endpoint_timeouts == {"Ticker": 5}
+        assert ka.coalescer.statistics == {}
+        assert ka.nonce_allocator.filepath == config.nonce_file
+        assert ka.nonce_window == 0
+
+    def test_from_config_default_nonce_file(self) -> None:
+        config = Config("tests/fixtures/config.yaml")
+        ka = KrakenClient.from_config(config)
+        assert ka.nonce_allocator.filepath == default_nonce_filepath(
+            "KRAKEN_API_PUBLIC_KEY"
+        )
+        ka.nonce_allocator.close()
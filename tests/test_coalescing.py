@@ -0,0 +1,159 @@
+"""coalescing.py tests module."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+import vcr
+from krakenapi import KrakenApi
+
+from krakendca.coalescing import CoalescingKrakenApi, RequestCoalescer
+
+
+class TestRequestCoalescer:
+    coalescer: RequestCoalescer
+
+    def setup(self) -> None:
+        self.coalescer = RequestCoalescer({"Ticker": 2})
+
+    def test_coalesce_in_flight_requests(self) -> None:
+        sent = []
+        release = threading.Event()
+
+        def send() -> dict:
+            sent.append(1)
+            release.wait(5)
+            return {"XETHZEUR": {"a": ["2083.16"]}}
+
+        key = ("https://api.kraken.com/0/public/Time", None)
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [
+                executor.submit(self.coalescer.get, key, "Time", send)
+                for _ in range(5)
+            ]
+            # Wait for every request to be registered before answering.
+            while sum(self.coalescer.statistics["Time"].values()) < 5:
+                time.sleep(0.001)
+            release.set()
+            responses = [future.result() for future in futures]
+        assert len(sent) == 1
+        assert all(response == responses[0] for response in responses)
+        # Callers get their own copy of the response.
+        assert responses[0] is not responses[1]
+        assert self.coalescer.statistics == {
+            "Time": {"sent": 1, "coalesced": 4, "cached": 0}
+        }
+        assert self.coalescer.saved_requests == 4
+
+    def test_cache_ttl(self) -> None:
+        key = ("https://api.kraken.com/0/public/Ticker", b"pair=XETHZEUR")
+        responses = iter([{"price": 1}, {"price": 2}])
+        with patch("krakendca.coalescing.monotonic", return_value=100):
+            assert self.coalescer.get(key, "Ticker", responses.__next__) == {
+                "price": 1
+            }
+        with patch("krakendca.coalescing.monotonic", return_value=101.9):
+            assert self.coalescer.get(key, "Ticker", responses.__next__) == {
+                "price": 1
+            }
+        with patch("krakendca.coalescing.monotonic", return_value=102):
+            assert self.coalescer.get(key, "Ticker", responses.__next__) == {
+                "price": 2
+            }
+        assert self.coalescer.statistics["Ticker"] == {
+            "sent": 2,
+            "coalesced": 0,
+            "cached": 1,
+        }
+
+    def test_not_cached_endpoint(self) -> None:
+        key = ("https://api.kraken.com/0/public/Time", None)
+        responses = iter([{"unixtime": 1}, {"unixtime": 2}])
+        assert self.coalescer.get(key, "Time", responses.__next__) == {
+            "unixtime": 1
+        }
+        assert self.coalescer.get(key, "Time", responses.__next__) == {
+            "unixtime": 2
+        }
+
+    def test_error_not_cached(self) -> None:
+        key = ("https://api.kraken.com/0/public/Ticker", b"pair=Fake")
+
+        def send() -> dict:
+            raise ValueError("Kraken API error -> EQuery:Unknown asset pair")
+
+        with pytest.raises(ValueError):
+            self.coalescer.get(key, "Ticker", send)
+        assert self.coalescer.get(key, "Ticker", lambda: {"ok": 1}) == {
+            "ok": 1
+        }
+
+    def test_clear(self) -> None:
+        key = ("https://api.kraken.com/0/public/Ticker", b"pair=XETHZEUR")
+        self.coalescer.get(key, "Ticker", lambda: {"price": 1})
+        self.coalescer.clear()
+        assert self.coalescer.get(key, "Ticker", lambda: {"price": 2}) == {
+            "price": 2
+        }
+
+    def test_invalidate(self) -> None:
+        ticker = ("https://api.kraken.com/0/public/Ticker", b"pair=XETHZEUR")
+        assets = ("https://api.kraken.com/0/public/Assets", None)
+        self.coalescer.get(ticker, "Ticker", lambda: {"price": 1})
+        self.coalescer.cache_ttls["Assets"] = 3600
+        self.coalescer.get(assets, "Assets", lambda: {"assets": 1})
+        self.coalescer.invalidate("Ticker")
+        assert self.coalescer.get(ticker, "Ticker", lambda: {"price": 2}) == {
+            "price": 2
+        }
+        assert self.coalescer.statistics["Ticker"]["sent"] == 2
+        # Other endpoints responses are kept.
+        assert self.coalescer.get(assets, "Assets", lambda: {}) == {
+            "assets": 1
+        }
+
+    def test_log_statistics(self, logging_capture) -> None:
+        key = ("https://api.kraken.com/0/public/Ticker", b"pair=XETHZEUR")
+        self.coalescer.get(key, "Ticker", lambda: {"price": 1})
+        self.coalescer.get(key, "Ticker", lambda: {"price": 1})
+        self.coalescer.log_statistics()
+        assert logging_capture.read() == (
+            "Public requests saved by coalescing: 1.\n"
+            "  Ticker: 1 sent, 0 coalesced, 1 cached.\n"
+        )
+
+
+class TestCoalescingKrakenApi:
+    ka: CoalescingKrakenApi
+
+    def setup(self) -> None:
+        # Fake keys.
+        self.ka = CoalescingKrakenApi(
+            "R6/OvXmIQEv1E8nyJd7+a9Zmaf84yJ7uifwe2yj5BgV1N+lgqURsxQwQ",
+            "MWZ9lFF/mreK4Fdk/SEpFLvVn//nbKUbCytGShSwvCvYlgRkn4K8i7VY"
+            "18UQEgOHzBIEsqg78BZJCEhvFIzw1Q==",
+        )
+
+    def test_init(self) -> None:
+        assert isinstance(self.ka, KrakenApi)
+        assert isinstance(self.ka.coalescer, RequestCoalescer)
+        coalescer = RequestCoalescer()
+        ka = CoalescingKrakenApi(coalescer=coalescer)
+        assert ka.coalescer is coalescer
+
+    @vcr.use_cassette("tests/fixtures/vcr_cassettes/test_get_pair_ticker.yaml")
+    def test_public_request_cached(self) -> None:
+        ticker = self.ka.get_pair_ticker("XETHZEUR")
+        # Cassette only contains one request.
+        assert self.ka.get_pair_ticker("XETHZEUR") == ticker
+        assert self.ka.coalescer.statistics["Ticker"]["cached"] == 1
+
+    @vcr.use_cassette(
+        "tests/fixtures/vcr_cassettes/test_get_balance.yaml",
+        filter_headers=["API-Key", "API-Sign"],
+    )
+    def test_private_request_not_coalesced(self) -> None:
+        balance = self.ka.get_balance()
+        assert isinstance(balance, dict)
+        assert self.ka.coalescer.statistics == {}
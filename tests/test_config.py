@@ -62,6 +62,20 @@ def test_config_properties() -> None:
     assert config.api_private_key == "KRAKEN_API_PRIVATE_KEY"
     assert type(config.dca_pairs) == list
     assert len(config.dca_pairs) == 2
+    assert config.retry == {}
+    assert config.shared_cache is None
+    assert config.order_store is None
+    assert config.nonce_file is None
+    assert config.nonce_window == 0
+    assert config.order_feed is False
+    assert config.snapshot is None
+    assert config.ohlc_store is None
+    assert config.strategy_state == "strategy_state.json"
+    assert config.reprice_state == "reprice_state.json"
+    assert config.metrics_port is None
+    assert config.api_budget == {}
+    assert config.run_deadline is None
+    assert config.timeouts == {}
     assert_dca_pair(config.dca_pairs[0], "XETHZEUR", 1, 15, 0.985, 2900.10)
     assert_dca_pair(
         config.dca_pairs[1], "XXBTZEUR", 3, 20, ignore_differing_orders=True
@@ -128,6 +142,163 @@ class TestConfig:
         e_info: str = mock_config_error(bad_config, ValueError)
         assert "No DCA pairs specified." in e_info
 
+    def test_shared_cache_is_not_a_path(self) -> None:
+        """Test shared_cache is not a file path."""
+        bad_config: str = self.config + "shared_cache: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "shared_cache must be a file path." in e_info
+
+    def test_order_store_is_not_a_path(self) -> None:
+        """Test order_store is not a file path."""
+        bad_config: str = self.config + "order_store: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "order_store must be a file path." in e_info
+
+    def test_nonce_file_is_not_a_path(self) -> None:
+        """Test nonce_file is not a file path."""
+        bad_config: str = self.config + "nonce_file: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "nonce_file must be a file path." in e_info
+
+    def test_snapshot_is_not_a_path(self) -> None:
+        """Test snapshot is not a file path."""
+        bad_config: str = self.config + "snapshot: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "snapshot must be a file path." in e_info
+
+    def test_ohlc_store_is_not_a_path(self) -> None:
+        """Test ohlc_store is not a directory path."""
+        bad_config: str = self.config + "ohlc_store: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "ohlc_store must be a directory path." in e_info
+
+    def test_nonce_window_is_negative(self) -> None:
+        """Test nonce_window is negative."""
+        bad_config: str = self.config + "nonce_window: -1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "nonce_window must be a positive integer or 0." in e_info
+
+    def test_order_feed_is_not_a_boolean(self) -> None:
+        """Test order_feed is not a boolean."""
+        bad_config: str = self.config + "order_feed: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "order_feed must be a boolean." in e_info
+
+    def test_run_deadline_is_not_positive(self) -> None:
+        """Test run_deadline is not a number > 0."""
+        bad_config: str = self.config + "run_deadline: 0\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "run_deadline must be a number > 0." in e_info
+
+    def test_timeouts_are_not_positive(self) -> None:
+        """Test timeouts are not numbers > 0."""
+        bad_config: str = self.config + "timeouts:\n  Ticker: -1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert (
+            "timeouts must be a dictionary of numbers > 0 per endpoint."
+            in e_info
+        )
+
+    def test_metrics_port_out_of_range(self) -> None:
+        """Test metrics_port is not an integer between 1 and 65535."""
+        bad_config: str = self.config + "metrics_port: 70000\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "metrics_port must be an integer between 1 and 65535." in e_info
+
+    def test_api_budget(self) -> None:
+        """Test api_budget names and values."""
+        bad_config: str = self.config + "api_budget:\n  calls_per_pair: 5\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert (
+            "api_budget must be one of calls, private_calls, pair_calls, "
+            "weight." in e_info
+        )
+        bad_config = self.config + "api_budget:\n  private_calls: 0\n"
+        e_info = mock_config_error(bad_config, ValueError)
+        assert "api_budget private_calls must be an integer > 0." in e_info
+
+    def test_notifications(self) -> None:
+        """Test notifications sinks and events."""
+        bad_config: str = self.config + "notifications:\n  events: [order]\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "notifications must set a webhook or smtp sink." in e_info
+        webhook: str = "notifications:\n  webhook:\n    url: http://hook\n"
+        bad_config = self.config + webhook + "  events: [trade]\n"
+        e_info = mock_config_error(bad_config, ValueError)
+        assert (
+            "notifications events must be a list of order, fill, error."
+            in e_info
+        )
+        bad_config = self.config + "notifications:\n  smtp:\n    port: 25\n"
+        e_info = mock_config_error(bad_config, ValueError)
+        assert (
+            "notifications smtp must set a host, sender and recipients list."
+            in e_info
+        )
+
+    def test_ladder_orders_out_of_range(self) -> None:
+        """Test ladder_orders is not an integer between 1 and 15."""
+        bad_config: str = self.config.replace(
+            "amount: 20", "amount: 20\n    ladder_orders: 16"
+        )
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "ladder_orders must be an integer between 1 and 15." in e_info
+
+    def test_ladder_range_out_of_range(self) -> None:
+        """Test ladder_range is not a number in ]0, 1[."""
+        bad_config: str = self.config.replace(
+            "amount: 20", "amount: 20\n    ladder_range: 1"
+        )
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "ladder_range must be a number in ]0, 1[." in e_info
+
+    def test_reprice_after_cancel_after(self) -> None:
+        """Test reprice_after and cancel_after are numbers of minutes > 0."""
+        for parameter in ("reprice_after", "cancel_after"):
+            bad_config: str = self.config.replace(
+                "amount: 20", f"amount: 20\n    {parameter}: 0"
+            )
+            e_info: str = mock_config_error(bad_config, ValueError)
+            assert f"{parameter} must be a number of minutes > 0." in e_info
+
+    def test_amount_strategy(self) -> None:
+        """Test amount_strategy type and parameters."""
+        config: str = self.config.replace(
+            "amount: 20",
+            "amount: 20\n    amount_strategy:\n"
+            "      type: moving_average\n      days: 200",
+        )
+        bad_config: str = config.replace("moving_average", "momentum")
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert (
+            "amount_strategy type must be one of moving_average, "
+            "value_averaging, volatility." in e_info
+        )
+        bad_config = config.replace("days: 200", "days: 1.5")
+        e_info = mock_config_error(bad_config, ValueError)
+        assert "amount_strategy days must be an integer > 0." in e_info
+        bad_config = config.replace("days: 200", "multiplier: 0")
+        e_info = mock_config_error(bad_config, ValueError)
+        assert "amount_strategy multiplier must be a number > 0." in e_info
+        bad_config = config.replace("days: 200", "target_volatility: 1")
+        e_info = mock_config_error(bad_config, ValueError)
+        assert (
+            "Unknown moving_average amount_strategy parameter: "
+            "target_volatility." in e_info
+        )
+
+    def test_strategy_state_is_not_a_path(self) -> None:
+        """Test strategy_state is not a file path."""
+        bad_config: str = self.config + "strategy_state: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "strategy_state must be a file path." in e_info
+
+    def test_reprice_state_is_not_a_path(self) -> None:
+        """Test reprice_state is not a file path."""
+        bad_config: str = self.config + "reprice_state: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "reprice_state must be a file path." in e_info
+
     def test_missing_pair_name(self) -> None:
         """Test missing pair name."""
         bad_config: str = self.config.replace('pair: "XETHZEUR"', "")
@@ -195,3 +366,60 @@ class TestConfig:
         )
         e_info: str = mock_config_error(bad_config, ValueError)
         assert "ignore_differing_orders must be a boolean." in e_info
+
+    def test_depth_pricing_is_not_boolean(self) -> None:
+        """Test depth_pricing is not boolean."""
+        bad_config: str = self.config.replace(
+            "ignore_differing_orders: True", "depth_pricing: error"
+        )
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "depth_pricing must be a boolean." in e_info
+
+    def test_retry(self) -> None:
+        """Test retry policies configuration."""
+        retry_config: str = self.config + (
+            "retry:\n"
+            "  public:\n"
+            "    max_attempts: 5\n"
+            "    hedge: False\n"
+            "  private:\n"
+            "    base_delay: 0.2\n"
+        )
+        mock_file = mock.mock_open(read_data=retry_config)
+        with mock.patch("builtins.open", mock_file):
+            config = Config("config-sample.yaml")
+        assert config.retry == {
+            "public": {"max_attempts": 5, "hedge": False},
+            "private": {"base_delay": 0.2},
+        }
+
+    def test_retry_unknown_endpoint_class(self) -> None:
+        """Test retry with unknown endpoint class."""
+        bad_config: str = self.config + "retry:\n  orders:\n    hedge: 1\n"
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert (
+            "retry endpoint class must be one of public, private, write."
+            in e_info
+        )
+
+    def test_retry_bad_parameters(self) -> None:
+        """Test retry with incorrect parameters."""
+        for policy, error in [
+            ("max_attempts: 0", "retry max_attempts must be an integer > 0."),
+            ("hedge: 1", "retry hedge must be a boolean."),
+            ("timeout: -1", "retry timeout must be a number > 0."),
+            ("retries: 1", "Unknown retry parameter: retries."),
+        ]:
+            bad_config: str = (
+                self.config + f"retry:\n  public:\n    {policy}\n"
+            )
+            e_info: str = mock_config_error(bad_config, ValueError)
+            assert error in e_info
+
+    def test_retry_write_requests(self) -> None:
+        """Test write requests can't be retried."""
+        bad_config: str = (
+            self.config + "retry:\n  write:\n    max_attempts: 2\n"
+        )
+        e_info: str = mock_config_error(bad_config, ValueError)
+        assert "write requests can't be retried or hedged." in e_info
@@ -1,16 +1,26 @@
 """dca.py tests module."""
 import os
 from datetime import datetime
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 import vcr
 from freezegun import freeze_time
 from krakenapi import KrakenApi
 
+from krakendca.account import Account
+from krakendca.accounting import BudgetExceededError, CallAccounting
 from krakendca.dca import DCA
-from krakendca.order import Order
+from krakendca.notifications import Notifier
+from krakendca.order import Order, OrderLadder
+from krakendca.order_book import OrderBook
+from krakendca.order_feed import OrderState
+from krakendca.order_store import OrderStore
 from krakendca.pair import Pair
+from krakendca.retry import RetryingKrakenApi
+from krakendca.shared_cache import SharedCache
+from krakendca.strategy import MovingAverageStrategy, ValueAveragingStrategy
+from krakendca.utils import pair_userref
 
 
 class TestDCA:
@@ -73,6 +83,49 @@ class TestDCA:
         os.remove(self.test_orders_filepath)
         assert captured == test_output
 
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_handle_dca_logic_api_budget(self, tmp_path):
+        """Test calls sent to Kraken stay within the per-run budget."""
+        self.dca.orders_filepath = str(tmp_path / "orders.csv")
+        self.dca.ka = RetryingKrakenApi(
+            self.dca.ka.api_public_key, self.dca.ka.api_private_key
+        )
+        accounting = CallAccounting(
+            {"calls": 10, "private_calls": 8, "pair_calls": 10, "weight": 10}
+        )
+        self.dca.ka.accounting = accounting
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_dca_logic.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ):
+            self.dca.handle_dca_logic()
+        assert {
+            endpoint: calls.calls
+            for endpoint, calls in accounting.endpoints.items()
+        } == {
+            "Time": 1,
+            "TradeBalance": 1,
+            "Balance": 1,
+            "OpenOrders": 2,
+            "ClosedOrders": 3,
+            "Ticker": 1,
+            "AddOrder": 1,
+        }
+        assert accounting.pairs == {"XETHZEUR": 10}
+        assert accounting.response_bytes > 0
+        # One more call fails the pair before its order is sent.
+        accounting.reset()
+        accounting.budgets = {"pair_calls": 9}
+        self.dca.last_order_unix = None
+        self.dca.tagged_orders_seen = False
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_dca_logic.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ):
+            with pytest.raises(BudgetExceededError) as e_info:
+                self.dca.handle_dca_logic()
+        assert "AddOrder not sent" in str(e_info.value)
+
     @freeze_time("2021-04-16 18:54:53.069731")
     def test_handle_dca_logic_error(self, logging_capture):
         """Test execution while already DCA."""
@@ -90,6 +143,7 @@ class TestDCA:
             "No DCA for XETHZEUR: Already placed an order today.\n"
         )
         assert captured == test_output
+        assert self.dca.rejection == "Already placed an order today."
 
     @freeze_time("2021-04-15 21:33:28.069731")
     def test_handle_dca_logic_ignore_other_orders(self, logging_capture):
@@ -127,6 +181,86 @@ class TestDCA:
         )
         assert captured == test_output
 
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_handle_dca_logic_with_account(self, logging_capture, tmp_path):
+        """Test execution with account data shared between pairs."""
+        self.dca.orders_filepath = str(tmp_path / "orders.csv")
+        account = Account(
+            1618522408,
+            {"eb": "1650.3006"},
+            {"ZEUR": "39.728", "XETH": "0.109598362"},
+            {},
+            {},
+            1618358400,
+        )
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_dca_logic.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ) as cassette:
+            self.dca.handle_dca_logic(account)
+        # Only ticker and order creation are requested.
+        assert [
+            cassette.requests[index].path for index in cassette.play_counts
+        ] == [
+            "/0/public/Ticker",
+            "/0/private/AddOrder",
+        ]
+        captured = logging_capture.read()
+        assert "Pair balances: 39.728 ZEUR, 0.109598362 XETH." in captured
+        assert "TXID: OCYS4K-OILOE-36HPAE" in captured
+        # Sent order is added to the shared account data.
+        assert "OCYS4K-OILOE-36HPAE" in account.open_orders
+        assert float(account.balance.get("ZEUR")) == pytest.approx(19.728)
+        assert self.dca.count_pair_daily_orders(account) == 1
+
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_handle_dca_logic_order_store(self, logging_capture, tmp_path):
+        """Test orders saved to and checked from the order store."""
+        self.dca.orders_filepath = str(tmp_path / "orders.csv")
+        self.dca.order_store = OrderStore(str(tmp_path / "orders.db"))
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_dca_logic.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ):
+            self.dca.handle_dca_logic()
+        assert not os.path.exists(self.dca.orders_filepath)
+        order = self.dca.order_store.last_order("XETHZEUR")
+        assert order.txid == "OCYS4K-OILOE-36HPAE"
+        assert "Order information saved to the order store." in (
+            logging_capture.read()
+        )
+        # Stored order found without requesting Kraken orders.
+        account = Account(1618522408, {}, {"ZEUR": "40"}, {}, {}, 0)
+        with patch.object(DCA, "count_pair_daily_orders") as count_orders:
+            assert self.dca.plan_order(account) is None
+        count_orders.assert_not_called()
+        assert self.dca.rejection == "Already placed an order today."
+        self.dca.order_store.close()
+
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_handle_dca_logic_notifications(self, tmp_path):
+        """Test sent orders and errors are notified."""
+        self.dca.orders_filepath = str(tmp_path / "orders.csv")
+        self.dca.notifier = MagicMock(spec=Notifier)
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_dca_logic.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ):
+            self.dca.handle_dca_logic()
+        self.dca.notifier.notify.assert_called_once_with(
+            "order",
+            "XETHZEUR order sent: buy 0.00957589 ETHEUR @ limit 2083.16, "
+            "20.0ZEUR (OCYS4K-OILOE-36HPAE).",
+        )
+        with patch.object(
+            DCA, "plan_order", side_effect=ValueError("No pair balance.")
+        ):
+            with pytest.raises(ValueError):
+                self.dca.handle_dca_logic()
+        self.dca.notifier.notify.assert_called_with(
+            "error", "DCA XETHZEUR failed: No pair balance."
+        )
+
     def test_get_system_time(self):
         """Test with system time in the past."""
         with freeze_time("2012-01-13 23:10:34.069731"):
@@ -203,6 +337,120 @@ class TestDCA:
         assert type(order_count) == int
         assert order_count == 1
 
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_count_pair_daily_orders_tagged(self):
+        userref = pair_userref("XETHZEUR")
+        account = Account(
+            1618522408,
+            {},
+            {},
+            {"O1": {"userref": userref}, "O2": {"userref": 0}},
+            {"O3": {"userref": userref, "opentm": 1618444800.5}},
+            1618358400,
+            [userref],
+        )
+        with patch.object(Account, "has_tagged_orders") as has_tagged_orders:
+            # Manual orders of the pair are not counted.
+            assert self.dca.count_pair_daily_orders(account) == 2
+        has_tagged_orders.assert_not_called()
+        # Last order kept for the snapshot.
+        assert self.dca.last_order_unix == 1618444800.5
+        assert self.dca.has_recent_order() is True
+
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_count_pair_daily_orders_edited(self):
+        userref = pair_userref("XETHZEUR")
+        account = Account(
+            1618522408,
+            {},
+            {},
+            {},
+            {"O1-EDITED": {"userref": userref, "opentm": 1618444800.5}},
+            1618358400,
+            [userref],
+        )
+        # Order opened the day before, repriced today.
+        self.dca.opened_at = {"O1-EDITED": 1618437600.5}
+        with patch.object(Account, "has_tagged_orders", return_value=True):
+            assert self.dca.count_pair_daily_orders(account) == 0
+        assert self.dca.has_recent_order() is False
+
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_count_pair_daily_orders_legacy(self):
+        userref = pair_userref("XETHZEUR")
+        account = Account(1618522408, {}, {}, {}, {}, 1618358400, [userref])
+        untagged_orders = (
+            {"O1": {"userref": 0, "descr": {"pair": "ETHEUR"}}},
+            {"O2": {"opentm": 1618444800.5, "descr": {"pair": "ETHEUR"}}},
+        )
+        with patch.object(
+            Account, "get_untagged_orders", return_value=untagged_orders
+        ), patch.object(Account, "has_tagged_orders", return_value=False):
+            # Untagged orders counted until a first tagged order.
+            assert self.dca.count_pair_daily_orders(account) == 2
+        with patch.object(
+            Account, "get_untagged_orders", return_value=untagged_orders
+        ), patch.object(Account, "has_tagged_orders", return_value=True):
+            assert self.dca.count_pair_daily_orders(account) == 0
+
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_count_pair_daily_orders_tagged_seen(self):
+        userref = pair_userref("XETHZEUR")
+        account = Account(1618522408, {}, {}, {}, {}, 1618358400, [userref])
+        with patch.object(
+            Account, "has_tagged_orders", return_value=True
+        ) as has_tagged_orders, patch.object(
+            Account, "get_untagged_orders"
+        ) as get_untagged_orders:
+            assert self.dca.count_pair_daily_orders(account) == 0
+            assert self.dca.count_pair_daily_orders(account) == 0
+        # Requested until a tagged order is seen only.
+        has_tagged_orders.assert_called_once()
+        get_untagged_orders.assert_not_called()
+        assert self.dca.tagged_orders_seen is True
+
+    @freeze_time("2021-04-15 21:33:28.069731")
+    def test_count_pair_daily_orders_order_feed(self):
+        userref = pair_userref("XETHZEUR")
+        account = Account(1618522408, {}, {}, {}, {}, 1618358400, [userref])
+        self.dca.order_feed = MagicMock(live=True, state=OrderState([userref]))
+        self.dca.order_feed.state.add_orders(
+            {
+                "O1": {"userref": userref, "opentm": "1618358400.5"},
+                "O2": {"userref": userref, "opentm": "1618444800.5"},
+            }
+        )
+        with patch.object(
+            Account, "get_untagged_orders"
+        ) as get_untagged_orders, patch.object(
+            Account, "has_tagged_orders"
+        ) as has_tagged_orders:
+            # Counted from the order feed state without any request.
+            assert self.dca.count_pair_daily_orders(account) == 1
+            self.dca.order_feed.state.reset({}, set())
+            assert self.dca.count_pair_daily_orders(account) == 0
+        get_untagged_orders.assert_not_called()
+        has_tagged_orders.assert_not_called()
+        # Untagged orders counted until a first tagged order.
+        self.dca.order_feed.state = OrderState([userref])
+        self.dca.tagged_orders_seen = False
+        untagged_orders = (
+            {"O3": {"userref": 0, "descr": {"pair": "ETHEUR"}}},
+            {},
+        )
+        with patch.object(
+            Account, "get_untagged_orders", return_value=untagged_orders
+        ) as get_untagged_orders:
+            assert self.dca.count_pair_daily_orders(account) == 1
+            # Kept in the feed state until an untagged order is seen.
+            assert self.dca.count_pair_daily_orders(account) == 1
+            assert get_untagged_orders.call_count == 1
+            self.dca.order_feed.state.add_orders(
+                {"O4": {"userref": 0, "opentm": "1618522400.5"}}
+            )
+            assert self.dca.count_pair_daily_orders(account) == 1
+            assert get_untagged_orders.call_count == 2
+
     def test_extract_pair_orders(self):
         # Pairs orders dictionary
         orders = {
@@ -337,6 +585,159 @@ class TestDCA:
         )
         assert captured == test_output
 
+    def test_price_order_ladder(self, logging_capture):
+        self.dca.ladder_orders = 4
+        self.dca.ladder_range = 0.02
+        self.dca.amount = 50
+        date = datetime(2021, 4, 15, 21, 33, 28)
+        ladder = self.dca.price_order(date, 2000)
+        assert isinstance(ladder, OrderLadder)
+        assert [order.pair_price for order in ladder.orders] == [
+            2000,
+            1986.67,
+            1973.33,
+            1960.0,
+        ]
+        # Fewer orders for each one to reach the pair minimum volume.
+        self.dca.amount = 30
+        ladder = self.dca.price_order(date, 2000)
+        assert len(ladder.orders) == 2
+        assert (
+            "Ladder reduced to 2 orders for the 0.005XETH minimum volume."
+            in (logging_capture.read())
+        )
+        # Single order if two orders would be too low.
+        self.dca.amount = 20
+        assert isinstance(self.dca.price_order(date, 2000), Order)
+
+    def test_apply_order_ladder(self, tmp_path):
+        self.dca.ladder_orders = 2
+        self.dca.amount = 40
+        self.dca.order_store = OrderStore(str(tmp_path / "orders.db"))
+        ladder = self.dca.price_order(datetime(2021, 4, 15, 21, 33, 28), 2000)
+        account = Account(1618522408, {}, {"ZEUR": "50"}, {}, {}, 0)
+        response = {
+            "orders": [
+                {"txid": "O1", "descr": {"order": "buy 1"}},
+                {"txid": "O2", "descr": {"order": "buy 2"}},
+            ]
+        }
+        with patch.object(
+            self.dca.ka, "send_api_request", return_value=response
+        ) as send_api_request:
+            self.dca.apply_order(ladder, account)
+        # Every ladder order sent in one request, and journaled.
+        send_api_request.assert_called_once()
+        assert send_api_request.call_args.args[0].full_url.endswith(
+            "/AddOrderBatch"
+        )
+        assert sorted(account.open_orders) == ["O1", "O2"]
+        assert float(account.balance["ZEUR"]) == pytest.approx(
+            50 - ladder.total_price
+        )
+        orders = self.dca.order_store.get_orders("XETHZEUR")
+        assert sorted(order.txid for order in orders) == ["O1", "O2"]
+        self.dca.order_store.close()
+
+    def test_price_order_amount_strategy(self, logging_capture, tmp_path):
+        self.dca.orders_filepath = str(tmp_path / "orders.csv")
+        self.dca.amount_strategy = MovingAverageStrategy(days=2)
+        self.dca.amount_strategy.load_state(
+            {"day": 18731, "price": 2500, "prices": []}
+        )
+        order = self.dca.price_order(datetime(2021, 4, 15, 21, 33, 28), 2000)
+        # 10% below the 2250 average.
+        assert order.total_price == pytest.approx(20 * (1 + 5 / 9), abs=0.01)
+        assert (
+            "moving_average amount strategy: 31.1111ZEUR instead of "
+            "20.0ZEUR." in logging_capture.read()
+        )
+        # Sent order pending for the strategy.
+        self.dca.amount_strategy = ValueAveragingStrategy()
+        self.dca.amount_strategy.load_state({"start_day": 18732})
+        order = self.dca.price_order(datetime(2021, 4, 15, 21, 33, 28), 2000)
+        with patch.object(
+            self.dca.ka,
+            "send_api_request",
+            return_value={"txid": ["O1"], "descr": {"order": "buy"}},
+        ):
+            self.dca.apply_order(order)
+        assert self.dca.amount_strategy.orders == {"O1": order.volume}
+        # Bought value above the target.
+        date = datetime(2021, 4, 15, 22, 33, 28)
+        assert self.dca.price_order(date, 2100) is None
+        assert self.dca.rejection == "Amount strategy order amount is 0."
+
+    @freeze_time("2021-04-15 21:33:28")
+    def test_plan_order_amount_strategy(self):
+        userref = pair_userref("XETHZEUR")
+        account = Account(
+            1618522408,
+            {"eb": "100"},
+            {"ZEUR": "25"},
+            {"O1": {"userref": userref, "opentm": 1618444800.5}},
+            {},
+            1618358400,
+            [userref],
+        )
+        self.dca.amount_strategy = MovingAverageStrategy(days=2)
+        self.dca.amount_strategy.load_state(
+            {"day": 18731, "price": 2500, "prices": []}
+        )
+        # Price recorded even if already placed an order today.
+        assert self.dca.plan_order(account, 2000) is None
+        assert self.dca.amount_strategy.get_state()["day"] == 18732
+        assert self.dca.amount_strategy.close_day == 18731
+        # Balance checked against the strategy amount ordered.
+        account.open_orders = {}
+        self.dca.last_order_unix = None
+        self.dca.tagged_orders_seen = True
+        with pytest.raises(ValueError) as e_info:
+            self.dca.plan_order(account, 2000)
+        assert "Insufficient funds to buy 31.1" in str(e_info.value)
+        # Lower than the DCA amount.
+        self.dca.amount_strategy = ValueAveragingStrategy()
+        self.dca.amount_strategy.load_state(
+            {"start_day": 18732, "volume": 0.005}
+        )
+        account.balance["ZEUR"] = "15"
+        order = self.dca.plan_order(account, 2000)
+        assert order.total_price == pytest.approx(10, abs=0.01)
+
+    def test_settle_strategy_orders(self):
+        account = Account(
+            1618522408,
+            {"eb": "100"},
+            {"ZEUR": "25"},
+            {"O1": {"status": "open", "vol_exec": "0"}},
+            {"O2": {"status": "closed", "vol_exec": "0.005"}},
+            1618358400,
+        )
+        self.dca.amount_strategy = ValueAveragingStrategy()
+        self.dca.amount_strategy.load_state(
+            {"orders": {"O1": 0.01, "O2": 0.005, "O3": 0.01, "O4": 0.01}}
+        )
+        response = {
+            "O3": {"status": "canceled", "vol_exec": "0.002"},
+            "O4": {"status": "pending", "vol_exec": "0"},
+        }
+        with patch.object(
+            self.dca.ka, "send_api_request", return_value=response
+        ) as send_api_request:
+            self.dca.settle_strategy_orders(account)
+        # Only the orders missing from the account are requested.
+        request = send_api_request.call_args[0][0]
+        assert request.full_url.endswith("/QueryOrders")
+        assert request.data.startswith(b"txid=O3,O4&")
+        assert self.dca.amount_strategy.pending_orders() == ["O1", "O4"]
+        assert self.dca.amount_strategy.volume == pytest.approx(0.007)
+        # Left pending on request failure.
+        with patch.object(
+            self.dca.ka, "send_api_request", side_effect=OSError("timeout")
+        ):
+            self.dca.settle_strategy_orders()
+        assert self.dca.amount_strategy.pending_orders() == ["O1", "O4"]
+
     @vcr.use_cassette("tests/fixtures/vcr_cassettes/test_limit_factor.yaml")
     def test_limit_factor(self):
         self.dca.limit_factor = 0.9
@@ -345,3 +746,55 @@ class TestDCA:
         assert self.dca.get_limit_price(3896.01, 1) == 3896.01
         self.dca.limit_factor = 0.98
         assert self.dca.get_limit_price(3896.01, 1) == 3818.1
+
+    def test_get_pair_ask_price_depth_pricing(self, logging_capture):
+        self.dca.depth_pricing = True
+        self.dca.order_book = OrderBook("XETHZEUR", "ETH/EUR")
+        self.dca.order_book.load_snapshot(
+            [["2083.16000", "0.00500000"], ["2083.50000", "1.00000000"]],
+            [["2082.90000", "1.00000000"]],
+        )
+        with patch.object(Pair, "get_pair_ask_price") as get_pair_ask_price:
+            assert self.dca.get_pair_ask_price() == 2083.5
+        get_pair_ask_price.assert_not_called()
+        assert logging_capture.read() == (
+            "Current XETHZEUR price to fill 20.0ZEUR: 2083.5 (average "
+            "2083.32).\n"
+        )
+        assert str(self.dca).endswith(", depth_pricing")
+
+    def test_price_order_depth_pricing_amount_strategy(self, logging_capture):
+        self.dca.depth_pricing = True
+        self.dca.order_book = OrderBook("XETHZEUR", "ETH/EUR")
+        self.dca.order_book.load_snapshot(
+            [
+                ["2083.16000", "0.00500000"],
+                ["2083.50000", "0.00500000"],
+                ["2090.00000", "1.00000000"],
+            ],
+            [["2082.90000", "1.00000000"]],
+        )
+        self.dca.amount_strategy = MovingAverageStrategy(days=2)
+        self.dca.amount_strategy.load_state(
+            {"day": 18731, "price": 2500, "prices": []}
+        )
+        order = self.dca.price_order(datetime(2021, 4, 15, 21, 33, 28))
+        # Priced from the depth needed to fill the strategy amount.
+        assert order.total_price > 20.84
+        assert order.pair_price == 2090
+        assert (
+            "Current XETHZEUR price to fill 29.0869ZEUR: 2090.0"
+            in logging_capture.read()
+        )
+
+    def test_get_pair_ask_price_shared_cache(self, tmp_path):
+        self.dca.shared_cache = SharedCache(str(tmp_path / "kraken-dca.cache"))
+        with patch.object(
+            KrakenApi,
+            "get_pair_ticker",
+            return_value={"XETHZEUR": {"a": ["2083.16"], "b": ["2082.9"]}},
+        ) as get_pair_ticker:
+            assert self.dca.get_pair_ask_price() == 2083.16
+            assert self.dca.get_pair_ask_price() == 2083.16
+        get_pair_ticker.assert_called_once_with("XETHZEUR")
+        self.dca.shared_cache.close()
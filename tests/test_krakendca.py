@@ -1,11 +1,27 @@
 """krakendca.py tests module."""
+from unittest.mock import MagicMock, patch
+
+import pytest
 import vcr
 from freezegun import freeze_time
 from krakenapi import KrakenApi
 
 from krakendca.config import Config
+from krakendca.client import KrakenClient
 from krakendca.dca import DCA
 from krakendca.krakendca import KrakenDCA
+from krakendca.notifications import Notifier
+from krakendca.order_book import OrderBook, OrderBookFeed
+from krakendca.order_feed import OrderFeed, OrderState
+from krakendca.retry import DeadlineExceededError, RetryingKrakenApi
+from krakendca.shared_cache import SharedCache
+from krakendca.snapshot import Snapshot
+from krakendca.strategy import (
+    MovingAverageStrategy,
+    load_states,
+    save_states,
+)
+from krakendca.utils import pair_userref
 
 
 class TestKrakenDCA:
@@ -90,6 +106,224 @@ class TestKrakenDCA:
             quote_decimals=4,
         )
 
+    @vcr.use_cassette(
+        "tests/fixtures/vcr_cassettes/test_krakendca_setup.yaml",
+        filter_headers=["API-Key", "API-Sign"],
+    )
+    def test_initialize_pairs_dca_shared_cache(self, tmp_path) -> None:
+        self.config.shared_cache = str(tmp_path / "kraken-dca.cache")
+        kdca = KrakenDCA(self.config, self.ka)
+        kdca.initialize_pairs_dca()
+        assert kdca.dcas_list[0].shared_cache is kdca.shared_cache
+        self.assert_kdca_pair(
+            dca_pair=kdca.dcas_list[1],
+            amount=20.0,
+            delay=3,
+            alt_name="XBTEUR",
+            base="XXBT",
+            lot_decimals=8,
+            name="XXBTZEUR",
+            order_min=0.0001,
+            pair_decimals=1,
+            quote="ZEUR",
+            quote_decimals=4,
+        )
+        # Pairs read from the shared cache by the next processes.
+        kdca = KrakenDCA(self.config, self.ka)
+        with patch.object(SharedCache, "refresh_pairs") as refresh_pairs:
+            kdca.initialize_pairs_dca()
+        refresh_pairs.assert_not_called()
+        assert kdca.dcas_list[0].pair.ws_name == "ETH/EUR"
+
+    @freeze_time("2021-09-12 19:50:08")
+    def test_initialize_pairs_dca_order_feed(self) -> None:
+        self.config.order_feed = True
+        kdca = KrakenDCA(self.config, self.ka)
+        pairs = {dca.pair.name: dca.pair for dca in self.kdca.dcas_list}
+        with patch.object(KrakenDCA, "get_pairs", return_value=pairs):
+            kdca.initialize_pairs_dca()
+        assert isinstance(kdca.order_feed, OrderFeed)
+        assert kdca.order_feed.state.userrefs == [
+            pair_userref("XETHZEUR"),
+            pair_userref("XXBTZEUR"),
+        ]
+        assert all(dca.order_feed is kdca.order_feed for dca in kdca.dcas_list)
+        # Closed orders needed since the longest pair delay.
+        assert kdca.order_feed.closed_orders_start() == 1631232000
+
+    def test_initialize_pairs_dca_snapshot(self, tmp_path) -> None:
+        pairs = {dca.pair.name: dca.pair for dca in self.kdca.dcas_list}
+        self.config.snapshot = str(tmp_path / "snapshot")
+        Snapshot(
+            pairs, {"XETHZEUR": 1631318400.5}, 0.4, tagged_pairs={"XXBTZEUR"}
+        ).save(self.config.snapshot, self.config.api_public_key)
+        kdca = KrakenDCA(self.config, self.ka)
+        # Pairs are not requested.
+        with patch.object(KrakenApi, "get_asset_pairs") as get_asset_pairs:
+            kdca.initialize_pairs_dca()
+        get_asset_pairs.assert_not_called()
+        assert kdca.clock_offset == 0.4
+        assert [dca.pair.name for dca in kdca.dcas_list] == list(pairs)
+        assert kdca.dcas_list[0].last_order_unix == 1631318400.5
+        assert kdca.dcas_list[1].last_order_unix is None
+        assert kdca.dcas_list[0].tagged_orders_seen is False
+        assert kdca.dcas_list[1].tagged_orders_seen is True
+
+    def test_initialize_pairs_dca_amount_strategy(self, tmp_path) -> None:
+        pairs = {dca.pair.name: dca.pair for dca in self.kdca.dcas_list}
+        self.config.strategy_state = str(tmp_path / "strategy_state.json")
+        self.config.dca_pairs[0]["amount_strategy"] = {
+            "type": "moving_average",
+            "days": 3,
+        }
+        state = {
+            "day": 18881,
+            "price": 2800.0,
+            "close_day": 18880,
+            "prices": [2700.0],
+        }
+        save_states(self.config.strategy_state, {"XETHZEUR": state})
+        kdca = KrakenDCA(self.config, self.ka)
+        with patch.object(KrakenDCA, "get_pairs", return_value=pairs):
+            kdca.initialize_pairs_dca()
+        strategy = kdca.dcas_list[0].amount_strategy
+        assert isinstance(strategy, MovingAverageStrategy)
+        assert strategy.days == 3
+        assert strategy.get_state() == state
+        assert kdca.dcas_list[1].amount_strategy is None
+        # Indicators saved after the run.
+        strategy.get_amount(15, 2600, 18882)
+        with patch.object(KrakenDCA, "plan_pairs_dca"):
+            with patch.object(KrakenDCA, "apply_plan"):
+                kdca.handle_pairs_dca()
+        assert load_states(self.config.strategy_state) == {
+            "XETHZEUR": {
+                "day": 18882,
+                "price": 2600,
+                "close_day": 18881,
+                "prices": [2700.0, 2800.0],
+            }
+        }
+
+    def test_handle_pairs_dca_snapshot(
+        self, tmp_path, logging_capture
+    ) -> None:
+        self.config.snapshot = str(tmp_path / "snapshot")
+        self.kdca.clock_offset = 0.4
+        # Orders within the pairs delays.
+        self.kdca.dcas_list[0].last_order_unix = 1631318400.5
+        self.kdca.dcas_list[1].last_order_unix = 1631232000.5
+        self.kdca.dcas_list[1].tagged_orders_seen = True
+        with freeze_time("2021-09-11 19:50:08"):
+            with patch.object(KrakenDCA, "plan_pairs_dca") as plan_pairs_dca:
+                self.kdca.handle_pairs_dca()
+            plan_pairs_dca.assert_not_called()
+            assert "No DCA due according to the snapshot." in (
+                logging_capture.read()
+            )
+            # A pair is due once its last order is out of the delay.
+            self.kdca.dcas_list[0].last_order_unix = 1631232000.5
+            with patch.object(KrakenDCA, "plan_pairs_dca") as plan_pairs_dca:
+                with patch.object(KrakenDCA, "apply_plan"):
+                    self.kdca.handle_pairs_dca()
+            plan_pairs_dca.assert_called_once()
+        snapshot = Snapshot.load(
+            self.config.snapshot, self.config.api_public_key
+        )
+        assert list(snapshot.pairs) == ["XETHZEUR", "XXBTZEUR"]
+        assert snapshot.last_orders == {
+            "XETHZEUR": 1631232000.5,
+            "XXBTZEUR": 1631232000.5,
+        }
+        assert snapshot.clock_offset == 0.4
+        assert snapshot.tagged_pairs == {"XXBTZEUR"}
+
+    def test_run_resident(self, logging_capture) -> None:
+        self.kdca.order_feed = MagicMock(spec=OrderFeed)
+        self.kdca.order_feed.wait_live.return_value = False
+        self.kdca.notifier = MagicMock(spec=Notifier)
+        runs = []
+
+        def handle_pairs_dca() -> None:
+            runs.append(1)
+            if len(runs) == 1:
+                raise ValueError("Kraken API error -> EService:Unavailable")
+            self.kdca.stop()
+
+        with patch.object(
+            KrakenDCA, "handle_pairs_dca", side_effect=handle_pairs_dca
+        ):
+            self.kdca.run_resident(0)
+        # Run again after an error, until stopped.
+        assert len(runs) == 2
+        self.kdca.order_feed.start.assert_called_once()
+        self.kdca.order_feed.stop.assert_called_once()
+        captured = logging_capture.read()
+        assert "Order feed not live, orders are requested." in captured
+        assert (
+            "DCA run error: Kraken API error -> EService:Unavailable"
+            in captured
+        )
+        self.kdca.notifier.notify.assert_called_once_with(
+            "error", "DCA run error: Kraken API error -> EService:Unavailable"
+        )
+
+    def test_notified_errors(self) -> None:
+        with pytest.raises(ValueError):
+            with self.kdca.notified_errors():
+                raise ValueError("Kraken API error -> EService:Unavailable")
+        self.kdca.notifier = MagicMock(spec=Notifier)
+        with pytest.raises(DeadlineExceededError):
+            with self.kdca.notified_errors():
+                raise DeadlineExceededError("Run deadline exceeded.")
+        self.kdca.notifier.notify.assert_called_once_with(
+            "error", "DCA run error: Run deadline exceeded."
+        )
+
+    def test_run_resident_metrics(self) -> None:
+        self.config.metrics_port = 9464
+        kdca = KrakenDCA(self.config, self.ka)
+        kdca.dcas_list = self.kdca.dcas_list
+        kdca.clock_offset = 0
+        for dca in kdca.dcas_list:
+            dca.last_order_unix = 2**32
+        with patch("krakendca.krakendca.MetricsServer") as metrics_server:
+            with patch.object(
+                KrakenDCA, "handle_pairs_dca", side_effect=kdca.stop
+            ):
+                kdca.run_resident(60)
+        metrics_server.assert_called_once()
+        assert metrics_server.call_args.args == (kdca.metrics, 9464)
+        metrics_server.return_value.start.assert_called_once()
+        metrics_server.return_value.stop.assert_called_once()
+        assert kdca.metrics.next_run is not None
+        # Runs skipped from the snapshot are recorded.
+        kdca.handle_pairs_dca()
+        assert {
+            pair: outcome
+            for pair, (_, outcome, _) in kdca.metrics.pair_runs.items()
+        } == {"XETHZEUR": "skipped", "XXBTZEUR": "skipped"}
+
+    @freeze_time("2021-09-12 19:50:08")
+    def test_plan_pairs_dca_order_feed(self) -> None:
+        userrefs = [pair_userref(dca.pair.name) for dca in self.kdca.dcas_list]
+        self.kdca.order_feed = MagicMock(live=True, state=OrderState(userrefs))
+        self.kdca.order_feed.state.reset({}, set(userrefs))
+        for dca in self.kdca.dcas_list:
+            dca.order_feed = self.kdca.order_feed
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_pairs_dca.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ) as cassette:
+            plan = self.kdca.plan_pairs_dca()
+        assert len(plan.orders) == 2
+        paths = [
+            cassette.requests[index].path for index in cassette.play_counts
+        ]
+        # Orders kept by the order feed are not requested.
+        assert "/0/private/OpenOrders" not in paths
+        assert "/0/private/ClosedOrders" not in paths
+
     @freeze_time("2021-09-12 19:50:08")
     @vcr.use_cassette(
         "tests/fixtures/vcr_cassettes/test_handle_pairs_dca.yaml",
@@ -101,6 +335,111 @@ class TestKrakenDCA:
         assert "buy 0.00519042 ETHEUR @ limit 2882.44" in captured
         assert "buy 0.00051336 XBTEUR @ limit 38857.2" in captured
 
+    @freeze_time("2021-09-12 19:50:08")
+    def test_handle_pairs_dca_pair_failure(self, logging_capture) -> None:
+        self.kdca.dcas_list[0].check_account_balance = MagicMock(
+            side_effect=ValueError("Insufficient funds to buy 15.0 ZEUR.")
+        )
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_pairs_dca.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ) as cassette:
+            self.kdca.handle_pairs_dca()
+        paths = [
+            cassette.requests[index].path for index in cassette.play_counts
+        ]
+        # The failing pair does not stop the next one.
+        assert paths.count("/0/private/AddOrder") == 1
+        captured = logging_capture.read()
+        assert "Create a 19.9477ZEUR buy limit order" in captured
+        assert "Run summary: 1 completed, 0 skipped, 1 failed." in captured
+        assert (
+            "s, Insufficient funds to buy 15.0 ZEUR.\nXXBTZEUR: completed in "
+            in captured
+        )
+
+    def test_handle_pairs_dca_api_budget(self, logging_capture) -> None:
+        self.config.api_budget = {"private_calls": 5}
+        ka = MagicMock(spec=RetryingKrakenApi)
+        kdca = KrakenDCA(self.config, ka)
+        assert ka.accounting is kdca.accounting
+        assert kdca.accounting.budgets == {"private_calls": 5}
+        kdca.dcas_list = self.kdca.dcas_list
+
+        def plan_pairs_dca() -> MagicMock:
+            kdca.accounting.record_call("Balance", False)
+            return MagicMock()
+
+        with patch.object(
+            KrakenDCA, "plan_pairs_dca", side_effect=plan_pairs_dca
+        ):
+            with patch.object(KrakenDCA, "apply_plan"):
+                kdca.handle_pairs_dca()
+        # Calls accounted per run.
+        assert "API calls: 1 (1 private, weight 1" in logging_capture.read()
+        with patch.object(
+            KrakenDCA, "plan_pairs_dca", side_effect=plan_pairs_dca
+        ):
+            with patch.object(KrakenDCA, "apply_plan"):
+                kdca.handle_pairs_dca()
+        assert kdca.accounting.calls == 1
+
+    def test_handle_pairs_dca_run_deadline(self) -> None:
+        self.config.run_deadline = 60
+        self.kdca.ka = MagicMock(spec=RetryingKrakenApi)
+        with patch.object(KrakenDCA, "plan_pairs_dca") as plan_pairs_dca:
+            with patch.object(KrakenDCA, "apply_plan"):
+                self.kdca.handle_pairs_dca()
+        plan_pairs_dca.assert_called_once()
+        self.kdca.ka.run_deadline.assert_called_once_with(60)
+
+    @freeze_time("2021-09-12 19:50:08")
+    def test_plan_pairs_dca(self) -> None:
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_pairs_dca.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ) as cassette:
+            plan = self.kdca.plan_pairs_dca()
+        assert str(plan) == (
+            "Plan (2 orders):\n"
+            "XETHZEUR: buy 0.00526946XETH at 2839.2ZEUR, 14.9611ZEUR + "
+            "0.0389ZEUR fee = 15.0ZEUR.\n"
+            "XXBTZEUR: buy 0.00051336XXBT at 38857.2ZEUR, 19.9477ZEUR + "
+            "0.0519ZEUR fee = 19.9996ZEUR."
+        )
+        paths = [
+            cassette.requests[index].path for index in cassette.play_counts
+        ]
+        # Prices of every pair requested at once, no order sent.
+        assert paths.count("/0/public/Ticker") == 1
+        assert "/0/private/AddOrder" not in paths
+
+    @freeze_time("2021-09-12 19:50:08")
+    def test_apply_plan(self) -> None:
+        with vcr.use_cassette(
+            "tests/fixtures/vcr_cassettes/test_handle_pairs_dca.yaml",
+            filter_headers=["API-Key", "API-Sign"],
+        ) as cassette:
+            plan = self.kdca.plan_pairs_dca()
+            self.kdca.dcas_list[1].max_price = 30000
+            self.kdca.apply_plan(plan)
+        paths = [
+            cassette.requests[index].path for index in cassette.play_counts
+        ]
+        # Prices requested again at once right before sending orders.
+        assert paths[-2:] == ["/0/public/Ticker", "/0/private/AddOrder"]
+        assert paths.count("/0/public/Ticker") == 2
+        assert paths.count("/0/private/AddOrder") == 1
+        # AddOrder request prepared once re-priced.
+        assert plan.planned_orders[0].prepared.endpoint == "AddOrder"
+        assert b"price=2839.2&" in plan.planned_orders[0].prepared.post_data
+        # Order re-priced above the maximum price is not sent.
+        assert plan.planned_orders[1].order is None
+        assert plan.planned_orders[1].prepared is None
+        assert plan.planned_orders[1].rejection == (
+            "Limit price (38857.2) greater than maximum price (30000)."
+        )
+
     @freeze_time("2022-03-26 18:37:46")
     @vcr.use_cassette(
         "tests/fixtures/vcr_cassettes/test_handle_pars_dca_max_price.yaml",
@@ -127,3 +466,71 @@ class TestKrakenDCA:
         self.kdca.handle_pairs_dca()
         captured = logging_capture.read()
         assert "Factor adjusted limit price (0.9850): 2797.99." in captured
+
+    def test_start_order_book_feed(self) -> None:
+        dca = self.kdca.dcas_list[0]
+        dca.depth_pricing = True
+        with patch.object(OrderBookFeed, "start") as start, patch.object(
+            OrderBookFeed, "wait_live", return_value=True
+        ):
+            self.kdca.start_order_book_feed()
+        start.assert_called_once()
+        feed = self.kdca.order_book_feed
+        assert list(feed.order_books.values()) == [dca.order_book]
+        order_book = dca.order_book
+        order_book.live = True
+        snapshot = OrderBook("XETHZEUR", "ETH/EUR")
+        snapshot.load_snapshot([["2083.5", "1.0", 0]], [["2083.0", "1.0", 0]])
+        tickers = {"XXBTZEUR": {"a": ["38857.2", "1", "1.000"]}}
+        with patch.object(
+            KrakenApi, "get_pair_ticker", return_value=tickers
+        ), patch.object(
+            OrderBook, "get_order_book_from_kraken", return_value=snapshot
+        ) as get_order_book_from_kraken:
+            # Live order books are not requested.
+            self.kdca.get_ask_prices(self.kdca.dcas_list)
+            get_order_book_from_kraken.assert_not_called()
+            # Requested while the feed is down, into the fed order book.
+            order_book.live = False
+            self.kdca.get_ask_prices(self.kdca.dcas_list)
+            get_order_book_from_kraken.assert_called_once()
+        assert dca.order_book is order_book
+        assert order_book.price_to_fill(20) == 2083.5
+
+    def test_get_ask_prices_refresh_coalesced(self) -> None:
+        self.kdca.ka = KrakenClient("api_public_key", "api_private_key")
+        tickers = {
+            "XETHZEUR": {"a": ["2882.44", "1", "1.000"], "b": ["2882.08"]},
+            "XXBTZEUR": {"a": ["38857.2", "1", "1.000"], "b": ["38857.1"]},
+        }
+        with patch.object(
+            RetryingKrakenApi, "send_request", return_value=tickers
+        ) as send_request:
+            self.kdca.get_ask_prices(self.kdca.dcas_list)
+            self.kdca.get_ask_prices(self.kdca.dcas_list)
+            assert send_request.call_count == 1
+            # The coalesced ticker is requested again before sending.
+            ask_prices = self.kdca.get_ask_prices(
+                self.kdca.dcas_list, refresh=True
+            )
+            assert send_request.call_count == 2
+        assert ask_prices == {"XETHZEUR": 2882.44, "XXBTZEUR": 38857.2}
+
+    def test_get_ask_prices_shared_cache(self, tmp_path) -> None:
+        self.kdca.shared_cache = SharedCache(str(tmp_path / "cache"))
+        tickers = {
+            "XETHZEUR": {"a": ["2882.44", "1", "1.000"], "b": ["2882.08"]},
+            "XXBTZEUR": {"a": ["38857.2", "1", "1.000"], "b": ["38857.1"]},
+        }
+        with patch.object(
+            KrakenApi, "get_pair_ticker", return_value=tickers
+        ) as get_pair_ticker:
+            ask_prices = self.kdca.get_ask_prices(self.kdca.dcas_list)
+            self.kdca.get_ask_prices(self.kdca.dcas_list)
+            assert get_pair_ticker.call_count == 1
+            # Fresh shared prices are requested again before sending.
+            self.kdca.get_ask_prices(self.kdca.dcas_list, refresh=True)
+            assert get_pair_ticker.call_count == 2
+        get_pair_ticker.assert_called_with("XETHZEUR,XXBTZEUR")
+        assert ask_prices == {"XETHZEUR": 2882.44, "XXBTZEUR": 38857.2}
+        self.kdca.shared_cache.close()
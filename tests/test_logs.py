@@ -0,0 +1,110 @@
+"""logs.py tests module."""
+import io
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+from krakendca.accounting import pair_context
+from krakendca.logs import (
+    ContextFilter,
+    JsonFormatter,
+    current_run_id,
+    phase_context,
+    run_context,
+    setup_logging,
+)
+
+
+class SlowStream(io.StringIO):
+    """
+    Stand-in output stream slow to write to, recording the writer
+    threads.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.threads = set()
+
+    def write(self, text: str) -> int:
+        self.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        return super().write(text)
+
+
+def make_record(message: str, *args) -> logging.LogRecord:
+    return logging.LogRecord(
+        "krakendca.dca", logging.INFO, __file__, 1, message, args, None
+    )
+
+
+def test_context_filter() -> None:
+    record = make_record("Outside of a run.")
+    ContextFilter().filter(record)
+    assert (record.pair, record.run_id, record.phase) == (None, None, None)
+    with run_context() as run_id, pair_context("XETHZEUR"):
+        with phase_context("send"):
+            record = make_record("Order successfully created.")
+            ContextFilter().filter(record)
+    assert len(run_id) == 12
+    assert (record.pair, record.run_id, record.phase) == (
+        "XETHZEUR",
+        run_id,
+        "send",
+    )
+    assert current_run_id.get() is None
+
+
+def test_json_formatter() -> None:
+    record = make_record("TXID: %s", "OCYS4K-OILOE-36HPAE")
+    record.created = 1618522408.069
+    record.pair, record.run_id, record.phase = "XETHZEUR", "abc", "send"
+    assert json.loads(JsonFormatter().format(record)) == {
+        "time": "2021-04-15T21:33:28.069+00:00",
+        "level": "INFO",
+        "logger": "krakendca.dca",
+        "message": "TXID: OCYS4K-OILOE-36HPAE",
+        "pair": "XETHZEUR",
+        "run_id": "abc",
+        "phase": "send",
+    }
+
+
+class TestSetupLogging:
+    @pytest.fixture(autouse=True)
+    def root_logger(self) -> None:
+        root = logging.getLogger()
+        handlers, level = root.handlers, root.level
+        yield
+        root.handlers, root.level = handlers, level
+
+    def test_setup_logging(self) -> None:
+        stream = SlowStream()
+        listener = setup_logging(json_format=True, stream=stream)
+        logger = logging.getLogger("krakendca.dca")
+        start = time.perf_counter()
+        with pair_context("XETHZEUR"), phase_context("plan"):
+            for index in range(10):
+                logger.info("Record %s.", index)
+        # Written by the listener thread, without waiting for the stream.
+        assert time.perf_counter() - start < 0.25
+        listener.stop()
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [line["message"] for line in lines] == [
+            f"Record {index}." for index in range(10)
+        ]
+        assert lines[0]["pair"] == "XETHZEUR"
+        assert lines[0]["phase"] == "plan"
+        assert threading.current_thread().name not in stream.threads
+
+    def test_setup_logging_text(self) -> None:
+        stream = io.StringIO()
+        listener = setup_logging(stream=stream)
+        logging.getLogger("krakendca.dca").debug("Not logged.")
+        logging.getLogger("krakendca.dca").warning("No DCA for %s.", "DOT")
+        listener.stop()
+        assert stream.getvalue().endswith(
+            " - WARNING:krakendca.dca: No DCA for DOT.\n"
+        )
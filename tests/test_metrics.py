@@ -0,0 +1,153 @@
+"""metrics.py tests module."""
+from unittest.mock import MagicMock, patch
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from krakendca import metrics
+from krakendca.metrics import Histogram, Metrics, MetricsServer
+from krakendca.order import Order
+from krakendca.pair import Pair
+from krakendca.plan import Plan, PlannedOrder
+
+
+def planned_order(pair_name: str, sent: bool, error: str = None):
+    """
+    Return a PlannedOrder object of a stand-in DCA pair.
+
+    :param pair_name: Pair name.
+    :param sent: True if the order was sent.
+    :param error: Pair error, if failed.
+    :return: PlannedOrder object.
+    """
+    dca = MagicMock()
+    dca.pair = Pair(pair_name, pair_name, "XETH", "ZEUR", 2, 8, 4, 0.005)
+    order = MagicMock(spec=Order)
+    order.legs = [order]
+    planned = PlannedOrder(dca, order, error=error)
+    planned.sent = sent
+    planned.duration = 0.5
+    return planned
+
+
+def test_histogram() -> None:
+    histogram = Histogram((0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+    assert histogram.cumulative_counts() == [
+        ("0.1", 2),
+        ("1", 3),
+        ("+Inf", 4),
+    ]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+class TestMetrics:
+    def setup(self) -> None:
+        self.metrics = Metrics()
+
+    def test_rate_limit(self) -> None:
+        with patch.object(metrics.time, "monotonic", return_value=100):
+            self.metrics = Metrics()
+            self.metrics.observe_request("Balance", False)
+            self.metrics.observe_request("ClosedOrders", False)
+            # Public and orders endpoints are not counted.
+            self.metrics.observe_request("Ticker", True)
+            self.metrics.observe_request("AddOrder", False)
+            assert self.metrics.decayed_rate_limit(100) == 3
+        assert self.metrics.decayed_rate_limit(103) == pytest.approx(2.01)
+        assert self.metrics.decayed_rate_limit(200) == 0
+        assert self.metrics.requests == {
+            "Balance": 1,
+            "ClosedOrders": 1,
+            "Ticker": 1,
+            "AddOrder": 1,
+        }
+
+    def test_healthy(self) -> None:
+        started_at = self.metrics.started_at
+        assert self.metrics.healthy(started_at + 10)
+        assert not self.metrics.healthy(started_at + 301)
+        self.metrics.schedule(started_at + 3600)
+        assert self.metrics.healthy(started_at + 3700)
+        assert not self.metrics.healthy(started_at + 3901)
+
+    def test_render(self) -> None:
+        plan = Plan(
+            None,
+            [
+                planned_order("XETHZEUR", True),
+                planned_order("XXBTZEUR", False, "Insufficient funds"),
+            ],
+        )
+        self.metrics.record_plan(plan, 1631476208)
+        self.metrics.record_plan(plan, 1631476268)
+        self.metrics.observe_latency("Ticker", 0.2)
+        self.metrics.schedule(1631479868)
+        rendered = self.metrics.render(
+            {"Ticker": {"sent": 1, "coalesced": 1, "cached": 2}}
+        )
+        lines = rendered.splitlines()
+        assert lines[-1] == "# EOF"
+        for line in (
+            "kraken_dca_up 0",
+            "kraken_dca_next_run_timestamp_seconds 1631479868",
+            'kraken_dca_pair_last_run_timestamp_seconds{pair="XETHZEUR"} '
+            "1631476268",
+            'kraken_dca_pair_last_run_duration_seconds{pair="XXBTZEUR"} 0.5',
+            'kraken_dca_pair_last_run_outcome{pair="XETHZEUR",'
+            'kraken_dca_pair_last_run_outcome="completed"} 1',
+            'kraken_dca_pair_last_run_outcome{pair="XXBTZEUR",'
+            'kraken_dca_pair_last_run_outcome="failed"} 1',
+            'kraken_dca_pair_last_run_outcome{pair="XXBTZEUR",'
+            'kraken_dca_pair_last_run_outcome="completed"} 0',
+            'kraken_dca_orders_placed_total{pair="XETHZEUR"} 2',
+            "kraken_dca_api_request_duration_seconds_bucket"
+            '{endpoint="Ticker",le="0.1"} 0',
+            "kraken_dca_api_request_duration_seconds_bucket"
+            '{endpoint="Ticker",le="0.25"} 1',
+            'kraken_dca_api_request_duration_seconds_count{endpoint="Ticker"}'
+            " 1",
+            "kraken_dca_api_rate_limit_counter 0.00",
+            'kraken_dca_cache_hit_ratio{endpoint="Ticker"} 0.7500',
+        ):
+            assert line in lines
+        assert "# TYPE kraken_dca_orders_placed counter" in lines
+        assert 'kraken_dca_orders_placed_total{pair="XXBTZEUR"}' not in (
+            rendered
+        )
+
+    def test_record_skipped(self) -> None:
+        self.metrics.record_skipped(["XETHZEUR"], 1631476208)
+        assert self.metrics.pair_runs == {
+            "XETHZEUR": (1631476208, "skipped", 0)
+        }
+
+
+def test_metrics_server() -> None:
+    server = MetricsServer(
+        Metrics(), 0, public_requests=lambda: {"Ticker": {"sent": 1}}
+    )
+    server.start()
+    try:
+        url = f"http://127.0.0.1:{server.port}"
+        with urlopen(f"{url}/healthz") as response:
+            assert response.status == 200
+            assert response.read() == b"ok\n"
+        with urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith(
+                "application/openmetrics-text"
+            )
+            body = response.read().decode()
+        assert 'kraken_dca_cache_hit_ratio{endpoint="Ticker"} 0.0000' in body
+        server.metrics.started_at = 0
+        with pytest.raises(HTTPError) as e_info:
+            urlopen(f"{url}/healthz")
+        assert e_info.value.code == 503
+        with pytest.raises(HTTPError) as e_info:
+            urlopen(f"{url}/other")
+        assert e_info.value.code == 404
+    finally:
+        server.stop()
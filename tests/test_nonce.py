@@ -0,0 +1,275 @@
+"""nonce.py tests module."""
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+import pytest
+from krakenapi import KrakenApi
+
+from krakendca.nonce import (
+    NonceAllocator,
+    NonceKrakenApi,
+    default_nonce_filepath,
+)
+from krakendca.retry import KrakenApiError, RetryingKrakenApi
+
+API_PRIVATE_KEY = base64.b64encode(b"kraken-dca-test-secret").decode()
+
+
+class Client(NonceKrakenApi, RetryingKrakenApi):
+    pass
+
+
+class NonceServer(ThreadingHTTPServer):
+    """
+    Local stand-in of Kraken private endpoints, enforcing Kraken nonce
+    rules: each request nonce must be greater than the greatest nonce
+    received minus the API key nonce window, and never reused.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, nonce_window: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), NonceRequestHandler)
+        self.nonce_window = nonce_window
+        self.lock = threading.Lock()
+        self.last_nonce = 0
+        self.nonces = []
+        self.errors = []
+
+
+class NonceRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        nonce = parse_qs(body.decode())["nonce"][0]
+        endpoint = self.path.rsplit("/", 1)[1]
+        signature = hmac.new(
+            base64.b64decode(API_PRIVATE_KEY),
+            f"/0/private/{endpoint}".encode()
+            + hashlib.sha256(nonce.encode() + body).digest(),
+            hashlib.sha512,
+        ).digest()
+        with self.server.lock:
+            if base64.b64decode(self.headers["API-Sign"]) != signature:
+                error = ["EAPI:Invalid signature"]
+            elif (
+                int(nonce) <= self.server.last_nonce - self.server.nonce_window
+                or int(nonce) in self.server.nonces
+            ):
+                error = ["EAPI:Invalid nonce"]
+            else:
+                error = []
+                self.server.last_nonce = max(
+                    self.server.last_nonce, int(nonce)
+                )
+                self.server.nonces.append(int(nonce))
+            self.server.errors += error
+        response = json.dumps({"error": error, "result": {"nonce": nonce}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(response.encode())
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def send_balance_requests(filepath: str, url: str, count: int) -> None:
+    """
+    Send private requests from another process sharing the nonce file.
+
+    :param filepath: Nonce file path.
+    :param url: Stand-in server URL.
+    :param count: Requests count.
+    :return: None
+    """
+    client = Client(
+        "api_public_key",
+        API_PRIVATE_KEY,
+        nonce_allocator=NonceAllocator(filepath),
+    )
+    with patch.object(
+        KrakenApi,
+        "create_api_path",
+        side_effect=lambda public, method: f"{url}/0/private/{method}",
+    ), ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: client.get_balance(), range(count)))
+
+
+class TestNonceAllocator:
+    @pytest.fixture(autouse=True)
+    def nonce_file(self, tmp_path) -> None:
+        self.filepath = str(tmp_path / "kraken-dca.nonce")
+
+    def test_default_nonce_filepath(self) -> None:
+        filepath = default_nonce_filepath("api_public_key")
+        assert filepath.endswith(".nonce")
+        assert filepath == default_nonce_filepath("api_public_key")
+        assert filepath != default_nonce_filepath("other_public_key")
+
+    def test_allocate(self) -> None:
+        allocator = NonceAllocator()
+        nonces = [allocator.allocate() for _ in range(10000)]
+        # Faster than the clock resolution, still strictly increasing.
+        assert nonces == sorted(set(nonces))
+
+    def test_allocate_threads(self) -> None:
+        allocator = NonceAllocator(self.filepath)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            nonces = list(
+                executor.map(lambda _: allocator.allocate(), range(10000))
+            )
+        allocator.close()
+        assert len(set(nonces)) == 10000
+
+    def test_allocate_clock_backwards(self) -> None:
+        allocator = NonceAllocator()
+        with patch("time.time_ns", return_value=2_000_000_000_000_000):
+            first = allocator.allocate()
+        with patch("time.time_ns", return_value=1_000_000_000_000_000):
+            second = allocator.allocate()
+        assert first == 2_000_000_000_000
+        assert second == first + 1
+
+    def test_allocate_restart(self) -> None:
+        allocator = NonceAllocator(self.filepath)
+        with patch("time.time_ns", return_value=2_000_000_000_000_000):
+            first = allocator.allocate()
+        allocator.close()
+        # Restarted after the clock went backwards.
+        allocator = NonceAllocator(self.filepath)
+        with patch("time.time_ns", return_value=1_000_000_000_000_000):
+            assert allocator.allocate() == first + 1
+        allocator.close()
+
+    def test_allocate_processes(self) -> None:
+        context = multiprocessing.get_context("fork")
+        queue = context.Queue()
+
+        def allocate() -> None:
+            allocator = NonceAllocator(self.filepath)
+            queue.put([allocator.allocate() for _ in range(2000)])
+            allocator.close()
+
+        processes = [context.Process(target=allocate) for _ in range(4)]
+        for process in processes:
+            process.start()
+        nonces = [nonce for _ in processes for nonce in queue.get(timeout=30)]
+        for process in processes:
+            process.join()
+        assert len(set(nonces)) == 8000
+
+
+class TestNonceKrakenApi:
+    @pytest.fixture(autouse=True)
+    def nonce_server(self, tmp_path) -> None:
+        self.filepath = str(tmp_path / "kraken-dca.nonce")
+        self.server = NonceServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        with patch.object(
+            KrakenApi,
+            "create_api_path",
+            side_effect=lambda public, method: (
+                f"{self.url}/0/{'public' if public else 'private'}/{method}"
+            ),
+        ):
+            yield
+        self.server.shutdown()
+        self.server.server_close()
+        thread.join()
+
+    def test_init(self) -> None:
+        client = Client("api_public_key", API_PRIVATE_KEY)
+        assert isinstance(client.nonce_allocator, NonceAllocator)
+        assert client.nonce_allocator.filepath is None
+        assert int(client.create_api_nonce()) < int(client.create_api_nonce())
+
+    def test_stand_in_rejects_nonce_reuse(self) -> None:
+        ka = RetryingKrakenApi("api_public_key", API_PRIVATE_KEY)
+        request = ka.create_api_request(False, "Balance")
+        ka.send_request(request, 5)
+        with pytest.raises(KrakenApiError) as e_info:
+            ka.send_request(request, 5)
+        assert e_info.value.error == "EAPI:Invalid nonce"
+
+    def test_parallel_private_requests(self) -> None:
+        client = Client(
+            "api_public_key",
+            API_PRIVATE_KEY,
+            nonce_allocator=NonceAllocator(self.filepath),
+        )
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: client.get_balance(), range(500)))
+        assert self.server.errors == []
+        assert len(self.server.nonces) == 500
+
+    def test_parallel_private_requests_processes(self) -> None:
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(
+                target=send_balance_requests,
+                args=(self.filepath, self.url, 100),
+            )
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            assert process.exitcode == 0
+        assert self.server.errors == []
+        assert len(self.server.nonces) == 400
+
+    def test_resigned_on_dispatch(self) -> None:
+        client = Client("api_public_key", API_PRIVATE_KEY)
+        request = client.create_api_request(False, "Balance")
+        # Sent again with a new nonce and signature, accepted twice.
+        assert (
+            client.send_request(request, 5)["nonce"]
+            != client.send_request(request, 5)["nonce"]
+        )
+        assert self.server.errors == []
+
+    def test_signed_once(self) -> None:
+        client = Client("api_public_key", API_PRIVATE_KEY)
+        with patch.object(
+            Client,
+            "create_api_signature",
+            wraps=client.create_api_signature,
+        ) as create_api_signature:
+            request = client.create_api_request(
+                False, "Balance", {"asset": "ZEUR"}
+            )
+            # Nonce and signature are left to dispatch.
+            assert request.data == b"asset=ZEUR&nonce=0"
+            assert not request.has_header("Api-sign")
+            assert request.get_header("Api-key") == "api_public_key"
+            create_api_signature.assert_not_called()
+            client.send_request(request, 5)
+            create_api_signature.assert_called_once()
+        assert self.server.errors == []
+        # Public requests are unchanged.
+        public = client.create_api_request(True, "Time")
+        assert public.full_url == f"{self.url}/0/public/Time"
+
+    def test_parallel_private_requests_window(self) -> None:
+        self.server.nonce_window = 1000000
+        client = Client(
+            "api_public_key",
+            API_PRIVATE_KEY,
+            nonce_allocator=NonceAllocator(self.filepath),
+            nonce_window=1000000,
+        )
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: client.get_balance(), range(500)))
+        assert self.server.errors == []
+        assert len(self.server.nonces) == 500
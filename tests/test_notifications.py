@@ -0,0 +1,326 @@
+"""notifications.py tests module."""
+import json
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import pytest
+
+from krakendca.notifications import (
+    Notification,
+    Notifier,
+    Sink,
+    SmtpSink,
+    WebhookSink,
+    coalesce,
+)
+from tests.test_order_feed import wait_until
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """
+    Local stand-in webhook recording JSON bodies, answering 503 while
+    down.
+    """
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), WebhookRequestHandler)
+        self.bodies: List[dict] = []
+        self.down = False
+        self.attempts = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.attempts += 1
+        if self.server.down:
+            self.send_response(503)
+        else:
+            self.server.bodies.append(json.loads(body))
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class SmtpServer(socketserver.ThreadingTCPServer):
+    """
+    Local stand-in SMTP server recording received messages.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), SmtpRequestHandler)
+        self.messages: List[tuple] = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class SmtpRequestHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        self.reply("220 localhost")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif command == "RCPT":
+                recipients.append(line.split(":", 1)[1].strip("<> "))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line == b".\r\n":
+                        break
+                    data += data_line
+                self.server.messages.append(
+                    (recipients, message_from_bytes(data))
+                )
+                self.reply("250 OK")
+            elif command == "QUIT" or not line:
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def test_coalesce() -> None:
+    notifications = coalesce(
+        [
+            Notification("error", "DCA XETHZEUR failed.", 1),
+            Notification("order", "XETHZEUR order sent.", 2),
+            Notification("error", "DCA XETHZEUR failed.", 3),
+        ]
+    )
+    assert [str(notification) for notification in notifications] == [
+        "[error] DCA XETHZEUR failed. (x2)",
+        "[order] XETHZEUR order sent.",
+    ]
+    assert notifications[0].created_at == 1
+
+
+def test_webhook_sink() -> None:
+    server = WebhookServer()
+    try:
+        sink = WebhookSink(server.url, {"chat_id": 42})
+        sink.send([Notification("order", "XETHZEUR order sent.", 1)])
+        assert server.bodies == [
+            {
+                "text": "[order] XETHZEUR order sent.",
+                "content": "[order] XETHZEUR order sent.",
+                "notifications": [
+                    {
+                        "event": "order",
+                        "message": "XETHZEUR order sent.",
+                        "created_at": 1,
+                        "count": 1,
+                    }
+                ],
+                "chat_id": 42,
+            }
+        ]
+        server.down = True
+        with pytest.raises(OSError):
+            sink.send([Notification("order", "XETHZEUR order sent.")])
+    finally:
+        server.stop()
+
+
+def test_smtp_sink() -> None:
+    server = SmtpServer()
+    try:
+        sink = SmtpSink(
+            "127.0.0.1",
+            "dca@example.com",
+            ["me@example.com"],
+            port=server.server_address[1],
+        )
+        sink.send(
+            [
+                Notification("order", "XETHZEUR order sent."),
+                Notification("error", "DCA XXBTZEUR failed."),
+            ]
+        )
+        recipients, message = server.messages[0]
+        assert recipients == ["me@example.com"]
+        assert message["Subject"] == "Kraken-DCA: error, order"
+        assert message.get_payload().splitlines() == [
+            "[order] XETHZEUR order sent.",
+            "[error] DCA XXBTZEUR failed.",
+        ]
+    finally:
+        server.stop()
+
+
+class TestNotifier:
+    @pytest.fixture(autouse=True)
+    def webhook(self, tmp_path) -> None:
+        self.server = WebhookServer()
+        self.spill_file = str(tmp_path / "spill.jsonl")
+        self.notifier = Notifier(
+            [WebhookSink(self.server.url)],
+            events=("order", "error"),
+            spill_file=self.spill_file,
+            batch_delay=0.2,
+            retry_delays=(0.01,),
+        )
+        yield
+        self.notifier.close(5)
+        self.server.stop()
+
+    def test_notify(self) -> None:
+        start = time.perf_counter()
+        for _ in range(3):
+            self.notifier.notify("order", "XETHZEUR order sent.")
+        self.notifier.notify("error", "DCA XXBTZEUR failed.")
+        # Not notified event.
+        self.notifier.notify("fill", "XETHZEUR order filled.")
+        # Queued without waiting for the sink.
+        assert time.perf_counter() - start < 0.1
+        assert wait_until(lambda: self.server.bodies)
+        assert self.server.bodies[0]["text"] == (
+            "[order] XETHZEUR order sent. (x3)\n"
+            "[error] DCA XXBTZEUR failed."
+        )
+        assert len(self.server.bodies) == 1
+
+    def test_spill(self) -> None:
+        self.server.down = True
+        self.notifier.notify("order", "XETHZEUR order sent.")
+        # Spilled once retries are exhausted.
+        assert wait_until(
+            lambda: self.notifier.load_spilled(self.notifier.sinks[0])
+        )
+        assert self.server.attempts == 2
+        self.server.down = False
+        self.notifier.notify("error", "DCA XXBTZEUR failed.")
+        assert wait_until(lambda: self.server.bodies)
+        # Spilled notifications are sent with the next batch.
+        assert self.server.bodies[0]["text"] == (
+            "[order] XETHZEUR order sent.\n[error] DCA XXBTZEUR failed."
+        )
+        assert wait_until(
+            lambda: not self.notifier.load_spilled(self.notifier.sinks[0])
+        )
+
+    def test_close(self) -> None:
+        self.server.down = True
+        self.notifier.retry_delays = (60,)
+        self.notifier.notify("order", "XETHZEUR order sent.")
+        assert wait_until(lambda: self.server.attempts)
+        # Closing cancels retries, the notification is spilled.
+        self.notifier.close(5)
+        spilled = self.notifier.load_spilled(self.notifier.sinks[0])
+        assert [notification.message for notification in spilled] == [
+            "XETHZEUR order sent."
+        ]
+        # Notifications are ignored once closed.
+        self.notifier.notify("order", "XETHZEUR order sent.")
+        assert self.server.attempts == 1
+
+    def test_queue_full(self) -> None:
+        sink = BlockingSink()
+        notifier = Notifier([sink], queue_size=1, batch_delay=0)
+        notifier.notify("order", "XETHZEUR order sent.")
+        assert sink.sending.wait(5)
+        # Queued while the worker is sending, then dropped.
+        notifier.notify("order", "XXBTZEUR order sent.")
+        notifier.notify("order", "DOTEUR order sent.")
+        assert notifier.dropped == 1
+        sink.release.set()
+        notifier.close(5)
+        assert [str(n) for n in sink.sent] == [
+            "[order] XETHZEUR order sent.",
+            "[order] XXBTZEUR order sent.",
+        ]
+
+
+def test_close_in_flight(tmp_path) -> None:
+    sink = BlockingSink()
+    notifier = Notifier(
+        [sink], spill_file=str(tmp_path / "spill.jsonl"), batch_delay=0
+    )
+    notifier.notify("order", "XETHZEUR order sent.")
+    notifier.notify("order", "XETHZEUR order sent.")
+    assert sink.sending.wait(5)
+    notifier.notify("error", "DCA XXBTZEUR failed.")
+    # The batch being sent is spilled with the queued notifications.
+    notifier.close(0.1)
+    spilled = notifier.load_spilled(sink)
+    assert [str(notification) for notification in spilled] == [
+        "[order] XETHZEUR order sent. (x2)",
+        "[error] DCA XXBTZEUR failed.",
+    ]
+    sink.release.set()
+    assert wait_until(lambda: sink.sent)
+    assert len(notifier.load_spilled(sink)) == 2
+
+
+class BlockingSink(Sink):
+    """
+    Stand-in sink blocking until released.
+    """
+
+    name = "blocking"
+
+    def __init__(self) -> None:
+        self.sending = threading.Event()
+        self.release = threading.Event()
+        self.sent: List[Notification] = []
+
+    def send(self, notifications: List[Notification]) -> None:
+        self.sending.set()
+        self.release.wait(5)
+        self.sent += notifications
+
+
+def test_from_config() -> None:
+    notifier = Notifier.from_config(
+        {
+            "webhook": {"url": "http://127.0.0.1/hook"},
+            "smtp": {
+                "host": "127.0.0.1",
+                "sender": "dca@example.com",
+                "recipients": ["me@example.com"],
+            },
+            "events": ["error"],
+        }
+    )
+    assert [sink.name for sink in notifier.sinks] == ["webhook", "smtp"]
+    assert notifier.events == ["error"]
+    assert notifier.spill_file == "notifications_spill.jsonl"
+
+
+def test_sink_abstract() -> None:
+    with pytest.raises(TypeError):
+        Sink()
@@ -0,0 +1,195 @@
+"""ohlc_store.py tests module."""
+import os
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from freezegun import freeze_time
+from krakenapi import KrakenApi
+
+from krakendca import ohlc_store
+from krakendca.ohlc_store import (
+    CLOSE,
+    COUNT,
+    HIGH,
+    LOW,
+    OPEN,
+    TIME,
+    VOLUME,
+    VWAP,
+    OHLCStore,
+    combine_candles,
+    trades_to_candles,
+)
+
+# 2021-09-12 00:00:00 UTC.
+START = 1631404800
+
+
+def candle(time: float, price: float = 2800) -> list:
+    """
+    Return a candle as returned by Kraken OHLC endpoint.
+
+    :param time: Candle Unix time.
+    :param price: Candle prices.
+    :return: Candle as list.
+    """
+    return [time, str(price), str(price), str(price), str(price), "0", "1", 2]
+
+
+def test_trades_to_candles() -> None:
+    trades = np.array(
+        [
+            [START + 1, 10, 1],
+            [START + 30, 12, 3],
+            [START + 59, 11, 1],
+            [START + 61, 9, 2],
+        ]
+    )
+    candles = trades_to_candles(trades, 1)
+    assert candles.tolist() == [
+        [START, 10, 12, 10, 11, 11.4, 5, 3],
+        [START + 60, 9, 9, 9, 9, 9, 2, 1],
+    ]
+    assert trades_to_candles(np.empty((0, 3)), 1).shape == (0, 8)
+
+
+def test_combine_candles() -> None:
+    first = trades_to_candles(np.array([[START, 10, 1], [START, 12, 1]]), 1)
+    second = trades_to_candles(np.array([[START + 1, 8, 2]]), 1)
+    combined = combine_candles(first[0], second[0])
+    assert combined[OPEN] == 10
+    assert combined[HIGH] == 12
+    assert combined[LOW] == 8
+    assert combined[CLOSE] == 8
+    assert combined[VWAP] == 9.5
+    assert combined[VOLUME] == 4
+    assert combined[COUNT] == 3
+
+
+class TestOHLCStore:
+    def setup(self) -> None:
+        self.ka = MagicMock(spec=KrakenApi)
+        self.ka.create_api_request.side_effect = (
+            lambda public, method, post_inputs=None: (method, post_inputs)
+        )
+        self.ka.send_api_request.side_effect = self.send_api_request
+        self.requests = []
+        self.ohlc = [candle(START + index * 60) for index in range(5)]
+        self.trades = [
+            ["2801", "0.5", START + 121.5, "b", "l", ""],
+            ["2803", "1.5", START + 130.5, "b", "l", ""],
+            ["2805", "1", START + 185.5, "s", "l", ""],
+        ]
+
+    def send_api_request(self, request: tuple) -> dict:
+        """
+        Stand-in Kraken REST API OHLC and Trades public endpoints.
+
+        :param request: Endpoint and POST inputs.
+        :return: Response result.
+        """
+        method, post_inputs = request
+        self.requests.append(request)
+        since = post_inputs.get("since", 0)
+        if method == "OHLC":
+            rows = [row for row in self.ohlc if row[0] > since]
+            return {"XETHZEUR": rows, "last": rows[-1][0] if rows else 0}
+        rows = [row for row in self.trades if row[2] * 1e9 > since]
+        # One trade per page.
+        rows = rows[:1]
+        last = int(rows[-1][2] * 1e9) if rows else since
+        return {"XETHZEUR": rows, "last": str(last)}
+
+    @freeze_time("2021-09-12 00:04:30")
+    def test_update(self, tmp_path) -> None:
+        store = OHLCStore(str(tmp_path))
+        # Last candle still open.
+        assert store.update(self.ka, "XETHZEUR", 1) == 4
+        assert self.requests[-1] == (
+            "OHLC",
+            {"pair": "XETHZEUR", "interval": 1},
+        )
+        self.ohlc.append(candle(START + 300))
+        with freeze_time("2021-09-12 00:06:00"):
+            assert store.update(self.ka, "XETHZEUR", 1) == 2
+        assert self.requests[-1][1]["since"] == START + 180
+        candles = store.read("XETHZEUR", 1)
+        # Zero-copy read from the memory-mapped file.
+        assert isinstance(candles, np.memmap)
+        assert candles.dtype == np.float64
+        assert candles[:, TIME].tolist() == [START + i * 60 for i in range(6)]
+        assert candles[0, CLOSE] == 2800
+        assert os.path.getsize(store.filepath("XETHZEUR", 1)) == 6 * 64
+
+    def test_append_partial_record(self, tmp_path) -> None:
+        store = OHLCStore(str(tmp_path))
+        candles = np.array([candle(START), candle(START + 60)], dtype=float)
+        store.append("XETHZEUR", 1, candles[:1])
+        with open(store.filepath("XETHZEUR", 1), "ab") as candles_file:
+            candles_file.write(b"\0" * 10)
+        # Partial record ignored then overwritten.
+        assert len(store.read("XETHZEUR", 1)) == 1
+        assert store.append("XETHZEUR", 1, candles) == 1
+        assert store.read("XETHZEUR", 1)[:, TIME].tolist() == [
+            START,
+            START + 60,
+        ]
+
+    def test_gaps_backfill(self, tmp_path) -> None:
+        store = OHLCStore(str(tmp_path))
+        candles = np.array(
+            [candle(START + index * 60) for index in (0, 1, 4)], dtype=float
+        )
+        store.append("XETHZEUR", 1, candles)
+        assert store.gaps("XETHZEUR", 1) == [(START + 120, START + 180)]
+        assert store.backfill(self.ka, "XETHZEUR", 1) == 2
+        assert store.gaps("XETHZEUR", 1) == []
+        backfilled = store.read("XETHZEUR", 1)[2:4]
+        assert backfilled.tolist() == [
+            [START + 120, 2801, 2803, 2801, 2803, 2802.5, 2, 2],
+            [START + 180, 2805, 2805, 2805, 2805, 2805, 1, 1],
+        ]
+        # Trades requested page by page until the gap end or the last
+        # trade.
+        trades_requests = [
+            post_inputs for method, post_inputs in self.requests
+        ]
+        assert trades_requests[0]["since"] == (START + 120) * 10**9
+        assert len(trades_requests) == 4
+
+    def test_ingest_trades_csv(self, tmp_path) -> None:
+        store = OHLCStore(str(tmp_path / "ohlc"))
+        store.append("XETHZEUR", 1, np.array([candle(START)], dtype=float))
+        trades_filepath = tmp_path / "XETHEUR.csv"
+        trades_filepath.write_text(
+            f"{START + 10},2700,1\n"
+            f"{START + 61},2801,0.5\n"
+            f"{START + 62},2803,1.5\n"
+            f"{START + 125},2805,1\n"
+        )
+        # Candles spanning two chunks are combined.
+        ohlc_store.CSV_CHUNK_SIZE = 2
+        try:
+            added = store.ingest_trades_csv(
+                "XETHZEUR", 1, str(trades_filepath)
+            )
+        finally:
+            ohlc_store.CSV_CHUNK_SIZE = 1_000_000
+        assert added == 2
+        candles = store.read("XETHZEUR", 1)
+        # Stored candle kept.
+        assert candles[0, CLOSE] == 2800
+        assert candles[1:].tolist() == [
+            [START + 60, 2801, 2803, 2801, 2803, 2802.5, 2, 2],
+            [START + 120, 2805, 2805, 2805, 2805, 2805, 1, 1],
+        ]
+        with pytest.raises(ValueError) as e_info:
+            store.ingest_trades_csv("XETHZEUR", 1, str(tmp_path / "none"))
+        assert "Can't read trades ->" in str(e_info.value)
+
+    def test_invalid_interval(self, tmp_path) -> None:
+        store = OHLCStore(str(tmp_path))
+        with pytest.raises(ValueError) as e_info:
+            store.read("XETHZEUR", 2)
+        assert "OHLC interval must be one of 1, 5, 15" in str(e_info.value)
@@ -1,12 +1,14 @@
 """order.py tests module."""
 import os
 from datetime import datetime
+from unittest.mock import patch
 
 import pandas as pd
 import pytest
 import vcr
 from krakenapi import KrakenApi
-from krakendca.order import Order
+from krakendca.order import Order, OrderLadder
+from krakendca.utils import pair_userref
 
 
 class TestOrder:
@@ -98,6 +100,48 @@ class TestOrder:
             "@ limit 1938.11"
         )
 
+    def test_send_order_userref(self) -> None:
+        response = {"txid": ["OUHXFN-RTP6W-ART4VP"], "descr": {"order": ""}}
+        with patch.object(
+            self.ka, "send_api_request", return_value=response
+        ) as send_api_request:
+            self.order.send_order(self.ka)
+        request = send_api_request.call_args.args[0]
+        assert request.full_url.endswith("/0/private/AddOrder")
+        assert f"userref={self.order.userref}" in request.data.decode()
+        assert self.order.userref == pair_userref("XETHZEUR")
+        # Not saved to orders history file.
+        assert "userref" not in vars(self.order)
+
+    def test_send_order_prepared(self) -> None:
+        response = {"txid": ["OUHXFN-RTP6W-ART4VP"], "descr": {"order": ""}}
+        prepared = self.order.prepare_request(self.ka)
+        with patch.object(
+            self.ka, "send_api_request", return_value=response
+        ) as send_api_request, patch.object(
+            self.ka, "create_api_nonce", return_value="1618522408000"
+        ):
+            self.order.send_order(self.ka, prepared)
+            request = self.ka.create_api_request(
+                False,
+                "AddOrder",
+                {
+                    "pair": "XETHZEUR",
+                    "type": "buy",
+                    "ordertype": "limit",
+                    "price": 2083.16,
+                    "volume": 0.00957589,
+                    "oflags": "fciq",
+                    "userref": self.order.userref,
+                },
+            )
+        sent = send_api_request.call_args.args[0]
+        # Same request as built at send time.
+        assert sent.full_url == request.full_url
+        assert sent.data == request.data
+        assert sent.headers == request.headers
+        assert self.order.txid == "OUHXFN-RTP6W-ART4VP"
+
     def test_save_order_csv(self) -> None:
         self.order.txid = "OCYS4K-OILOE-36HPAE"
         self.order.description = "buy 0.00957589 ETHEUR @ limit 2083.16"
@@ -140,3 +184,85 @@ class TestOrder:
         order_fee = Order.estimate_order_fee(0.01105373, 1802.82, 2)
         assert type(order_fee) == float
         assert order_fee == 0.05
+
+
+class TestOrderLadder:
+    ladder: OrderLadder
+
+    def setup(self) -> None:
+        self.ladder = OrderLadder.buy_limit_ladder(
+            datetime(2021, 4, 15, 21, 33, 28),
+            "XETHZEUR",
+            60,
+            2083.16,
+            2041.5,
+            3,
+            2,
+            8,
+            4,
+        )
+        self.ka = KrakenApi(
+            "R6/OvXmIQEv1E8nyJd7+a9Zmaf84yJ7uifwe2yj5BgV1N+lgqURsxQwQ",
+            "MWZ9lFF/mreK4Fdk/SEpFLvVn//nbKUbCytGShSwvCvYlgRkn4K8i7VY18UQEgOHz"
+            "BIEsqg78BZJCEhvFIzw1Q==",
+        )
+
+    def test_buy_limit_ladder(self) -> None:
+        assert [order.pair_price for order in self.ladder.orders] == [
+            2083.16,
+            2062.33,
+            2041.5,
+        ]
+        # Amount split between the orders, each rounded as single orders.
+        assert [order.volume for order in self.ladder.orders] == [
+            Order.set_order_volume(20, price, 8)
+            for price in (2083.16, 2062.33, 2041.5)
+        ]
+        assert self.ladder.pair == "XETHZEUR"
+        assert self.ladder.pair_price == 2083.16
+        assert self.ladder.low_pair_price == 2041.5
+        assert self.ladder.legs == self.ladder.orders
+        assert self.ladder.total_price == round(
+            sum(order.total_price for order in self.ladder.orders), 4
+        )
+
+    def test_prepare_request(self) -> None:
+        prepared = self.ladder.prepare_request(self.ka)
+        assert prepared.endpoint == "AddOrderBatch"
+        post_data = prepared.post_data.decode()
+        assert post_data.startswith("pair=XETHZEUR&")
+        assert "orders%5B2%5D%5Bprice%5D=2041.5&" in post_data
+        assert (
+            f"orders%5B0%5D%5Buserref%5D={pair_userref('XETHZEUR')}&"
+            in post_data
+        )
+
+    def test_send_order(self, logging_capture) -> None:
+        response = {
+            "orders": [
+                {"txid": "O1", "descr": {"order": "buy 1"}},
+                {"error": "EOrder:Insufficient funds"},
+                {"txid": "O3", "descr": {"order": "buy 3"}},
+            ]
+        }
+        with patch.object(
+            self.ka, "send_api_request", return_value=response
+        ) as send_api_request:
+            self.ladder.send_order(self.ka)
+        send_api_request.assert_called_once()
+        # Orders rejected by Kraken are not kept.
+        assert [order.txid for order in self.ladder.legs] == ["O1", "O3"]
+        assert self.ladder.legs[1].description == "buy 3"
+        assert (
+            "Ladder order at 2062.33: EOrder:Insufficient funds"
+            in logging_capture.read()
+        )
+
+    def test_send_order_rejected(self) -> None:
+        response = {"orders": [{"error": "EOrder:Insufficient funds"}] * 3}
+        with patch.object(self.ka, "send_api_request", return_value=response):
+            with pytest.raises(ValueError) as e_info:
+                self.ladder.send_order(self.ka)
+        assert "Ladder orders rejected: 2083.16: EOrder:Insufficient" in str(
+            e_info.value
+        )
@@ -0,0 +1,216 @@
+"""order_book.py tests module."""
+import json
+import time
+import zlib
+from unittest.mock import patch
+
+import pytest
+from krakenapi import KrakenApi
+
+from krakendca.order_book import (
+    BookSide,
+    OrderBook,
+    OrderBookChecksumError,
+    OrderBookFeed,
+    checksum_field,
+)
+from tests.test_websocket import WebSocketServer
+
+ASKS = [
+    ["2083.16000", "0.50000000", "1618522408.123456"],
+    ["2083.50000", "1.00000000", "1618522408.123456"],
+    ["2084.00000", "2.00000000", "1618522408.123456"],
+]
+BIDS = [
+    ["2082.90000", "0.30000000", "1618522408.123456"],
+    ["2082.50000", "1.20000000", "1618522408.123456"],
+]
+
+
+class TestBookSide:
+    def test_update(self) -> None:
+        asks = BookSide(ascending=True)
+        bids = BookSide(ascending=False)
+        for price in ["2083.5", "2083.1", "2084.0"]:
+            asks.update(price, "1.0")
+            bids.update(price, "1.0")
+        assert [level[0] for level in asks.levels()] == [
+            "2083.1",
+            "2083.5",
+            "2084.0",
+        ]
+        assert [level[0] for level in bids.levels(2)] == ["2084.0", "2083.5"]
+        # Volume update and level removal.
+        asks.update("2083.50", "2.5")
+        asks.update("2083.1", "0.00000000")
+        asks.update("2090.0", "0.00000000")
+        assert asks.levels() == [("2083.50", "2.5"), ("2084.0", "1.0")]
+        asks.truncate(1)
+        assert asks.levels() == [("2083.50", "2.5")]
+        assert len(asks) == 1
+
+    def test_cumulative(self) -> None:
+        asks = BookSide(ascending=True)
+        asks.update("10.0", "1.0")
+        asks.update("20.0", "2.0")
+        cumulative = asks.cumulative()
+        assert cumulative == ([10.0, 20.0], [10.0, 50.0], [1.0, 3.0])
+        # Built once until the book changes.
+        assert asks.cumulative() is cumulative
+        asks.update("5.0", "1.0")
+        assert asks.cumulative() == (
+            [5.0, 10.0, 20.0],
+            [5.0, 15.0, 55.0],
+            [1.0, 2.0, 4.0],
+        )
+
+
+class TestOrderBook:
+    order_book: OrderBook
+
+    def setup(self) -> None:
+        self.order_book = OrderBook("XETHZEUR", "ETH/EUR", depth=10)
+        self.order_book.load_snapshot(ASKS, BIDS)
+
+    def test_init(self) -> None:
+        order_book = OrderBook("XETHZEUR")
+        assert order_book.pair == "XETHZEUR"
+        assert order_book.ws_name is None
+        assert order_book.depth == 25
+        assert order_book.live is False
+
+    def test_get_order_book_from_kraken(self) -> None:
+        ka = KrakenApi("api_public_key", "api_private_key")
+        depth = {"XETHZEUR": {"asks": ASKS, "bids": BIDS}}
+        with patch.object(
+            ka, "send_api_request", return_value=depth
+        ) as send_api_request:
+            order_book = OrderBook.get_order_book_from_kraken(
+                ka, "XETHZEUR", "ETH/EUR", 10
+            )
+        request = send_api_request.call_args.args[0]
+        assert request.full_url.endswith("/0/public/Depth")
+        assert request.data.decode() == "pair=XETHZEUR&count=10"
+        assert order_book.ws_name == "ETH/EUR"
+        assert order_book.asks.levels() == self.order_book.asks.levels()
+        assert order_book.bids.levels() == self.order_book.bids.levels()
+
+    def test_price_to_fill(self) -> None:
+        assert self.order_book.price_to_fill(20) == 2083.16
+        assert self.order_book.average_price_to_fill(20) == 2083.16
+        # Filled on the second ask level.
+        assert self.order_book.price_to_fill(1500) == 2083.5
+        base_volume = 0.5 + (1500 - 0.5 * 2083.16) / 2083.5
+        assert self.order_book.average_price_to_fill(1500) == pytest.approx(
+            1500 / base_volume
+        )
+        assert self.order_book.price_to_fill(1000, "sell") == 2082.5
+        with pytest.raises(ValueError) as e_info:
+            self.order_book.price_to_fill(10000)
+        assert "Not enough XETHZEUR order book depth to fill 10000." in str(
+            e_info.value
+        )
+
+    def test_checksum(self) -> None:
+        assert checksum_field("0.05005000") == "5005000"
+        assert checksum_field("2083.16000") == "208316000"
+        expected = zlib.crc32(
+            b"20831600050000000"
+            b"208350000100000000208400000200000000"
+            b"20829000030000000"
+            b"208250000120000000"
+        )
+        assert self.order_book.checksum() == expected
+
+    def test_apply_message(self) -> None:
+        self.order_book.apply_message(
+            [
+                336,
+                {"as": ASKS[1:], "bs": BIDS[:1]},
+                "book-10",
+                "ETH/EUR",
+            ]
+        )
+        assert self.order_book.price_to_fill(20) == 2083.5
+        assert len(self.order_book.bids) == 1
+        expected = OrderBook("XETHZEUR")
+        expected.load_snapshot(
+            [["2083.40000", "0.10000000"]] + ASKS[1:], BIDS[:1]
+        )
+        self.order_book.apply_message(
+            [
+                336,
+                {"a": [["2083.40000", "0.10000000", "1618522409.1"]]},
+                {"b": [], "c": str(expected.checksum())},
+                "book-10",
+                "ETH/EUR",
+            ]
+        )
+        assert self.order_book.asks.levels() == expected.asks.levels()
+
+    def test_apply_message_checksum_mismatch(self) -> None:
+        with pytest.raises(OrderBookChecksumError) as e_info:
+            self.order_book.apply_message(
+                [
+                    336,
+                    {
+                        "a": [["2083.16000", "0.00000000", "1618522409.1"]],
+                        "c": "1234",
+                    },
+                    "book-10",
+                    "ETH/EUR",
+                ]
+            )
+        assert "XETHZEUR order book checksum mismatch." in str(e_info.value)
+
+    def test_apply_message_truncate(self) -> None:
+        order_book = OrderBook("XETHZEUR", "ETH/EUR", depth=2)
+        order_book.apply_message(
+            [336, {"as": ASKS, "bs": BIDS}, "book-10", "ETH/EUR"]
+        )
+        assert len(order_book.asks) == 2
+        assert order_book.price_to_fill(3000) == 2083.5
+
+
+class TestOrderBookFeed:
+    def test_feed(self) -> None:
+        update = [
+            336,
+            {"a": [["2083.16000", "0.00000000", "1618522409.1"]]},
+            "book-10",
+            "ETH/EUR",
+        ]
+        expected = OrderBook("XETHZEUR", depth=10)
+        expected.load_snapshot(ASKS[1:], BIDS)
+        update[1]["c"] = str(expected.checksum())
+
+        def handler(server, connection, stream):
+            server.receive(stream)
+            for message in [
+                {"event": "systemStatus", "status": "online"},
+                {"event": "subscriptionStatus", "status": "subscribed"},
+                [336, {"as": ASKS, "bs": BIDS}, "book-10", "ETH/EUR"],
+                [337, {"as": ASKS, "bs": BIDS}, "book-10", "XBT/EUR"],
+                update,
+            ]:
+                server.send(connection, json.dumps(message))
+            while True:
+                server.receive(stream)
+
+        server = WebSocketServer(handler)
+        order_book = OrderBook("XETHZEUR", "ETH/EUR", depth=10)
+        feed = OrderBookFeed([order_book], server.url)
+        feed.start()
+        assert feed.wait_live(5)
+        deadline = time.perf_counter() + 5
+        while time.perf_counter() < deadline and len(order_book.asks) == 3:
+            time.sleep(0.01)
+        assert order_book.live is True
+        assert order_book.asks.levels() == expected.asks.levels()
+        feed.stop()
+        assert order_book.live is False
+        assert json.loads(server.received[0]) == {
+            "event": "subscribe",
+            "pair": ["ETH/EUR"],
+            "subscription": {"name": "book", "depth": 10},
+        }
@@ -0,0 +1,288 @@
+"""order_feed.py tests module."""
+import json
+import time
+from typing import Callable
+from unittest.mock import MagicMock, patch
+
+from krakenapi import KrakenApi
+
+from krakendca import order_feed
+from krakendca.order_feed import OrderFeed, OrderState
+from tests.test_websocket import WebSocketServer
+
+USERREFS = [1, 2]
+
+
+def open_order(userref: int, opentm: float) -> dict:
+    """
+    Return an order as sent by Kraken openOrders channel and REST API.
+
+    :param userref: Order userref.
+    :param opentm: Order open time.
+    :return: Order information dictionary.
+    """
+    return {"status": "open", "userref": userref, "opentm": str(opentm)}
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 5) -> bool:
+    """
+    Wait for a condition to be true.
+
+    :param condition: Condition function.
+    :param timeout: Timeout in seconds.
+    :return: Condition value.
+    """
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestOrderState:
+    def setup(self) -> None:
+        self.state = OrderState(USERREFS)
+
+    def test_add_orders(self) -> None:
+        self.state.add_orders(
+            {
+                "O1": open_order(1, 1618444800.5),
+                "O2": open_order(1, 1618531200.5),
+                # Other userrefs and untagged orders are not kept.
+                "O3": open_order(3, 1618531200.5),
+                "O4": open_order(0, 1618531200.5),
+                # Status update without order information.
+                "O5": {"status": "closed"},
+            }
+        )
+        # Orders already known are counted once.
+        self.state.add_orders({"O2": open_order(1, 1618531200.5)})
+        assert self.state.count_orders(1, 0) == 2
+        assert self.state.count_orders(1, 1618531200) == 1
+        assert self.state.count_orders(1, 1618531201) == 0
+        assert self.state.count_orders(2, 0) == 0
+        assert self.state.count_orders(3, 0) == 0
+        assert self.state.has_tagged_orders(1) is True
+        assert self.state.has_tagged_orders(2) is False
+
+    def test_reset(self) -> None:
+        self.state.add_orders({"O1": open_order(1, 1618444800.5)})
+        self.state.reset({"O2": open_order(2, 1618444800.5)}, {2})
+        assert self.state.count_orders(1, 0) == 0
+        assert self.state.count_orders(2, 0) == 1
+        # Tagged orders were seen for both userrefs.
+        assert self.state.has_tagged_orders(1) is True
+        assert self.state.has_tagged_orders(2) is True
+
+    def test_set_open_time(self) -> None:
+        self.state.add_orders({"O1": open_order(1, 1618531200.5)})
+        self.state.set_open_time("O1", 1, 1618444800.5)
+        assert self.state.count_orders(1, 1618531200) == 0
+        assert self.state.count_orders(1, 0) == 1
+        # Orders not known yet are counted once.
+        self.state.set_open_time("O2", 1, 1618444800.5)
+        self.state.add_orders({"O2": open_order(1, 1618531200.5)})
+        assert self.state.count_orders(1, 0) == 2
+        # Original open times are kept on reset.
+        self.state.opened_at = {"O3": 1618444800.5}
+        self.state.reset({"O3": open_order(1, 1618531200.5)}, set())
+        assert self.state.count_orders(1, 1618531200) == 0
+
+    def test_prune(self) -> None:
+        self.state.add_orders(
+            {
+                "O1": open_order(1, 1618358400.5),
+                "O2": open_order(1, 1618444800.5),
+                "O3": open_order(2, 1618358400.5),
+                "O4": open_order(2, 1618531200.5),
+            }
+        )
+        self.state.add_orders(
+            {"O1": {"status": "closed"}, "O3": {"status": "canceled"}}
+        )
+        self.state.add_orders({"O2": {"status": "closed"}})
+        self.state.prune(1618531200)
+        # Closed orders opened before start are forgotten, open ones kept.
+        assert self.state.count_orders(1, 0) == 0
+        assert self.state.count_orders(2, 0) == 1
+        # Forgotten orders are counted again if seen again.
+        self.state.add_orders({"O2": open_order(1, 1618444800.5)})
+        assert self.state.count_orders(1, 0) == 1
+        assert self.state.has_tagged_orders(1) is True
+
+    def test_prune_open_orders(self) -> None:
+        self.state.add_orders({"O1": open_order(1, 1618358400.5)})
+        self.state.prune(1618531200)
+        # Still open orders traded later are not counted again.
+        self.state.add_orders({"O1": {"userref": 1, "opentm": "1618531300.1"}})
+        assert self.state.count_orders(1, 0) == 1
+        assert self.state.count_orders(1, 1618531200) == 0
+
+    def test_untagged_count(self) -> None:
+        assert self.state.get_untagged_count(1, 1618531200) is None
+        self.state.set_untagged_count(1, 1618531200, 2)
+        assert self.state.get_untagged_count(1, 1618531200) == 2
+        # Counted again from another start.
+        assert self.state.get_untagged_count(1, 1618617600) is None
+        # Tagged orders and updates keep the count.
+        self.state.add_orders(
+            {"O1": open_order(1, 1618531300.5), "O2": {"status": "closed"}}
+        )
+        assert self.state.get_untagged_count(1, 1618531200) == 2
+        self.state.add_orders({"O3": open_order(0, 1618531300.5)})
+        assert self.state.get_untagged_count(1, 1618531200) is None
+        self.state.set_untagged_count(1, 1618531200, 3)
+        self.state.reset({}, set())
+        assert self.state.get_untagged_count(1, 1618531200) is None
+
+
+class TestOrderFeed:
+    def setup(self) -> None:
+        self.ka = MagicMock(spec=KrakenApi)
+        self.ka.create_api_request.side_effect = (
+            lambda public, method, post_inputs=None: (method, post_inputs)
+        )
+        self.ka.send_api_request.side_effect = self.send_api_request
+        self.requests = []
+        self.open_orders = {"O1": open_order(1, 1618444800.5)}
+        self.closed_orders = {"O2": open_order(1, 1618358400.5)}
+
+    def send_api_request(self, request: tuple) -> dict:
+        """
+        Stand-in Kraken REST API private endpoints.
+
+        :param request: Endpoint and POST inputs.
+        :return: Response result.
+        """
+        method, post_inputs = request
+        self.requests.append(method)
+        userref = (post_inputs or {}).get("userref")
+        if method == "GetWebSocketsToken":
+            return {"token": "WS_TOKEN"}
+        orders = self.open_orders if method == "OpenOrders" else {}
+        if method == "ClosedOrders":
+            orders = self.closed_orders
+        orders = {
+            txid: order_infos
+            for txid, order_infos in orders.items()
+            if userref is None or order_infos.get("userref") == userref
+        }
+        if method == "OpenOrders":
+            return {"open": orders}
+        return {"closed": orders, "count": len(orders)}
+
+    def feed_handler(self, *messages: list) -> Callable:
+        """
+        Return a stand-in private feed handler sending channel snapshots,
+        then messages.
+
+        :param messages: Messages sent after the snapshots.
+        :return: WebSocketServer handler.
+        """
+
+        def handler(server, connection, stream):
+            server.receive(stream)
+            server.receive(stream)
+            for message in [
+                {"event": "systemStatus", "status": "online"},
+                [[{"O1": open_order(1, 1618444800.5)}], "openOrders", 1],
+                [[], "ownTrades", 1],
+                *messages,
+            ]:
+                if isinstance(message, list):
+                    message[2] = {"sequence": message[2]}
+                server.send(connection, json.dumps(message))
+            while True:
+                server.receive(stream)
+
+        return handler
+
+    def test_feed(self) -> None:
+        trade = {"ordertxid": "O4", "userref": 2, "time": "1618531300.1"}
+        server = WebSocketServer(
+            self.feed_handler(
+                [[{"O3": open_order(2, 1618531200.5)}], "openOrders", 2],
+                [[{"T1": trade}], "ownTrades", 2],
+            )
+        )
+        trades = []
+        feed = OrderFeed(
+            self.ka,
+            USERREFS,
+            lambda: 1618358400,
+            server.url,
+            on_trade=trades.append,
+        )
+        feed.start()
+        assert feed.wait_live(5)
+        assert feed.live is True
+        assert wait_until(lambda: feed.state.count_orders(2, 0) == 2)
+        # Trades after the snapshot are passed on.
+        assert trades == [trade]
+        # Resynced from REST API, with closed orders.
+        assert feed.state.count_orders(1, 0) == 2
+        assert feed.state.count_orders(1, 1618444800) == 1
+        feed.stop()
+        assert feed.live is False
+        assert [json.loads(message) for message in server.received[:2]] == [
+            {
+                "event": "subscribe",
+                "subscription": {"name": channel, "token": "WS_TOKEN"},
+            }
+            for channel in ("openOrders", "ownTrades")
+        ]
+
+    def test_feed_prune(self) -> None:
+        start = [1618358400]
+        feed = OrderFeed(self.ka, USERREFS, lambda: start[0], "")
+        feed.resync()
+        with patch.object(feed.state, "prune") as prune:
+            for sequence in (1, 2):
+                feed.handle_message(
+                    json.dumps([[], "ownTrades", {"sequence": sequence}])
+                )
+            # Pruned once the earliest delay start moves only.
+            prune.assert_not_called()
+            start[0] = 1618444800
+            for sequence in (3, 4):
+                feed.handle_message(
+                    json.dumps([[], "ownTrades", {"sequence": sequence}])
+                )
+        prune.assert_called_once_with(1618444800)
+
+    def test_resync_sequence_gap(self, logging_capture) -> None:
+        server = WebSocketServer(
+            self.feed_handler(
+                [[{"O3": open_order(2, 1618531200.5)}], "openOrders", 3],
+            )
+        )
+        feed = OrderFeed(self.ka, USERREFS, lambda: 1618358400, server.url)
+        feed.start()
+        assert feed.wait_live(5)
+        assert wait_until(lambda: feed.state.count_orders(2, 0) == 1)
+        feed.stop()
+        assert self.requests.count("ClosedOrders") >= 4
+        assert (
+            "Order feed openOrders sequence gap (1 -> 3), resyncing."
+            in logging_capture.read()
+        )
+
+    def test_resync_reconnect(self) -> None:
+        def handler(server, connection, stream):
+            if server.connections == 2:
+                # First connection dropped after subscribing.
+                server.connections = 1
+                server.receive(stream)
+                server.receive(stream)
+                return
+            self.feed_handler()(server, connection, stream)
+
+        server = WebSocketServer(handler, connections=2)
+        feed = OrderFeed(self.ka, USERREFS, lambda: 1618358400, server.url)
+        with patch.object(order_feed, "RECONNECT_DELAY", 0.01):
+            feed.start()
+            assert feed.wait_live(5)
+        # State requested again on the new connection.
+        assert self.requests.count("GetWebSocketsToken") == 2
+        assert self.requests.count("OpenOrders") == 4
+        assert feed.state.count_orders(1, 0) == 2
+        feed.stop()
@@ -0,0 +1,149 @@
+"""order_store.py tests module."""
+import multiprocessing
+from datetime import datetime
+
+import pytest
+
+from krakendca.order import Order
+from krakendca.order_store import OrderStore
+
+
+def create_order(
+    date: str, pair: str = "XETHZEUR", amount: float = 20
+) -> Order:
+    order = Order.buy_limit_order(
+        datetime.strptime(date, "%Y-%m-%d %H:%M:%S"),
+        pair,
+        amount,
+        2083.16,
+        8,
+        4,
+    )
+    order.txid = f"{pair}-{date}"
+    order.description = f"buy {order.volume} {pair} @ limit 2083.16"
+    return order
+
+
+def write_orders(filepath: str, pair: str, count: int) -> None:
+    """
+    Save orders one per transaction from another process.
+
+    :param filepath: Database file path.
+    :param pair: Orders pair.
+    :param count: Orders count to save.
+    :return: None
+    """
+    store = OrderStore(filepath)
+    for index in range(count):
+        store.add_order(
+            create_order(
+                f"2021-04-15 21:{index // 60:02d}:" f"{index % 60:02d}", pair
+            )
+        )
+    store.close()
+
+
+class TestOrderStore:
+    store: OrderStore
+
+    @pytest.fixture(autouse=True)
+    def order_store(self, tmp_path) -> None:
+        self.filepath = str(tmp_path / "orders.db")
+        self.store = OrderStore(self.filepath)
+        yield
+        self.store.close()
+
+    def test_init(self) -> None:
+        store = OrderStore(self.filepath)
+        assert store.filepath == self.filepath
+        store.close()
+
+    def test_add_order(self) -> None:
+        assert self.store.last_order("XETHZEUR") is None
+        order = create_order("2021-04-15 21:33:28")
+        self.store.add_order(order)
+        # Already saved txid is ignored.
+        self.store.add_order(order)
+        assert len(self.store.get_orders("XETHZEUR")) == 1
+        last_order = self.store.last_order("XETHZEUR")
+        assert vars(last_order) == vars(order)
+
+    def test_last_order(self) -> None:
+        self.store.add_orders(
+            [
+                create_order("2021-04-16 21:33:28"),
+                create_order("2021-04-17 21:33:28", "XXBTZEUR"),
+                create_order("2021-04-15 21:33:28"),
+            ]
+        )
+        assert self.store.last_order("XETHZEUR").date == datetime(
+            2021, 4, 16, 21, 33, 28
+        )
+        assert self.store.last_order("XXBTZEUR").pair == "XXBTZEUR"
+        assert self.store.last_order("DOTEUR") is None
+
+    def test_get_orders(self) -> None:
+        self.store.add_orders(
+            [
+                create_order("2021-04-14 21:33:28"),
+                create_order("2021-04-15 21:33:28", amount=100),
+                create_order("2021-04-16 21:33:28"),
+            ]
+        )
+        since = datetime(2021, 4, 15)
+        orders = self.store.get_orders("XETHZEUR", since)
+        assert [order.date.day for order in orders] == [15, 16]
+        # Orders within 1% of the amount only.
+        orders = self.store.get_orders("XETHZEUR", since, amount=20)
+        assert [order.date.day for order in orders] == [16]
+
+    def test_remove_orders(self) -> None:
+        orders = [
+            create_order("2021-04-14 21:33:28"),
+            create_order("2021-04-15 21:33:28"),
+        ]
+        self.store.add_orders(orders)
+        removed = self.store.remove_orders([orders[0].txid, "UNKNOWN"])
+        assert removed == 1
+        assert [order.txid for order in self.store.get_orders("XETHZEUR")] == [
+            orders[1].txid
+        ]
+
+    def test_concurrent_writers(self) -> None:
+        context = multiprocessing.get_context("fork")
+        writers = [
+            context.Process(
+                target=write_orders, args=(self.filepath, pair, 200)
+            )
+            for pair in ("XETHZEUR", "XXBTZEUR", "DOTEUR")
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+            assert writer.exitcode == 0
+        for pair in ("XETHZEUR", "XXBTZEUR", "DOTEUR"):
+            assert len(self.store.get_orders(pair)) == 200
+
+    def test_import_csv(self, logging_capture) -> None:
+        csv_filepath = "tests/fixtures/test_handle_dca_logic.csv"
+        # Duplicated txid in the history file is imported once.
+        assert self.store.import_csv(csv_filepath) == 2
+        # Imported again, already saved orders are ignored.
+        assert self.store.import_csv(csv_filepath) == 0
+        orders = self.store.get_orders("XETHZEUR")
+        assert [order.txid for order in orders] == [
+            "XYZS4K-OILOE-36ABCD",
+            "OCYS4K-OILOE-36HPAE",
+        ]
+        assert orders[0].pair_price == 2083.16
+        assert orders[0].description == "buy 0.00957589 ETHEUR @ limit 2083.16"
+        assert (
+            f"0 orders imported from {csv_filepath} to {self.filepath}, 3 "
+            f"already saved." in logging_capture.read()
+        )
+
+    def test_import_csv_not_found(self) -> None:
+        with pytest.raises(ValueError) as e_info:
+            self.store.import_csv("tests/fixtures/missing.csv")
+        assert "Can't read order history ->" in str(e_info.value)
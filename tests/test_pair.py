@@ -42,6 +42,7 @@ class TestPair:
         asset_pairs = self.ka.get_asset_pairs()
         pair = Pair.get_pair_from_kraken(self.ka, asset_pairs, "XETHZEUR")
         self.assert_xethzeur_pair(pair)
+        assert pair.ws_name == "ETH/EUR"
 
     def test_get_pair_information(self) -> None:
         # Test with existing pair.
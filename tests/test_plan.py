@@ -0,0 +1,87 @@
+"""plan.py tests module."""
+from datetime import datetime
+
+from krakenapi import KrakenApi
+
+from krakendca.account import Account
+from krakendca.dca import DCA
+from krakendca.order import Order, OrderLadder
+from krakendca.pair import Pair
+from krakendca.plan import Plan, PlannedOrder
+
+
+class TestPlan:
+    plan: Plan
+
+    def setup(self) -> None:
+        ka = KrakenApi("api_public_key", "api_private_key")
+        eth = Pair("XETHZEUR", "ETHEUR", "XETH", "ZEUR", 2, 8, 4, 0.005)
+        btc = Pair("XXBTZEUR", "XBTEUR", "XXBT", "ZEUR", 1, 8, 4, 0.0001)
+        order = Order.buy_limit_order(
+            datetime(2021, 4, 15, 21, 33, 28), "XETHZEUR", 20, 2083.16, 8, 4
+        )
+        self.account = Account(1618522408, {}, {}, {}, {}, 1618358400)
+        self.plan = Plan(
+            self.account,
+            [
+                PlannedOrder(DCA(ka, 1, eth, 20), order),
+                PlannedOrder(
+                    DCA(ka, 1, btc, 20),
+                    None,
+                    "Already placed an order today.",
+                ),
+            ],
+        )
+
+    def test_init(self) -> None:
+        assert self.plan.account is self.account
+        assert len(self.plan.planned_orders) == 2
+
+    def test_orders(self) -> None:
+        assert self.plan.orders == self.plan.planned_orders[:1]
+
+    def test_str(self) -> None:
+        assert str(self.plan) == (
+            "Plan (1 order):\n"
+            "XETHZEUR: buy 0.00957589XETH at 2083.16ZEUR, 19.9481ZEUR + "
+            "0.0519ZEUR fee = 20.0ZEUR.\n"
+            "XXBTZEUR: no order, Already placed an order today."
+        )
+
+    def test_str_ladder(self) -> None:
+        planned = self.plan.planned_orders[0]
+        planned.order = OrderLadder.buy_limit_ladder(
+            planned.order.date, "XETHZEUR", 40, 2083.16, 2062.33, 2, 2, 8, 4
+        )
+        assert str(planned) == (
+            "XETHZEUR: buy 0.0192485XETH at 2 orders from 2083.16ZEUR to "
+            "2062.33ZEUR, 39.8962ZEUR + 0.1038ZEUR fee = 40.0ZEUR."
+        )
+
+    def test_handling(self, logging_capture) -> None:
+        planned = self.plan.planned_orders[0]
+        with planned.handling():
+            raise OSError("Run deadline exceeded, Ticker not sent.")
+        assert planned.order is None
+        assert planned.status == "failed"
+        assert planned.duration > 0
+        assert (
+            "DCA XETHZEUR failed: Run deadline exceeded, Ticker not sent."
+            in logging_capture.read()
+        )
+        assert str(planned) == (
+            "XETHZEUR: failed, Run deadline exceeded, Ticker not sent."
+        )
+
+    def test_summary(self) -> None:
+        self.plan.planned_orders[0].sent = True
+        self.plan.planned_orders[0].duration = 0.123
+        self.plan.planned_orders.append(
+            PlannedOrder(self.plan.planned_orders[0].dca, None, error="Lag.")
+        )
+        assert self.plan.summary() == (
+            "Run summary: 1 completed, 1 skipped, 1 failed.\n"
+            "XETHZEUR: completed in 0.12s\n"
+            "XXBTZEUR: skipped in 0.00s, Already placed an order today.\n"
+            "XETHZEUR: failed in 0.00s, Lag."
+        )
@@ -0,0 +1,145 @@
+"""profiling.py tests module."""
+import builtins
+import os
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+from urllib.request import Request
+
+import vcr
+from krakenapi import KrakenApi
+
+from krakendca.profiling import ImportTimer, Profiler
+
+
+def fibonacci(n: int) -> int:
+    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+
+class TestImportTimer:
+    def test_install_uninstall(self) -> None:
+        original_import = builtins.__import__
+        import_timer = ImportTimer()
+        import_timer.install()
+        assert builtins.__import__ != original_import
+        import json  # noqa: F401
+
+        import_timer.uninstall()
+        assert builtins.__import__ == original_import
+        assert "json" in import_timer.timings
+        assert import_timer.timings["json"] >= 0
+
+    def test_nested_imports_not_recorded(self) -> None:
+        import_timer = ImportTimer()
+        import_timer.install()
+        # Nested imports of the vcr package are not recorded.
+        __import__("vcr.cassette")
+        import_timer.uninstall()
+        assert list(import_timer.timings) == ["vcr.cassette"]
+
+
+class TestProfiler:
+    profiler: Profiler
+
+    def setup(self) -> None:
+        self.profiler = Profiler("profile")
+
+    @vcr.use_cassette("tests/fixtures/vcr_cassettes/test_get_time.yaml")
+    def test_instrument_api(self) -> None:
+        ka = KrakenApi()
+        self.profiler.instrument_api(ka)
+        assert ka.get_time() == 1618001260
+        calls, wall, cpu = self.profiler.endpoints["Time"]
+        assert calls == 1
+        assert wall > 0
+        assert cpu >= 0
+        assert self.profiler.network_time >= 0
+
+    def test_run(self) -> None:
+        assert self.profiler.run(fibonacci, 10) == 55
+        assert self.profiler.wall_time > 0
+        assert self.profiler.cpu_time >= 0
+
+    def test_write_stats(self, tmp_path) -> None:
+        self.profiler.output_prefix = str(tmp_path / "output" / "profile")
+        self.profiler.run(fibonacci, 15)
+        stats_filepath, collapsed_filepath = self.profiler.write_stats()
+        assert os.path.isfile(stats_filepath)
+        stats = pstats.Stats(stats_filepath)
+        assert any(name == "fibonacci" for _, _, name in stats.stats)
+        with open(collapsed_filepath, "r") as stream:
+            lines = stream.read().splitlines()
+        assert lines
+        for line in lines:
+            stack, microseconds = line.rsplit(" ", 1)
+            assert int(microseconds) > 0
+        assert any("fibonacci (test_profiling.py" in line for line in lines)
+
+    def test_write_stats_threads(self, tmp_path) -> None:
+        self.profiler.output_prefix = str(tmp_path / "profile")
+
+        def run_in_threads() -> list:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                return list(executor.map(fibonacci, [12, 13]))
+
+        assert self.profiler.run(run_in_threads) == [144, 233]
+        stats_filepath, _ = self.profiler.write_stats()
+        stats = pstats.Stats(stats_filepath)
+        # Worker threads calls merged with the calling thread ones.
+        assert any(name == "fibonacci" for _, _, name in stats.stats)
+        assert any(name == "run_in_threads" for _, _, name in stats.stats)
+
+    def test_instrument_api_threads(self) -> None:
+        ka = MagicMock(spec=KrakenApi)
+        ka.send_api_request.return_value = {}
+        self.profiler.instrument_api(ka)
+        request = Request("https://api.kraken.com/0/public/Time")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(800):
+                executor.submit(ka.send_api_request, request)
+        assert self.profiler.endpoints["Time"][0] == 800
+
+    def test_collapse_stacks(self) -> None:
+        main = ("main.py", 1, "main")
+        fetch = ("api.py", 10, "fetch")
+        parse = ("api.py", 20, "parse")
+        stats = {
+            main: (1, 1, 0.1, 1.0, {}),
+            fetch: (2, 2, 0.2, 0.8, {main: (2, 2, 0.2, 0.8)}),
+            parse: (
+                3,
+                3,
+                0.6,
+                0.6,
+                {fetch: (2, 2, 0.4, 0.4), main: (1, 1, 0.2, 0.2)},
+            ),
+        }
+        collapsed = dict(Profiler.collapse_stacks(stats))
+        assert collapsed == {
+            "main (main.py:1)": 100000,
+            "main (main.py:1);fetch (api.py:10)": 200000,
+            "main (main.py:1);fetch (api.py:10);parse (api.py:20)": 400000,
+            "main (main.py:1);parse (api.py:20)": 200000,
+        }
+
+    def test_function_label(self) -> None:
+        assert Profiler.function_label(("~", 0, "<built-in>")) == "<built-in>"
+        assert (
+            Profiler.function_label(("/app/krakendca/dca.py", 5, "a;b"))
+            == "a,b (dca.py:5)"
+        )
+
+    def test_report(self, logging_capture) -> None:
+        self.profiler.import_timer.timings = {"krakenapi": 0.0123}
+        self.profiler.endpoints = {"Ticker": [2, 0.5, 0.1]}
+        self.profiler.wall_time = 1
+        self.profiler.cpu_time = 0.25
+        self.profiler.report()
+        captured = logging_capture.read()
+        assert captured == (
+            "Import time breakdown:\n"
+            "  krakenapi: 12.3ms\n"
+            "Run: 1000.0ms wall, 250.0ms CPU, 400.0ms network.\n"
+            "Network time per endpoint:\n"
+            "  Ticker: 2 call(s), 400.0ms network, 100.0ms CPU.\n"
+        )
@@ -0,0 +1,200 @@
+"""reconcile.py tests module."""
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from krakenapi import KrakenApi
+
+from krakendca.order import Order
+from krakendca.order_store import OrderStore
+from krakendca.pair import Pair
+from krakendca.reconcile import Reconciler
+from krakendca.utils import pair_userref
+
+PAIR = Pair("XETHZEUR", "ETHEUR", "XETH", "ZEUR", 2, 8, 4, 0.005)
+USERREF = pair_userref("XETHZEUR")
+
+
+def kraken_order(
+    opentm: int,
+    volume: str = "0.01000000",
+    status: str = "closed",
+    userref: int = USERREF,
+    pair: str = "ETHEUR",
+) -> dict:
+    return {
+        "userref": userref,
+        "status": status,
+        "opentm": opentm,
+        "vol": volume,
+        "vol_exec": volume if status == "closed" else "0.00000000",
+        "cost": "20.00000" if status == "closed" else "0.00000",
+        "fee": "0.05200" if status == "closed" else "0.00000",
+        "oflags": "fciq",
+        "descr": {
+            "pair": pair,
+            "type": "buy",
+            "ordertype": "limit",
+            "price": "2000.00",
+            "order": f"buy {volume} {pair} @ limit 2000.00",
+        },
+    }
+
+
+# 2021-04-15 00:00:00 UTC.
+DAY = 1618444800
+CLOSED_ORDERS = {
+    "MATCHED": kraken_order(DAY + 60),
+    "MISSING": kraken_order(DAY + 120),
+    "CANCELED": kraken_order(DAY + 180, status="canceled"),
+    "DIFFERING": kraken_order(DAY + 240),
+    "OTHER": kraken_order(DAY + 300, userref=0, pair="XBTEUR"),
+}
+OPEN_ORDERS = {
+    "OPEN": kraken_order(DAY + 360, status="open", userref=0),
+    "EARLIER": kraken_order(DAY - 86400, status="open"),
+}
+
+
+def journal_order(date: str, txid: str, volume: float = 0.01) -> Order:
+    order = Order(
+        datetime.strptime(date, "%Y-%m-%d %H:%M:%S"),
+        "XETHZEUR",
+        "buy",
+        "limit",
+        "fciq",
+        2000.0,
+        volume,
+        20.0,
+        0.052,
+        20.052,
+    )
+    order.txid = txid
+    order.description = f"buy {volume} ETHEUR @ limit 2000.00"
+    return order
+
+
+JOURNAL = [
+    journal_order("2021-04-15 00:01:00", "MATCHED"),
+    journal_order("2021-04-15 00:03:00", "CANCELED"),
+    journal_order("2021-04-15 00:04:00", "DIFFERING", 0.02),
+    journal_order("2021-04-15 00:05:00", "VANISHED"),
+    journal_order("2021-04-15 00:06:00", None),
+    journal_order("2021-04-10 00:00:00", "BEFORE"),
+]
+
+
+class TestReconciler:
+    @pytest.fixture(autouse=True)
+    def reconciler(self, tmp_path) -> None:
+        self.ka = MagicMock(spec=KrakenApi)
+        self.ka.create_api_request.side_effect = (
+            lambda public, method, post_inputs=None: (method, post_inputs)
+        )
+        self.ka.send_api_request.side_effect = self.send_api_request
+        self.orders_filepath = str(tmp_path / "orders.csv")
+        pd.DataFrame.from_records(
+            [{**order.__dict__, "date": order.date} for order in JOURNAL[::-1]]
+        ).to_csv(self.orders_filepath, index=False)
+        self.reconciler = Reconciler(
+            self.ka, [PAIR], orders_filepath=self.orders_filepath
+        )
+        self.start = datetime(2021, 4, 15)
+        self.end = datetime(2021, 4, 16)
+
+    @staticmethod
+    def send_api_request(request: tuple) -> dict:
+        method, post_inputs = request
+        if method == "OpenOrders":
+            return {"open": OPEN_ORDERS}
+        # Pages of 2 orders.
+        ofs = post_inputs.get("ofs", 0)
+        txids = list(CLOSED_ORDERS)[ofs : ofs + 2]  # noqa: E203
+        return {
+            "closed": {txid: CLOSED_ORDERS[txid] for txid in txids},
+            "count": len(CLOSED_ORDERS),
+        }
+
+    def test_get_closed_orders(self) -> None:
+        assert self.reconciler.get_closed_orders(1, 2) == CLOSED_ORDERS
+        offsets = [
+            call.args[2].get("ofs")
+            for call in self.ka.create_api_request.call_args_list
+        ]
+        assert sorted(offsets, key=str) == [2, 4, None]
+        assert self.ka.create_api_request.call_args_list[0].args[2] == {
+            "start": 1,
+            "end": 2,
+            "closetime": "open",
+        }
+
+    def test_order_from_kraken(self) -> None:
+        order = Reconciler.order_from_kraken("OPEN", OPEN_ORDERS["OPEN"], PAIR)
+        assert order.date == datetime(2021, 4, 15, 0, 6)
+        assert order.pair == "XETHZEUR"
+        assert order.volume == 0.01
+        assert order.pair_price == 2000.0
+        # Cost and fee estimated until filled.
+        assert order.price == 20.0
+        assert order.fee == 0.052
+        assert order.txid == "OPEN"
+        canceled = Reconciler.order_from_kraken(
+            "CANCELED", CLOSED_ORDERS["CANCELED"], PAIR
+        )
+        assert canceled.volume == 0
+
+    def test_reconcile(self) -> None:
+        reconciliation = self.reconciler.reconcile(self.start, self.end)
+        assert reconciliation.kraken_count == 5
+        assert reconciliation.journal_count == 5
+        assert list(reconciliation.missing) == ["OPEN", "MISSING"]
+        assert reconciliation.orphaned == {
+            "CANCELED": "canceled on Kraken",
+            "VANISHED": "not on Kraken",
+        }
+        assert list(reconciliation.mismatched) == ["DIFFERING"]
+        assert reconciliation.untracked == 1
+        assert not reconciliation.is_consistent
+        report = reconciliation.report().splitlines()
+        assert report[0] == (
+            "Reconciliation from 2021-04-15 00:00:00 to 2021-04-16 00:00:00: "
+            "5 Kraken orders, 5 journal orders, 2 missing, 2 orphaned, "
+            "1 mismatched."
+        )
+        assert (
+            "  Mismatched DIFFERING: volume 0.02 in journal, 0.01 on Kraken."
+            in report
+        )
+        assert "  Orphaned CANCELED: canceled on Kraken." in report
+        assert report[-1] == "  1 journal orders without txid not reconciled."
+
+    def test_repair_orders_csv(self) -> None:
+        self.reconciler.repair(self.reconciler.reconcile(self.start, self.end))
+        history = pd.read_csv(self.orders_filepath, dtype={"txid": str})
+        assert history["txid"].fillna("").tolist() == [
+            "BEFORE",
+            "MATCHED",
+            "MISSING",
+            "DIFFERING",
+            "",
+            "OPEN",
+        ]
+        assert history["volume"].tolist() == [0.01] * 6
+        assert self.reconciler.reconcile(self.start, self.end).is_consistent
+
+    def test_repair_order_store(self, tmp_path) -> None:
+        store = OrderStore(str(tmp_path / "orders.db"))
+        store.add_orders(JOURNAL)
+        reconciler = Reconciler(self.ka, [PAIR], order_store=store)
+        reconciler.repair(reconciler.reconcile(self.start, self.end))
+        orders = store.get_orders("XETHZEUR", self.start)
+        assert [order.txid for order in orders] == [
+            "MATCHED",
+            "MISSING",
+            "DIFFERING",
+            None,
+            "OPEN",
+        ]
+        assert reconciler.reconcile(self.start, self.end).is_consistent
+        store.close()
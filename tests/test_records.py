@@ -0,0 +1,175 @@
+"""records.py tests module."""
+import json
+import sys
+
+import pytest
+import vcr
+
+from krakendca.dca import DCA
+from krakendca.pair import Pair
+from krakendca.reconcile import Reconciler
+from krakendca.records import (
+    OrderDescription,
+    OrderRecord,
+    PairRecord,
+    decode_response,
+)
+from krakendca.retry import RetryingKrakenApi
+from krakendca.utils import pair_userref
+
+PAIR = Pair("XETHZEUR", "ETHEUR", "XETH", "ZEUR", 2, 8, 4, 0.005)
+
+
+def kraken_order(pair: str, price: str, volume: str, userref: int) -> dict:
+    """
+    Return a closed limit order as returned by Kraken.
+
+    :param pair: Order pair alternative name.
+    :param price: Order limit price.
+    :param volume: Order volume.
+    :param userref: Order userref.
+    :return: Kraken order information.
+    """
+    return {
+        "refid": None,
+        "userref": userref,
+        "status": "closed",
+        "reason": None,
+        "opentm": 1631318400.5,
+        "closetm": 1631318460.1,
+        "starttm": 0,
+        "expiretm": 0,
+        "descr": {
+            "pair": pair,
+            "type": "buy",
+            "ordertype": "limit",
+            "price": price,
+            "price2": "0",
+            "leverage": "none",
+            "order": f"buy {volume} {pair} @ limit {price}",
+            "close": "",
+        },
+        "vol": volume,
+        "vol_exec": volume,
+        "cost": "19.94",
+        "fee": "0.05",
+        "price": price,
+        "stopprice": "0.00000",
+        "limitprice": "0.00000",
+        "misc": "",
+        "oflags": "fciq",
+        "trades": ["TQVTSR-IUB7V-GCNL5B"],
+    }
+
+
+def kraken_body(result: dict) -> bytes:
+    return json.dumps({"error": [], "result": result}).encode()
+
+
+class TestDecodeResponse:
+    def setup(self) -> None:
+        self.userref = pair_userref(PAIR.name)
+        self.orders = {
+            "OCYS4K-OILOE-36HPAE": kraken_order(
+                "ETHEUR", "2882.44", "0.00691799", self.userref
+            ),
+            "OAHFAY-XD3PN-LPUCKW": kraken_order(
+                "XBTEUR", "38857.2", "0.00051336", 0
+            ),
+        }
+
+    def test_decode_orders(self) -> None:
+        result = decode_response(
+            kraken_body({"closed": self.orders, "count": 2}), "ClosedOrders"
+        )
+        assert result["count"] == 2
+        closed = result["closed"]
+        assert list(closed) == list(self.orders)
+        order = closed["OCYS4K-OILOE-36HPAE"]
+        assert isinstance(order, OrderRecord)
+        assert isinstance(order.get("descr"), OrderDescription)
+        # Read like the Kraken order, without the fields not read.
+        assert order.get("userref") == self.userref
+        assert order.get("vol") == "0.00691799"
+        assert order.get("descr").get("price") == "2882.44"
+        assert order.get("closetm") is None
+        assert order.get("reason", "none") == "none"
+        assert not hasattr(order, "__dict__")
+        assert order == {
+            "userref": self.userref,
+            "status": "closed",
+            "opentm": 1631318400.5,
+            "vol": "0.00691799",
+            "vol_exec": "0.00691799",
+            "cost": "19.94",
+            "fee": "0.05",
+            "oflags": "fciq",
+            "descr": {
+                "pair": "ETHEUR",
+                "type": "buy",
+                "ordertype": "limit",
+                "price": "2882.44",
+                "order": "buy 0.00691799 ETHEUR @ limit 2882.44",
+            },
+        }
+        assert decode_response(kraken_body({"open": {}}), "OpenOrders") == {
+            "open": {}
+        }
+
+    def test_records_size(self) -> None:
+        closed = decode_response(
+            kraken_body({"closed": self.orders, "count": 2}), "ClosedOrders"
+        )["closed"]
+        order = closed["OCYS4K-OILOE-36HPAE"]
+        descr = order.get("descr")
+        raw = self.orders["OCYS4K-OILOE-36HPAE"]
+        assert (
+            sys.getsizeof(order) + sys.getsizeof(descr)
+            < (sys.getsizeof(raw) + sys.getsizeof(raw["descr"])) / 2
+        )
+
+    def test_decode_errors(self) -> None:
+        body = json.dumps({"error": ["EOrder:Unknown order"]}).encode()
+        assert decode_response(body, "OpenOrders") == "EOrder:Unknown order"
+        with pytest.raises(ValueError) as e_info:
+            decode_response(b"<html>", "OpenOrders")
+        assert "Response received from API was wrongly formatted" in str(
+            e_info.value
+        )
+        # Other endpoints results are left as is.
+        assert decode_response(kraken_body({"ZEUR": "100"}), "Balance") == {
+            "ZEUR": "100"
+        }
+
+    def test_orders_records_consumers(self) -> None:
+        closed = decode_response(
+            kraken_body({"closed": self.orders, "count": 2}), "ClosedOrders"
+        )["closed"]
+        pair_orders = DCA.extract_pair_orders(closed, PAIR.name, "ETHEUR")
+        assert list(pair_orders) == ["OCYS4K-OILOE-36HPAE"]
+        assert DCA.filter_ignored_orders(pair_orders, 20) == pair_orders
+        assert list(DCA.extract_tagged_orders(closed, None)) == [
+            "OAHFAY-XD3PN-LPUCKW"
+        ]
+        order = Reconciler.order_from_kraken(
+            "OCYS4K-OILOE-36HPAE", closed["OCYS4K-OILOE-36HPAE"], PAIR
+        )
+        assert order.volume == 0.00691799
+        assert order.pair_price == 2882.44
+        assert order.total_price == 19.99
+        assert order.o_flags == "fciq"
+
+
+class TestRetryingDecoding:
+    def setup(self) -> None:
+        self.ka = RetryingKrakenApi("api_public_key", "api_private_key")
+
+    @vcr.use_cassette(
+        "tests/fixtures/vcr_cassettes/test_get_pair_from_kraken.yaml"
+    )
+    def test_asset_pairs_records(self) -> None:
+        asset_pairs = self.ka.get_asset_pairs()
+        assert isinstance(asset_pairs["XETHZEUR"], PairRecord)
+        assert asset_pairs["XETHZEUR"].get("fees") is None
+        pair = Pair.get_pair_from_kraken(self.ka, asset_pairs, "XETHZEUR")
+        assert vars(pair) == dict(vars(PAIR), ws_name="ETH/EUR")
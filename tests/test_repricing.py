@@ -0,0 +1,228 @@
+"""repricing.py tests module."""
+from typing import Dict, List
+from unittest.mock import MagicMock
+
+from krakenapi import KrakenApi
+
+from krakendca.dca import DCA
+from krakendca.order_feed import OrderState
+from krakendca.pair import Pair
+from krakendca.repricing import MAX_CANCEL_BATCH, Repricer
+from krakendca.strategy import ValueAveragingStrategy
+from krakendca.utils import pair_userref
+
+NOW: float = 1631476800.0
+ETH_USERREF: int = pair_userref("XETHZEUR")
+BTC_USERREF: int = pair_userref("XXBTZEUR")
+
+
+def open_order(
+    userref: int,
+    price: float,
+    volume: float,
+    age: float,
+    vol_exec: float = 0,
+) -> dict:
+    return {
+        "userref": userref,
+        "opentm": NOW - age,
+        "vol": str(volume),
+        "vol_exec": str(vol_exec),
+        "descr": {"price": str(price), "type": "buy", "ordertype": "limit"},
+    }
+
+
+class TestRepricer:
+    def setup(self) -> None:
+        self.ka = MagicMock(spec=KrakenApi)
+        self.requests: List[tuple] = []
+        self.open_orders: Dict[str, dict] = {}
+
+        def create_api_request(
+            public_method: bool, api_method: str, post_inputs: dict = None
+        ) -> tuple:
+            return api_method, post_inputs
+
+        def send_api_request(request: tuple) -> dict:
+            self.requests.append(request)
+            api_method, post_inputs = request
+            if api_method == "OpenOrders":
+                return {"open": self.open_orders}
+            if api_method == "EditOrder":
+                return {"txid": f"{post_inputs['txid']}-EDITED"}
+            return {"count": len(post_inputs)}
+
+        self.ka.create_api_request.side_effect = create_api_request
+        self.ka.send_api_request.side_effect = send_api_request
+        eth = Pair("XETHZEUR", "ETHEUR", "XETH", "ZEUR", 2, 8, 4, 0.005)
+        btc = Pair("XXBTZEUR", "XBTEUR", "XXBT", "ZEUR", 1, 8, 4, 0.0001)
+        self.eth_dca = DCA(
+            self.ka, 1, eth, 20, limit_factor=0.99, reprice_after=60
+        )
+        self.btc_dca = DCA(
+            self.ka, 1, btc, 20, max_price=39000, cancel_after=240
+        )
+        self.repricer = Repricer(self.ka, [self.eth_dca, self.btc_dca])
+        self.ask_prices_requests: List[List[str]] = []
+
+    def get_ask_prices(self, dcas: List[DCA]) -> Dict[str, float]:
+        names = sorted(dca.pair.name for dca in dcas)
+        self.ask_prices_requests.append(names)
+        return {"XETHZEUR": 3000, "XXBTZEUR": 40000}
+
+    def api_methods(self) -> List[str]:
+        return [api_method for api_method, _ in self.requests]
+
+    def test_reprice(self) -> None:
+        self.open_orders = {
+            # Stale order.
+            "OETH1": open_order(ETH_USERREF, 2900, 0.00687, 3600),
+            # Recent order.
+            "OETH2": open_order(ETH_USERREF, 2900, 0.00687, 600),
+            # Partially filled order.
+            "OETH3": open_order(ETH_USERREF, 2900, 0.00687, 3600, 0.001),
+            # Order not placed by Kraken-DCA.
+            "OOTHER": open_order(0, 2900, 0.00687, 86400),
+            # Old order canceled.
+            "OBTC1": open_order(BTC_USERREF, 38000, 0.0005, 86400),
+        }
+        counts = self.repricer.reprice(self.get_ask_prices, NOW)
+        assert counts == {"repriced": 1, "canceled": 1}
+        # One OpenOrders request for every pair.
+        assert self.api_methods() == [
+            "OpenOrders",
+            "EditOrder",
+            "CancelOrderBatch",
+        ]
+        assert self.requests[1][1] == {
+            "txid": "OETH1",
+            "pair": "XETHZEUR",
+            "volume": "0.00670808",
+            "price": "2970.0",
+            "userref": ETH_USERREF,
+        }
+        assert self.requests[2][1] == {"orders[0]": "OBTC1"}
+        assert self.ask_prices_requests == [["XETHZEUR"]]
+        # The edited order keeps its original open time.
+        assert self.repricer.opened_at == {"OETH1-EDITED": NOW - 3600}
+
+    def test_reprice_edited_order_age(self) -> None:
+        self.eth_dca.cancel_after = 120
+        self.open_orders = {
+            "OETH1": open_order(ETH_USERREF, 2900, 0.00687, 3600)
+        }
+        self.repricer.reprice(self.get_ask_prices, NOW)
+        # Edited order reported as just opened by Kraken.
+        self.open_orders = {
+            "OETH1-EDITED": open_order(ETH_USERREF, 2970, 0.0067, 0)
+        }
+        self.requests.clear()
+        counts = self.repricer.reprice(self.get_ask_prices, NOW + 3600)
+        assert counts == {"repriced": 0, "canceled": 1}
+        assert self.requests[-1] == (
+            "CancelOrderBatch",
+            {"orders[0]": "OETH1-EDITED"},
+        )
+        # Kept while within the pair delay, counted as a daily order.
+        assert self.repricer.opened_at == {"OETH1-EDITED": NOW - 3600}
+        self.open_orders = {}
+        self.repricer.reprice(self.get_ask_prices, NOW + 86400)
+        assert self.repricer.opened_at == {}
+
+    def test_reprice_state(self, tmp_path) -> None:
+        filepath = str(tmp_path / "reprice_state.json")
+        self.eth_dca.cancel_after = 120
+        self.repricer = Repricer(self.ka, [self.eth_dca], filepath)
+        self.open_orders = {
+            "OETH1": open_order(ETH_USERREF, 2900, 0.00687, 3600)
+        }
+        self.repricer.reprice(self.get_ask_prices, NOW)
+        # Next run, the original open time is read from the state file.
+        repricer = Repricer(self.ka, [self.eth_dca], filepath)
+        assert repricer.opened_at == {"OETH1-EDITED": NOW - 3600}
+        assert self.eth_dca.opened_at is repricer.opened_at
+        self.open_orders = {
+            "OETH1-EDITED": open_order(ETH_USERREF, 2970, 0.0067, 0)
+        }
+        counts = repricer.reprice(self.get_ask_prices, NOW + 3600)
+        assert counts == {"repriced": 0, "canceled": 1}
+
+    def test_reprice_order_feed(self) -> None:
+        self.eth_dca.order_feed = MagicMock(state=OrderState([ETH_USERREF]))
+        self.open_orders = {
+            "OETH1": open_order(ETH_USERREF, 2900, 0.00687, 3600)
+        }
+        self.repricer.reprice(self.get_ask_prices, NOW)
+        # The edited order is counted from its original open time.
+        self.eth_dca.order_feed.state.add_orders(
+            {"OETH1-EDITED": open_order(ETH_USERREF, 2970, 0.0067, 0)}
+        )
+        state = self.eth_dca.order_feed.state
+        assert state.count_orders(ETH_USERREF, NOW - 3600) == 1
+        assert state.count_orders(ETH_USERREF, NOW - 3599) == 0
+
+    def test_reprice_amount_strategy(self) -> None:
+        self.eth_dca.amount_strategy = ValueAveragingStrategy()
+        self.eth_dca.amount_strategy.record_order("OETH1", 0.00687)
+        self.open_orders = {
+            "OETH1": open_order(ETH_USERREF, 2900, 0.00687, 3600)
+        }
+        self.repricer.reprice(self.get_ask_prices, NOW)
+        # The edited order is pending instead of the original one.
+        assert self.eth_dca.amount_strategy.orders == {
+            "OETH1-EDITED": 0.00670808
+        }
+
+    def test_reprice_max_price(self) -> None:
+        self.btc_dca.reprice_after = 60
+        self.btc_dca.cancel_after = None
+        self.open_orders = {
+            "OBTC1": open_order(BTC_USERREF, 38000, 0.0005, 3600),
+            "OBTC2": open_order(BTC_USERREF, 39000, 0.0005, 3600),
+        }
+        counts = self.repricer.reprice(self.get_ask_prices, NOW)
+        # Repriced up to max_price, orders at max_price are left as is.
+        assert counts == {"repriced": 1, "canceled": 0}
+        assert self.requests[1][1]["txid"] == "OBTC1"
+        assert self.requests[1][1]["price"] == "39000.0"
+
+    def test_reprice_order_min(self) -> None:
+        self.open_orders = {
+            "OETH1": open_order(ETH_USERREF, 2000, 0.005, 3600)
+        }
+        counts = self.repricer.reprice(self.get_ask_prices, NOW)
+        assert counts == {"repriced": 0, "canceled": 0}
+        assert self.api_methods() == ["OpenOrders"]
+
+    def test_reprice_ladder(self) -> None:
+        self.eth_dca.ladder_orders = 3
+        self.open_orders = {
+            "OETH1": open_order(ETH_USERREF, 2900, 0.00687, 3600)
+        }
+        counts = self.repricer.reprice(self.get_ask_prices, NOW)
+        # Ladder orders are not repriced.
+        assert counts == {"repriced": 0, "canceled": 0}
+        assert self.ask_prices_requests == []
+
+    def test_reprice_edit_error(self, logging_capture) -> None:
+        self.ka.send_api_request.side_effect = [
+            {"open": {"OETH1": open_order(ETH_USERREF, 2900, 0.00687, 3600)}},
+            ValueError("EOrder:Unknown order"),
+        ]
+        counts = self.repricer.reprice(self.get_ask_prices, NOW)
+        assert counts == {"repriced": 0, "canceled": 0}
+        assert "Order OETH1 not repriced: EOrder:Unknown order" in (
+            logging_capture.read()
+        )
+
+    def test_cancel_orders_batches(self) -> None:
+        txids = [f"O{index}" for index in range(MAX_CANCEL_BATCH + 5)]
+        assert self.repricer.cancel_orders(txids) == MAX_CANCEL_BATCH + 5
+        assert [len(post_inputs) for _, post_inputs in self.requests] == [
+            MAX_CANCEL_BATCH,
+            5,
+        ]
+        assert self.requests[1][1] == {
+            f"orders[{index}]": f"O{MAX_CANCEL_BATCH + index}"
+            for index in range(5)
+        }
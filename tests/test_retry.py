@@ -0,0 +1,264 @@
+"""retry.py tests module."""
+import io
+import json
+import threading
+import time
+from unittest.mock import patch
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs
+
+import pytest
+import vcr
+
+from krakendca.metrics import Metrics
+from krakendca.retry import (
+    DEFAULT_RETRY_POLICIES,
+    DeadlineExceededError,
+    KrakenApiError,
+    RetryingKrakenApi,
+    RetryPolicy,
+    endpoint_class,
+    is_transient_error,
+)
+
+
+def kraken_response(result: dict = None, error: str = None) -> io.BytesIO:
+    """
+    Return a fake urlopen response with Kraken API response format.
+
+    :param result: Response result.
+    :param error: Response error.
+    :return: Fake response.
+    """
+    body = {"error": [error] if error else [], "result": result or {}}
+    return io.BytesIO(json.dumps(body).encode())
+
+
+class TestRetryPolicy:
+    def test_init(self) -> None:
+        policy = RetryPolicy()
+        assert policy.max_attempts == 1
+        assert policy.base_delay == 0.5
+        assert policy.max_delay == 8
+        assert policy.timeout == 30
+        assert policy.hedge is False
+        assert policy.hedge_delay == 1
+
+    def test_from_config(self) -> None:
+        policy = RetryPolicy.from_config(
+            {"max_attempts": 6, "hedge": False},
+            DEFAULT_RETRY_POLICIES["public"],
+        )
+        assert policy.max_attempts == 6
+        assert policy.hedge is False
+        assert policy.base_delay == 0.25
+        assert policy.timeout == 10
+
+    def test_backoff_delay(self) -> None:
+        policy = RetryPolicy(base_delay=0.5, max_delay=3)
+        for attempt, ceiling in [(1, 0.5), (2, 1), (3, 2), (4, 3), (10, 3)]:
+            delays = [policy.backoff_delay(attempt) for _ in range(100)]
+            assert all(0 <= delay <= ceiling for delay in delays)
+            # Jittered delays.
+            assert len(set(delays)) > 1
+
+
+class TestRetryingKrakenApi:
+    ka: RetryingKrakenApi
+
+    def setup(self) -> None:
+        # Fake keys.
+        self.ka = RetryingKrakenApi(
+            "R6/OvXmIQEv1E8nyJd7+a9Zmaf84yJ7uifwe2yj5BgV1N+lgqURsxQwQ",
+            "MWZ9lFF/mreK4Fdk/SEpFLvVn//nbKUbCytGShSwvCvYlgRkn4K8i7VY"
+            "18UQEgOHzBIEsqg78BZJCEhvFIzw1Q==",
+            retry_policies={
+                "public": RetryPolicy(max_attempts=3, base_delay=0.001),
+                "private": RetryPolicy(max_attempts=3, base_delay=0.001),
+            },
+        )
+
+    def test_init(self) -> None:
+        assert self.ka.retry_policies["public"].max_attempts == 3
+        assert self.ka.retry_policies["write"].max_attempts == 1
+        assert self.ka.retry_statistics == {}
+
+    def test_endpoint_class(self) -> None:
+        assert endpoint_class(self.ka.create_api_request(True, "Time")) == (
+            "public"
+        )
+        request = self.ka.create_api_request(False, "Balance")
+        assert endpoint_class(request) == "private"
+        request = self.ka.create_api_request(False, "AddOrder", {"a": 1})
+        assert endpoint_class(request) == "write"
+
+    def test_is_transient_error(self) -> None:
+        assert is_transient_error(KrakenApiError("EService:Unavailable"))
+        assert is_transient_error(KrakenApiError("EGeneral:Internal error"))
+        assert not is_transient_error(
+            KrakenApiError("EOrder:Insufficient funds")
+        )
+        assert is_transient_error(URLError("Connection refused"))
+        assert is_transient_error(ConnectionResetError())
+        assert is_transient_error(TimeoutError())
+        assert is_transient_error(HTTPError("url", 503, "", None, None))
+        assert not is_transient_error(HTTPError("url", 404, "", None, None))
+        assert not is_transient_error(ValueError("Bad value"))
+        assert not is_transient_error(DeadlineExceededError())
+
+    @vcr.use_cassette("tests/fixtures/vcr_cassettes/test_get_time.yaml")
+    def test_send_request(self) -> None:
+        assert self.ka.get_time() == 1618001260
+
+    @vcr.use_cassette("tests/fixtures/vcr_cassettes/test_get_time.yaml")
+    def test_send_request_metrics(self) -> None:
+        self.ka.metrics = Metrics()
+        self.ka.get_time()
+        assert self.ka.metrics.requests == {"Time": 1}
+        assert self.ka.metrics.latencies["Time"].count == 1
+
+    def test_retry_transient_error(self) -> None:
+        responses = [
+            kraken_response(error="EService:Unavailable"),
+            URLError("Connection reset"),
+            kraken_response({"unixtime": 1618001260}),
+        ]
+        with patch("krakendca.retry.urlopen", side_effect=responses):
+            assert self.ka.get_time() == 1618001260
+        assert self.ka.retry_statistics["Time"]["retries"] == 2
+
+    def test_retry_attempts_exhausted(self) -> None:
+        responses = [
+            kraken_response(error="EService:Unavailable") for _ in range(3)
+        ]
+        with patch(
+            "krakendca.retry.urlopen", side_effect=responses
+        ) as urlopen:
+            with pytest.raises(KrakenApiError) as e_info:
+                self.ka.get_time()
+        assert "Kraken API error -> EService:Unavailable" in str(e_info.value)
+        assert urlopen.call_count == 3
+
+    def test_no_retry_permanent_error(self) -> None:
+        with patch(
+            "krakendca.retry.urlopen",
+            return_value=kraken_response(error="EQuery:Unknown asset pair"),
+        ) as urlopen:
+            with pytest.raises(ValueError) as e_info:
+                self.ka.get_pair_ticker("Fake")
+        assert "Kraken API error -> EQuery:Unknown asset pair" in str(
+            e_info.value
+        )
+        assert urlopen.call_count == 1
+
+    def test_retry_private_request_new_nonce(self) -> None:
+        responses = [
+            kraken_response(error="EService:Busy"),
+            kraken_response({"closed": {}, "count": 0}),
+        ]
+        with patch(
+            "krakendca.retry.urlopen", side_effect=responses
+        ) as urlopen:
+            self.ka.get_closed_orders({"start": 1618358400})
+        first, second = [call.args[0] for call in urlopen.call_args_list]
+        first_data = parse_qs(first.data.decode())
+        second_data = parse_qs(second.data.decode())
+        assert first_data["start"] == second_data["start"] == ["1618358400"]
+        assert int(second_data["nonce"][0]) >= int(first_data["nonce"][0])
+        # Request created again with a new nonce and signature.
+        assert second is not first
+        assert "Api-sign" in second.headers
+
+    def test_write_request_not_retried(self) -> None:
+        with patch(
+            "krakendca.retry.urlopen", side_effect=URLError("Timed out")
+        ) as urlopen:
+            with pytest.raises(URLError):
+                self.ka.create_order(
+                    "XETHZEUR", "buy", "limit", 2083.16, 0.00957589, "fciq"
+                )
+        assert urlopen.call_count == 1
+
+    def test_hedged_request(self) -> None:
+        self.ka.retry_policies["public"] = RetryPolicy(
+            hedge=True, hedge_delay=0.05
+        )
+        release = threading.Event()
+        calls = []
+
+        def urlopen(request, timeout):
+            calls.append(time.perf_counter())
+            if len(calls) == 1:
+                # First request is stalled.
+                release.wait(5)
+                return kraken_response({"unixtime": 1})
+            return kraken_response({"unixtime": 2})
+
+        with patch("krakendca.retry.urlopen", side_effect=urlopen):
+            assert self.ka.get_time() == 2
+            release.set()
+        assert len(calls) == 2
+        assert calls[1] - calls[0] >= 0.04
+        assert self.ka.retry_statistics["Time"]["hedges"] == 1
+
+    def test_hedged_request_fast_response(self) -> None:
+        self.ka.retry_policies["public"] = RetryPolicy(
+            hedge=True, hedge_delay=1
+        )
+        with patch(
+            "krakendca.retry.urlopen",
+            return_value=kraken_response({"unixtime": 1}),
+        ) as urlopen:
+            assert self.ka.get_time() == 1
+        assert urlopen.call_count == 1
+
+    def test_hedge_delay(self) -> None:
+        policy = RetryPolicy(hedge=True, hedge_delay=0.8)
+        assert self.ka.hedge_delay("Ticker", policy) == 0.8
+        for latency in range(1, 101):
+            self.ka.record_latency("Ticker", latency / 1000)
+        # p95 of the recorded latencies.
+        assert self.ka.hedge_delay("Ticker", policy) == 0.095
+
+    def test_load_latencies(self) -> None:
+        latencies = {"Ticker": [0.1, 0.2], "Balance": [0.3]}
+        self.ka.load_latencies(latencies)
+        assert self.ka.get_latencies() == latencies
+
+    def test_request_timeout(self) -> None:
+        policy = RetryPolicy(timeout=10)
+        assert self.ka.request_timeout("Ticker", "public", policy) == 10
+        self.ka.endpoint_timeouts = {"Ticker": 2}
+        assert self.ka.request_timeout("Ticker", "public", policy) == 2
+        with self.ka.run_deadline(1):
+            assert self.ka.request_timeout("Ticker", "public", policy) <= 1
+            # Write requests keep their whole timeout once sent.
+            assert self.ka.request_timeout("AddOrder", "write", policy) == 10
+        assert self.ka.deadline is None
+
+    def test_run_deadline_exceeded(self) -> None:
+        with patch("krakendca.retry.urlopen") as urlopen:
+            with self.ka.run_deadline(0):
+                with pytest.raises(DeadlineExceededError) as e_info:
+                    self.ka.create_order(
+                        "XETHZEUR", "buy", "limit", 2083.16, 0.00957589, "fciq"
+                    )
+        assert str(e_info.value) == "Run deadline exceeded, AddOrder not sent."
+        urlopen.assert_not_called()
+
+    def test_run_deadline_not_retried(self) -> None:
+        self.ka.retry_policies["private"] = RetryPolicy(
+            max_attempts=3, base_delay=10, max_delay=10
+        )
+        with patch(
+            "krakendca.retry.urlopen", side_effect=URLError("Timed out")
+        ) as urlopen, patch.object(
+            RetryPolicy, "backoff_delay", return_value=10
+        ):
+            with self.ka.run_deadline(5):
+                with pytest.raises(DeadlineExceededError) as e_info:
+                    self.ka.get_balance()
+        assert "Run deadline exceeded, Balance not retried" in str(
+            e_info.value
+        )
+        assert urlopen.call_count == 1
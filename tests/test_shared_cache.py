@@ -0,0 +1,208 @@
+"""shared_cache.py tests module."""
+import multiprocessing
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+import vcr
+from krakenapi import KrakenApi
+
+from krakendca.shared_cache import PairRecord, SharedCache
+
+TICKER = {
+    "XETHZEUR": {"a": ["2083.16000", "1", "1.000"], "b": ["2082.9", "1"]},
+    "XXBTZEUR": {"a": ["50000.1", "1", "1.000"], "b": ["49999.9", "1"]},
+}
+
+
+def write_records(filepath: str, count: int) -> None:
+    """
+    Write records with equal ask and bid from another process.
+
+    :param filepath: Shared cache file path.
+    :param count: Records count to write.
+    :return: None
+    """
+    cache = SharedCache(filepath)
+    with cache.lock():
+        for price in range(1, count + 1):
+            cache.write(PairRecord("XETHZEUR", ask=price, bid=price))
+    cache.close()
+
+
+class TestSharedCache:
+    cache: SharedCache
+
+    def setup(self) -> None:
+        self.ka = MagicMock(spec=KrakenApi)
+        self.ka.get_pair_ticker.return_value = TICKER
+
+    @pytest.fixture(autouse=True)
+    def shared_cache(self, tmp_path) -> None:
+        self.filepath = str(tmp_path / "kraken-dca.cache")
+        self.cache = SharedCache(self.filepath, capacity=4)
+        yield
+        self.cache.close()
+
+    def test_init(self) -> None:
+        assert self.cache.capacity == 4
+        # Existing file capacity is used.
+        cache = SharedCache(self.filepath)
+        assert cache.capacity == 4
+        cache.close()
+
+    def test_init_not_a_cache(self, tmp_path) -> None:
+        filepath = tmp_path / "config.yaml"
+        filepath.write_text("api:\n  public_key: KEY\n")
+        with pytest.raises(ValueError) as e_info:
+            SharedCache(str(filepath))
+        assert "is not a Kraken-DCA shared cache." in str(e_info.value)
+
+    def test_read_write(self) -> None:
+        assert self.cache.read("XETHZEUR") is None
+        record = PairRecord("XETHZEUR", "ETHEUR", "ETH/EUR", ask=2083.16)
+        with self.cache.lock():
+            self.cache.write(record)
+        assert self.cache.read("XETHZEUR") == record
+        # Visible from other processes mapping the file.
+        cache = SharedCache(self.filepath)
+        assert cache.read("XETHZEUR") == record
+        cache.close()
+
+    def test_write_full(self, logging_capture) -> None:
+        with self.cache.lock():
+            for index in range(5):
+                self.cache.write(PairRecord(f"PAIR{index}"))
+        assert [self.cache.read(f"PAIR{index}") for index in range(4)] == [
+            PairRecord(f"PAIR{index}") for index in range(4)
+        ]
+        assert self.cache.read("PAIR4") is None
+        assert logging_capture.read() == (
+            "Shared cache full, PAIR4 is not shared.\n"
+        )
+
+    def test_write_name_too_long(self) -> None:
+        with pytest.raises(ValueError) as e_info:
+            with self.cache.lock():
+                self.cache.write(PairRecord("PAIR", ws_name="A" * 17))
+        assert "AAAAAAAAAAAAAAAAA longer than 16 bytes." in str(e_info.value)
+        assert self.cache.read("PAIR") is None
+
+    def test_get_prices_full(self) -> None:
+        with self.cache.lock():
+            for index in range(4):
+                self.cache.write(PairRecord(f"PAIR{index}"))
+        # Not shared, yet returned from the Ticker request.
+        assert self.cache.get_prices(self.ka, ["XETHZEUR"]) == {
+            "XETHZEUR": (2083.16, 2082.9)
+        }
+        self.ka.get_pair_ticker.assert_called_once_with("XETHZEUR")
+        with self.cache.lock():
+            assert self.cache.refresh_prices(self.ka, ["XXBTZEUR"]) == {
+                "XXBTZEUR": (50000.1, 49999.9)
+            }
+        assert self.cache.read("XXBTZEUR") is None
+
+    def test_seqlock_consistent_reads(self) -> None:
+        writer = multiprocessing.get_context("fork").Process(
+            target=write_records, args=(self.filepath, 20000)
+        )
+        writer.start()
+        reads = 0
+        while writer.is_alive() or not reads:
+            record = self.cache.read("XETHZEUR")
+            if record:
+                # Never a torn record.
+                assert record.ask == record.bid
+                reads += 1
+        writer.join()
+        assert self.cache.read("XETHZEUR").ask == 20000
+
+    def test_get_prices(self) -> None:
+        pairs = ["XETHZEUR", "XXBTZEUR"]
+        assert self.cache.get_prices(self.ka, pairs) == {
+            "XETHZEUR": (2083.16, 2082.9),
+            "XXBTZEUR": (50000.1, 49999.9),
+        }
+        # A single Ticker request for every pair.
+        self.ka.get_pair_ticker.assert_called_once_with("XETHZEUR,XXBTZEUR")
+        # Fresh prices read by another process.
+        cache = SharedCache(self.filepath)
+        assert cache.get_ask_price(self.ka, "XXBTZEUR") == 50000.1
+        cache.close()
+        assert self.ka.get_pair_ticker.call_count == 1
+
+    def test_get_prices_outdated(self) -> None:
+        self.cache.cache_ttls = {"Ticker": 0.05}
+        self.cache.get_prices(self.ka, ["XETHZEUR"])
+        time.sleep(0.06)
+        self.cache.get_prices(self.ka, ["XETHZEUR"])
+        assert self.ka.get_pair_ticker.call_count == 2
+
+    def test_single_refresh(self) -> None:
+        release = threading.Event()
+
+        def get_pair_ticker(pair: str) -> dict:
+            release.wait(5)
+            return TICKER
+
+        self.ka.get_pair_ticker.side_effect = get_pair_ticker
+        caches = [SharedCache(self.filepath) for _ in range(4)]
+        threads = [
+            threading.Thread(
+                target=cache.get_ask_price, args=(self.ka, "XETHZEUR")
+            )
+            for cache in caches
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        for cache in caches:
+            assert cache.read("XETHZEUR").ask == 2083.16
+            cache.close()
+        # Other processes waited for the refresh instead of requesting.
+        assert self.ka.get_pair_ticker.call_count == 1
+
+    @vcr.use_cassette(
+        "tests/fixtures/vcr_cassettes/test_krakendca_setup.yaml",
+        allow_playback_repeats=True,
+    )
+    def test_get_pairs(self) -> None:
+        ka = KrakenApi("api_public_key", "api_private_key")
+        pair = self.cache.get_pairs(ka, ["XETHZEUR"])["XETHZEUR"]
+        assert pair.name == "XETHZEUR"
+        assert pair.alt_name == "ETHEUR"
+        assert pair.ws_name == "ETH/EUR"
+        assert pair.base == "XETH"
+        assert pair.quote == "ZEUR"
+        assert pair.pair_decimals == 2
+        assert pair.lot_decimals == 8
+        assert pair.quote_decimals == 4
+        assert pair.order_min == 0.004
+        # Prices are kept on metadata refresh.
+        with self.cache.lock():
+            self.cache.write(
+                self.cache.read("XETHZEUR")._replace(metadata_timestamp=0)
+            )
+        self.cache.get_prices(self.ka, ["XETHZEUR"])
+        self.cache.get_pairs(ka, ["XETHZEUR"])
+        assert self.cache.read("XETHZEUR").ask == 2083.16
+
+    @vcr.use_cassette(
+        "tests/fixtures/vcr_cassettes/test_krakendca_setup.yaml",
+        allow_playback_repeats=True,
+    )
+    def test_get_pairs_full(self) -> None:
+        with self.cache.lock():
+            for index in range(4):
+                self.cache.write(PairRecord(f"PAIR{index}"))
+        ka = KrakenApi("api_public_key", "api_private_key")
+        pair = self.cache.get_pairs(ka, ["XETHZEUR"])["XETHZEUR"]
+        assert pair.name == "XETHZEUR"
+        assert pair.alt_name == "ETHEUR"
+        assert pair.order_min == 0.004
+        assert self.cache.read("XETHZEUR") is None
@@ -0,0 +1,84 @@
+"""signer.py tests module."""
+import base64
+from unittest.mock import patch
+
+import pytest
+from krakenapi import KrakenApi
+
+from krakendca.signer import (
+    PreparedRequest,
+    RequestSigner,
+    SigningKrakenApi,
+    replace_nonce,
+)
+
+API_PRIVATE_KEY = base64.b64encode(b"kraken-dca-test-secret").decode()
+
+
+def test_replace_nonce() -> None:
+    assert replace_nonce(b"nonce=1", "2") == b"nonce=2"
+    assert replace_nonce(b"pair=XETHZEUR&nonce=1", "2") == (
+        b"pair=XETHZEUR&nonce=2"
+    )
+    assert replace_nonce(b"nonce=1&pair=XETHZEUR", "2") == (
+        b"nonce=2&pair=XETHZEUR"
+    )
+
+
+class TestRequestSigner:
+    def setup(self) -> None:
+        self.ka = KrakenApi("api_public_key", API_PRIVATE_KEY)
+        self.signer = RequestSigner(API_PRIVATE_KEY)
+
+    def test_sign(self) -> None:
+        for endpoint, post_data in [
+            ("Balance", b"nonce=1618522408000"),
+            ("AddOrder", b"pair=XETHZEUR&volume=0.01&nonce=1618522408001"),
+            ("Balance", b"nonce=1618522408002"),
+        ]:
+            nonce = post_data.rsplit(b"=", 1)[1].decode()
+            # Same signature as KrakenApi, from the reused HMAC state.
+            assert self.signer.sign(
+                nonce, post_data, endpoint
+            ) == self.ka.create_api_signature(nonce, post_data, endpoint)
+
+    def test_sign_incorrect_private_key(self) -> None:
+        signer = RequestSigner("api_private_key")
+        with pytest.raises(ValueError) as e_info:
+            signer.sign("1", b"nonce=1", "Balance")
+        assert "Incorrect Kraken API private key ->" in str(e_info.value)
+
+
+class TestPreparedRequest:
+    def setup(self) -> None:
+        self.ka = SigningKrakenApi("api_public_key", API_PRIVATE_KEY)
+        self.post_inputs = {"pair": "XETHZEUR", "volume": 0.01}
+
+    def test_init(self) -> None:
+        prepared = PreparedRequest(self.ka, "AddOrder", self.post_inputs)
+        assert prepared.endpoint == "AddOrder"
+        assert prepared.url == "https://api.kraken.com/0/private/AddOrder"
+        assert prepared.post_data == b"pair=XETHZEUR&volume=0.01&"
+
+    def test_finalize(self) -> None:
+        for post_inputs in [self.post_inputs, None]:
+            prepared = PreparedRequest(self.ka, "AddOrder", post_inputs)
+            with patch.object(
+                SigningKrakenApi, "create_api_nonce", return_value="42"
+            ):
+                request = prepared.finalize(self.ka)
+                expected = KrakenApi.create_api_request(
+                    self.ka, False, "AddOrder", dict(post_inputs or {})
+                )
+            assert request.full_url == expected.full_url
+            assert request.data == expected.data
+            assert request.headers == expected.headers
+
+    def test_finalize_signed_at_dispatch(self) -> None:
+        prepared = PreparedRequest(self.ka, "AddOrder", self.post_inputs)
+        self.ka.signed_at_dispatch = True
+        with patch.object(SigningKrakenApi, "create_api_nonce") as nonce:
+            request = prepared.finalize(self.ka)
+        nonce.assert_not_called()
+        assert request.data == b"pair=XETHZEUR&volume=0.01&nonce=0"
+        assert request.headers == {"Api-key": "api_public_key"}
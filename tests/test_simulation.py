@@ -0,0 +1,172 @@
+"""simulation.py tests module."""
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from krakenapi import KrakenApi
+
+from krakendca.dca import DCA
+from krakendca.ohlc_store import CLOSE, COLUMNS, OHLCStore
+from krakendca.order import Order
+from krakendca.pair import Pair
+from krakendca.simulation import (
+    PERCENTILES,
+    MonteCarlo,
+    SimulatedDCA,
+    bootstrap_paths,
+    gbm_paths,
+    log_returns,
+    order_volumes,
+)
+
+PAIR = Pair("XETHZEUR", "ETHEUR", "XETH", "ZEUR", 2, 8, 4, 0.005)
+
+
+def history(days: int = 720, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 2000 * np.exp(np.cumsum(rng.normal(0.001, 0.04, days)))
+
+
+def test_order_volumes() -> None:
+    prices = np.array([2882.44, 38857.2, 1.5])
+    assert order_volumes(20, prices, 8).tolist() == [
+        Order.set_order_volume(20, price, 8) for price in prices
+    ]
+
+
+def test_paths() -> None:
+    returns = log_returns(history())
+    rng = np.random.default_rng(0)
+    for model_paths in (bootstrap_paths, gbm_paths):
+        prices = model_paths(returns, 2800, 30, 1000, rng)
+        assert prices.shape == (1000, 31)
+        assert (prices[:, 0] == 2800).all()
+        daily_returns = np.diff(np.log(prices), axis=1)
+        assert abs(daily_returns.std() - returns.std()) < 0.002
+    # Bootstrapped returns are drawn from the history returns.
+    prices = bootstrap_paths(returns, 2800, 30, 10, rng)
+    assert np.isin(
+        np.round(np.diff(np.log(prices), axis=1), 10), returns.round(10)
+    ).all()
+
+
+class TestSimulatedDCA:
+    def setup(self) -> None:
+        # Two paths over 4 days.
+        self.prices = np.array(
+            [
+                [3000.0, 2950.0, 2990.0, 3100.0, 3200.0],
+                [3000.0, 3050.0, 3100.0, 3300.0, 3500.0],
+            ]
+        )
+
+    def test_limit_prices(self) -> None:
+        ka = MagicMock(spec=KrakenApi)
+        dca = DCA(ka, 1, PAIR, 20, limit_factor=0.985, max_price=3100)
+        simulated = SimulatedDCA.from_dca(dca)
+        asks = np.array([2882.44, 3117.81])
+        assert simulated.limit_prices(asks).tolist() == [
+            dca.get_limit_price(ask, PAIR.pair_decimals) for ask in asks
+        ]
+
+    def test_simulate(self) -> None:
+        outcomes = SimulatedDCA(PAIR, 2, 20).simulate(self.prices)
+        # Orders on days 0 and 2, filled at the day price.
+        volumes = [
+            Order.set_order_volume(20, price, PAIR.lot_decimals)
+            for price in (3000, 2990, 3000, 3100)
+        ]
+        assert outcomes["units"] == pytest.approx(
+            [volumes[0] + volumes[1], volumes[2] + volumes[3]]
+        )
+        spent = sum(
+            Order.estimate_order_price(volume, price, 4)
+            + Order.estimate_order_fee(volume, price, 4)
+            for volume, price in zip(volumes[:2], (3000, 2990))
+        )
+        assert outcomes["spent"][0] == pytest.approx(spent)
+        assert outcomes["cost_basis"][0] == pytest.approx(
+            spent / outcomes["units"][0]
+        )
+        assert outcomes["value"][0] == pytest.approx(
+            outcomes["units"][0] * 3200
+        )
+        assert outcomes["filled"].tolist() == [1, 1]
+
+    def test_simulate_limit_factor(self) -> None:
+        outcomes = SimulatedDCA(PAIR, 2, 20, limit_factor=0.99).simulate(
+            self.prices
+        )
+        # Only the first order of the first path is filled, on day 1.
+        assert outcomes["filled"].tolist() == [0.5, 0]
+        assert outcomes["units"][0] == Order.set_order_volume(
+            20, 2970, PAIR.lot_decimals
+        )
+        assert outcomes["units"][1] == 0
+        assert np.isnan(outcomes["cost_basis"][1])
+
+    def test_simulate_max_price(self) -> None:
+        outcomes = SimulatedDCA(PAIR, 1, 20, max_price=3000).simulate(
+            self.prices
+        )
+        # Orders above max_price are not created.
+        assert outcomes["filled"].tolist() == [0.75, 0.25]
+
+
+class TestMonteCarlo:
+    def setup(self) -> None:
+        self.dcas = [
+            SimulatedDCA(PAIR, 1, 20, limit_factor=0.99),
+            SimulatedDCA(
+                Pair("XXBTZEUR", "XBTEUR", "XXBT", "ZEUR", 1, 8, 4, 0.0001),
+                7,
+                50,
+                max_price=40000,
+            ),
+        ]
+        self.histories = {
+            "XETHZEUR": history(),
+            "XXBTZEUR": history(seed=2) * 15,
+        }
+
+    def test_run(self) -> None:
+        monte_carlo = MonteCarlo(
+            self.dcas, self.histories, "gbm", days=365, workers=2, seed=1
+        )
+        start = time.perf_counter()
+        results = monte_carlo.run(10000)
+        assert time.perf_counter() - start < 10
+        assert list(results) == ["XETHZEUR", "XXBTZEUR"]
+        result = results["XETHZEUR"]
+        assert result.paths == 10000
+        percentiles = result.percentiles()
+        assert len(percentiles["cost_basis"]) == len(PERCENTILES)
+        assert (np.diff(percentiles["units"]) >= 0).all()
+        assert result.report().startswith("XETHZEUR: 10000 paths\n")
+        # Reproducible with the same seed.
+        rerun = monte_carlo.run(10000)["XETHZEUR"]
+        assert (rerun.outcomes["units"] == result.outcomes["units"]).all()
+
+    def test_init(self) -> None:
+        with pytest.raises(ValueError) as e_info:
+            MonteCarlo(self.dcas, self.histories, "garch")
+        assert "Simulation model must be one of" in str(e_info.value)
+        with pytest.raises(ValueError) as e_info:
+            MonteCarlo(self.dcas, {"XETHZEUR": history()})
+        assert "Not enough XXBTZEUR daily prices history" in str(e_info.value)
+
+    def test_from_ohlc_store(self, tmp_path) -> None:
+        ohlc_store = OHLCStore(str(tmp_path))
+        candles = np.zeros((720, len(COLUMNS)))
+        candles[:, 0] = 1631404800 + 86400 * np.arange(720)
+        candles[:, CLOSE] = self.histories["XETHZEUR"]
+        ohlc_store.append("XETHZEUR", 1440, candles)
+        dca = DCA(MagicMock(spec=KrakenApi), 1, PAIR, 20)
+        monte_carlo = MonteCarlo.from_ohlc_store(
+            [dca], ohlc_store, days=30, workers=1
+        )
+        assert (
+            monte_carlo.histories["XETHZEUR"] == self.histories["XETHZEUR"]
+        ).all()
+        assert monte_carlo.run(100)["XETHZEUR"].paths == 100
@@ -0,0 +1,96 @@
+"""snapshot.py tests module."""
+import struct
+import time
+
+import pytest
+
+from krakendca import snapshot
+from krakendca.pair import Pair
+from krakendca.snapshot import Snapshot, SnapshotError
+
+API_PUBLIC_KEY = "api_public_key"
+
+
+class TestSnapshot:
+    def setup(self) -> None:
+        self.snapshot = Snapshot(
+            {
+                "XETHZEUR": Pair(
+                    "XETHZEUR", "ETHEUR", "XETH", "ZEUR", 2, 8, 4, 0.004
+                ),
+                "XXBTZEUR": Pair(
+                    "XXBTZEUR",
+                    "XBTEUR",
+                    "XXBT",
+                    "ZEUR",
+                    1,
+                    8,
+                    4,
+                    0.0001,
+                    "XBT/EUR",
+                ),
+            },
+            {"XETHZEUR": 1631318400.5},
+            -0.25,
+            {"Ticker": [0.125, 0.25], "Balance": [0.5]},
+            tagged_pairs={"XETHZEUR"},
+        )
+
+    def test_encode_decode(self) -> None:
+        decoded = Snapshot.decode(
+            self.snapshot.encode(API_PUBLIC_KEY), API_PUBLIC_KEY
+        )
+        assert decoded.created_at == self.snapshot.created_at
+        assert decoded.clock_offset == -0.25
+        assert decoded.last_orders == {"XETHZEUR": 1631318400.5}
+        assert decoded.latencies == {"Ticker": [0.125, 0.25], "Balance": [0.5]}
+        assert decoded.tagged_pairs == {"XETHZEUR"}
+        for name, pair in self.snapshot.pairs.items():
+            assert vars(decoded.pairs[name]) == vars(pair)
+
+    def test_encode_name_too_long(self) -> None:
+        self.snapshot.latencies = {"E" * 33: [0.1]}
+        with pytest.raises(SnapshotError) as e_info:
+            self.snapshot.encode(API_PUBLIC_KEY)
+        assert "longer than 32 bytes" in str(e_info.value)
+
+    def test_decode_invalid(self) -> None:
+        data = self.snapshot.encode(API_PUBLIC_KEY)
+        new_version = data[:4] + struct.pack("<H", 3) + data[6:]
+        corrupted = data[:60] + bytes([data[60] ^ 1]) + data[61:]
+        for invalid_data, api_public_key, error in [
+            (data[:10], API_PUBLIC_KEY, "truncated file"),
+            (b"KDCX" + data[4:], API_PUBLIC_KEY, "not a Kraken-DCA snapshot"),
+            (new_version, API_PUBLIC_KEY, "version 3, expected 2"),
+            (corrupted, API_PUBLIC_KEY, "checksum mismatch"),
+            (data, "other_api_public_key", "saved for another API key"),
+        ]:
+            with pytest.raises(SnapshotError) as e_info:
+                Snapshot.decode(invalid_data, api_public_key)
+            assert str(e_info.value) == error
+
+    def test_decode_stale(self) -> None:
+        self.snapshot.created_at = time.time() - snapshot.DEFAULT_MAX_AGE - 60
+        with pytest.raises(SnapshotError) as e_info:
+            Snapshot.decode(
+                self.snapshot.encode(API_PUBLIC_KEY), API_PUBLIC_KEY
+            )
+        assert "stale, saved" in str(e_info.value)
+
+    def test_save_load(self, tmp_path) -> None:
+        filepath = str(tmp_path / "snapshot")
+        assert Snapshot.load(filepath, API_PUBLIC_KEY) is None
+        self.snapshot.save(filepath, API_PUBLIC_KEY)
+        loaded = Snapshot.load(filepath, API_PUBLIC_KEY)
+        assert loaded.last_orders == self.snapshot.last_orders
+        assert list(tmp_path.iterdir()) == [tmp_path / "snapshot"]
+
+    def test_load_discarded(self, tmp_path, logging_capture) -> None:
+        filepath = str(tmp_path / "snapshot")
+        with open(filepath, "wb") as snapshot_file:
+            snapshot_file.write(b"KDCS")
+        assert Snapshot.load(filepath, API_PUBLIC_KEY) is None
+        assert (
+            f"Snapshot {filepath} discarded: truncated file."
+            in logging_capture.read()
+        )
@@ -0,0 +1,174 @@
+"""strategy.py tests module."""
+import math
+
+import pytest
+
+from krakendca.strategy import (
+    AmountStrategy,
+    MovingAverageStrategy,
+    ValueAveragingStrategy,
+    VolatilityStrategy,
+    load_states,
+    save_states,
+    unix_day,
+)
+
+# 2021-09-12 UTC.
+DAY = 18882
+
+
+def test_unix_day() -> None:
+    assert unix_day(1631404800) == DAY
+    assert unix_day(1631491199.9) == DAY
+
+
+class TestMovingAverageStrategy:
+    def setup(self) -> None:
+        self.strategy = MovingAverageStrategy(days=3, multiplier=5)
+
+    def test_get_amount(self) -> None:
+        # Average of the available days until the window is full.
+        assert self.strategy.get_amount(20, 100, DAY) == 20
+        assert self.strategy.get_amount(20, 80, DAY + 1) == pytest.approx(
+            20 * (1 + 5 * (90 - 80) / 90)
+        )
+        assert self.strategy.get_amount(20, 60, DAY + 2) == 40
+        # Oldest price out of the window.
+        self.strategy.get_amount(20, 90, DAY + 3)
+        assert self.strategy.moving_average() == pytest.approx(230 / 3)
+        assert self.strategy.prices_sum == 140
+        # Not below the average.
+        assert self.strategy.get_amount(20, 100, DAY + 4) == 20
+
+    def test_get_amount_same_day(self) -> None:
+        self.strategy.get_amount(20, 100, DAY)
+        # Runs of the same day replace the day price.
+        for price in (90, 95, 80):
+            self.strategy.get_amount(20, price, DAY + 1)
+        assert list(self.strategy.prices) == [100]
+        assert self.strategy.moving_average() == 90
+
+    def test_get_amount_days_gap(self) -> None:
+        self.strategy = MovingAverageStrategy(days=4, multiplier=5)
+        self.strategy.get_amount(20, 100, DAY)
+        self.strategy.get_amount(20, 70, DAY + 3)
+        self.strategy.get_amount(20, 40, DAY + 5)
+        # Days without run interpolated up to the closing price of DAY + 3.
+        assert list(self.strategy.prices) == [90, 80, 70]
+        assert self.strategy.close_day == DAY + 3
+        assert self.strategy.moving_average() == pytest.approx(70)
+
+    def test_state(self) -> None:
+        for day, price in enumerate((100, 80, 60)):
+            self.strategy.get_amount(20, price, DAY + day)
+        state = self.strategy.get_state()
+        assert state == {
+            "day": DAY + 2,
+            "price": 60,
+            "close_day": DAY + 1,
+            "prices": [100, 80],
+        }
+        # Restored with a shorter window.
+        strategy = MovingAverageStrategy(days=2)
+        strategy.load_state(state)
+        assert list(strategy.prices) == [80]
+        assert strategy.moving_average() == 70
+
+
+class TestValueAveragingStrategy:
+    def test_get_amount(self) -> None:
+        strategy = ValueAveragingStrategy(delay=2)
+        assert strategy.get_amount(20, 100, DAY) == 20
+        strategy.record_order("O1", 0.2)
+        # Same target during the delay, pending order counted.
+        assert strategy.get_amount(20, 100, DAY + 1) == 0
+        strategy.settle_order("O1", 0.2)
+        # Value below the target.
+        assert strategy.get_amount(20, 50, DAY + 2) == 30
+        strategy.record_order("O2", 0.6)
+        strategy.replace_order("O2", "O3", 0.6)
+        assert strategy.pending_orders() == ["O3"]
+        # Value above the target.
+        assert strategy.get_amount(20, 100, DAY + 4) == 0
+        assert strategy.get_amount(20, 40, DAY + 4) == 28
+        # Capped to max_multiplier times the DCA amount.
+        assert strategy.get_amount(20, 10, DAY + 4) == 40
+        state = strategy.get_state()
+        assert state["start_day"] == DAY
+        assert state["volume"] == pytest.approx(0.2)
+        assert state["orders"] == {"O3": 0.6}
+        strategy = ValueAveragingStrategy(delay=2)
+        strategy.load_state(state)
+        assert strategy.get_amount(20, 50, DAY + 6) == pytest.approx(40)
+        # Canceled unfilled, only the executed volume is counted.
+        strategy.settle_order("O3", 0.1)
+        strategy.settle_order("O3", 0.6)
+        assert strategy.pending_orders() == []
+        assert strategy.volume == pytest.approx(0.3)
+
+
+class TestVolatilityStrategy:
+    def test_get_amount(self) -> None:
+        strategy = VolatilityStrategy(halflife_days=1, target_volatility=0.6)
+        # No volatility estimate without a previous close.
+        assert strategy.get_amount(20, 100, DAY) == 20
+        returns = [math.log(110 / 100), math.log(99 / 110)]
+        volatility = math.sqrt(returns[0] ** 2 * 365)
+        assert strategy.get_amount(20, 110, DAY + 1) == pytest.approx(
+            20 * 0.6 / volatility
+        )
+        strategy.get_amount(20, 99, DAY + 2)
+        assert strategy.variance == pytest.approx(returns[0] ** 2)
+        assert strategy.close == 110
+        # Half-life of 1 day.
+        variance = (returns[0] ** 2 + returns[1] ** 2) / 2
+        assert strategy.get_amount(20, 99, DAY + 2) == pytest.approx(
+            min(20 * 0.6 / math.sqrt(variance * 365), 40)
+        )
+        strategy = VolatilityStrategy(halflife_days=1)
+        strategy.load_state(
+            {"day": DAY, "price": 100, "close": 100, "variance": 1e-4}
+        )
+        # Low volatility amount capped to max_multiplier.
+        assert strategy.get_amount(20, 100, DAY) == 40
+
+    def test_get_amount_days_gap(self) -> None:
+        strategy = VolatilityStrategy(halflife_days=1, target_volatility=0.6)
+        strategy.get_amount(20, 100, DAY)
+        strategy.get_amount(20, 110, DAY + 1)
+        # Return over 4 days, scaled to a daily variance.
+        strategy.get_amount(20, 121, DAY + 5)
+        daily_variance = math.log(121 / 110) ** 2 / 4
+        variance = math.log(110 / 100) ** 2
+        # Weighted as 4 days of a 1 day half-life.
+        variance = daily_variance * 15 / 16 + variance / 16
+        amount = strategy.get_amount(20, 121, DAY + 6)
+        assert strategy.variance == pytest.approx(variance)
+        assert strategy.close_day == DAY + 5
+        # Flat current day return.
+        assert amount == pytest.approx(
+            min(20 * 0.6 / math.sqrt(variance / 2 * 365), 40)
+        )
+
+
+def test_from_config() -> None:
+    strategy = AmountStrategy.from_config(
+        {"type": "moving_average", "days": 50, "max_multiplier": 3}, 1
+    )
+    assert isinstance(strategy, MovingAverageStrategy)
+    assert strategy.days == 50
+    assert strategy.max_multiplier == 3
+    strategy = AmountStrategy.from_config({"type": "value_averaging"}, 7)
+    assert strategy.delay == 7
+
+
+def test_states(tmp_path, logging_capture) -> None:
+    filepath = str(tmp_path / "strategy_state.json")
+    assert load_states(filepath) == {}
+    states = {"XETHZEUR": {"day": DAY, "price": 2800.0, "prices": []}}
+    save_states(filepath, states)
+    assert load_states(filepath) == states
+    with open(filepath, "w") as states_file:
+        states_file.write("{")
+    assert load_states(filepath) == {}
+    assert f"Strategy states {filepath} discarded" in logging_capture.read()
@@ -9,6 +9,7 @@ from krakendca.utils import (
     current_utc_day_datetime,
     datetime_as_utc_unix,
     find_nested_dictionary,
+    pair_userref,
     utc_unix_time_datetime,
 )
 
@@ -69,3 +70,10 @@ def test_find_nested_dictionary() -> None:
     assert nested_dictionary == {"key1": "value1", "key2": "value2"}
     nested_dictionary = find_nested_dictionary(dictionary, "dict4")
     assert nested_dictionary is None
+
+
+def test_pair_userref() -> None:
+    userref = pair_userref("XETHZEUR")
+    assert userref == pair_userref("XETHZEUR")
+    assert userref != pair_userref("XXBTZEUR")
+    assert 0 < userref < 2**31
@@ -0,0 +1,133 @@
+"""websocket.py tests module."""
+import io
+import socket
+import threading
+from typing import Callable, List
+
+import pytest
+
+from krakendca.websocket import (
+    OPCODE_CLOSE,
+    OPCODE_PING,
+    OPCODE_PONG,
+    OPCODE_TEXT,
+    WebSocket,
+    WebSocketClosed,
+    accept_key,
+    encode_frame,
+    read_frame,
+)
+
+
+class WebSocketServer:
+    """
+    Local WebSocket server standing in for Kraken, serving connections one
+    after the other with a handler receiving the connection and its
+    stream.
+    """
+
+    url: str
+    received: List[str]
+
+    def __init__(self, handler: Callable, connections: int = 1) -> None:
+        self.handler = handler
+        self.connections = connections
+        self.received = []
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.url = f"ws://127.0.0.1:{self.server.getsockname()[1]}/"
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self) -> None:
+        try:
+            for _ in range(self.connections):
+                self.serve_connection()
+        finally:
+            self.server.close()
+
+    def serve_connection(self) -> None:
+        connection, _ = self.server.accept()
+        stream = connection.makefile("rb")
+        key = ""
+        while True:
+            line = stream.readline().decode().strip()
+            if not line:
+                break
+            if line.lower().startswith("sec-websocket-key:"):
+                key = line.split(":", 1)[1].strip()
+        connection.sendall(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n"
+            ).encode()
+        )
+        try:
+            self.handler(self, connection, stream)
+        except (OSError, WebSocketClosed):
+            pass
+        finally:
+            connection.close()
+
+    def send(self, connection: socket.socket, message: str) -> None:
+        connection.sendall(
+            encode_frame(OPCODE_TEXT, message.encode(), mask=False)
+        )
+
+    def receive(self, stream) -> str:
+        final, opcode, payload = read_frame(stream)
+        message = payload.decode()
+        self.received.append(message)
+        return message
+
+
+def test_encode_read_frame() -> None:
+    for size in (5, 300, 70000):
+        payload = b"x" * size
+        for mask in (True, False):
+            stream = io.BytesIO(encode_frame(OPCODE_TEXT, payload, mask))
+            assert read_frame(stream) == (True, OPCODE_TEXT, payload)
+    with pytest.raises(WebSocketClosed):
+        read_frame(io.BytesIO(b"\x81"))
+
+
+def test_send_receive() -> None:
+    def handler(server, connection, stream):
+        message = server.receive(stream).encode()
+        # Ping answered by the client before reading next message.
+        connection.sendall(encode_frame(OPCODE_PING, b"ping", mask=False))
+        # Fragmented message.
+        connection.sendall(bytes([0x01, 3]) + b"ech")
+        connection.sendall(bytes([0x80, len(message) + 2]) + b"o " + message)
+        final, opcode, payload = read_frame(stream)
+        server.received.append((opcode, payload))
+        connection.sendall(encode_frame(OPCODE_CLOSE, b"", mask=False))
+
+    server = WebSocketServer(handler)
+    websocket = WebSocket.connect(server.url, timeout=5)
+    websocket.send("hello")
+    assert websocket.receive() == "echo hello"
+    with pytest.raises(WebSocketClosed):
+        websocket.receive()
+    websocket.close()
+    server.thread.join(5)
+    assert server.received == ["hello", (OPCODE_PONG, b"ping")]
+
+
+def test_handshake_error() -> None:
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+
+    def serve():
+        connection, _ = server.accept()
+        connection.recv(4096)
+        connection.sendall(b"HTTP/1.1 403 Forbidden\r\n\r\n")
+        connection.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    with pytest.raises(ConnectionError) as e_info:
+        WebSocket.connect(f"ws://127.0.0.1:{port}/", timeout=5)
+    assert "WebSocket handshake failed" in str(e_info.value)
+    thread.join(5)
+    server.close()